@@ -10,6 +10,10 @@ import sqlite3
 import subprocess
 from datetime import datetime, timedelta
 
+# 批量写库（WAL + TEMP 暂存表 + 一个事务合并）
+sys.path.append(os.path.join(os.path.expanduser("~"), "Coding", "Financial_System", "Query"))
+from Bulk_Writer import BulkWriter
+
 def show_alert(message):
     # AppleScript代码模板
     applescript_code = f'display dialog "{message}" buttons {{"OK"}} default button "OK"'
@@ -21,48 +25,32 @@ def insert_screener_records(db_file, screener_data, prices, volumes):
     """
     把 screener 抓到的 price/volume 写入到对应 sector 表，
     date = 昨天(系统时间-1天)。
-    如果昨天已有同一只票的记录，则跳过不插入。
+    如果昨天已有同一只票的记录，则跳过不插入（ON CONFLICT DO NOTHING）。
     """
     # 计算“昨天”的日期字符串
     yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
-    conn = sqlite3.connect(db_file, timeout=60.0)
-    cur = conn.cursor()
-
-    # 取出数据库中已有的表名，避免 typo 或 SQL 注入
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    valid_tables = {row[0] for row in cur.fetchall()}
-    inserted = 0
-    skipped  = 0
-    for sector, symbols in screener_data.items():
-        if sector not in valid_tables:
-            print(f"⚠️ 警告：数据库中不存在表 `{sector}`，已跳过该 sector 的写入")
-            continue
-        for symbol in symbols:
-            price = prices.get(symbol)
-            vol   = volumes.get(symbol)
-            if price is None or vol is None:
-                # 不该发生，保证 read_screener_file 一定把 price/volume 都解析了
-                continue
-
-            # 检查昨天同一只票的记录是否已存在
-            cur.execute(
-                f'SELECT 1 FROM "{sector}" WHERE date=? AND name=? LIMIT 1;',
-                (yesterday, symbol)
-            )
-            if cur.fetchone():
-                skipped += 1
+    with BulkWriter(db_file) as writer:
+        # 取出数据库中已有的表名，避免 typo 或 SQL 注入
+        valid_tables = {row[0] for row in writer.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'")}
+        for sector, symbols in screener_data.items():
+            if sector not in valid_tables:
+                print(f"⚠️ 警告：数据库中不存在表 `{sector}`，已跳过该 sector 的写入")
                 continue
-
-            # 不存在则插入 (增加了 open, high, low，这里暂时设为 None)
-            cur.execute(
-                f'''INSERT INTO "{sector}" (date, name, price, volume, open, high, low)
-                    VALUES (?, ?, ?, ?, ?, ?, ?);''',
-                (yesterday, symbol, price, vol, None, None, None)
-            )
-            inserted += 1
-    conn.commit()
-    conn.close()
+            # 不该出现缺 price/volume 的情况，read_screener_file 一定把两者都解析了
+            # open, high, low 暂时设为 None
+            rows = [(yesterday, symbol, prices[symbol], volumes[symbol], None, None, None)
+                    for symbol in symbols
+                    if prices.get(symbol) is not None and volumes.get(symbol) is not None]
+            if rows:
+                writer.add(sector, rows, on_conflict="ignore")
+        staged = writer.pending()
+        stats = writer.commit()
+
+    inserted = stats['changed']
+    skipped = staged - inserted
+    print(BulkWriter.describe(stats))
     print(f"✅ 插入完成：{inserted} 条新纪录，跳过 {skipped} 条已有记录（日期：{yesterday}）")
 
 # 读取screener数据文件
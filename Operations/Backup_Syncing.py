@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 from datetime import datetime, timedelta
 import shutil
 
@@ -7,6 +8,9 @@ import shutil
 
 USER_HOME = os.path.expanduser("~")
 
+sys.path.append(os.path.join(USER_HOME, 'Coding/Financial_System/Query'))
+from Earning_History_Store import export_if_dirty as export_earning_history
+
 # 定义源文件和目标目录的路径
 LOCAL_DOWNLOAD_BACKUP = os.path.join(USER_HOME, 'Downloads/backup/DB_backup')
 
@@ -267,8 +271,11 @@ def update_version_json(new_files_info, updated_base_names, updated_files_list):
 
 # --- 主程序执行 ---
 
-if __name__ == "__main__":
-    
+def main(ctx=None):
+    """ctx: 与其他流水线阶段的入口一致；备份排在 commit 之后，读的是已经写回磁盘的文件，用不到上下文"""
+    # 0. 扫描脚本只写库：备份前把库里没导出的 Earning_History 记录导出成 JSON
+    export_earning_history()
+
     # 1. 执行简单的覆盖备份
     print("--- 开始执行简单覆盖备份 ---")
     for source, dest_list in SIMPLE_BACKUP_FILES.items():
@@ -279,3 +286,7 @@ if __name__ == "__main__":
     backup_with_timestamp_and_cleanup()
     
     print("\n所有任务已完成。")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,16 @@ from PyQt5.QtGui import QKeySequence
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
+TAG_NEIGHBOURS_SCRIPT = os.path.join(BASE_CODING_DIR, "Financial_System", "Query", "Tag_Neighbours.py")
+
+def refresh_tag_neighbours():
+    """保存后在后台增量刷新相似 symbol 的预计算表（Tag_Neighbours），不阻塞编辑器"""
+    try:
+        subprocess.Popen([sys.executable, TAG_NEIGHBOURS_SCRIPT, '--refresh'],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    except Exception as e:
+        print(f"启动 Tag_Neighbours 刷新失败: {e}")
+
 def get_clipboard_content():
     """获取剪贴板内容，包含错误处理"""
     try:
@@ -307,6 +317,7 @@ class TagEditor(QMainWindow):
         try:
             with open(self.json_file_path, 'w', encoding='utf-8') as file:
                 json.dump(self.data, file, ensure_ascii=False, indent=2)
+            refresh_tag_neighbours()
             return True
         except Exception as e:
             QMessageBox.critical(self, "Error", f"保存失败: {str(e)}")
@@ -1,6 +1,7 @@
 import sys
 import json
 import os
+import subprocess
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QListWidget, QListWidgetItem,
@@ -12,6 +13,16 @@ from PyQt5.QtGui import QKeySequence
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
+TAG_NEIGHBOURS_SCRIPT = os.path.join(BASE_CODING_DIR, "Financial_System", "Query", "Tag_Neighbours.py")
+
+def refresh_tag_neighbours():
+    """保存后在后台增量刷新相似 symbol 的预计算表（Tag_Neighbours），不阻塞编辑器"""
+    try:
+        subprocess.Popen([sys.executable, TAG_NEIGHBOURS_SCRIPT, '--refresh'],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    except Exception as e:
+        print(f"启动 Tag_Neighbours 刷新失败: {e}")
+
 class DroppableListWidget(QListWidget):
     """
     一个可接收拖拽项目的 QListWidget。
@@ -544,6 +555,7 @@ class TagEditor(QMainWindow):
             # 保存 earning 数据
             with open(self.earning_json_path, 'w', encoding='utf-8') as f:
                 json.dump(self.earning_data, f, ensure_ascii=False, indent=4)
+            refresh_tag_neighbours()
             
             self.is_dirty = False
             self.setWindowTitle(self.base_window_title)
@@ -1,25 +1,30 @@
 import sqlite3
 import sys
 import os
-from typing import Callable, Tuple, Dict, Set
+from typing import Callable, Tuple, Dict, Set, Optional
 
 USER_HOME = os.path.expanduser("~")
 
 db_path = os.path.join(USER_HOME, 'Coding/Database/Finance.db')
 
+sys.path.append(os.path.join(USER_HOME, 'Coding/Financial_System/Query'))
+from Bulk_Writer import BulkWriter
+
 def fill_missing_ratio_data(
     cursor: sqlite3.Cursor,
     name1: str,
     name2: str,
     result_name: str,
     op: Callable[[float, float], float] = lambda a, b: a / b,
-    digits: int = 2
+    digits: int = 2,
+    writer: BulkWriter = None
 ) -> int:
     """
     补充 result_name 的历史缺失数据。
     数据基于 name1 和 name2 在相同日期的数据，通过 op 计算得到。
     如果某日期的 result_name 数据已存在，则不会重复插入。
-    返回实际插入的条数。
+    传了 writer 时计算结果只暂存到 BulkWriter（由调用方一次 commit），返回暂存的条数；
+    否则逐条 INSERT，返回实际插入的条数。
     """
     print(f"\n开始为 {result_name} 检查并补充历史缺失数据...")
 
@@ -59,6 +64,7 @@ def fill_missing_ratio_data(
 
     # 5. 遍历这些日期，计算并插入数据
     inserted_count = 0
+    staged_rows = []
     for date_to_process in dates_to_fill:
         price1 = data1_map.get(date_to_process)
         price2 = data2_map.get(date_to_process)
@@ -72,6 +78,9 @@ def fill_missing_ratio_data(
             raw_value = op(price1, price2)
             result_value = round(raw_value, digits)
 
+            if writer is not None:
+                staged_rows.append((date_to_process, result_name, result_value))
+                continue
             cursor.execute(
                 "INSERT INTO Currencies (date, name, price) VALUES (?, ?, ?)",
                 (date_to_process, result_name, result_value)
@@ -88,6 +97,10 @@ def fill_missing_ratio_data(
         except Exception as e:
             print(f"警告：在日期 {date_to_process} 处理 {result_name} 时发生错误: {e}，跳过。")
     
+    if staged_rows:
+        inserted_count = writer.add("Currencies", staged_rows, columns=("date", "name", "price"),
+                                    on_conflict="ignore")
+
     if inserted_count > 0:
         print(f"✅ 成功为 {result_name} 补充了 {inserted_count} 条历史数据。")
     else:
@@ -102,16 +115,17 @@ def insert_ratio(
     result_name: str,
     op: Callable[[float, float], float] = lambda a, b: a / b,
     digits: int = 2
-) -> Tuple[int, int]:
+) -> Tuple[int, Optional[str]]:
     """
     取 name1/name2 最新共同日期的数据，按 op 计算结果并插入或更新。
     - 如果目标数据不存在，则插入。
     - 如果目标数据已存在但值不同，则更新。
     - 如果目标数据已存在且值相同，则跳过。
-    返回 (操作行数, lastrowid)。
-    - 插入: (1, new_id)
-    - 更新: (1, -1)
-    - 跳过: (0, -1)
+    返回 (操作行数, 插入的日期)。
+    - 插入: (1, latest_date)
+    - 更新: (1, None)
+    - 跳过: (0, None)
+    不用 lastrowid：Schema_Migration --without-rowid 重建后的 Currencies 没有 rowid。
     """
     # 1) 找 name1 和 name2 共同的最新日期
     cursor.execute(
@@ -163,7 +177,7 @@ def insert_ratio(
     if existing_data:
         if abs(existing_data[0] - result) < (10**-(digits+1)): # 比较浮点数，允许微小误差
             # print(f"{result_name} 在 {latest_date} 的数据已存在且值相同 ({result})，跳过最新数据插入。")
-            return 0, -1 
+            return 0, None
         else:
             # 如果值不同，执行更新操作
             print(f"🔄 信息: {result_name} 在 {latest_date} 的数据已存在但值不同，将执行更新。")
@@ -173,32 +187,40 @@ def insert_ratio(
                 "UPDATE Currencies SET price = ? WHERE date = ? AND name = ?",
                 (result, latest_date, result_name)
             )
-            # 返回更新的行数 (通常是1) 和 -1 (因为没有新 lastrowid)
-            return cursor.rowcount, -1
+            # 返回更新的行数 (通常是1) 和 None (没有新插入的日期)
+            return cursor.rowcount, None
 
     # 3) 如果数据不存在，则计算并插入
     cursor.execute(
         "INSERT INTO Currencies (date, name, price) VALUES (?, ?, ?)",
         (latest_date, result_name, result)
     )
-    return cursor.rowcount, cursor.lastrowid
+    return cursor.rowcount, latest_date
 
 def main():
-    conn = sqlite3.connect(db_path)
+    # 历史补数先暂存，一个事务合并（WAL，不阻塞正在读库的 GUI）；最新日期的 5 条仍逐条比对插入 / 更新
+    writer = BulkWriter(db_path)
+    conn = writer.conn
     cursor = conn.cursor()
 
     try:
         # --- 首先，补充历史缺失数据 ---
         # 为 CNYI 补充历史数据
-        fill_missing_ratio_data(cursor, 'DXY', 'USDCNY', 'CNYI', op=lambda a, b: a / b, digits=3)
+        fill_missing_ratio_data(cursor, 'DXY', 'USDCNY', 'CNYI', op=lambda a, b: a / b, digits=3, writer=writer)
         # 为 JPYI 补充历史数据
-        fill_missing_ratio_data(cursor, 'DXY', 'USDJPY', 'JPYI', op=lambda a, b: a / b, digits=4)
+        fill_missing_ratio_data(cursor, 'DXY', 'USDJPY', 'JPYI', op=lambda a, b: a / b, digits=4, writer=writer)
         # 为 EURI 补充历史数据
-        fill_missing_ratio_data(cursor, 'DXY', 'EURUSD', 'EURI', op=lambda a, b: a * b, digits=2)
+        fill_missing_ratio_data(cursor, 'DXY', 'EURUSD', 'EURI', op=lambda a, b: a * b, digits=2, writer=writer)
         # 为 CHFI 补充历史数据
-        fill_missing_ratio_data(cursor, 'DXY', 'USDCHF', 'CHFI', op=lambda a, b: a / b, digits=2)
+        fill_missing_ratio_data(cursor, 'DXY', 'USDCHF', 'CHFI', op=lambda a, b: a / b, digits=2, writer=writer)
         # 为 GBPI 补充历史数据
-        fill_missing_ratio_data(cursor, 'DXY', 'GBPUSD', 'GBPI', op=lambda a, b: a * b, digits=2)
+        fill_missing_ratio_data(cursor, 'DXY', 'GBPUSD', 'GBPI', op=lambda a, b: a * b, digits=2, writer=writer)
+
+        stats = writer.commit()
+        if stats['failed']:
+            raise sqlite3.DatabaseError(f"补充历史数据失败: {stats['failed']['Currencies']}")
+        if stats['rows']:
+            print(BulkWriter.describe(stats))
 
         print("\n开始处理（或确认）最新日期的数据：")
         
@@ -213,13 +235,12 @@ def main():
         ]
 
         for r in ratios_to_process:
-            cnt, lid = insert_ratio(cursor, r['n1'], r['n2'], r['res'], op=r['op'], digits=r['dig'])
+            cnt, date_val = insert_ratio(cursor, r['n1'], r['n2'], r['res'], op=r['op'], digits=r['dig'])
             
             if cnt > 0:  # cnt > 0 意味着发生了插入或更新
-                if lid > 0:  # lid > 0 意味着是插入操作
-                    date_val = cursor.execute('SELECT date FROM Currencies WHERE rowid=?', (lid,)).fetchone()[0]
-                    print(f"✔️  {r['res']:<4} 最新数据已插入: {cnt} 条 (日期={date_val}, ID={lid})")
-                else:  # lid == -1 意味着是更新操作
+                if date_val:  # 返回了日期意味着是插入操作
+                    print(f"✔️  {r['res']:<4} 最新数据已插入: {cnt} 条 (日期={date_val})")
+                else:  # None 意味着是更新操作
                     print(f"🔄  {r['res']:<4} 最新数据已更新。")
             else:  # cnt == 0 意味着数据已存在且值相同，跳过
                 print(f"👌  {r['res']:<4} 最新数据已存在且值相同，无需操作。")
@@ -246,7 +267,7 @@ def main():
         conn.rollback()
         sys.exit(1)
     finally:
-        conn.close()
+        writer.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
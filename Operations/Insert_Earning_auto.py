@@ -20,6 +20,7 @@ from PyQt6.QtCore import Qt, QTimer
 HOME = os.path.expanduser("~") 
 sys.path.append(os.path.join(HOME, 'Coding/Financial_System/Query'))
 from Chart_input import plot_financial_data
+from Tool_Host import launch as launch_in_tool_host
 
 TXT_PATH = os.path.join(HOME, "Coding/News/Earnings_Release_new.txt")
 SECTORS_JSON_PATH = os.path.join(HOME, "Coding/Financial_System/Modules/Sectors_All.json")
@@ -56,7 +57,7 @@ def execute_external_script(script_type, keyword):
     try:
         if script_type in ['futu', 'kimi']:
             subprocess.Popen(['osascript', script_configs[script_type], keyword])
-        else:
+        elif not launch_in_tool_host(script_configs[script_type], [keyword]):
             python_path = '/Library/Frameworks/Python.framework/Versions/Current/bin/python3'
             subprocess.Popen([python_path, script_configs[script_type], keyword])
     except Exception as e:
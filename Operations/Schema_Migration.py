@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Schema_Migration.py
+Finance.db 的版本化 schema 迁移 & 索引管理
+
+背景：各板块表只有 UNIQUE(date, name)，这是一个 date 在前的索引，
+而几乎所有热点查询都是 WHERE name = ? ORDER BY date，只能走全表扫描或
+"索引 + 回表"。本脚本为所有板块表、Earning、Options、MNSPP 安装
+(name, date, ...) 的覆盖索引，让单只 symbol 的查询变成纯索引范围扫描。
+
+版本号记录在 PRAGMA user_version 中，每个迁移只会执行一次。
+
+用法:
+    python Schema_Migration.py                 # 迁移到最新版本
+    python Schema_Migration.py --status        # 查看当前版本与各表索引情况
+    python Schema_Migration.py --bench         # 迁移前后各跑一次查询基准
+    python Schema_Migration.py --without-rowid # 额外把板块表重建为 WITHOUT ROWID 聚簇表
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Finance.db")
+SECTORS_ALL_JSON = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Sectors_All.json")
+
+# 旧版 Chart_input.fetch_data 在读路径上创建的索引（库内全局同名，只会建在第一张被打开的表上）
+LEGACY_INDEX_NAMES = ["idx_name"]
+
+# 覆盖索引中 key 之后附带的列（只会挑选表中真实存在的列）
+SECTOR_PAYLOAD_COLUMNS = ["price", "volume", "open", "high", "low"]
+EXTRA_TABLE_SPECS = {
+    # 表名: (key 列, 附带列)
+    "Earning": (["name", "date"], ["price"]),
+    "Options": (["name", "date"], ["iv", "price", "change"]),
+    "MNSPP":   (["symbol"], ["shares", "marketcap", "pe_ratio", "pb"]),
+}
+
+BENCH_SAMPLE_SIZE = 50
+
+
+# =========================================================
+# 基础工具
+# =========================================================
+
+def index_name_for(table_name):
+    """统一的覆盖索引命名，YF_Today / Tiger_Today 建表时使用同一个名字"""
+    return f"idx_{table_name}_name_date"
+
+def get_user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def set_user_version(conn, version):
+    # PRAGMA 不支持参数绑定，这里 version 一定是 int
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+def table_exists(conn, table_name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+    ).fetchone()
+    return row is not None
+
+def get_table_columns(conn, table_name):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()]
+
+def is_without_rowid(conn, table_name):
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+    ).fetchone()
+    return bool(row and row[0] and "WITHOUT ROWID" in row[0].upper())
+
+def load_sector_tables(conn, json_path=SECTORS_ALL_JSON):
+    """Sectors_All.json 的分组名 ∩ 数据库中真实存在的表"""
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            sectors = list(json.load(f).keys())
+    except Exception as e:
+        print(f"⚠️ 读取 Sectors_All.json 失败，回退为扫描数据库: {e}")
+        sectors = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()]
+    tables = []
+    for t in sectors:
+        if not table_exists(conn, t):
+            continue
+        cols = get_table_columns(conn, t)
+        if "name" in cols and "date" in cols:
+            tables.append(t)
+    return tables
+
+def build_index_spec(conn, table_name):
+    """
+    返回 (key 列, 附带列)，附带列会被放进索引里，
+    这样 SELECT date, price, ... WHERE name = ? 不需要回表。
+    """
+    cols = get_table_columns(conn, table_name)
+    if table_name in EXTRA_TABLE_SPECS:
+        keys, payload = EXTRA_TABLE_SPECS[table_name]
+    else:
+        keys, payload = ["name", "date"], SECTOR_PAYLOAD_COLUMNS
+    if not all(k in cols for k in keys):
+        return None
+    return keys, [c for c in payload if c in cols]
+
+
+# =========================================================
+# 迁移步骤
+# =========================================================
+
+def ensure_covering_index(conn, table_name):
+    """
+    为单张表安装覆盖索引；WITHOUT ROWID 表本身就按 (name, date) 聚簇，无需再建。
+    conn 也可以是 cursor：YF_Today / Tiger_Today / YF_StockETFCrypto 建表后直接调用这里，
+    附带列按表中真实存在的列挑选，不再各自维护一份列清单。
+    """
+    if is_without_rowid(conn, table_name):
+        return False
+    spec = build_index_spec(conn, table_name)
+    if spec is None:
+        return False
+    keys, payload = spec
+    col_sql = ", ".join(f'"{c}"' for c in keys + payload)
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS "{index_name_for(table_name)}" '
+        f'ON "{table_name}" ({col_sql})'
+    )
+    return True
+
+def migration_1_covering_indexes(conn):
+    """v1: 删除读路径上遗留的 idx_name，为所有板块表 + Earning/Options/MNSPP 建覆盖索引"""
+    for idx in LEGACY_INDEX_NAMES:
+        conn.execute(f'DROP INDEX IF EXISTS "{idx}"')
+    tables = load_sector_tables(conn) + [t for t in EXTRA_TABLE_SPECS if table_exists(conn, t)]
+    for t in tables:
+        if ensure_covering_index(conn, t):
+            print(f"  ✅ {t}: {index_name_for(t)}")
+        else:
+            print(f"  ⏭️ {t}: 跳过")
+
+def migration_2_analyze(conn):
+    """v2: 收集统计信息，让查询规划器稳定选择新索引"""
+    conn.execute("ANALYZE")
+
+# 版本号 -> 迁移函数，只允许在末尾追加
+MIGRATIONS = [
+    (1, migration_1_covering_indexes),
+    (2, migration_2_analyze),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def migrate(db_path=DB_PATH, target_version=LATEST_VERSION):
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        current = get_user_version(conn)
+        print(f"当前 schema 版本: {current}，目标版本: {target_version}")
+        for version, func in MIGRATIONS:
+            if version <= current or version > target_version:
+                continue
+            print(f"▶ 执行迁移 v{version}: {func.__doc__.strip() if func.__doc__ else func.__name__}")
+            t0 = time.perf_counter()
+            try:
+                conn.execute("BEGIN")
+                func(conn)
+                set_user_version(conn, version)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"❌ 迁移 v{version} 失败，已回滚: {e}")
+                return current
+            current = version
+            print(f"  v{version} 完成，用时 {time.perf_counter() - t0:.2f}s")
+        return current
+    finally:
+        conn.close()
+
+
+# =========================================================
+# 可选：重建为 WITHOUT ROWID（按 (name, date) 聚簇存储）
+# =========================================================
+
+def rebuild_without_rowid(conn, table_name):
+    """
+    把一张板块表重建为 PRIMARY KEY(name, date) WITHOUT ROWID，
+    保留 UNIQUE(date, name)，以兼容现有的 ON CONFLICT(date, name) 写法。
+    """
+    if is_without_rowid(conn, table_name):
+        return False
+    cols = get_table_columns(conn, table_name)
+    if "id" in cols:
+        # YF_StockETFCrypto 建的表带自增 id，Show_DATABASE 依赖它排序，保留 rowid 布局
+        print(f"  ⏭️ {table_name}: 含自增 id 列，保留覆盖索引方案")
+        return False
+    types = {r[1]: r[2] for r in conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()}
+    col_defs = ",\n            ".join(f'"{c}" {types.get(c) or ""}'.rstrip() for c in cols)
+    col_list = ", ".join(f'"{c}"' for c in cols)
+    tmp_name = f"{table_name}__new"
+
+    conn.execute(f'DROP TABLE IF EXISTS "{tmp_name}"')
+    conn.execute(f'''
+        CREATE TABLE "{tmp_name}" (
+            {col_defs},
+            PRIMARY KEY(name, date),
+            UNIQUE(date, name)
+        ) WITHOUT ROWID
+    ''')
+    # WITHOUT ROWID 的主键强制 NOT NULL，脏数据直接丢弃
+    conn.execute(f'''
+        INSERT OR IGNORE INTO "{tmp_name}" ({col_list})
+        SELECT {col_list} FROM "{table_name}"
+        WHERE name IS NOT NULL AND date IS NOT NULL
+        ORDER BY name, date
+    ''')
+    conn.execute(f'DROP TABLE "{table_name}"')
+    conn.execute(f'ALTER TABLE "{tmp_name}" RENAME TO "{table_name}"')
+    return True
+
+def convert_sector_tables_without_rowid(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        for t in load_sector_tables(conn):
+            t0 = time.perf_counter()
+            try:
+                conn.execute("BEGIN")
+                changed = rebuild_without_rowid(conn, t)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"❌ {t} 重建失败，已回滚: {e}")
+                continue
+            if changed:
+                print(f"  ✅ {t} 已重建为 WITHOUT ROWID，用时 {time.perf_counter() - t0:.2f}s")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+# =========================================================
+# 基准 & 状态
+# =========================================================
+
+def explain_plan(conn, table_name):
+    cols = [c for c in ["date"] + SECTOR_PAYLOAD_COLUMNS if c in get_table_columns(conn, table_name)]
+    sql = f'SELECT {", ".join(cols)} FROM "{table_name}" WHERE name = ? ORDER BY date'
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", ("__probe__",)).fetchall()
+    return sql, " | ".join(r[-1] for r in rows)
+
+def run_benchmark(db_path=DB_PATH, sample_size=BENCH_SAMPLE_SIZE, seed=42):
+    """
+    每张板块表随机抽 sample_size 个 symbol，执行 fetch_data 同款查询，
+    返回 {table: (平均毫秒, 查询计划)}
+    """
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    rng = random.Random(seed)
+    results = {}
+    try:
+        for t in load_sector_tables(conn):
+            names = [r[0] for r in conn.execute(f'SELECT DISTINCT name FROM "{t}"').fetchall()]
+            if not names:
+                continue
+            sample = rng.sample(names, min(sample_size, len(names)))
+            sql, plan = explain_plan(conn, t)
+            t0 = time.perf_counter()
+            for n in sample:
+                conn.execute(sql, (n,)).fetchall()
+            avg_ms = (time.perf_counter() - t0) * 1000 / len(sample)
+            results[t] = (avg_ms, plan)
+    finally:
+        conn.close()
+    return results
+
+def print_benchmark_diff(before, after):
+    print(f"\n{'表':<24}{'迁移前(ms)':>12}{'迁移后(ms)':>12}{'加速':>8}")
+    for t in sorted(set(before) | set(after)):
+        b = before.get(t, (None, ""))[0]
+        a = after.get(t, (None, ""))[0]
+        if b is None or a is None:
+            continue
+        speedup = f"{b / a:.1f}x" if a > 0 else "-"
+        print(f"{t:<24}{b:>12.3f}{a:>12.3f}{speedup:>8}")
+    print("\n查询计划:")
+    for t in sorted(after):
+        print(f"  {t}: {before.get(t, (0, '?'))[1]}  ->  {after[t][1]}")
+
+def print_status(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        print(f"schema 版本: {get_user_version(conn)} / 最新 {LATEST_VERSION}")
+        for t in load_sector_tables(conn) + [t for t in EXTRA_TABLE_SPECS if table_exists(conn, t)]:
+            idx = [r[1] for r in conn.execute(f'PRAGMA index_list("{t}")').fetchall()]
+            layout = "WITHOUT ROWID" if is_without_rowid(conn, t) else "rowid"
+            print(f"  {t:<24}{layout:<15}{', '.join(idx)}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finance.db schema 迁移与索引管理")
+    parser.add_argument('--db', default=DB_PATH, help="数据库路径")
+    parser.add_argument('--status', action='store_true', help="只查看当前版本与索引")
+    parser.add_argument('--bench', action='store_true', help="迁移前后各跑一次查询基准")
+    parser.add_argument('--without-rowid', action='store_true', help="把板块表重建为 WITHOUT ROWID")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ 数据库不存在: {args.db}")
+        sys.exit(1)
+
+    if args.status:
+        print_status(args.db)
+        return
+
+    before = run_benchmark(args.db) if args.bench else None
+    migrate(args.db)
+    if args.without_rowid:
+        convert_sector_tables_without_rowid(args.db)
+    if args.bench:
+        after = run_benchmark(args.db)
+        print_benchmark_diff(before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import os
-import json
 import sqlite3
 import re
 import shutil
@@ -7,6 +6,10 @@ import sys
 from datetime import datetime, timedelta, date
 from collections import OrderedDict
 
+from Price_Store import get_global_store
+from Rolling_Extrema import ExtremaEngine
+from Modules_Cache import load_json, save_json, use_context
+
 # ==============================================================================
 # 全局配置 & 依赖检查
 # ==============================================================================
@@ -158,16 +161,14 @@ def run_update_colors():
         earnings_symbols |= parse_earnings_release(path)
 
     try:
-        with open(ConfigCompare.SECTORS_ALL_JSON_PATH, 'r', encoding='utf-8') as file:
-            sectors_data = json.load(file)
-            economics_symbols = set(sectors_data.get('Economics', []))
+        sectors_data = load_json(ConfigCompare.SECTORS_ALL_JSON_PATH)
+        economics_symbols = set(sectors_data.get('Economics', []))
     except Exception as e:
         print(f"读取 Sectors_All 错误: {e}")
         economics_symbols = set()
 
     try:
-        with open(ConfigCompare.COLOR_JSON_PATH, 'r', encoding='utf-8') as file:
-            colors = json.load(file)
+        colors = load_json(ConfigCompare.COLOR_JSON_PATH)
     except Exception as e:
         print(f"读取 Colors 错误: {e}")
         colors = {}
@@ -186,8 +187,7 @@ def run_update_colors():
     colors['red_keywords'] = final_keywords
 
     try:
-        with open(ConfigCompare.COLOR_JSON_PATH, 'w', encoding='utf-8') as file:
-            json.dump(colors, file, ensure_ascii=False, indent=4)
+        save_json(ConfigCompare.COLOR_JSON_PATH, colors, ensure_ascii=False, indent=4)
         print(f"Update Colors 完成。已更新: {ConfigCompare.COLOR_JSON_PATH}")
     except Exception as e:
         print(f"写入文件时发生错误: {e}")
@@ -195,8 +195,7 @@ def run_update_colors():
 def read_latest_date_info_all(gainer_loser_path):
     if not os.path.exists(gainer_loser_path):
         return None, {"gainer": [], "loser": []}
-    with open(gainer_loser_path, 'r') as f:
-        data = json.load(f)
+    data = load_json(gainer_loser_path)
     if not data:
         return None, {"gainer": [], "loser": []}
     latest_date = max(data.keys())
@@ -258,8 +257,7 @@ def run_compare_all():
     if not os.path.exists(ConfigCompare.SECTORS_ALL_JSON_PATH):
         return
 
-    with open(ConfigCompare.SECTORS_ALL_JSON_PATH, 'r') as f:
-        config_data = json.load(f)
+    config_data = load_json(ConfigCompare.SECTORS_ALL_JSON_PATH)
 
     output = []
     
@@ -391,8 +389,7 @@ def read_earnings_release_for_stocks(filepath, error_file_path):
 def read_gainers_losers_stocks(filepath):
     if not os.path.exists(filepath):
         return [], []
-    with open(filepath, 'r') as file:
-        data = json.load(file)
+    data = load_json(filepath)
     if not data:
         return [], []
     today_date = datetime.now().strftime("%Y-%m-%d")
@@ -417,10 +414,8 @@ def get_prices_available_days(cursor, table_name, name, dates):
 
 def run_compare_stocks(blacklist, interested_sectors):
     print("--- 开始执行: Compare_Stocks ---")
-    with open(ConfigCompare.SECTORS_ALL_JSON_PATH, 'r') as file:
-        data = json.load(file)
-    with open(ConfigCompare.DESCRIPTION_PATH, 'r') as file:
-        description_data = json.load(file)
+    data = load_json(ConfigCompare.SECTORS_ALL_JSON_PATH)
+    description_data = load_json(ConfigCompare.DESCRIPTION_PATH)
 
     earnings_maps = []
     for fpath in ConfigCompare.EARNINGS_FILES:
@@ -519,10 +514,8 @@ def get_prices_four_days_etf(cursor, table_name, name, dates):
 
 def run_compare_etfs(blacklist, interested_sectors):
     print("--- 开始执行: Compare_ETFs ---")
-    with open(ConfigCompare.SECTORS_ALL_JSON_PATH, 'r') as file:
-        data = json.load(file)
-    with open(ConfigCompare.DESCRIPTION_PATH, 'r') as file:
-        description_data = json.load(file)
+    data = load_json(ConfigCompare.SECTORS_ALL_JSON_PATH)
+    description_data = load_json(ConfigCompare.DESCRIPTION_PATH)
         
     symbol_to_tags = {}
     for item in description_data.get("stocks", []) + description_data.get("etfs", []):
@@ -698,8 +691,7 @@ def log_and_print_error(error_message):
 
 def load_blacklist_newlow_shared(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file).get("newlow", [])
+        return load_json(file_path).get("newlow", [])
     except Exception as e:
         print(f"读取黑名单错误: {e}")
         return []
@@ -716,14 +708,25 @@ def load_stock_splits_shared(file_path):
         print(f"读取拆股文件错误 (非致命): {e}")
     return stock_splits_symbols
 
-def get_latest_price_and_date_shared(cursor, table_name, name):
-    query = f"SELECT date, price FROM {table_name} WHERE name = ? ORDER BY date DESC LIMIT 1"
-    cursor.execute(query, (name,))
-    return cursor.fetchone()
+_EXTREMA_ENGINE = None
+
+def get_extrema_engine():
+    """5000/500/50/HighLow 共用一个引擎：每张板块表只扫描一次，区间最值全在内存里算"""
+    global _EXTREMA_ENGINE
+    if _EXTREMA_ENGINE is None:
+        _EXTREMA_ENGINE = ExtremaEngine(get_global_store(DB_PATH_ANALYSE))
+    return _EXTREMA_ENGINE
+
+def get_price_extremes_shared(engine, table_name, name, windows):
+    """windows: {interval: (start, end)} -> {interval: (max, min)}，空区间不出现在结果中"""
+    return {
+        k: (mx, mn)
+        for k, (mx, mn, cnt) in engine.window_extrema(table_name, name, windows).items()
+        if cnt
+    }
 
 def update_sectors_panel_json(config_path, updates, blacklist_newlow):
-    with open(config_path, 'r', encoding='utf-8') as file:
-        data = json.load(file, object_pairs_hook=OrderedDict)
+    data = load_json(config_path, ordered=True)
     for category, symbols in updates.items():
         if category in data:
             for symbol in symbols:
@@ -736,8 +739,7 @@ def update_sectors_panel_json(config_path, updates, blacklist_newlow):
                     print(f"Panel Update: '{symbol}' 在黑名单中，跳过")
         else:
             data[category] = {symbol: "" for symbol in symbols if symbol not in blacklist_newlow}
-    with open(config_path, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
+    save_json(config_path, data, ensure_ascii=False, indent=4)
 
 def parse_output_generic(output):
     updates = {}
@@ -756,9 +758,9 @@ def parse_output_generic(output):
 
 def _apply_color_updates_with_priority(color_path, updates, priority_map, log_prefix):
     try:
-        with open(color_path, 'r', encoding='utf-8') as file:
-            all_colors = json.load(file)
+        all_colors = load_json(color_path)
     except: return
+    if not all_colors: return  # Colors.json 不存在时不新建
     colors = {k: v for k, v in all_colors.items() if k != "red_keywords"}
     symbol_to_color = {}
     for color, symbols in colors.items():
@@ -784,8 +786,7 @@ def _apply_color_updates_with_priority(color_path, updates, priority_map, log_pr
                 symbol_to_color[name] = cat
                 print(f"[{log_prefix} Color] '{name}' 添加到 '{cat}'")
     colors["red_keywords"] = all_colors.get("red_keywords", [])
-    with open(color_path, 'w', encoding='utf-8') as f:
-        json.dump(colors, f, ensure_ascii=False, indent=4)
+    save_json(color_path, colors, ensure_ascii=False, indent=4)
 
 def clean_backups_analyse(directory, file_patterns):
     if not os.path.exists(directory): return
@@ -811,18 +812,10 @@ def clean_backups_analyse(directory, file_patterns):
 # 1. Analyse 5000 (Weekly)
 PATH_SECTORS_5000 = os.path.join(HOME, 'Coding/Financial_System/Modules/Sectors_5000.json')
 
-def get_price_comparison_5000(cursor, table_name, interval_weeks, name, validate):
+def get_window_5000(interval_weeks, validate):
     ex_validate = validate - timedelta(days=1)
     past_date = validate - timedelta(weeks=interval_weeks)
-    query = f"""
-    SELECT MAX(price), MIN(price)
-    FROM {table_name} WHERE date BETWEEN ? AND ? AND name = ?
-    """
-    cursor.execute(query, (past_date.strftime("%Y-%m-%d"), ex_validate.strftime("%Y-%m-%d"), name))
-    result = cursor.fetchone()
-    if result and (result[0] is not None and result[1] is not None):
-        return result
-    return None
+    return past_date.strftime("%Y-%m-%d"), ex_validate.strftime("%Y-%m-%d")
 
 def parse_output_color_5000(output):
     updates_color = {}
@@ -861,40 +854,35 @@ def run_logic_5000(blacklist_newlow, stock_splits_symbols):
     print("\n" + "="*40)
     print(">>> 正在执行: Analyse_Stocks_5000 (Weekly)")
     print("="*40)
-    with open(PATH_SECTORS_5000, 'r') as file:
-        data = json.load(file)
+    data = load_json(PATH_SECTORS_5000)
     output = []
     intervals = [6, 8, 10]
     valid_tables = ["Basic_Materials", "Communication_Services", "Consumer_Cyclical",
                     "Consumer_Defensive", "Energy", "Financial_Services", "Healthcare",
                     "Industrials", "Real_Estate", "Technology", "Utilities"]
-    with create_connection_analyse(DB_PATH_ANALYSE) as conn:
-        cursor = conn.cursor()
-        for table_name, names in data.items():
-            if table_name not in valid_tables: continue
-            for name in names:
-                if is_blacklisted(name): continue
-                result = get_latest_price_and_date_shared(cursor, table_name, name)
-                if not result:
-                    log_and_print_error(f"[5000] 无历史数据: {name}")
-                    continue
-                validate_str, validate_price = result
-                validate = datetime.strptime(validate_str, "%Y-%m-%d")
-                price_extremes = {}
-                for interval in intervals:
-                    res = get_price_comparison_5000(cursor, table_name, interval, name, validate)
-                    if res:
-                        price_extremes[interval] = res
-                for interval in intervals:
-                    _, min_price = price_extremes.get(interval, (None, None))
-                    if min_price is not None and validate_price <= min_price:
-                        if name in stock_splits_symbols:
-                            log_and_print_error(f"[5000] {name} 在拆股名单中，跳过。")
-                            break
-                        output_line = f"{table_name} {name} {interval}W_newlow"
-                        print(f"[5000 Output] {output_line}")
-                        output.append(output_line)
+    engine = get_extrema_engine()
+    for table_name, names in data.items():
+        if table_name not in valid_tables: continue
+        for name in names:
+            if is_blacklisted(name): continue
+            result = engine.latest(table_name, name)
+            if not result:
+                log_and_print_error(f"[5000] 无历史数据: {name}")
+                continue
+            validate_str, validate_price = result
+            validate = datetime.strptime(validate_str, "%Y-%m-%d")
+            windows = {interval: get_window_5000(interval, validate) for interval in intervals}
+            price_extremes = get_price_extremes_shared(engine, table_name, name, windows)
+            for interval in intervals:
+                _, min_price = price_extremes.get(interval, (None, None))
+                if min_price is not None and validate_price <= min_price:
+                    if name in stock_splits_symbols:
+                        log_and_print_error(f"[5000] {name} 在拆股名单中，跳过。")
                         break
+                    output_line = f"{table_name} {name} {interval}W_newlow"
+                    print(f"[5000 Output] {output_line}")
+                    output.append(output_line)
+                    break
     if output:
         final_output = "\n".join(output)
         updates = parse_output_generic(final_output)
@@ -905,18 +893,10 @@ def run_logic_5000(blacklist_newlow, stock_splits_symbols):
 # 2. Analyse 500 (Monthly)
 PATH_SECTORS_500 = os.path.join(HOME, 'Coding/Financial_System/Modules/Sectors_500.json')
 
-def get_price_comparison_500(cursor, table_name, interval_months, name, validate):
+def get_window_500(interval_months, validate):
     ex_validate = validate - timedelta(days=1)
     past_date = validate - relativedelta(months=int(interval_months))
-    query = f"""
-    SELECT MAX(price), MIN(price)
-    FROM {table_name} WHERE date BETWEEN ? AND ? AND name = ?
-    """
-    cursor.execute(query, (past_date.strftime("%Y-%m-%d"), ex_validate.strftime("%Y-%m-%d"), name))
-    result = cursor.fetchone()
-    if result and (result[0] is not None and result[1] is not None):
-        return result
-    return None
+    return past_date.strftime("%Y-%m-%d"), ex_validate.strftime("%Y-%m-%d")
 
 def parse_output_color_500(output):
     updates_color = {}
@@ -954,40 +934,35 @@ def run_logic_500(blacklist_newlow, stock_splits_symbols):
     print("\n" + "="*40)
     print(">>> 正在执行: Analyse_Stocks_500 (Monthly)")
     print("="*40)
-    with open(PATH_SECTORS_500, 'r') as file:
-        data = json.load(file)
+    data = load_json(PATH_SECTORS_500)
     output = []
     intervals = [5]
     valid_tables = ["Basic_Materials", "Communication_Services", "Consumer_Cyclical",
                     "Consumer_Defensive", "Energy", "Financial_Services", "Healthcare",
                     "Industrials", "Real_Estate", "Technology", "Utilities"]
-    with create_connection_analyse(DB_PATH_ANALYSE) as conn:
-        cursor = conn.cursor()
-        for table_name, names in data.items():
-            if table_name not in valid_tables: continue
-            for name in names:
-                if is_blacklisted(name): continue
-                result = get_latest_price_and_date_shared(cursor, table_name, name)
-                if not result:
-                    log_and_print_error(f"[500] 无历史数据: {name}")
-                    continue
-                validate_str, validate_price = result
-                validate = datetime.strptime(validate_str, "%Y-%m-%d")
-                price_extremes = {}
-                for interval in intervals:
-                    res = get_price_comparison_500(cursor, table_name, interval, name, validate)
-                    if res:
-                        price_extremes[interval] = res
-                for interval in intervals:
-                    _, min_price = price_extremes.get(interval, (None, None))
-                    if min_price is not None and validate_price <= min_price:
-                        if name in stock_splits_symbols:
-                            log_and_print_error(f"[500] {name} 在拆股名单中，跳过。")
-                            break
-                        output_line = f"{table_name} {name} {interval}M_newlow"
-                        print(f"[500 Output] {output_line}")
-                        output.append(output_line)
+    engine = get_extrema_engine()
+    for table_name, names in data.items():
+        if table_name not in valid_tables: continue
+        for name in names:
+            if is_blacklisted(name): continue
+            result = engine.latest(table_name, name)
+            if not result:
+                log_and_print_error(f"[500] 无历史数据: {name}")
+                continue
+            validate_str, validate_price = result
+            validate = datetime.strptime(validate_str, "%Y-%m-%d")
+            windows = {interval: get_window_500(interval, validate) for interval in intervals}
+            price_extremes = get_price_extremes_shared(engine, table_name, name, windows)
+            for interval in intervals:
+                _, min_price = price_extremes.get(interval, (None, None))
+                if min_price is not None and validate_price <= min_price:
+                    if name in stock_splits_symbols:
+                        log_and_print_error(f"[500] {name} 在拆股名单中，跳过。")
                         break
+                    output_line = f"{table_name} {name} {interval}M_newlow"
+                    print(f"[500 Output] {output_line}")
+                    output.append(output_line)
+                    break
     if output:
         final_output = "\n".join(output)
         updates = parse_output_generic(final_output)
@@ -1004,23 +979,14 @@ PATH_NEWHIGH_OUTPUT = os.path.join(HOME, 'Coding/News/10Y_newhigh_stock.txt')
 PATH_COMPARE_ALL = os.path.join(HOME, 'Coding/News/backup/Compare_All.txt')
 PATH_DESCRIPTION = os.path.join(HOME, 'Coding/Financial_System/Modules/description.json')
 
-def get_price_comparison_50(cursor, table_name, interval, name, validate):
-    today = datetime.now()
+def get_window_50(interval, validate, today):
     ex_validate = validate - timedelta(days=1)
     if interval < 1:
         days = int(interval * 30)
         past_date = validate - timedelta(days=days - 1)
     else:
         past_date = today - relativedelta(months=int(interval))
-    query = f"""
-    SELECT MAX(price), MIN(price)
-    FROM {table_name} WHERE date BETWEEN ? AND ? AND name = ?
-    """
-    cursor.execute(query, (past_date.strftime("%Y-%m-%d"), ex_validate.strftime("%Y-%m-%d"), name))
-    result = cursor.fetchone()
-    if result and (result[0] is not None and result[1] is not None):
-        return result
-    return None
+    return past_date.strftime("%Y-%m-%d"), ex_validate.strftime("%Y-%m-%d")
 
 def parse_output_color_50(output):
     updates_color = {}
@@ -1052,11 +1018,13 @@ def parse_output_color_50(output):
 
 def update_color_json_50(color_config_path, updates_colors):
     try:
-        with open(color_config_path, 'r', encoding='utf-8') as file:
-            all_colors = json.load(file)
+        all_colors = load_json(color_config_path)
     except Exception as e:
         print(f"读取Colors文件错误: {e}")
         return
+    if not all_colors:
+        print(f"读取Colors文件错误: {color_config_path} 不存在或为空")
+        return
     colors = {k: v for k, v in all_colors.items() if k != "red_keywords"}
     for category_list, names in updates_colors.items():
         for name in names:
@@ -1077,16 +1045,14 @@ def update_color_json_50(color_config_path, updates_colors):
                 print(f"[50 Color] '{name}' 已在 '{category_list}' 中")
     colors["red_keywords"] = all_colors.get("red_keywords", [])
     try:
-        with open(color_config_path, 'w', encoding='utf-8') as file:
-            json.dump(colors, file, ensure_ascii=False, indent=4)
+        save_json(color_config_path, colors, ensure_ascii=False, indent=4)
     except Exception as e:
         print(f"写入Colors文件错误: {e}")
 
 def load_existing_highs_json_50(file_path):
     highs_map = {}
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(file_path)
         if 'stocks' in data and isinstance(data.get('stocks'), list):
             for stock_group in data['stocks']:
                 if isinstance(stock_group, dict):
@@ -1111,8 +1077,7 @@ def read_compare_all_50(file_path):
 def load_tags_map_50(file_path):
     tag_map = {}
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(file_path)
         for section in ['stocks', 'etfs']:
             for item in data.get(section, []):
                 symbol = item.get('symbol')
@@ -1146,8 +1111,7 @@ def run_logic_50(blacklist_newlow, stock_splits_symbols):
     print("\n" + "="*40)
     print(">>> 正在执行: Analyse_Stocks_50 (All Sectors & Highs)")
     print("="*40)
-    with open(PATH_SECTORS_ALL, 'r') as file:
-        data = json.load(file)
+    data = load_json(PATH_SECTORS_ALL)
     output = []
     output_high = []
     intervals = [120, 60, 24, 13]
@@ -1157,45 +1121,42 @@ def run_logic_50(blacklist_newlow, stock_splits_symbols):
     valid_tables = ["Basic_Materials", "Communication_Services", "Consumer_Cyclical",
                     "Consumer_Defensive", "Energy", "Financial_Services", "Healthcare",
                     "Industrials", "Real_Estate", "Technology", "Utilities"]
-    with create_connection_analyse(DB_PATH_ANALYSE) as conn:
-        cursor = conn.cursor()
-        for table_name, names in data.items():
-            if table_name not in valid_tables: continue
-            for name in names:
-                if is_blacklisted(name): continue
-                result = get_latest_price_and_date_shared(cursor, table_name, name)
-                if not result:
-                    log_and_print_error(f"[50] 无历史数据: {name}")
-                    continue
-                validate_str, validate_price = result
-                validate = datetime.strptime(validate_str, "%Y-%m-%d")
-                price_extremes = {}
-                for interval in intervals:
-                    res = get_price_comparison_50(cursor, table_name, interval, name, validate)
-                    if res:
-                        price_extremes[interval] = res
-                
-                # Check New Highs
-                for highinterval in highintervals:
-                    max_price, _ = price_extremes.get(highinterval, (None, None))
-                    if max_price is not None and validate_price >= max_price:
-                        if highinterval >= 12:
-                            years = highinterval // 12
-                            output_line = f"{table_name} {name} {years}Y_newhigh {validate_price}"
-                            output_high.append(output_line)
-                # Check New Lows
-                for interval in intervals:
-                    _, min_price = price_extremes.get(interval, (None, None))
-                    if min_price is not None and validate_price <= min_price:
-                        if interval >= 12:
-                            if name in stock_splits_symbols:
-                                log_and_print_error(f"[50] {name} 在拆股名单中，跳过。")
-                                break
-                            years = interval // 12
-                            output_line = f"{table_name} {name} {years}Y_newlow"
-                            print(f"[50 Output] {output_line}")
-                            output.append(output_line)
+    engine = get_extrema_engine()
+    today = datetime.now()
+    for table_name, names in data.items():
+        if table_name not in valid_tables: continue
+        for name in names:
+            if is_blacklisted(name): continue
+            result = engine.latest(table_name, name)
+            if not result:
+                log_and_print_error(f"[50] 无历史数据: {name}")
+                continue
+            validate_str, validate_price = result
+            validate = datetime.strptime(validate_str, "%Y-%m-%d")
+            windows = {interval: get_window_50(interval, validate, today) for interval in intervals}
+            price_extremes = get_price_extremes_shared(engine, table_name, name, windows)
+            
+            # Check New Highs
+            for highinterval in highintervals:
+                max_price, _ = price_extremes.get(highinterval, (None, None))
+                if max_price is not None and validate_price >= max_price:
+                    if highinterval >= 12:
+                        years = highinterval // 12
+                        output_line = f"{table_name} {name} {years}Y_newhigh {validate_price}"
+                        output_high.append(output_line)
+            # Check New Lows
+            for interval in intervals:
+                _, min_price = price_extremes.get(interval, (None, None))
+                if min_price is not None and validate_price <= min_price:
+                    if interval >= 12:
+                        if name in stock_splits_symbols:
+                            log_and_print_error(f"[50] {name} 在拆股名单中，跳过。")
                             break
+                        years = interval // 12
+                        output_line = f"{table_name} {name} {years}Y_newlow"
+                        print(f"[50 Output] {output_line}")
+                        output.append(output_line)
+                        break
     
     if output:
         final_output = "\n".join(output)
@@ -1243,14 +1204,6 @@ HL_TIME_INTERVALS = {
     "[5Y]":         relativedelta(years=-5)
 }
 
-def get_prices_in_range_hl(cursor, table_name, symbol, start_date_str, end_date_str):
-    try:
-        query = f'SELECT price FROM "{table_name}" WHERE name = ? AND date BETWEEN ? AND ?'
-        cursor.execute(query, (symbol, start_date_str, end_date_str))
-        return [row[0] for row in cursor.fetchall() if row[0] is not None]
-    except Exception as e:
-        print(f"[HL] Warning: Could not query price range for {symbol}. {e}")
-        return []
 
 def parse_highlow_backup_hl(filepath):
     parsed_data = {label: {"Low": [], "High": []} for label in HL_TIME_INTERVALS.keys()}
@@ -1293,11 +1246,9 @@ def run_logic_highlow():
     print("="*40)
     target_categories = ["Bonds", "Currencies", "Crypto", "Indices", "Commodities", "ETFs", "Economics"]
     try:
-        with open(HL_JSON_PATH, 'r', encoding='utf-8') as f:
-            all_sectors = json.load(f)
+        all_sectors = load_json(HL_JSON_PATH)
         etf_symbols = set(all_sectors.get("ETFs", []))
-        conn = create_connection_analyse(DB_PATH_ANALYSE)
-        cursor = conn.cursor()
+        engine = get_extrema_engine()
     except Exception as e:
         print(f"[HL] Setup Error: {e}")
         return
@@ -1309,26 +1260,27 @@ def run_logic_highlow():
         if not symbols: continue
         print(f"[HL] Processing {category}...")
         for symbol in symbols:
-            latest = get_latest_price_and_date_shared(cursor, category, symbol)
+            latest = engine.latest(category, symbol)
             if not latest: continue
             try:
                 latest_date_str, latest_price = latest
                 latest_date_obj = date.fromisoformat(latest_date_str)
             except: continue
             if latest_price is None: continue
-            for label, time_delta in HL_TIME_INTERVALS.items():
-                start_date = (latest_date_obj + time_delta).isoformat()
-                prices = get_prices_in_range_hl(cursor, category, symbol, start_date, latest_date_str)
-                if len(prices) < 2: continue
-                min_p, max_p = min(prices), max(prices)
+            windows = {
+                label: ((latest_date_obj + time_delta).isoformat(), latest_date_str)
+                for label, time_delta in HL_TIME_INTERVALS.items()
+            }
+            extremes = engine.window_extrema(category, symbol, windows)
+            for label in HL_TIME_INTERVALS:
+                max_p, min_p, count = extremes[label]
+                if count < 2: continue
                 if latest_price == min_p:
                     if symbol not in current_run_results[label]["Low"]:
                         current_run_results[label]["Low"].append(symbol)
                 if latest_price == max_p:
                     if symbol not in current_run_results[label]["High"]:
                         current_run_results[label]["High"].append(symbol)
-    if conn: conn.close()
-    
     print("[HL] Reading backup and filtering...")
     backup_data = parse_highlow_backup_hl(HL_BACKUP_OUTPUT_PATH)
     results_for_main = {label: {"Low": [], "High": []} for label in HL_TIME_INTERVALS.keys()}
@@ -1463,8 +1415,7 @@ def format_turnover_scanner(val):
 
 def load_json_scanner(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json(filepath)
     except Exception as e:
         print(f"读取 JSON 失败 {filepath}: {e}")
         return {}
@@ -1830,7 +1781,7 @@ def run_volume_high_scanner():
 # ==============================================================================
 # 主入口
 # ==============================================================================
-if __name__ == "__main__":
+def run():
     print("************************************************************************")
     print(f"FULL SYSTEM START: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("************************************************************************")
@@ -1846,4 +1797,12 @@ if __name__ == "__main__":
 
     print("\n************************************************************************")
     print("所有任务执行完毕 (Compare + Analyse + VolumeScanner)。")
-    print("************************************************************************")
\ No newline at end of file
+    print("************************************************************************")
+
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        run()
+
+if __name__ == "__main__":
+    main()
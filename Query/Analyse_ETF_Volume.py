@@ -4,6 +4,10 @@ import os
 import re
 import datetime
 
+from Turnover_Rank import turnover_rank, get_panel, preload, is_top_n as is_top_n_turnover
+from Earning_History_Store import get_store as get_earning_history_store
+from Modules_Cache import symbol_to_tags, load_json, save_json, use_context
+
 # --- 1. 配置文件和路径 ---
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
@@ -56,8 +60,7 @@ CONFIG = {
 # --- 2. 辅助与文件操作模块 ---
 def load_tag_settings(json_path):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            settings = json.load(f)
+        settings = load_json(json_path)
         tag_blacklist = set(settings.get('BLACKLIST_TAGS', []))
         return tag_blacklist
     except Exception:
@@ -65,16 +68,9 @@ def load_tag_settings(json_path):
 
 
 def load_symbol_tags(json_path):
+    # 经 Modules_Cache：description.json 没变时直接取缓存好的 symbol -> tags（只读）
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        symbol_tag_map = {}
-        for item in data.get('stocks', []):
-            symbol = item.get('symbol')
-            tags = item.get('tag', [])
-            if symbol:
-                symbol_tag_map[symbol] = tags
-        return symbol_tag_map
+        return symbol_to_tags(json_path)
     except Exception:
         return {}
 
@@ -86,8 +82,7 @@ def update_panel_etf(json_path, etf_high_list, etf_high_notes,
     只写入 ETF 相关的 4 个分组（含 _backup），不影响其他分组。
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
     except (FileNotFoundError, json.JSONDecodeError):
         data = {}
 
@@ -104,8 +99,7 @@ def update_panel_etf(json_path, etf_high_list, etf_high_notes,
     data['ETF_Volume_low_backup'] = build_group_dict(etf_low_list, etf_low_notes)
 
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        save_json(json_path, data, indent=4, ensure_ascii=False)
         log_detail("Panel 文件更新完成（ETF 分组）。")
     except Exception as e:
         log_detail(f"错误: 写入 Panel JSON 文件失败: {e}")
@@ -120,72 +114,38 @@ def update_earning_history_json(file_path, group_name, symbols_to_add, log_detai
     record_date_str = base_date_str
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
-
-    if group_name not in data:
-        data[group_name] = {}
-
-    existing_symbols = data[group_name].get(record_date_str, [])
-    combined_symbols = set(existing_symbols) | set(symbols_to_add)
-    updated_symbols = sorted(list(combined_symbols))
-
-    if not updated_symbols:
-        return
-
-    data[group_name][record_date_str] = updated_symbols
-    num_added = len(updated_symbols) - len(existing_symbols)
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        history = get_earning_history_store(DB_FILE, file_path)
+        num_added, total = history.add(group_name, record_date_str, symbols_to_add)
+        # 二次保险：如果合并后依然为空，也跳过
+        if not total:
+            return
         log_detail(f"成功更新: 日期={record_date_str}, 分组='{group_name}', 新增 {num_added} 个。")
-    except Exception as e:
+    except (sqlite3.Error, ValueError) as e:
         log_detail(f"错误: 写入历史记录文件失败: {e}")
 
 
 # --- 3. 核心逻辑模块 ---
+def _log_turnover_rank(res, lookback_months, rank_threshold, latest_turnover, is_top_n, log_detail):
+    log_detail(f"    - 成交额排名检查: 回溯{lookback_months}个月, 共{res.count}个交易日")
+    top_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in res.top])
+    log_detail(f"      前{rank_threshold}名: {top_str}")
+    log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 在前{rank_threshold}: {is_top_n}")
+
+
 def check_turnover_rank(cursor, sector_name, symbol, latest_date_str, latest_turnover,
                         lookback_months, rank_threshold, log_detail, is_tracing):
     """
     检查 latest_turnover 是否是过去 lookback_months 个月内的前 rank_threshold 名
     """
-    try:
-        dt = datetime.datetime.strptime(latest_date_str, "%Y-%m-%d")
-        start_date = dt - datetime.timedelta(days=lookback_months * 30)
-        start_date_str = start_date.strftime("%Y-%m-%d")
-    except Exception:
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, lookback_months * 30,
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
+    if not res or res.count == 0:
         return False
 
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, start_date_str, latest_date_str))
-    rows = cursor.fetchall()
-
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            valid_data.append((r[0], r[1] * r[2]))
-
-    if not valid_data:
-        return False
-
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-
-    is_top_n = False
-    if latest_turnover in top_n_turnovers:
-        is_top_n = True
-    elif len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]:
-        is_top_n = True
+    is_top_n = is_top_n_turnover(res.top, latest_turnover, rank_threshold)
 
     if is_tracing:
-        log_detail(f"    - 成交额排名检查: 回溯{lookback_months}个月, 共{len(valid_data)}个交易日")
-        top_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
-        log_detail(f"      前{rank_threshold}名: {top_str}")
-        log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 在前{rank_threshold}: {is_top_n}")
+        _log_turnover_rank(res, lookback_months, rank_threshold, latest_turnover, is_top_n, log_detail)
 
     return is_top_n
 
@@ -205,6 +165,8 @@ def get_etf_yearly_turnover_top_symbols(db_path, symbols, target_date_override,
     conn = sqlite3.connect(db_path, timeout=60.0)
     cursor = conn.cursor()
 
+    # 先取每只 ETF 最新一天的数据，再一次性批量计算排名
+    latest_rows = {}
     for symbol in symbols:
         is_tracing = (symbol == symbol_to_trace)
         if is_tracing:
@@ -229,12 +191,23 @@ def get_etf_yearly_turnover_top_symbols(db_path, symbols, target_date_override,
             if is_tracing:
                 log_detail("    x 无最新成交数据")
             continue
+        latest_rows[symbol] = row
+
+    ranks = turnover_rank(cursor, [("ETFs", s) for s in latest_rows],
+                          {s: row[0] for s, row in latest_rows.items()},
+                          lookback_months * 30, rank_threshold, panel=get_panel(cursor))
 
-        latest_date, latest_price, latest_volume = row
+    for symbol, (latest_date, latest_price, latest_volume) in latest_rows.items():
+        is_tracing = (symbol == symbol_to_trace)
         latest_turnover = latest_price * latest_volume
+        res = ranks.get(symbol)
+        if not res or res.count == 0:
+            continue
 
-        if check_turnover_rank(cursor, "ETFs", symbol, latest_date, latest_turnover,
-                               lookback_months, rank_threshold, log_detail, is_tracing):
+        is_top_n = is_top_n_turnover(res.top, latest_turnover, rank_threshold)
+        if is_tracing:
+            _log_turnover_rank(res, lookback_months, rank_threshold, latest_turnover, is_top_n, log_detail)
+        if is_top_n:
             result.add(symbol)
             if is_tracing:
                 log_detail(f"    ✅ 年度成交额前{rank_threshold} -> 标记 '甲'")
@@ -267,6 +240,10 @@ def process_etf_volume_high(db_path, target_date_override, symbol_to_trace, log_
         conn.close()
         return []
 
+    # 成交额排名：全部 ETF 一次读库，循环里只在内存里切片
+    preload(cursor, [("ETFs", s) for s in all_etfs], target_date_override or None,
+            turnover_lookback_months * 30)
+
     for symbol in all_etfs:
         is_tracing = (symbol == symbol_to_trace)
         if is_tracing:
@@ -335,6 +312,10 @@ def process_etf_volume_low(db_path, target_date_override, symbol_to_trace, log_d
         conn.close()
         return []
 
+    # 成交额排名（T 日与 T-1 日）：全部 ETF 一次读库
+    preload(cursor, [("ETFs", s) for s in all_etfs], target_date_override or None,
+            turnover_lookback_months * 30)
+
     for symbol in all_etfs:
         is_tracing = (symbol == symbol_to_trace)
         if is_tracing:
@@ -428,12 +409,11 @@ def process_etf_volume_low_continuation(db_path, target_date_override,
         (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
     log_detail(f"基准日期: {base_date}")
 
-    # --- 读取 History ---
+    # --- 读取 History（直接从 Earning_History 库里取，库为准）---
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        log_detail(f"无法加载 History JSON: {e}")
+        history_data = get_earning_history_store(DB_FILE, history_json_path).to_dict(["ETF_Volume_low"])
+    except sqlite3.Error as e:
+        log_detail(f"无法加载 History: {e}")
         return []
 
     low_history = history_data.get("ETF_Volume_low", {})
@@ -634,7 +614,7 @@ def run_etf_volume_logic(log_detail):
     log_detail("程序运行结束。")
 
 
-def main():
+def run():
     if SYMBOL_TO_TRACE:
         print(f"追踪模式已启用，目标: {SYMBOL_TO_TRACE}。日志: {LOG_FILE_PATH}")
         try:
@@ -652,5 +632,11 @@ def main():
         run_etf_volume_logic(log_detail_console)
 
 
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        run()
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
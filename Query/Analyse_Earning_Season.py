@@ -3,6 +3,11 @@ import json
 import os
 import datetime
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from Earning_History_Store import get_store as get_earning_history_store
+from Modules_Cache import symbol_to_tags, load_json, save_json, use_context
+from Price_Store import get_global_store
 
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
@@ -64,6 +69,10 @@ CONFIG = {
     "MIN_TURNOVER": 100_000_000,
     "MARKETCAP_THRESHOLD": 100_000_000_000,
     "MAX_RISE_FROM_7D_LOW": 0.06,
+
+    # 构建数据缓存时按板块分片并行 (None = CPU 核数, 1 = 串行)
+    "CACHE_WORKERS": None,
+    "CACHE_PARALLEL_MIN_SYMBOLS": 200,  # symbol 数少于此值时串行，避免进程启动开销
 }
 
 # --- 3. 辅助与文件操作模块 ---
@@ -72,8 +81,7 @@ CONFIG = {
 def load_tag_settings(json_path):
     """从 Tags_Setting.json 加载 BLACKLIST_TAGS 和 HOT_TAGS。"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            settings = json.load(f)
+        settings = load_json(json_path)
         
         # 从JSON加载列表，并转换成set，如果不存在则返回空set
         tag_blacklist = set(settings.get('BLACKLIST_TAGS', []))
@@ -97,8 +105,7 @@ def load_tag_settings(json_path):
 def create_symbol_to_sector_map(json_file_path):
     """从Sectors_All.json创建 symbol -> sector 的映射。"""
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            sectors_data = json.load(f)
+        sectors_data = load_json(json_file_path)
         symbol_map = {symbol: sector for sector, symbols in sectors_data.items() for symbol in symbols}
         print(f"成功创建板块映射，共 {len(symbol_map)} 个 symbol。")
         return symbol_map
@@ -118,8 +125,7 @@ def get_symbols_from_file(file_path):
 def load_blacklist(json_file_path):
     """从Blacklist.json加载'newlow'黑名单。"""
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_file_path)
         blacklist = set(data.get('newlow', []))
         print(f"成功加载 'newlow' 黑名单: {len(blacklist)} 个 symbol。")
         return blacklist
@@ -131,8 +137,7 @@ def load_blacklist(json_file_path):
 def load_earning_symbol_blacklist(json_path):
     """从Blacklist.json加载'Earning'分组的symbol黑名单。"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
         blacklist = set(data.get('Earning', []))
         print(f"成功加载 'Earning' Symbol 黑名单: {len(blacklist)} 个 symbol。")
         return blacklist
@@ -144,17 +149,10 @@ def load_earning_symbol_blacklist(json_path):
 def load_symbol_tags(json_path):
     """从 description.json 加载 'stocks' 分组下所有 symbol 的 tags。"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        symbol_tag_map = {}
-        stock_list = data.get('stocks', [])
-        
-        for item in stock_list:
-            symbol = item.get('symbol')
-            tags = item.get('tag', [])
-            if symbol:
-                symbol_tag_map[symbol] = tags
+        if not os.path.exists(json_path):
+            raise FileNotFoundError(json_path)
+        # 经 Modules_Cache：description.json 没变时直接取缓存好的 symbol -> tags（只读）
+        symbol_tag_map = symbol_to_tags(json_path)
         
         print(f"成功从 description.json 加载 {len(symbol_tag_map)} 个 symbol 的 tags。")
         return symbol_tag_map
@@ -176,8 +174,7 @@ def update_json_panel(symbols_list, target_json_path, group_name, symbol_to_note
     """
     print(f"\n--- 更新 JSON 文件: {os.path.basename(target_json_path)} -> '{group_name}' ---")
     try:
-        with open(target_json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(target_json_path)
     except (FileNotFoundError, json.JSONDecodeError):
         print(f"信息: 目标JSON文件不存在或格式错误，将创建一个新的。")
         data = {}
@@ -189,8 +186,7 @@ def update_json_panel(symbols_list, target_json_path, group_name, symbol_to_note
         data[group_name] = {symbol: symbol_to_note.get(symbol, "") for symbol in sorted(symbols_list)}
 
     try:
-        with open(target_json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        save_json(target_json_path, data, indent=4, ensure_ascii=False)
         print(f"成功将 {len(symbols_list)} 个 symbol 写入组 '{group_name}'.")
     except Exception as e:
         print(f"错误: 写入JSON文件失败: {e}")
@@ -208,35 +204,12 @@ def update_earning_history_json(file_path, group_name, symbols_to_add, log_detai
     yesterday_str = yesterday.isoformat()  # 获取 'YYYY-MM-DD' 格式的昨天日期
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        log_detail("信息: 历史记录文件不存在或格式错误，将创建新的。")
-        data = {}
-
-    # 确保顶层分组存在 (e.g., 'season')
-    if group_name not in data:
-        data[group_name] = {}
-
-    # 获取昨天已有的 symbol 列表，如果不存在则为空列表
-    existing_symbols = data[group_name].get(yesterday_str, [])
-    
-    # 合并新旧列表，通过集合去重，然后排序
-    combined_symbols = set(existing_symbols) | set(symbols_to_add)
-    updated_symbols = sorted(list(combined_symbols))
-
-    # 更新数据结构
-    data[group_name][yesterday_str] = updated_symbols
-    
-    num_added = len(updated_symbols) - len(existing_symbols)
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        history = get_earning_history_store(DB_FILE, file_path)
+        num_added, total = history.add(group_name, yesterday_str, symbols_to_add)
         log_detail(f"成功更新历史记录。日期: {yesterday_str}, 分组: '{group_name}'.")
         log_detail(f"  - 本次新增 {num_added} 个不重复的 symbol。")
-        log_detail(f"  - 当天总计 {len(updated_symbols)} 个 symbol。")
-    except Exception as e:
+        log_detail(f"  - 当天总计 {total} 个 symbol。")
+    except (sqlite3.Error, ValueError) as e:
         log_detail(f"错误: 写入历史记录文件失败: {e}")
         
 def get_next_er_date(last_er_date):
@@ -250,124 +223,165 @@ def build_stock_data_cache(symbols, db_path, symbol_sector_map, symbol_to_trace,
     """
     为所有给定的symbols一次性从数据库加载所有需要的数据。
     这是性能优化的核心，避免了重复查询。
+    symbol 较多时按板块表分片到进程池并行构建（见 CONFIG["CACHE_WORKERS"]）。
     """
     print(f"\n--- 开始为 {len(symbols)} 个 symbol 构建数据缓存 ---")
-    cache = {}
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
+    workers = CONFIG.get("CACHE_WORKERS") or os.cpu_count() or 1
+    if workers > 1 and len(symbols) > CONFIG.get("CACHE_PARALLEL_MIN_SYMBOLS", 200):
+        cache = build_stock_data_cache_sharded(symbols, db_path, symbol_sector_map, symbol_to_trace, log_detail, target_date, workers)
+        print(f"--- 数据缓存构建完成，有效数据: {len(cache)} 个 ---")
+        return cache
+
+    # 行情 / 财报 / MNSPP 全部来自共享的 PriceStore：每张表只扫描一次，之后全是内存查找
+    store = get_global_store(db_path)
+    store.load_tables(sorted({symbol_sector_map[s] for s in symbols if s in symbol_sector_map}))
 
+    cache = {}
     # 检查marketcap列是否存在的标志
-    marketcap_exists = True
+    state = {'marketcap_exists': True}
 
     for i, symbol in enumerate(symbols):
-        is_tracing = (symbol == symbol_to_trace)
-        if is_tracing: log_detail(f"\n{'='*20} 开始为目标 {symbol} 构建数据缓存 {'='*20}")
+        data = build_symbol_data(store, i, symbol, symbol_sector_map, symbol_to_trace, log_detail, print, state, target_date)
+        if data is not None:
+            cache[symbol] = data
 
-        data = {'is_valid': False, 'all_er_dates': [], 'latest_er_date_str': '', 'latest_er_date': None, 'all_er_prices': [], 'latest_date_str': '', 'latest_price': 0.0, 'latest_volume': 0.0, 'pe_ratio': None, 'marketcap': None, 'earning_record_price': None}
-        table_name = symbol_sector_map.get(symbol)
-        if not table_name: continue
+    print(f"--- 数据缓存构建完成，有效数据: {len(cache)} 个 ---")
+    return cache
 
-        # 1. 获取财报日期 (回测移植：增加日期上限)
-        if target_date:
-            cursor.execute("SELECT date FROM Earning WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT ?", 
-                           (symbol, target_date, CONFIG["NUM_EARNINGS_TO_CHECK"] + 1))
-        else:
-            cursor.execute("SELECT date FROM Earning WHERE name = ? ORDER BY date DESC LIMIT ?", 
-                           (symbol, CONFIG["NUM_EARNINGS_TO_CHECK"] + 1))
-        
-        earnings_dates = [r[0] for r in cursor.fetchall()]
-        if is_tracing: log_detail(f"[{symbol}] 步骤1: 获取财报日期。找到 {len(earnings_dates)} 个: {earnings_dates}")
-        
-        if len(earnings_dates) < CONFIG["NUM_EARNINGS_TO_CHECK"]:
-            if is_tracing: log_detail(f"[{symbol}] 失败: 财报次数 ({len(earnings_dates)}) 少于要求的 {CONFIG['NUM_EARNINGS_TO_CHECK']} 次。")
-            continue
+def _cache_shard_worker(args):
+    """
+    子进程：只加载本分片的板块表（PriceStore 默认以 mode=ro 只读 URI 连接），构建本分片的缓存。
+    trace 日志和 print 输出按 symbol 分别缓冲，由主进程按原 symbol 顺序输出。
+    """
+    indexed_symbols, db_path, symbol_sector_map, symbol_to_trace, target_date, config = args
+    CONFIG.update(config)
+    store = get_global_store(db_path)
+    store.load_tables(sorted(set(symbol_sector_map.values())))
+    state = {'marketcap_exists': True}
+    part, logs = {}, {}
+    for i, symbol in indexed_symbols:
+        lines = []
+        data = build_symbol_data(
+            store, i, symbol, symbol_sector_map, symbol_to_trace,
+            lambda m: lines.append((False, m)), lambda m: lines.append((True, m)),
+            state, target_date
+        )
+        if data is not None:
+            part[symbol] = data
+        if lines:
+            logs[symbol] = lines
+    return part, logs
+
+def build_stock_data_cache_sharded(symbols, db_path, symbol_sector_map, symbol_to_trace, log_detail, target_date, workers):
+    """按板块表把 symbols 分片到进程池，结果按原 symbol 顺序合并回同一个 cache"""
+    shards = {}
+    for i, symbol in enumerate(symbols):
+        shards.setdefault(symbol_sector_map.get(symbol) or "", []).append((i, symbol))
+    # 大表先跑，尽量让各进程同时结束
+    ordered = sorted(shards.values(), key=len, reverse=True)
+    config = dict(CONFIG)
+
+    parts, logs = {}, {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(ordered))) as pool:
+        futures = [
+            pool.submit(_cache_shard_worker, (
+                shard, db_path,
+                {s: symbol_sector_map[s] for _, s in shard if s in symbol_sector_map},
+                symbol_to_trace, target_date, config
+            ))
+            for shard in ordered
+        ]
+        for fut in futures:
+            part, part_logs = fut.result()
+            parts.update(part)
+            logs.update(part_logs)
 
-        data['all_er_dates'] = earnings_dates
-        data['latest_er_date_str'] = earnings_dates[0]
-        data['latest_er_date'] = datetime.datetime.strptime(earnings_dates[0], "%Y-%m-%d").date()
-
-        # 2. 获取这些财报日的收盘价
-        er_prices = []
-        prices_valid = True
-        for date_str in earnings_dates:
-            cursor.execute(f'SELECT price FROM "{table_name}" WHERE name = ? AND date = ?', (symbol, date_str))
-            price_result = cursor.fetchone()
-            if price_result and price_result[0] is not None:
-                er_prices.append(price_result[0])
-            else:
-                # 关键财报日价格缺失，但为了保持长度一致，先用None填充
-                er_prices.append(None)
-        if is_tracing: log_detail(f"[{symbol}] 步骤2: 获取财报日收盘价。价格: {er_prices}")
-        
-        # 检查关键的前N次财报价格是否存在
-        if any(p is None for p in er_prices[:CONFIG["NUM_EARNINGS_TO_CHECK"]]):
-            if is_tracing: log_detail(f"[{symbol}] 失败: 前 {CONFIG['NUM_EARNINGS_TO_CHECK']} 次财报中存在缺失的价格。")
-            continue
+    cache = {}
+    for symbol in symbols:
+        for is_print, line in logs.get(symbol, ()):
+            (print if is_print else log_detail)(line)
+        if symbol in parts:
+            cache[symbol] = parts[symbol]
+    return cache
 
-        data['all_er_prices'] = er_prices
-        
-        # 3. 获取最新交易日数据 (回测移植：根据 target_date 锁定基准日)
-        if target_date:
-            cursor.execute(f'SELECT date, price, volume FROM "{table_name}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 1', (symbol, target_date))
-        else:
-            cursor.execute(f'SELECT date, price, volume FROM "{table_name}" WHERE name = ? ORDER BY date DESC LIMIT 1', (symbol,))
-        
-        latest_row = cursor.fetchone()
-        if not latest_row or latest_row[1] is None or latest_row[2] is None:
-            if is_tracing: log_detail(f"[{symbol}] 失败: 未能获取到有效的最新交易日数据。查询结果: {latest_row}")
-            continue
-            
-        data['latest_date_str'], data['latest_price'], data['latest_volume'] = latest_row
-        data['latest_date'] = datetime.datetime.strptime(data['latest_date_str'], "%Y-%m-%d").date()
-        if is_tracing: log_detail(f"[{symbol}] 步骤3: 获取最新交易日数据。日期: {data['latest_date_str']}, 价格: {data['latest_price']}, 成交量: {data['latest_volume']}")
-
-        # 4. 获取其他所需数据 (PE, MarketCap, Earning表price)
-        data['pe_ratio'] = None
-        data['marketcap'] = None
-
-        # 4. 获取 PE, 市值等 (MNSPP表通常只存最新，回测时作为参考)
-        if marketcap_exists: # 如果列存在，尝试最优查询
-            try:
-                cursor.execute("SELECT pe_ratio, marketcap FROM MNSPP WHERE symbol = ?", (symbol,))
-                row = cursor.fetchone()
-                if row:
-                    data['pe_ratio'] = row[0]
-                    data['marketcap'] = row[1]
-                if is_tracing: log_detail(f"[{symbol}] 步骤4: 尝试从MNSPP获取PE和市值。查询结果: PE={data['pe_ratio']}, 市值={data['marketcap']}")
-            except sqlite3.OperationalError as e:
-                if "no such column: marketcap" in str(e):
-                    if i == 0: # 只在第一次遇到错误时打印警告
-                        print(f"警告: MNSPP表中未找到 'marketcap' 列。将回退到仅查询 'pe_ratio'。")
-                    marketcap_exists = False # 标记列不存在，后续循环不再尝试
-                    # 执行回退查询
-                    cursor.execute("SELECT pe_ratio FROM MNSPP WHERE symbol = ?", (symbol,))
-                    row = cursor.fetchone()
-                    if row:
-                        data['pe_ratio'] = row[0]
-                    if is_tracing: log_detail(f"[{symbol}] 步骤4 (回退): 'marketcap'列不存在。查询PE。结果: PE={data['pe_ratio']}")
-                else:
-                    # 其他数据库错误
-                    print(f"警告: 查询MNSPP表时发生意外错误 for {symbol}: {e}")
-        else: # 如果已经知道列不存在，直接使用回退查询
-            cursor.execute("SELECT pe_ratio FROM MNSPP WHERE symbol = ?", (symbol,))
-            row = cursor.fetchone()
-            if row:
-                data['pe_ratio'] = row[0]
-            if is_tracing: log_detail(f"[{symbol}] 步骤4 (已知列不存在): 查询PE。结果: PE={data['pe_ratio']}")
-
-        cursor.execute("SELECT price FROM Earning WHERE name = ? AND date = ?", (symbol, data['latest_er_date_str']))
-        row = cursor.fetchone()
-        data['earning_record_price'] = row[0] if row else None
-        if is_tracing: log_detail(f"[{symbol}] 步骤5: 从Earning表获取最新财报记录的价格。结果: {data['earning_record_price']}")
-        
-        # 5. 如果所有关键数据都获取成功，则标记为有效
-        data['is_valid'] = True
-        cache[symbol] = data
-        if is_tracing: log_detail(f"[{symbol}] 成功: 数据缓存构建完成，标记为有效。")
+def build_symbol_data(store, i, symbol, symbol_sector_map, symbol_to_trace, log_detail, emit, state, target_date=None):
+    """构建单个 symbol 的缓存数据；不满足条件时返回 None。emit 用于普通 print 输出"""
+    is_tracing = (symbol == symbol_to_trace)
+    if is_tracing: log_detail(f"\n{'='*20} 开始为目标 {symbol} 构建数据缓存 {'='*20}")
+
+    data = {'is_valid': False, 'all_er_dates': [], 'latest_er_date_str': '', 'latest_er_date': None, 'all_er_prices': [], 'latest_date_str': '', 'latest_price': 0.0, 'latest_volume': 0.0, 'pe_ratio': None, 'marketcap': None, 'earning_record_price': None}
+    table_name = symbol_sector_map.get(symbol)
+    if not table_name: return None
+
+    # 1. 获取财报日期 (回测移植：增加日期上限)
+    er_rows = store.load_earnings().get(symbol, [])
+    if target_date:
+        er_rows = [r for r in er_rows if r[0] <= target_date]
+    # 等价于 ORDER BY date DESC LIMIT N+1
+    er_rows = er_rows[::-1][:CONFIG["NUM_EARNINGS_TO_CHECK"] + 1]
+
+    earnings_dates = [r[0] for r in er_rows]
+    if is_tracing: log_detail(f"[{symbol}] 步骤1: 获取财报日期。找到 {len(earnings_dates)} 个: {earnings_dates}")
+
+    if len(earnings_dates) < CONFIG["NUM_EARNINGS_TO_CHECK"]:
+        if is_tracing: log_detail(f"[{symbol}] 失败: 财报次数 ({len(earnings_dates)}) 少于要求的 {CONFIG['NUM_EARNINGS_TO_CHECK']} 次。")
+        return None
+
+    data['all_er_dates'] = earnings_dates
+    data['latest_er_date_str'] = earnings_dates[0]
+    data['latest_er_date'] = datetime.datetime.strptime(earnings_dates[0], "%Y-%m-%d").date()
+
+    # 2. 获取这些财报日的收盘价
+    # 关键财报日价格缺失时为了保持长度一致，用None填充
+    price_on_date = dict(store.prices_on_dates(table_name, symbol, earnings_dates))
+    er_prices = [price_on_date.get(date_str) for date_str in earnings_dates]
+    if is_tracing: log_detail(f"[{symbol}] 步骤2: 获取财报日收盘价。价格: {er_prices}")
+
+    # 检查关键的前N次财报价格是否存在
+    if any(p is None for p in er_prices[:CONFIG["NUM_EARNINGS_TO_CHECK"]]):
+        if is_tracing: log_detail(f"[{symbol}] 失败: 前 {CONFIG['NUM_EARNINGS_TO_CHECK']} 次财报中存在缺失的价格。")
+        return None
+
+    data['all_er_prices'] = er_prices
+
+    # 3. 获取最新交易日数据 (回测移植：根据 target_date 锁定基准日)
+    # 正常模式 target_date 为空：取库里最新的一条数据
+    latest_row = store.latest_on_or_before(table_name, symbol, target_date or None)
+    latest_row = latest_row[:3] if latest_row else None
+    if not latest_row or latest_row[1] is None or latest_row[2] is None:
+        if is_tracing: log_detail(f"[{symbol}] 失败: 未能获取到有效的最新交易日数据。查询结果: {latest_row}")
+        return None
+
+    data['latest_date_str'], data['latest_price'], data['latest_volume'] = latest_row
+    data['latest_date'] = datetime.datetime.strptime(data['latest_date_str'], "%Y-%m-%d").date()
+    if is_tracing: log_detail(f"[{symbol}] 步骤3: 获取最新交易日数据。日期: {data['latest_date_str']}, 价格: {data['latest_price']}, 成交量: {data['latest_volume']}")
+
+    # 4. 获取其他所需数据 (PE, MarketCap, Earning表price)
+    data['pe_ratio'] = None
+    data['marketcap'] = None
+
+    # 4. 获取 PE, 市值等 (MNSPP表通常只存最新，回测时作为参考)；缺 marketcap 列时对应值为 None
+    row = store.load_mnspp(("pe_ratio", "marketcap")).get(symbol)
+    if row:
+        data['pe_ratio'] = row['pe_ratio']
+        data['marketcap'] = row['marketcap']
+    if state['marketcap_exists']:
+        if 'marketcap' not in store.mnspp_columns:
+            emit(f"警告: MNSPP表中未找到 'marketcap' 列。将回退到仅查询 'pe_ratio'。")
+            state['marketcap_exists'] = False # 标记列不存在，只警告一次
+        elif is_tracing: log_detail(f"[{symbol}] 步骤4: 尝试从MNSPP获取PE和市值。查询结果: PE={data['pe_ratio']}, 市值={data['marketcap']}")
+    if not state['marketcap_exists'] and is_tracing:
+        log_detail(f"[{symbol}] 步骤4 (已知列不存在): 查询PE。结果: PE={data['pe_ratio']}")
+
+    # 最新一条财报记录的 price（er_rows 已按日期倒序）
+    data['earning_record_price'] = er_rows[0][1]
+    if is_tracing: log_detail(f"[{symbol}] 步骤5: 从Earning表获取最新财报记录的价格。结果: {data['earning_record_price']}")
+
+    # 5. 如果所有关键数据都获取成功，则标记为有效
+    data['is_valid'] = True
+    if is_tracing: log_detail(f"[{symbol}] 成功: 数据缓存构建完成，标记为有效。")
+    return data
 
-    conn.close()
-    print(f"--- 数据缓存构建完成，有效数据: {len(cache)} 个 ---")
-    return cache
 
 # --- 5. 策略模块 (已集成追踪系统) ---
 
@@ -388,7 +402,7 @@ def run_strategy_1(data, symbol_to_trace, log_detail):
     return result
 
 # <<< 修改开始: 修改策略3的函数签名和内部逻辑 >>>
-def run_strategy_3(data, cursor, symbol_sector_map, symbols_for_time_condition, symbol_to_trace, log_detail):
+def run_strategy_3(data, store, symbol_sector_map, symbols_for_time_condition, symbol_to_trace, log_detail):
     """ 策略 3 (修改后):
     (1) 如果最近2次财报上升，最新价 < 过去N次财报最高价 * (1-9%)
     (2) 如果不上升，最近2次财报差额 >= 3%，最新财报非负，且最新价 < 过去N次财报最低价
@@ -452,12 +466,7 @@ def run_strategy_3(data, cursor, symbol_sector_map, symbols_for_time_condition,
         return False
     
     ten_days_ago = data['latest_date'] - datetime.timedelta(days=10)
-    cursor.execute(
-        f'SELECT MIN(price) FROM "{table_name}" WHERE name = ? AND date BETWEEN ? AND ?',
-        (data['symbol'], ten_days_ago.isoformat(), data['latest_date_str'])
-    )
-    min_price_row = cursor.fetchone()
-    min_price_10d = min_price_row[0] if min_price_row and min_price_row[0] is not None else None
+    min_price_10d = store.min_in_range(table_name, data['symbol'], start=ten_days_ago, end=data['latest_date_str'])
     
     if is_tracing: log_detail(f"  - 查询过去10天最低价 (从{ten_days_ago.isoformat()}到{data['latest_date_str']}) -> {min_price_10d}")
 
@@ -554,7 +563,7 @@ def run_strategy_3_5(data, symbols_for_time_condition, symbol_to_trace, log_deta
     return result
 
 # 策略 4
-def run_strategy_4(data, cursor, symbol_sector_map, symbol_to_trace, log_detail):
+def run_strategy_4(data, store, symbol_sector_map, symbol_to_trace, log_detail):
     """ 策略 4 (修改后):
     (1) 最近N次财报递增，最近30天内财报，Earning表price>0
     (2) 最新收盘价位于财报日后6-26天
@@ -621,12 +630,7 @@ def run_strategy_4(data, cursor, symbol_sector_map, symbol_to_trace, log_detail)
             
         start_range = data['latest_er_date'] - datetime.timedelta(days=2)
         end_range   = data['latest_er_date'] + datetime.timedelta(days=5)
-        cursor.execute(
-            f'SELECT MAX(price) FROM "{table_name}" WHERE name = ? AND date BETWEEN ? AND ?',
-            (data['symbol'], start_range.isoformat(), end_range.isoformat())
-        )
-        max_price_row = cursor.fetchone()
-        max_price_around_er = max_price_row[0] if max_price_row else None
+        max_price_around_er = store.max_in_range(table_name, data['symbol'], start=start_range, end=end_range)
         
         if max_price_around_er is None: 
             if is_tracing: log_detail(f"  - 结果: False (无法获取财报日前后最高价)")
@@ -657,12 +661,7 @@ def run_strategy_4(data, cursor, symbol_sector_map, symbol_to_trace, log_detail)
         return False
         
     ten_days_ago = data['latest_date'] - datetime.timedelta(days=10)
-    cursor.execute(
-        f'SELECT MIN(price) FROM "{table_name}" WHERE name = ? AND date BETWEEN ? AND ?',
-        (data['symbol'], ten_days_ago.isoformat(), data['latest_date_str'])
-    )
-    min_price_row = cursor.fetchone()
-    min_price_10d = min_price_row[0] if min_price_row and min_price_row[0] is not None else None
+    min_price_10d = store.min_in_range(table_name, data['symbol'], start=ten_days_ago, end=data['latest_date_str'])
 
     if is_tracing: log_detail(f"  - 查询过去10天最低价 (从{ten_days_ago.isoformat()}到{data['latest_date_str']}) -> {min_price_10d}")
 
@@ -849,27 +848,25 @@ def run_processing_logic(log_detail):
 
     # 3. 运行策略
     results = defaultdict(list)
-    with sqlite3.connect(DB_FILE, timeout=60.0) as conn: # 策略3和4需要一个cursor
-        cursor = conn.cursor()
-
-        for symbol, data in stock_data_cache.items():
-            if not data['is_valid']:
-                continue
+    store = get_global_store(DB_FILE) # 策略3和4的区间最高/最低价直接查 PriceStore
+    for symbol, data in stock_data_cache.items():
+        if not data['is_valid']:
+            continue
             
-            data['symbol'] = symbol # 将symbol本身加入data，方便策略3、4使用
+        data['symbol'] = symbol # 将symbol本身加入data，方便策略3、4使用
 
-            # <<< 修改开始: 使用 'symbols_for_time_condition' 来决定是否运行策略1 >>>
-            # 跑主列表策略 (仅针对在 'next', 'third' 等文件里的symbols)
-            if symbol in symbols_for_time_condition:
-                if run_strategy_1(data, SYMBOL_TO_TRACE, log_detail): results['s1'].append(symbol)
-            # <<< 修改结束 >>>
+        # <<< 修改开始: 使用 'symbols_for_time_condition' 来决定是否运行策略1 >>>
+        # 跑主列表策略 (仅针对在 'next', 'third' 等文件里的symbols)
+        if symbol in symbols_for_time_condition:
+            if run_strategy_1(data, SYMBOL_TO_TRACE, log_detail): results['s1'].append(symbol)
+        # <<< 修改结束 >>>
                 
-            # <<< 修改开始: 将 'symbols_for_time_condition' 传递给策略3和3.5 >>>
-            # 跑通知列表策略 (针对所有有数据的symbols)
-            if run_strategy_3(data, cursor, symbol_sector_map, symbols_for_time_condition, SYMBOL_TO_TRACE, log_detail): results['s3'].append(symbol)
-            if run_strategy_3_5(data, symbols_for_time_condition, SYMBOL_TO_TRACE, log_detail): results['s3_5'].append(symbol)
-            # <<< 修改结束 >>>
-            if run_strategy_4(data, cursor, symbol_sector_map, SYMBOL_TO_TRACE, log_detail): results['s4'].append(symbol)
+        # <<< 修改开始: 将 'symbols_for_time_condition' 传递给策略3和3.5 >>>
+        # 跑通知列表策略 (针对所有有数据的symbols)
+        if run_strategy_3(data, store, symbol_sector_map, symbols_for_time_condition, SYMBOL_TO_TRACE, log_detail): results['s3'].append(symbol)
+        if run_strategy_3_5(data, symbols_for_time_condition, SYMBOL_TO_TRACE, log_detail): results['s3_5'].append(symbol)
+        # <<< 修改结束 >>>
+        if run_strategy_4(data, store, symbol_sector_map, SYMBOL_TO_TRACE, log_detail): results['s4'].append(symbol)
 
     # 4. 汇总初步结果
     # 主列表现在只包含 s1
@@ -940,8 +937,7 @@ def run_processing_logic(log_detail):
     # 7. 新增：根据 panel.json 中已存在的分组进行最终过滤 (移植自 b.py)
     log_detail("\n--- 开始根据 panel.json 已有分组 ('Today', 'Must') 进行最终过滤 ---")
     try:
-        with open(PANEL_JSON_FILE, 'r', encoding='utf-8') as f:
-            panel_data = json.load(f)
+        panel_data = load_json(PANEL_JSON_FILE)
     except (FileNotFoundError, json.JSONDecodeError):
         log_detail(f"警告: panel 文件 ({PANEL_JSON_FILE}) 未找到或格式错误，将不进行分组过滤。")
         panel_data = {}
@@ -1004,7 +1000,8 @@ def run_processing_logic(log_detail):
         if SYMBOL_TO_TRACE:
             log_detail(f"🔎 [验证] '{SYMBOL_TO_TRACE}' 状态: S12={SYMBOL_TO_TRACE in final_symbols}, S34={SYMBOL_TO_TRACE in final_Strategy34_list}")
         log_detail("="*60 + "\n")
-        return 
+        # 返回本该写入 History 的命中列表 (供 Backtest.py 回放比对)
+        return {"season": sorted(set(final_symbols + final_Strategy34_list))}
     
     # 8.2 打印最终结果
     log_detail("\n--- 所有过滤完成后的最终结果 ---")
@@ -1095,7 +1092,7 @@ def run_processing_logic(log_detail):
 
 # --- 7. 主执行流程 (已集成追踪系统) ---
 
-def main():
+def run():
     """主程序入口"""
     # 检查是否设置了追踪符号
     if SYMBOL_TO_TRACE:
@@ -1112,5 +1109,10 @@ def main():
 
     print("\n程序运行结束。")
 
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        run()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,11 @@
 import json
-import sqlite3
 import os
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from Earning_History_Store import get_store as get_earning_history_store
+from Price_Store import get_global_store
+
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
@@ -27,6 +29,26 @@ SECTORS_ALL_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules",
 EARNING_HISTORY_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Earning_History.json")
 SECTORS_PANEL_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Sectors_panel.json")
 
+
+# ========== 行情 / 财报读取（共享 PriceStore，原来每个 symbol 逐条 SQL） ==========
+# PriceStore 的每一行为 (date, price, volume, open, high, low)
+
+def rows_low_price(store, table, symbol, start, end):
+    """等价于 SELECT date, low, price ... WHERE date >= start AND date < end ORDER BY date ASC"""
+    return [(r[0], r[5], r[1]) for r in store.rows_between(table, symbol, start, end, end_inclusive=False)]
+
+def low_price_on(store, table, symbol, date_str):
+    """等价于 SELECT low, price ... WHERE date = ?，无数据返回 None"""
+    rows = store.rows_between(table, symbol, date_str, date_str)
+    return (rows[0][5], rows[0][1]) if rows else None
+
+def latest_earning_before(store, symbol, end, start=None):
+    """Earning 表中 start <= date < end 的最近一条 (date, price)，无则 None"""
+    for d, p in reversed(store.load_earnings().get(symbol, [])):
+        if d < end:
+            return (d, p) if start is None or d >= start else None
+    return None
+
 def run_support_logic(log_detail):
     log_detail("Analyse_Earning_Support 程序开始运行...")
     if SYMBOL_TO_TRACE: 
@@ -40,8 +62,8 @@ def run_support_logic(log_detail):
     try:
         with open(SECTORS_ALL_PATH, 'r', encoding='utf-8') as f:
             sectors_all = json.load(f)
-        with open(EARNING_HISTORY_PATH, 'r', encoding='utf-8') as f:
-            earning_history = json.load(f)
+        # Earning_History 以库为准，直接从库里取（不依赖 JSON 是否已导出）
+        earning_history = get_earning_history_store(DB_PATH, EARNING_HISTORY_PATH).to_dict()
         with open(SECTORS_PANEL_PATH, 'r', encoding='utf-8') as f:
             sectors_panel = json.load(f)
     except Exception as e:
@@ -82,15 +104,13 @@ def run_support_logic(log_detail):
         log_detail(f"   2. JSON 文件中该日期的数据结构可能缺失。")
         return # 如果没找到，直接结束程序，避免后续报错
 
-    # ========== 连接数据库，构建 symbol -> 表名 映射 ==========
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # ========== 整表载入 PriceStore，构建 symbol -> 表名 映射 ==========
+    store = get_global_store(DB_PATH)
 
     symbol_to_table = {}
     for table in sectors_all.keys():
         try:
-            cursor.execute(f'SELECT DISTINCT name FROM [{table}]')
-            for (name,) in cursor.fetchall():
+            for name in store.load_table(table):
                 symbol_to_table[name] = table
         except Exception as e:
             log_detail(f"查询表 [{table}] 出错: {e}")
@@ -114,18 +134,7 @@ def run_support_logic(log_detail):
 
         try:
             # 1. 获取该 symbol 的最新两条记录 (包含前一交易日，用于判断收盘价是否下跌)
-            if TARGET_DATE:
-                cursor.execute(
-                    f'SELECT date, price, low FROM [{table}] WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 2',
-                    (symbol, TARGET_DATE)
-                )
-            else:
-                cursor.execute(
-                    f'SELECT date, price, low FROM [{table}] WHERE name = ? ORDER BY date DESC LIMIT 2',
-                    (symbol,)
-                )
-                
-            latest_rows = cursor.fetchall()
+            latest_rows = [(r[0], r[1], r[5]) for r in store.last_n(table, symbol, 2, end=TARGET_DATE or None)][::-1]
             
             if not latest_rows or len(latest_rows) < 2:
                 if is_tracing: log_detail(f"⚠️ [追踪] {symbol} 在目标日期前数据不足两条，跳过")
@@ -136,8 +145,7 @@ def run_support_logic(log_detail):
             prev_date, prev_close, prev_low = latest_rows[1]
 
             # [新增] 检查 latest_date 是否为财报日，如果是则直接过滤跳过
-            cursor.execute('SELECT 1 FROM Earning WHERE name = ? AND date = ?', (symbol, latest_date))
-            if cursor.fetchone():
+            if any(d == latest_date for d, _ in store.load_earnings().get(symbol, [])):
                 if is_tracing: log_detail(f"⚠️ [追踪] {symbol} 最新交易日({latest_date})恰好为财报日，按规则过滤跳过")
                 continue
 
@@ -176,11 +184,7 @@ def run_support_logic(log_detail):
                 date_ago = (latest_dt - timedelta(days=lookback_days)).strftime("%Y-%m-%d")
 
                 # 增加查询 price 字段
-                cursor.execute(
-                    f'SELECT date, low, price FROM [{table}] WHERE name = ? AND date >= ? AND date < ? ORDER BY date ASC',
-                    (symbol, date_ago, latest_date)
-                )
-                hist_rows = cursor.fetchall()
+                hist_rows = rows_low_price(store, table, symbol, date_ago, latest_date)
 
                 if not hist_rows:
                     if is_tracing: log_detail(f"  -> {lookback_days}天内无历史数据")
@@ -248,13 +252,7 @@ def run_support_logic(log_detail):
                         
                         # 【新增逻辑】尝试使用最近一次财报日作为支撑点
                         if is_tracing: log_detail(f"  -> 尝试使用最近财报日的 low 和 price 作为支撑点...")
-                        cursor.execute(
-                            '''SELECT date FROM Earning 
-                               WHERE name = ? AND date < ?
-                               ORDER BY date DESC LIMIT 1''',
-                            (symbol, latest_date)
-                        )
-                        recent_earning_row = cursor.fetchone()
+                        recent_earning_row = latest_earning_before(store, symbol, latest_date)
                         earning_fallback_success = False
                         
                         if recent_earning_row:
@@ -263,11 +261,7 @@ def run_support_logic(log_detail):
                             recent_e_days_diff = (latest_dt - recent_e_dt).days
                             
                             if recent_e_days_diff >= MIN_SUPPORT_DAYS:
-                                cursor.execute(
-                                    f'SELECT low, price FROM [{table}] WHERE name = ? AND date = ?',
-                                    (symbol, recent_e_date)
-                                )
-                                recent_e_price_row = cursor.fetchone()
+                                recent_e_price_row = low_price_on(store, table, symbol, recent_e_date)
                                 if recent_e_price_row:
                                     # 成功获取到最近财报日的数据，替换支撑点变量
                                     support_date = recent_e_date
@@ -358,12 +352,7 @@ def run_support_logic(log_detail):
                     p_date_ago = (latest_dt - timedelta(days=p_days)).strftime("%Y-%m-%d")
 
                     # 增加查询 price 字段
-                    cursor.execute(
-                        f'SELECT date, low, price FROM [{table}] '
-                        f'WHERE name = ? AND date >= ? AND date < ? ORDER BY date ASC',
-                        (symbol, p_date_ago, latest_date)
-                    )
-                    p_rows = cursor.fetchall()
+                    p_rows = rows_low_price(store, table, symbol, p_date_ago, latest_date)
 
                     if not p_rows:
                         if is_tracing: log_detail(f"  ⏹️ 第{round_num}轮({p_days}天)无历史数据，并行流程结束")
@@ -451,13 +440,7 @@ def run_support_logic(log_detail):
                     date_N_ago = (latest_dt - timedelta(days=fallback_days)).strftime("%Y-%m-%d")
 
                     # 去掉了 AND price > 0 的限制
-                    cursor.execute(
-                        '''SELECT date, price FROM Earning 
-                           WHERE name = ? AND date >= ? AND date < ?
-                           ORDER BY date DESC LIMIT 1''',
-                        (symbol, date_N_ago, latest_date)
-                    )
-                    earning_row = cursor.fetchone()
+                    earning_row = latest_earning_before(store, symbol, latest_date, start=date_N_ago)
 
                     if not earning_row:
                         if is_tracing: log_detail(f"  ⏭️ {fallback_days}天范围内无符合条件的财报，尝试下一档")
@@ -466,11 +449,7 @@ def run_support_logic(log_detail):
                     earning_date = earning_row[0]
 
                     # 增加查询 price 字段
-                    cursor.execute(
-                        f'SELECT low, price FROM [{table}] WHERE name = ? AND date = ?',
-                        (symbol, earning_date)
-                    )
-                    earning_low_row = cursor.fetchone()
+                    earning_low_row = low_price_on(store, table, symbol, earning_date)
 
                     if not earning_low_row:
                         if is_tracing: log_detail(f"  ⚠️ 财报日({earning_date})无 low 数据，尝试下一档")
@@ -536,24 +515,14 @@ def run_support_logic(log_detail):
                 date_31_ago = (latest_dt - timedelta(days=31)).strftime("%Y-%m-%d")
                 
                 # 寻找31天内的最近一次财报日
-                cursor.execute(
-                    '''SELECT date FROM Earning 
-                       WHERE name = ? AND date >= ? AND date < ?
-                       ORDER BY date DESC LIMIT 1''',
-                    (symbol, date_31_ago, latest_date)
-                )
-                recent_e_row = cursor.fetchone()
+                recent_e_row = latest_earning_before(store, symbol, latest_date, start=date_31_ago)
                 
                 if recent_e_row:
                     recent_e_date = recent_e_row[0]
                     if is_tracing: log_detail(f"  -> 发现31天内财报日: {recent_e_date}，开始在该区间寻找支撑点")
                     
                     # 在 财报日 到 最新日期 之间寻找最低支撑点
-                    cursor.execute(
-                        f'SELECT date, low, price FROM [{table}] WHERE name = ? AND date >= ? AND date < ? ORDER BY date ASC',
-                        (symbol, recent_e_date, latest_date)
-                    )
-                    p4_rows = cursor.fetchall()
+                    p4_rows = rows_low_price(store, table, symbol, recent_e_date, latest_date)
                     
                     if p4_rows:
                         # 默认按 low 寻找最低点
@@ -633,7 +602,6 @@ def run_support_logic(log_detail):
         except Exception as e:
             log_detail(f"处理 {symbol} 时出错: {e}")
 
-    conn.close()
 
     # ========== 结果汇总与文件写入 ==========
     if TARGET_DATE:
@@ -650,24 +618,17 @@ def run_support_logic(log_detail):
         sectors_panel["SupportLevel_Over"] = support_over
         sectors_panel["SupportLevel_Over_backup"] = support_over.copy()
 
-        # 更新 Earning_History.json
-        if "SupportLevel_Close" not in earning_history:
-            earning_history["SupportLevel_Close"] = {}
+        # 更新 Earning_History（按天整体覆盖，只写改动的那几天）
+        history = get_earning_history_store(DB_PATH, EARNING_HISTORY_PATH)
         for date_key, sym_list in earning_close.items():
-            earning_history["SupportLevel_Close"][date_key] = sorted(sym_list)
-
-        if "SupportLevel_Over" not in earning_history:
-            earning_history["SupportLevel_Over"] = {}
+            history.replace("SupportLevel_Close", date_key, sorted(sym_list))
         for date_key, sym_list in earning_over.items():
-            earning_history["SupportLevel_Over"][date_key] = sorted(sym_list)
+            history.replace("SupportLevel_Over", date_key, sorted(sym_list))
 
         # 写回文件
         with open(SECTORS_PANEL_PATH, 'w', encoding='utf-8') as f:
             json.dump(sectors_panel, f, indent=4, ensure_ascii=False)
 
-        with open(EARNING_HISTORY_PATH, 'w', encoding='utf-8') as f:
-            json.dump(earning_history, f, indent=4, ensure_ascii=False)
-
         log_detail(f"\n===== 完成 =====")
         log_detail(f"SupportLevel_Close ({len(support_close)}个): {list(support_close.keys())}")
         log_detail(f"SupportLevel_Over  ({len(support_over)}个): {list(support_over.keys())}")
@@ -4,6 +4,12 @@ import os
 import re
 import datetime
 
+from Rolling_Stats import get_table_stats
+from Earning_History_Store import get_store as get_earning_history_store
+from Modules_Cache import symbol_to_tags, load_json, save_json, use_context
+from Turnover_Rank import turnover_rank, get_panel, preload, lookback_start, meets_cutoff, is_top_n as is_top_n_turnover
+from Price_Store import get_global_store
+
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
@@ -97,8 +103,7 @@ def clean_symbol(symbol_with_suffix):
 
 def load_tag_settings(json_path):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            settings = json.load(f)
+        settings = load_json(json_path)
         tag_blacklist = set(settings.get('BLACKLIST_TAGS', []))
         hot_tags = set(settings.get('HOT_TAGS', []))
         # [新增] 读取 HOT_TAGS_T
@@ -109,8 +114,7 @@ def load_tag_settings(json_path):
 
 def load_all_symbols(json_path, target_sectors):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            all_sectors_data = json.load(f)
+        all_sectors_data = load_json(json_path)
         symbol_to_sector_map = {}
         for sector, symbols in all_sectors_data.items():
             if sector in target_sectors:
@@ -122,17 +126,9 @@ def load_all_symbols(json_path, target_sectors):
         return None
 
 def load_symbol_tags(json_path):
+    # 经 Modules_Cache：description.json 没变时直接取缓存好的 symbol -> tags（只读）
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        symbol_tag_map = {}
-        stock_list = data.get('stocks', [])
-        for item in stock_list:
-            symbol = item.get('symbol')
-            tags = item.get('tag', [])
-            if symbol:
-                symbol_tag_map[symbol] = tags
-        return symbol_tag_map
+        return symbol_to_tags(json_path)
     except Exception:
         return {}
 
@@ -156,8 +152,7 @@ def update_panel_with_conflict_check(json_path, pe_vol_list, pe_vol_notes, pe_vo
     ]
 
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
     except (FileNotFoundError, json.JSONDecodeError):
         data = {}
 
@@ -213,12 +208,15 @@ def update_panel_with_conflict_check(json_path, pe_vol_list, pe_vol_notes, pe_vo
     data['PE_Hot_backup'] = build_group_dict(pe_hot_list, pe_hot_notes)
 
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        save_json(json_path, data, indent=4, ensure_ascii=False)
         log_detail("Panel 文件更新完成 (包含冲突清理及 PE_Hot 写入)。")
     except Exception as e:
         log_detail(f"错误: 写入 Panel JSON 文件失败: {e}")
 
+def load_history(history_json_path):
+    """{分组: {日期: [symbols]}}，直接从 Earning_History 库里取（库为准，不依赖 JSON 是否已导出）"""
+    return get_earning_history_store(DB_FILE, history_json_path).to_dict()
+
 def update_earning_history_json(file_path, group_name, symbols_to_add, log_detail, base_date_str):
     log_detail(f"\n--- 更新历史记录文件: {os.path.basename(file_path)} -> '{group_name}' ---")
     
@@ -231,60 +229,44 @@ def update_earning_history_json(file_path, group_name, symbols_to_add, log_detai
     record_date_str = base_date_str
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
-
-    if group_name not in data:
-        data[group_name] = {}
-
-    existing_symbols = data[group_name].get(record_date_str, [])
-    combined_symbols = set(existing_symbols) | set(symbols_to_add)
-    updated_symbols = sorted(list(combined_symbols))
-    
-    # 二次保险：如果合并后依然为空，也跳过
-    if not updated_symbols:
-        return
-    
-    data[group_name][record_date_str] = updated_symbols
-    num_added = len(updated_symbols) - len(existing_symbols)
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        history = get_earning_history_store(DB_FILE, file_path)
+        num_added, total = history.add(group_name, record_date_str, symbols_to_add)
+        # 二次保险：如果合并后依然为空，也跳过
+        if not total:
+            return
         log_detail(f"成功更新历史记录。日期: {record_date_str}, 分组: '{group_name}'.")
         log_detail(f" - 本次新增 {num_added} 个不重复的 symbol。")
-    except Exception as e:
+    except (sqlite3.Error, ValueError) as e:
         log_detail(f"错误: 写入历史记录文件失败: {e}")
 
 # --- 3. 核心逻辑模块 ---
-def get_trading_dates_list(cursor, sector_name, symbol, end_date_str, limit=10):
+def get_recent_rows(store, sector_name, symbol, end_date_str, limit):
+    """
+    包含 end_date_str 在内的最近 limit 行 (date, price, volume, open)，按日期倒序，
+    与原 SELECT date, price, volume, open ... ORDER BY date DESC LIMIT ? 一致；end_date_str 为空表示最新。
+    """
+    return [r[:4] for r in store.last_n(sector_name, symbol, limit, end=end_date_str or None)][::-1]
+
+def get_trading_dates_list(store, sector_name, symbol, end_date_str, limit=10):
     """
     获取包含 end_date_str 在内的最近 limit 个交易日日期列表。
     返回: ['2025-01-28', '2025-01-27', '2025-01-24', ...] (倒序)
     """
-    query = f'SELECT date FROM "{sector_name}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT ?'
-    cursor.execute(query, (symbol, end_date_str, limit))
-    rows = cursor.fetchall()
-    return [r[0] for r in rows]
+    return [r[0] for r in get_recent_rows(store, sector_name, symbol, end_date_str, limit)]
+
+def get_earning_rows(store, symbol, end_date_str=None):
+    """Earning 表中该 symbol 的 [(date, price)]，按日期升序；end_date_str 不为空时只取该日(含)之前的"""
+    rows = store.load_earnings().get(symbol, [])
+    if end_date_str:
+        rows = [r for r in rows if r[0] <= end_date_str]
+    return rows
 
-def check_is_earnings_day(cursor, symbol, target_date_str):
+def check_is_earnings_day(store, symbol, target_date_str):
     """
     检查 target_date_str 是否为该 symbol 在 Earning 表中的最新财报日。
     """
-    try:
-        # 查询该 symbol 的最新一条财报记录（或者直接查是否存在该日期的记录）
-        # 这里逻辑是：如果该日是财报日，Earning表里应该有这一天的记录
-        query = "SELECT date FROM Earning WHERE name = ? AND date = ?"
-        cursor.execute(query, (symbol, target_date_str))
-        row = cursor.fetchone()
-        if row:
-            return True
-        return False
-    except Exception as e:
-        # 如果表不存在或查询出错，默认不过滤
-        return False
+    # 这里逻辑是：如果该日是财报日，Earning表里应该有这一天的记录（Earning 表不存在时为空，默认不过滤）
+    return any(d == target_date_str for d, _ in store.load_earnings().get(symbol, []))
 
 # ========== 新增：动态生成白名单 (过去一年涨幅 > 100%) ==========
 def generate_whitelist_symbols(db_path, sectors_json_path, target_date_override, log_detail):
@@ -294,11 +276,9 @@ def generate_whitelist_symbols(db_path, sectors_json_path, target_date_override,
         log_detail(f"错误: {sectors_json_path} 不存在，无法生成白名单。")
         return []
 
-    with open(sectors_json_path, 'r', encoding='utf-8') as f:
-        sectors_data = json.load(f)
+    sectors_data = load_json(sectors_json_path)
 
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
+    store = get_global_store(db_path)
 
     # 确定基准日期和一年前的日期
     base_date_str = target_date_override if target_date_override else datetime.date.today().isoformat()
@@ -314,25 +294,17 @@ def generate_whitelist_symbols(db_path, sectors_json_path, target_date_override,
             continue
         
         for symbol in symbols:
-            query = f"""
-                SELECT 
-                    (SELECT price FROM "{sector}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 1) as latest_price,
-                    (SELECT MIN(price) FROM "{sector}" WHERE name = ? AND date >= ? AND date <= ?) as min_price
-            """
-            try:
-                cursor.execute(query, (symbol, base_date_str, symbol, one_year_ago_str, base_date_str))
-                row = cursor.fetchone()
-                
-                if row and row[0] is not None and row[1] is not None:
-                    latest_p, min_p = row
-                    if min_p > 0:
-                        growth = (latest_p - min_p) / min_p
-                        if growth > 1.0:  # 原来是 1.5，现在改为 1.0 (即 100%)
-                            final_symbols.append(symbol)
-            except sqlite3.OperationalError:
-                continue
+            # 板块表不存在时两者都为 None，直接跳过
+            latest_row = store.latest_on_or_before(sector, symbol, base_date_str)
+            latest_p = latest_row[1] if latest_row else None
+            min_p = store.min_in_range(sector, symbol, start=one_year_ago_str, end=base_date_str)
+
+            if latest_p is not None and min_p is not None:
+                if min_p > 0:
+                    growth = (latest_p - min_p) / min_p
+                    if growth > 1.0:  # 原来是 1.5，现在改为 1.0 (即 100%)
+                        final_symbols.append(symbol)
 
-    conn.close()
     log_detail(f"动态白名单生成完成，共命中 {len(final_symbols)} 个 Symbol。")
     return final_symbols
 
@@ -361,15 +333,15 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
     
     # 加载历史记录
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
     except Exception as e:
         log_detail(f"错误: 无法读取历史记录文件: {e}")
         return []
 
-    # 连接数据库
+    # 连接数据库（成交额排名走 SQL，行情 / 财报走共享的 PriceStore）
     conn = sqlite3.connect(db_path, timeout=60.0)
     cursor = conn.cursor()
+    store = get_global_store(db_path)
 
     target_groups = CONFIG["TARGET_GROUPS"]
     
@@ -379,7 +351,7 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
     
     # 获取最近 5 天日期，算出 T-1, T-2, T-3
     # global_dates[0] = Today, global_dates[1] = T-1 (上一个有效交易日)
-    global_dates = get_trading_dates_list(cursor, sample_sector, sample_symbol, base_date, limit=5)
+    global_dates = get_trading_dates_list(store, sample_sector, sample_symbol, base_date, limit=5)
     
     if len(global_dates) < 4:
         log_detail("错误: 无法获取足够的交易日历数据。")
@@ -404,6 +376,22 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
         (date_t3, 3, "T-3策略")
     ]
 
+    # 成交额排名：先收集 4 个任务的全部候选，每张表一次读库（窗口同时覆盖"财报日起"和"N 个月"两种）
+    all_candidates = set()
+    for hist_date, _, _ in tasks:
+        for group in target_groups:
+            grp_data = history_data.get(group, {})
+            if isinstance(grp_data, dict):
+                all_candidates.update(clean_symbol(s) for s in grp_data.get(hist_date, []))
+    rank_pairs = [(sector_map[s], s) for s in sorted(all_candidates) if s in sector_map]
+    preload_days = int(CONFIG["COND8_VOLUME_LOOKBACK_MONTHS"] * 30)
+    for _, s in rank_pairs:
+        er_rows = get_earning_rows(store, s, base_date)
+        if er_rows:
+            er_days = (datetime.date.fromisoformat(base_date) - datetime.date.fromisoformat(er_rows[-1][0])).days
+            preload_days = max(preload_days, er_days)
+    preload(cursor, rank_pairs, base_date, preload_days)
+
     # ===== 新增：追踪 symbol 在策略1中的详细状态 =====
     trace_found_in_any_task = False
     
@@ -437,7 +425,7 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
             
             # 获取该股的具体交易日历
             # 获取 5 天: Today(0), T-1(1), T-2(2), T-3(3)
-            dates = get_trading_dates_list(cursor, sector, symbol, base_date, limit=5)
+            dates = get_trading_dates_list(store, sector, symbol, base_date, limit=5)
             
             if len(dates) < 4:
                 if is_tracing: log_detail(f"    x [失败] 交易日数据不足4天。")
@@ -446,9 +434,7 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
                 if is_tracing: log_detail(f"    x [失败] 日期对齐不匹配: dates[{date_idx}]={dates[date_idx]} != {hist_date}。")
                 continue
             
-            query = f'SELECT price, volume, open FROM "{sector}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 2'
-            cursor.execute(query, (symbol, dates[0]))
-            rows = cursor.fetchall()
+            rows = [r[1:4] for r in get_recent_rows(store, sector, symbol, dates[0], 2)]
 
             if len(rows) < 2:
                 if is_tracing: log_detail(f"    x [失败] 缺少足够的价格数据进行涨跌幅对比。")
@@ -475,8 +461,8 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
             turnover_curr = price_curr * vol_curr
             
             # 先判断从最近财报日到今天是否是成交额前三
-            cursor.execute("SELECT date FROM Earning WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 1", (symbol, dates[0]))
-            er_row = cursor.fetchone()
+            er_rows = get_earning_rows(store, symbol, dates[0])
+            er_row = er_rows[-1] if er_rows else None
             
             vol_cond = False
             if er_row:
@@ -504,7 +490,7 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
             if vol_cond:
                 # ================== 财报日过滤逻辑 ==================
                 # 1. 检查今日(dates[0])是否为财报日
-                if check_is_earnings_day(cursor, symbol, dates[0]):
+                if check_is_earnings_day(store, symbol, dates[0]):
                     if is_tracing: log_detail(f"    🛑 [过滤] 今日({dates[0]}) 为财报日，剔除。")
                     continue
                 
@@ -512,7 +498,7 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
                 has_recent_earnings = False
                 # [修改点] 使用配置项 earnings_check_days 来控制循环范围
                 for i in range(1, min(earnings_check_days + 1, len(dates))):
-                    if check_is_earnings_day(cursor, symbol, dates[i]):
+                    if check_is_earnings_day(store, symbol, dates[i]):
                         if is_tracing: log_detail(f"    🛑 [过滤] 前面第{i}天({dates[i]}) 为财报日，剔除。")
                         has_recent_earnings = True
                         break # 只要有一天是财报日，就跳出循环
@@ -556,8 +542,7 @@ def check_pe_volume_retention(db_path, history_json_path, panel_json_path, curre
     
     # 2. 加载历史记录，找到"前一天"的 PE_Volume 列表
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
         
         hist_pe_vol = history_data.get("PE_Volume", {})
         if not hist_pe_vol:
@@ -608,12 +593,11 @@ def check_pe_volume_retention(db_path, history_json_path, panel_json_path, curre
         
         # 如果在 history 中没有找到当天的任何数据（可能是实盘当天还没写入 history），则降级从 Panel 读取
         if not valid_pool and not target_date_override:
-            with open(panel_json_path, 'r', encoding='utf-8') as f:
-                panel_data = json.load(f)
-                for name in target_pool_names:
-                    group_data = panel_data.get(name, {})
-                    if isinstance(group_data, dict):
-                        valid_pool.update(group_data.keys())
+            panel_data = load_json(panel_json_path)
+            for name in target_pool_names:
+                group_data = panel_data.get(name, {})
+                if isinstance(group_data, dict):
+                    valid_pool.update(group_data.keys())
                         
         log_detail(f"    -> 已加载扩展后的验证池 ({'/'.join(target_pool_names)}) (日期: {base_date}): 共 {len(valid_pool)} 个 unique symbol")
     except Exception as e:
@@ -629,8 +613,7 @@ def check_pe_volume_retention(db_path, history_json_path, panel_json_path, curre
 
     # 4. 遍历筛选
     retention_list = []
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
+    store = get_global_store(db_path)
     current_set = set(current_pe_volume)
 
     for symbol in prev_symbols:
@@ -651,9 +634,7 @@ def check_pe_volume_retention(db_path, history_json_path, panel_json_path, curre
             if is_tracing: log_detail(f"    x [回溯] {symbol}: 未找到板块映射，跳过。")
             continue
 
-        query = f'SELECT date, price, volume, open FROM "{sector}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 2'
-        cursor.execute(query, (symbol, base_date))
-        rows = cursor.fetchall()
+        rows = get_recent_rows(store, sector, symbol, base_date, 2)
 
         if len(rows) < 2:
             if is_tracing: log_detail(f"    x [回溯] {symbol}: 交易数据不足2天，跳过。")
@@ -686,7 +667,6 @@ def check_pe_volume_retention(db_path, history_json_path, panel_json_path, curre
             if is_tracing:
                 log_detail(f"    x [回溯] {symbol}: 未满足下跌条件，未捞回。")
 
-    conn.close()
 
     # ===== 新增：回溯追踪总结 =====
     if symbol_to_trace:
@@ -714,15 +694,16 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
     # 【回测逻辑】这里处理回测日期
     base_date = target_date_override if target_date_override else (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
     
-    # 1. 连接数据库获取全局日期
+    # 1. 连接数据库获取全局日期（成交额排名走 SQL，行情 / 财报走共享的 PriceStore）
     conn = sqlite3.connect(db_path, timeout=60.0)
     cursor = conn.cursor()
+    store = get_global_store(db_path)
     
     sample_symbol = list(sector_map.keys())[0] if sector_map else "AAPL"
     sample_sector = sector_map.get(sample_symbol, "Technology")
 
     # 获取最近3个交易日 (T, T-1, T-2)
-    global_dates = get_trading_dates_list(cursor, sample_sector, sample_symbol, base_date, limit=lookback_days)
+    global_dates = get_trading_dates_list(store, sample_sector, sample_symbol, base_date, limit=lookback_days)
     
     if len(global_dates) < 2: # 至少需要 T 和 T-1
         log_detail("错误: 交易日数据不足，无法执行策略2。")
@@ -733,8 +714,7 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
 
     # 2. 从History中收集候选股 (仅限 T, T-1, T-2)
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
     except Exception:
         conn.close()
         return [], []
@@ -764,6 +744,10 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
     # [修改点] 拆分分支A和分支B的记录列表
     results_a = [] # 分支A：放量上涨
     results_b = [] # 分支B：缩量上涨
+
+    # 成交额排名：全部候选每张表一次读库，下面 T, T-1, T-2 的排名都在内存里切片
+    preload(cursor, [(sector_map[s], s) for s in candidate_symbols if s in sector_map],
+            base_date, int(vol_rank_months * 30))
     
     # 3. 逐个检查逻辑
     for symbol in candidate_symbols:
@@ -774,9 +758,7 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
         if is_tracing: log_detail(f"--- 正在检查 {symbol} (策略2) ---")
 
         # 【修改点 1】将 LIMIT 从 3 改为 8，以便获取今日 + 过去 7 天的数据
-        query = f'SELECT date, price, volume, open FROM "{sector}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 8'
-        cursor.execute(query, (symbol, base_date))
-        rows = cursor.fetchall()
+        rows = get_recent_rows(store, sector, symbol, base_date, 8)
         
         # 至少需要 T 和 T-1 进行涨跌判断
         if len(rows) < 2:
@@ -816,7 +798,7 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
                     log_detail(f"    i [通过] 价格位置合理: 当前价 {price_curr} 未超过前{len(past_prices)}日最低点 {min_past_price} 的 3%")
 
         # 规则2: 财报日过滤 (T-1日)
-        if check_is_earnings_day(cursor, symbol, date_prev):
+        if check_is_earnings_day(store, symbol, date_prev):
             if is_tracing: log_detail(f"    🛑 昨日({date_prev})是财报日，跳过。")
             continue
 
@@ -912,9 +894,8 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
     # 加载历史记录
     hist_pe_vol_high = {}
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            hist_data = json.load(f)
-            hist_pe_vol_high = hist_data.get("PE_Volume_high", {})
+        hist_data = load_history(history_json_path)
+        hist_pe_vol_high = hist_data.get("PE_Volume_high", {})
     except Exception as e:
         log_detail(f"读取历史文件失败: {e}")
         hist_data = {}
@@ -944,16 +925,15 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
         
         # 如果在 history 中没有找到当天的任何数据（可能是实盘当天还没写入 history），则降级从 Panel 读取
         if not base_valid_pool and not target_date_override:
-            with open(panel_json_path, 'r', encoding='utf-8') as f:
-                panel_data = json.load(f)
-                for name in base_pool_names:
-                    group_data = panel_data.get(name, {})
-                    if isinstance(group_data, dict):
-                        base_valid_pool.update(group_data.keys())
-                for name in extended_pool_names:
-                    group_data = panel_data.get(name, {})
-                    if isinstance(group_data, dict):
-                        extended_valid_pool.update(group_data.keys())
+            panel_data = load_json(panel_json_path)
+            for name in base_pool_names:
+                group_data = panel_data.get(name, {})
+                if isinstance(group_data, dict):
+                    base_valid_pool.update(group_data.keys())
+            for name in extended_pool_names:
+                group_data = panel_data.get(name, {})
+                if isinstance(group_data, dict):
+                    extended_valid_pool.update(group_data.keys())
                         
         log_detail(f"已加载基础跌幅池 (日期: {base_date})，共 {len(base_valid_pool)} 个候选抄底 Symbol。")
         log_detail(f"已加载扩展跌幅池 (PE_valid/invalid)，共 {len(extended_valid_pool)} 个候选抄底 Symbol。")
@@ -966,13 +946,20 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
     results_bing = []    # 丙类
     results_chaodi = []  # 抄底类
     
-    # 连接数据库
+    # 连接数据库（成交额排名走 SQL，行情 / 财报走共享的 PriceStore）
     conn = sqlite3.connect(db_path, timeout=60.0)
     cursor = conn.cursor()
+    store = get_global_store(db_path)
+    store.load_tables(sorted(set(sector_map.values())))
     
     # 遍历所有 symbol
     all_symbols = list(sector_map.keys())
     log_detail(f"开始扫描 {len(all_symbols)} 个 Symbol...")
+
+    # 成交额排名（12 个月 / 6 个月 / 丙类与抄底的 N 天）：每张表一次读库，循环里只在内存里切片
+    preload(cursor, [(sector_map[s], s) for s in all_symbols],
+            target_date_override or None,
+            max(turnover_lookback_months * 30, 6 * 30, bing_lookback_days))
     
     for symbol in all_symbols:
         is_tracing = (symbol == symbol_to_trace)
@@ -991,12 +978,7 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
             log_detail(f"    - 命中 HOT_TAGS: {has_hot_tag}, 命中 HOT_TAGS_T: {has_hot_tag_t}")
         
         # 1. 财报数据检查
-        if target_date_override:
-            cursor.execute("SELECT date, price FROM Earning WHERE name = ? AND date <= ? ORDER BY date ASC", (symbol, target_date_override))
-        else:
-            cursor.execute("SELECT date, price FROM Earning WHERE name = ? ORDER BY date ASC", (symbol,))
-        
-        er_rows = cursor.fetchall()
+        er_rows = get_earning_rows(store, symbol, target_date_override)
         
         # 至少需要1次财报记录
         if len(er_rows) < 1:
@@ -1012,10 +994,7 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
             log_detail(f"    - 财报记录: {len(er_rows)} 次, 最新财报日: {latest_er_date}, 涨跌幅: {latest_er_pct}")
         
         # 2. 财报日价格
-        placeholders = ', '.join(['?'] * len(all_er_dates))
-        query = f'SELECT date, price FROM "{sector}" WHERE name = ? AND date IN ({placeholders}) ORDER BY date ASC'
-        cursor.execute(query, (symbol, *all_er_dates))
-        price_data = cursor.fetchall()
+        price_data = store.prices_on_dates(sector, symbol, all_er_dates)
         
         if len(price_data) != len(all_er_dates):
             if is_tracing:
@@ -1043,14 +1022,7 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
             log_detail(f"    - 条件B (财报涨跌幅>0): {latest_er_pct} > 0 = {cond_er_pct_positive}")
         
         # 4. 获取最新交易数据
-        if target_date_override:
-            query = f'SELECT date, price, volume, open FROM "{sector}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 2'
-            cursor.execute(query, (symbol, target_date_override))
-        else:
-            query = f'SELECT date, price, volume, open FROM "{sector}" WHERE name = ? ORDER BY date DESC LIMIT 2'
-            cursor.execute(query, (symbol,))
-        
-        rows = cursor.fetchall()
+        rows = get_recent_rows(store, sector, symbol, target_date_override, 2)
         
         if len(rows) < 2 or rows[0][1] is None or rows[0][2] is None or rows[0][3] is None or rows[1][1] is None or rows[1][2] is None:
             if is_tracing:
@@ -1144,9 +1116,7 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
                 
                 if cond_c_price_up and cond_c_turnover_down:
                     # 获取从甲日到今天的所有交易数据（按日期升序）
-                    query_c = f'SELECT date, price, volume, open FROM "{sector}" WHERE name = ? AND date >= ? AND date <= ? ORDER BY date ASC'
-                    cursor.execute(query_c, (symbol, latest_jia_history_date, latest_date))
-                    all_rows_c = cursor.fetchall()
+                    all_rows_c = [r[:4] for r in store.rows_between(sector, symbol, latest_jia_history_date, latest_date)]
 
                     # 至少需要: 甲日 + 1个中间日 + 今天 = 3条记录
                     if len(all_rows_c) >= 3:
@@ -1300,43 +1270,24 @@ def check_turnover_since_earning(cursor, sector_name, symbol, er_date_str, lates
     """
     检查 latest_turnover 是否是从 er_date_str (财报日) 到 latest_date_str 期间的前 rank_threshold 名成交额
     """
-    # 查询从财报日到最新日期的所有交易数据
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, er_date_str, latest_date_str))
-    rows = cursor.fetchall()
-    
-    # 计算成交额并过滤掉 None 值
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
-    
-    if not valid_data:
+    # 从财报日到最新日期的成交额前 N 名（批量接口，按 cursor 复用已加载的数据）
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, {symbol: er_date_str},
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
+
+    if not res or res.count == 0:
         return False
-    
-    # 按成交额从大到小排序
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    
-    # 获取前 rank_threshold 名
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-    
+
+    top_n_data = res.top
+
     # 判断最新成交额是否在前 N 名中（或者大于等于第 N 名）
-    is_top_n = False
-    if len(top_n_turnovers) > 0:
-        # 如果数据量少于阈值，且当前值在其中，那肯定是前N名
-        # 如果数据量足够，检查是否大于等于第N大的值
-        cutoff_value = top_n_turnovers[-1]
-        if latest_turnover >= cutoff_value:
-            is_top_n = True
-    
+    is_top_n = meets_cutoff(top_n_data, latest_turnover)
+
     if is_tracing:
-        log_detail(f"    - 条件F (财报日起前{rank_threshold}): 范围 {er_date_str} ~ {latest_date_str}, 共 {len(valid_data)} 个交易日")
+        log_detail(f"    - 条件F (财报日起前{rank_threshold}): 范围 {er_date_str} ~ {latest_date_str}, 共 {res.count} 个交易日")
         top_n_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
         log_detail(f"      前{rank_threshold}名: {top_n_str}")
         log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 是否前{rank_threshold}: {is_top_n}")
-    
+
     return is_top_n
 
 def check_turnover_rank_by_days(cursor, sector_name, symbol, latest_date_str, latest_turnover, lookback_days, rank_threshold, log_detail, is_tracing):
@@ -1346,49 +1297,23 @@ def check_turnover_rank_by_days(cursor, sector_name, symbol, latest_date_str, la
     参数:
         lookback_days: 回溯天数（如45天）
     """
-    # 计算 N 天前的日期
-    try:
-        dt = datetime.datetime.strptime(latest_date_str, "%Y-%m-%d")
-        start_date = dt - datetime.timedelta(days=lookback_days)
-        start_date_str = start_date.strftime("%Y-%m-%d")
-    except Exception:
-        return False
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, lookback_days,
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
 
-    # 查询过去 N 天的所有日期、价格和成交量
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, start_date_str, latest_date_str))
-    rows = cursor.fetchall()
-    
-    # 计算成交额并过滤掉 None 值
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
-    
-    if not valid_data:
+    if not res or res.count == 0:
         return False
-    
-    # 按成交额从大到小排序
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    
-    # 截取前 N 名
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-    
+
+    top_n_data = res.top
+
     # 判定逻辑
-    is_top_n = False
-    if latest_turnover in top_n_turnovers:
-        is_top_n = True
-    elif len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]:
-        is_top_n = True
-    
+    is_top_n = is_top_n_turnover(top_n_data, latest_turnover, rank_threshold)
+
     if is_tracing:
-        log_detail(f"    - 条件F (成交额排名-丙类): 回溯{lookback_days}天，共{len(valid_data)}个交易日")
+        log_detail(f"    - 条件F (成交额排名-丙类): 回溯{lookback_days}天，共{res.count}个交易日")
         top_n_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
         log_detail(f"      前{rank_threshold}名: {top_n_str}")
         log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 在前{rank_threshold}名: {is_top_n}")
-    
+
     return is_top_n
 
 def check_turnover_rank(cursor, sector_name, symbol, latest_date_str, latest_turnover, lookback_months, rank_threshold, log_detail, is_tracing):
@@ -1396,48 +1321,36 @@ def check_turnover_rank(cursor, sector_name, symbol, latest_date_str, latest_tur
     检查 latest_turnover (成交额=price*volume) 是否是过去 lookback_months 个月内的前 rank_threshold 名
     """
     # 计算 N 个月前的日期
-    try:
-        dt = datetime.datetime.strptime(latest_date_str, "%Y-%m-%d")
-        start_date = dt - datetime.timedelta(days=lookback_months * 30)
-        start_date_str = start_date.strftime("%Y-%m-%d")
-    except Exception:
+    start_date_str = lookback_start(latest_date_str, lookback_months * 30)
+    if start_date_str is None:
         return False
 
-    # 查询过去 N 个月的所有日期、价格和成交量
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, start_date_str, latest_date_str))
-    rows = cursor.fetchall()
-    
-    # 计算成交额并过滤掉 None 值
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
-    
-    if not valid_data:
+    # 优先使用写库时增量维护的滚动统计（仅当统计正好截止到 latest_date_str 时）
+    cached = None
+    # 每张表只批量读取一次（一条 GROUP BY 核对新鲜度），不再逐只查 MAX(date)
+    stats = get_table_stats(cursor, sector_name).get(symbol)
+    if stats is not None and stats.last_date == latest_date_str:
+        cached = stats.turnover_top_k(start_date_str, rank_threshold)
+
+    if cached is not None:
+        top_n_data, valid_count = cached
+    else:
+        res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, lookback_months * 30,
+                            rank_threshold, panel=get_panel(cursor)).get(symbol)
+        top_n_data, valid_count = (res.top, res.count) if res else ([], 0)
+
+    if valid_count == 0:
         return False
-    
-    # 按成交额从大到小排序
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    
-    # 截取前 N 名
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-    
+
     # 判定逻辑
-    is_top_n = False
-    if latest_turnover in top_n_turnovers:
-        is_top_n = True
-    elif len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]:
-        is_top_n = True
-    
+    is_top_n = is_top_n_turnover(top_n_data, latest_turnover, rank_threshold)
+
     if is_tracing:
-        log_detail(f"    - 条件E (成交额排名): 回溯{lookback_months}个月，共{len(valid_data)}个交易日")
+        log_detail(f"    - 条件E (成交额排名): 回溯{lookback_months}个月，共{valid_count}个交易日")
         top_n_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
         log_detail(f"      前{rank_threshold}名: {top_n_str}")
         log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 在前{rank_threshold}名: {is_top_n}")
-    
+
     return is_top_n
 
 # ========== 修改：处理 PE_Hot 策略的独立函数 (接收动态白名单 + 增加市值维度 + 10天防暴涨过滤) ==========
@@ -1473,9 +1386,10 @@ def process_pe_hot(db_path, sector_map, target_date_override, panel_json_path, h
     # 确定基准日期
     base_date = target_date_override if target_date_override else (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
     
-    # 连接数据库以获取成交额和市值
+    # 连接数据库以获取市值；成交额来自共享的 PriceStore
     conn = sqlite3.connect(db_path, timeout=60.0)
     cursor = conn.cursor()
+    store = get_global_store(db_path)
     
     # ========== 查询市值 >= min_mcap 的 symbol ==========
     high_mcap_symbols = set()
@@ -1492,8 +1406,7 @@ def process_pe_hot(db_path, sector_map, target_date_override, panel_json_path, h
     pool_symbols_with_notes = {}
     try:
         # 1. 优先从 History 读取 (支持回测)
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
         
         history_loaded = False
         for group in target_groups:
@@ -1507,8 +1420,7 @@ def process_pe_hot(db_path, sector_map, target_date_override, panel_json_path, h
         
         # 2. 降级从 Panel 读取 (支持实盘)
         if not history_loaded and not target_date_override:
-            with open(panel_json_path, 'r', encoding='utf-8') as f:
-                panel_data = json.load(f)
+            panel_data = load_json(panel_json_path)
             for group in target_groups:
                 if group in panel_data and isinstance(panel_data[group], dict):
                     for sym, note in panel_data[group].items():
@@ -1534,9 +1446,7 @@ def process_pe_hot(db_path, sector_map, target_date_override, panel_json_path, h
                         continue
                         
                     # 4. 查询最新 10 天的价格和成交量
-                    query = f'SELECT price, volume FROM "{sector}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 10'
-                    cursor.execute(query, (sym, base_date))
-                    rows = cursor.fetchall()
+                    rows = [r[1:3] for r in get_recent_rows(store, sector, sym, base_date, 10)]
                     
                     if rows and rows[0][0] is not None and rows[0][1] is not None:
                         latest_price, latest_volume = rows[0]
@@ -1720,23 +1630,21 @@ def run_pe_volume_logic(log_detail):
     try:
         if TARGET_DATE:
             # 回测模式：从 History 中获取当天的备注
-            with open(EARNING_HISTORY_JSON_FILE, 'r', encoding='utf-8') as f:
-                hist_data = json.load(f)
-                for group_name, group_content in hist_data.items():
-                    if base_date_str in group_content:
-                        for sym_with_note in group_content[base_date_str]:
-                            sym = clean_symbol(sym_with_note)
-                            if len(sym_with_note) > len(all_existing_notes.get(sym, "")):
-                                all_existing_notes[sym] = sym_with_note
+            hist_data = load_history(EARNING_HISTORY_JSON_FILE)
+            for group_name, group_content in hist_data.items():
+                if base_date_str in group_content:
+                    for sym_with_note in group_content[base_date_str]:
+                        sym = clean_symbol(sym_with_note)
+                        if len(sym_with_note) > len(all_existing_notes.get(sym, "")):
+                            all_existing_notes[sym] = sym_with_note
         else:
             # 实盘模式：从 Panel 中获取最新备注
-            with open(PANEL_JSON_FILE, 'r', encoding='utf-8') as f:
-                p_data = json.load(f)
-                for group_name, group_content in p_data.items():
-                    if isinstance(group_content, dict):
-                        for s, n in group_content.items():
-                            if len(n) > len(all_existing_notes.get(s, "")):
-                                all_existing_notes[s] = n
+            p_data = load_json(PANEL_JSON_FILE)
+            for group_name, group_content in p_data.items():
+                if isinstance(group_content, dict):
+                    for s, n in group_content.items():
+                        if len(n) > len(all_existing_notes.get(s, "")):
+                            all_existing_notes[s] = n
     except Exception as e:
         log_detail(f"提示: 读取现有备注时出错: {e}")
 
@@ -1807,31 +1715,30 @@ def run_pe_volume_logic(log_detail):
 
     # ================= 新增：PE_Hot 连续命中追加“追”字 =================
     try:
-        with open(EARNING_HISTORY_JSON_FILE, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
-            hist_pe_hot = history_data.get("PE_Hot", {})
+        history_data = load_history(EARNING_HISTORY_JSON_FILE)
+        hist_pe_hot = history_data.get("PE_Hot", {})
+        
+        if hist_pe_hot:
+            sorted_dates = sorted(hist_pe_hot.keys())
+            prev_date = None
+            # 寻找小于当前 base_date_str 的最大历史日期
+            for d in reversed(sorted_dates):
+                if d < base_date_str:
+                    prev_date = d
+                    break
             
-            if hist_pe_hot:
-                sorted_dates = sorted(hist_pe_hot.keys())
-                prev_date = None
-                # 寻找小于当前 base_date_str 的最大历史日期
-                for d in reversed(sorted_dates):
-                    if d < base_date_str:
-                        prev_date = d
-                        break
+            if prev_date:
+                # 获取上一期的 symbol 列表并清洗
+                prev_symbols_raw = hist_pe_hot[prev_date]
+                prev_symbols = set([clean_symbol(s) for s in prev_symbols_raw])
                 
-                if prev_date:
-                    # 获取上一期的 symbol 列表并清洗
-                    prev_symbols_raw = hist_pe_hot[prev_date]
-                    prev_symbols = set([clean_symbol(s) for s in prev_symbols_raw])
-                    
-                    # 遍历今天的 pe_hot_list，如果在上一期中存在，则在 notes 中追加“追”
-                    for sym in pe_hot_list:
-                        if sym in prev_symbols:
-                            if sym in pe_hot_notes:
-                                pe_hot_notes[sym] += "追"
-                                if SYMBOL_TO_TRACE == sym:
-                                    log_detail(f"    - [PE_Hot连续命中] {sym} 在上一期({prev_date})也存在，追加'追'字。")
+                # 遍历今天的 pe_hot_list，如果在上一期中存在，则在 notes 中追加“追”
+                for sym in pe_hot_list:
+                    if sym in prev_symbols:
+                        if sym in pe_hot_notes:
+                            pe_hot_notes[sym] += "追"
+                            if SYMBOL_TO_TRACE == sym:
+                                log_detail(f"    - [PE_Hot连续命中] {sym} 在上一期({prev_date})也存在，追加'追'字。")
     except Exception as e:
         log_detail(f"读取历史文件追加 PE_Hot '追'字失败: {e}")
 
@@ -1869,7 +1776,13 @@ def run_pe_volume_logic(log_detail):
         log_detail(f"    - 抄底类: {len(filtered_pe_volume_high_chaodi)} 个")
         log_detail(f"📊 [策略-Hot] PE_Hot 命中: {len(pe_hot_list)} 个") 
         log_detail("="*60 + "\n")
-        return
+        # 返回本该写入 History 的命中列表 (带中文后缀，与 History 中的格式一致)
+        return {
+            "PE_Volume": sorted(pe_volume_notes.values()),
+            "PE_Volume_up": sorted(pe_volume_up_notes.values()),
+            "PE_Volume_high": sorted(pe_vol_high_notes.values()),
+            "PE_Hot": sorted(pe_hot_notes.values()),
+        }
 
     # 6. 写入 Panel (已有的函数逻辑会顺带将其自动写入到对应的 _backup 里)
     log_detail(f"\n正在写入 Panel 文件...")
@@ -1920,7 +1833,7 @@ def run_pe_volume_logic(log_detail):
 
     log_detail("程序运行结束。")
 
-def main():
+def run():
     if SYMBOL_TO_TRACE:
         print(f"追踪模式已启用，目标: {SYMBOL_TO_TRACE}。日志仅输出到控制台。")
     else:
@@ -1931,5 +1844,10 @@ def main():
         
     run_pe_volume_logic(log_detail_console)
 
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        run()
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,7 +1,12 @@
 import json
-import sqlite3
 import os
+import sqlite3
 import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from Price_Store import get_global_store, to_day
+from Earning_History_Store import get_store as get_earning_history_store
+from Modules_Cache import symbol_to_tags, load_json, save_json, use_context
 
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
@@ -136,13 +141,16 @@ CONFIG = {
     # PE_W 专属附加条件：最新价较近一个月最低价的涨幅限制
     "PE_W_LOOKBACK_DAYS": 21,        # 最近一个月（约21个交易日）
     "PE_W_MAX_RISE_FROM_LOW": 0.07,  # 最高不超过 6%
+
+    # 构建数据缓存时按板块分片并行 (None = CPU 核数, 1 = 串行)
+    "CACHE_WORKERS": None,
+    "CACHE_PARALLEL_MIN_SYMBOLS": 200,  # symbol 数少于此值时串行，避免进程启动开销
 }
 
 # --- 3. 辅助与文件操作模块 ---
 def load_tag_settings(json_path):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            settings = json.load(f)
+        settings = load_json(json_path)
         tag_blacklist = set(settings.get('BLACKLIST_TAGS', []))
         hot_tags = set(settings.get('HOT_TAGS', []))
         return tag_blacklist, hot_tags
@@ -151,8 +159,7 @@ def load_tag_settings(json_path):
 
 def load_all_symbols(json_path, target_sectors):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            all_sectors_data = json.load(f)
+        all_sectors_data = load_json(json_path)
         all_symbols = []
         symbol_to_sector_map = {}
         for sector, symbols in all_sectors_data.items():
@@ -167,39 +174,28 @@ def load_all_symbols(json_path, target_sectors):
 
 def load_blacklist(json_path):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
         return set(data.get('newlow', []))
     except Exception:
         return set()
 
 def load_earning_symbol_blacklist(json_path):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
         return set(data.get('Earning', []))
     except Exception:
         return set()
 
 def load_symbol_tags(json_path):
+    # 经 Modules_Cache：description.json 没变时直接取缓存好的 symbol -> tags（只读）
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        symbol_tag_map = {}
-        stock_list = data.get('stocks', [])
-        for item in stock_list:
-            symbol = item.get('symbol')
-            tags = item.get('tag', [])
-            if symbol:
-                symbol_tag_map[symbol] = tags
-        return symbol_tag_map
+        return symbol_to_tags(json_path)
     except Exception:
         return {}
 
 def update_json_panel(symbols_list, json_path, group_name, symbol_to_note=None):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
     except (FileNotFoundError, json.JSONDecodeError):
         data = {}
 
@@ -209,8 +205,7 @@ def update_json_panel(symbols_list, json_path, group_name, symbol_to_note=None):
         data[group_name] = {symbol: symbol_to_note.get(symbol, "") for symbol in sorted(symbols_list)}
 
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        save_json(json_path, data, indent=4, ensure_ascii=False)
     except Exception as e:
         print(f"错误: 写入JSON文件失败: {e}")
 
@@ -226,276 +221,270 @@ def update_earning_history_json(file_path, group_name, symbols_to_add, log_detai
     yesterday_str = yesterday.isoformat()  # 获取 'YYYY-MM-DD' 格式的昨天日期
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        log_detail("信息: 历史记录文件不存在或格式错误，将创建新的。")
-        data = {}
-
-    # 确保顶层分组存在 (e.g., 'season')
-    if group_name not in data:
-        data[group_name] = {}
-
-    # 获取昨天已有的 symbol 列表，如果不存在则为空列表
-    existing_symbols = data[group_name].get(yesterday_str, [])
-
-    # 合并新旧列表，通过集合去重，然后排序
-    combined_symbols = set(existing_symbols) | set(symbols_to_add)
-    updated_symbols = sorted(list(combined_symbols))
-
-    # === 二次保险 ===
-    if not updated_symbols:
-        return
-    
-    # 更新数据结构
-    data[group_name][yesterday_str] = updated_symbols
-
-    num_added = len(updated_symbols) - len(existing_symbols)
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        history = get_earning_history_store(DB_FILE, file_path)
+        num_added, total = history.add(group_name, yesterday_str, symbols_to_add)
+        # === 二次保险 ===
+        if not total:
+            return
         log_detail(f"成功更新历史记录。日期: {yesterday_str}, 分组: '{group_name}'.")
         log_detail(f" - 本次新增 {num_added} 个不重复的 symbol。")
-        log_detail(f" - 当天总计 {len(updated_symbols)} 个 symbol。")
-    except Exception as e:
+        log_detail(f" - 当天总计 {total} 个 symbol。")
+    except (sqlite3.Error, ValueError) as e:
         log_detail(f"错误: 写入历史记录文件失败: {e}")
 
 # --- 4. 核心数据获取模块 ---
 def build_stock_data_cache(symbols, symbol_to_sector_map, db_path, symbol_to_trace, log_detail, symbol_to_tags_map, target_date=None):
+    workers = CONFIG.get("CACHE_WORKERS") or os.cpu_count() or 1
+    if workers > 1 and len(symbols) > CONFIG.get("CACHE_PARALLEL_MIN_SYMBOLS", 200):
+        return build_stock_data_cache_sharded(
+            symbols, symbol_to_sector_map, db_path, symbol_to_trace, log_detail,
+            symbol_to_tags_map, target_date, workers
+        )
+
+    # 所有行情数据来自共享的 PriceStore：每张板块表只扫描一次，之后全是内存查找
+    store = get_global_store(db_path)
+    needed_sectors = sorted({symbol_to_sector_map[s] for s in symbols if s in symbol_to_sector_map})
+    store.load_tables(needed_sectors)
+    earnings_map = store.load_earnings()
+    mnspp_map = store.load_mnspp(("pe_ratio", "marketcap"))
+
+    cache = {}
+    for symbol in symbols:
+        data = build_symbol_data(store, earnings_map, mnspp_map, symbol, symbol_to_sector_map,
+                                 symbol_to_trace, log_detail, symbol_to_tags_map, target_date)
+        if data is not None:
+            cache[symbol] = data
+    return cache
+
+def _cache_shard_worker(args):
+    """
+    子进程：只加载本分片的板块表，逐个 symbol 构建缓存。
+    trace 日志按 symbol 分别缓冲，由主进程按原 symbol 顺序输出。
+    """
+    (symbols, symbol_to_sector_map, db_path, symbol_to_trace,
+     symbol_to_tags_map, target_date, config) = args
+    CONFIG.update(config)  # spawn 启动的子进程拿不到主进程运行时写入的配置 (HOT_TAGS 等)
+    store = get_global_store(db_path)  # PriceStore 默认以 mode=ro 只读 URI 连接
+    store.load_tables(sorted({symbol_to_sector_map[s] for s in symbols if s in symbol_to_sector_map}))
+    earnings_map = store.load_earnings()
+    mnspp_map = store.load_mnspp(("pe_ratio", "marketcap"))
+
+    part, logs = {}, {}
+    for symbol in symbols:
+        lines = []
+        data = build_symbol_data(store, earnings_map, mnspp_map, symbol, symbol_to_sector_map,
+                                 symbol_to_trace, lines.append, symbol_to_tags_map, target_date)
+        if data is not None:
+            part[symbol] = data
+        if lines:
+            logs[symbol] = lines
+    return part, logs
+
+def build_stock_data_cache_sharded(symbols, symbol_to_sector_map, db_path, symbol_to_trace, log_detail, symbol_to_tags_map, target_date, workers):
+    """按板块表把 symbols 分片到进程池，结果按原 symbol 顺序合并回同一个 cache"""
+    shards = {}
+    for symbol in symbols:
+        # 无板块映射的 symbol 也放进分片里，保持原来的失败日志
+        shards.setdefault(symbol_to_sector_map.get(symbol, ""), []).append(symbol)
+    # 大表先跑，尽量让各进程同时结束
+    ordered = sorted(shards.items(), key=lambda kv: -len(kv[1]))
+    config = dict(CONFIG)
+
+    parts, logs = {}, {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(ordered))) as pool:
+        futures = [
+            pool.submit(_cache_shard_worker, (
+                shard_symbols, symbol_to_sector_map, db_path, symbol_to_trace,
+                {s: symbol_to_tags_map[s] for s in shard_symbols if s in symbol_to_tags_map},
+                target_date, config
+            ))
+            for _, shard_symbols in ordered
+        ]
+        for fut in futures:
+            part, part_logs = fut.result()
+            parts.update(part)
+            logs.update(part_logs)
+
     cache = {}
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
-    marketcap_exists = True
+    for symbol in symbols:
+        for line in logs.get(symbol, ()):
+            log_detail(line)
+        if symbol in parts:
+            cache[symbol] = parts[symbol]
+    return cache
+
+def build_symbol_data(store, earnings_map, mnspp_map, symbol, symbol_to_sector_map, symbol_to_trace, log_detail, symbol_to_tags_map, target_date=None):
+    """构建单个 symbol 的缓存数据；不满足条件时返回 None"""
     # 获取配置的天数（取通用回撤天数和PE_W需求天数的最大值，确保数据够用）
     lookback_days = max(
         CONFIG.get("LOOKBACK_WINDOW_DAYS", 10), 
         CONFIG.get("PE_W_LOOKBACK_DAYS", 21)
     )
 
-    for i, symbol in enumerate(symbols):
-        is_tracing = (symbol == symbol_to_trace)
-        data = {'is_valid': False}
-        sector_name = symbol_to_sector_map.get(symbol)
-        
-        if not sector_name:
-            if is_tracing: log_detail(f"[{symbol}] 失败: 在板块映射中未找到该symbol。")
-            continue
+    is_tracing = (symbol == symbol_to_trace)
+    data = {'is_valid': False}
+    sector_name = symbol_to_sector_map.get(symbol)
 
-        # ========== 【修改点 1/3】: 财报获取增加回测日期限制 ==========
-        if target_date:
-            # 回测模式：只获取回测日期(含)之前的财报
-            cursor.execute("SELECT date, price FROM Earning WHERE name = ? AND date <= ? ORDER BY date ASC", (symbol, target_date))
-        else:
-            # 正常模式：获取所有财报
-            cursor.execute("SELECT date, price FROM Earning WHERE name = ? ORDER BY date ASC", (symbol,))
-        # ========================================================
-        
-        er_rows = cursor.fetchall()
-        if not er_rows:
-            if is_tracing: log_detail(f"[{symbol}] 失败: 在Earning表中未找到符合日期的财报记录。")
-            continue
+    if not sector_name:
+        if is_tracing: log_detail(f"[{symbol}] 失败: 在板块映射中未找到该symbol。")
+        return None
 
-        if is_tracing: log_detail(f"[{symbol}] 步骤1: 从Earning表获取了 {len(er_rows)} 条财报记录。")
-        
-        all_er_dates = [r[0] for r in er_rows]
-        all_er_pcts = [r[1] for r in er_rows]
-        data['all_er_pcts'] = all_er_pcts
-        data['all_er_dates'] = all_er_dates
-        data['latest_er_date_str'] = all_er_dates[-1]
-        data['latest_er_pct'] = all_er_pcts[-1]
+    # ========== 【修改点 1/3】: 财报获取增加回测日期限制 ==========
+    er_rows = earnings_map.get(symbol, [])
+    if target_date:
+        # 回测模式：只获取回测日期(含)之前的财报
+        er_rows = [r for r in er_rows if r[0] <= target_date]
+    # ========================================================
 
-        if is_tracing: log_detail(f"[{symbol}] - 最新财报日: {data['latest_er_date_str']}, 最新财报涨跌幅: {data['latest_er_pct']}")
+    if not er_rows:
+        if is_tracing: log_detail(f"[{symbol}] 失败: 在Earning表中未找到符合日期的财报记录。")
+        return None
 
-        placeholders = ', '.join(['?'] * len(all_er_dates))
-        query = (f'SELECT date, price FROM "{sector_name}" WHERE name = ? AND date IN ({placeholders}) ORDER BY date ASC')
-        cursor.execute(query, (symbol, *all_er_dates))
-        price_data = cursor.fetchall()
+    if is_tracing: log_detail(f"[{symbol}] 步骤1: 从Earning表获取了 {len(er_rows)} 条财报记录。")
 
-        if is_tracing: log_detail(f"[{symbol}] 步骤2: 查询财报日收盘价。要求 {len(all_er_dates)} 条，实际查到 {len(price_data)} 条。")
-        
-        if len(price_data) != len(all_er_dates):
-            if is_tracing: log_detail(f"[{symbol}] 失败: 财报日收盘价数据不完整。")
-            continue
+    all_er_dates = [r[0] for r in er_rows]
+    all_er_pcts = [r[1] for r in er_rows]
+    data['all_er_pcts'] = all_er_pcts
+    data['all_er_dates'] = all_er_dates
+    data['latest_er_date_str'] = all_er_dates[-1]
+    data['latest_er_pct'] = all_er_pcts[-1]
 
-        data['all_er_prices'] = [p[1] for p in price_data]
-        if is_tracing: log_detail(f"[{symbol}] - 财报日收盘价列表: {data['all_er_prices']}")
+    if is_tracing: log_detail(f"[{symbol}] - 最新财报日: {data['latest_er_date_str']}, 最新财报涨跌幅: {data['latest_er_pct']}")
 
-        # 步骤3: 获取基准交易日数据 (原代码逻辑保持不变，这部分是对的)
-        if target_date:
-            # 回测模式：强制查询指定日期(含)之前的最新一条数据
-            query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 1'
-            params = (symbol, target_date)
-            if is_tracing: log_detail(f"[{symbol}] !!! 回测模式启动 !!! 正在查找 {target_date} 或之前的最新数据...")
-        else:
-            # 正常模式：查询数据库里最新的一条数据
-            query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? ORDER BY date DESC LIMIT 1'
-            params = (symbol,)
+    price_data = store.prices_on_dates(sector_name, symbol, all_er_dates)
 
-        cursor.execute(query, params)
-        latest_row = cursor.fetchone()
-        
-        if not latest_row or latest_row[1] is None or latest_row[2] is None:
-            if is_tracing: log_detail(f"[{symbol}] 失败: 未能获取有效的交易日数据(可能该日期停牌或无数据)。")
-            continue
-        
-        # 这一步很关键：一旦这里锁定了 latest_date_str 为 2025-12-17
-        data['latest_date_str'], data['latest_price'], data['latest_volume'] = latest_row
-        
-        if is_tracing: log_detail(f"[{symbol}] 步骤3: 获取基准交易日数据。日期: {data['latest_date_str']}, 价格: {data['latest_price']}, 成交量: {data['latest_volume']}")
+    if is_tracing: log_detail(f"[{symbol}] 步骤2: 查询财报日收盘价。要求 {len(all_er_dates)} 条，实际查到 {len(price_data)} 条。")
 
-        # ========== 修改开始：同时获取日期和价格 ==========
-        # 将 SQL 中的 LIMIT 改为动态参数
-        cursor.execute(f'SELECT date, price FROM "{sector_name}" WHERE name = ? AND date < ? ORDER BY date DESC LIMIT {lookback_days}', (symbol, data['latest_date_str']))
-        prev_rows = cursor.fetchall()
-        
-        # 使用通用的键名 'prev_window_dates' 和 'prev_window_prices'，不再带数字
-        data['prev_window_dates'] = [r[0] for r in prev_rows]
-        data['prev_window_prices'] = [r[1] for r in prev_rows]
+    if len(price_data) != len(all_er_dates):
+        if is_tracing: log_detail(f"[{symbol}] 失败: 财报日收盘价数据不完整。")
+        return None
 
-        if is_tracing: 
-            log_detail(f"[{symbol}] 步骤3.1: 获取最近 {lookback_days} 个交易日数据。日期: {data['prev_window_dates']}, 价格: {data['prev_window_prices']}")
+    data['all_er_prices'] = [p[1] for p in price_data]
+    if is_tracing: log_detail(f"[{symbol}] - 财报日收盘价列表: {data['all_er_prices']}")
 
-        latest_er_date = data['latest_er_date_str']
-        latest_er_price = data['all_er_prices'][-1]
-        
-        cursor.execute(f'SELECT price FROM "{sector_name}" WHERE name = ? AND date > ? ORDER BY date ASC LIMIT 3', (symbol, latest_er_date))
-        next_days_rows = cursor.fetchall()
-        next_days_prices = [row[0] for row in next_days_rows]
+    # 步骤3: 获取基准交易日数据 (原代码逻辑保持不变，这部分是对的)
+    if target_date:
+        # 回测模式：强制查询指定日期(含)之前的最新一条数据
+        if is_tracing: log_detail(f"[{symbol}] !!! 回测模式启动 !!! 正在查找 {target_date} 或之前的最新数据...")
+    # 正常模式 target_date 为空：取库里最新的一条数据
+    latest_row = store.latest_on_or_before(sector_name, symbol, target_date or None)
 
-        er_window_prices = [latest_er_price]
-        er_window_prices.extend(next_days_prices)
-        data['er_window_high_price'] = max(er_window_prices) if er_window_prices else None
-        
-        if is_tracing: log_detail(f"[{symbol}] 步骤3.2: 查找财报窗口期最高价。窗口期价格: {er_window_prices}, 最高价: {data['er_window_high_price']}")
+    if not latest_row or latest_row[1] is None or latest_row[2] is None:
+        if is_tracing: log_detail(f"[{symbol}] 失败: 未能获取有效的交易日数据(可能该日期停牌或无数据)。")
+        return None
 
-        # ========== 【修改点 2/3】: "财报后至今最高价" 需增加回测日期上限 ==========
-        if target_date:
-            cursor.execute(f'SELECT MAX(price) FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?', (symbol, data['latest_er_date_str'], target_date))
-        else:
-            cursor.execute(f'SELECT MAX(price) FROM "{sector_name}" WHERE name = ? AND date >= ?', (symbol, data['latest_er_date_str']))
-        # ======================================================================
-        high_since_er_row = cursor.fetchone()
-        data['high_since_er'] = high_since_er_row[0] if high_since_er_row else None
+    # 这一步很关键：一旦这里锁定了 latest_date_str 为 2025-12-17
+    data['latest_date_str'], data['latest_price'], data['latest_volume'] = latest_row[:3]
 
-        if is_tracing: log_detail(f"[{symbol}] 步骤3.3: 获取自最新财报日({data['latest_er_date_str']})以来的最高价: {data['high_since_er']}")
+    if is_tracing: log_detail(f"[{symbol}] 步骤3: 获取基准交易日数据。日期: {data['latest_date_str']}, 价格: {data['latest_price']}, 成交量: {data['latest_volume']}")
 
-        cursor.execute(f'SELECT MAX(price) FROM "{sector_name}" WHERE name = ? AND date > ? AND date <= ?', (symbol, latest_er_date, data['latest_date_str']))
-        high_between_er_and_latest_row = cursor.fetchone()
-        data['high_between_er_and_latest'] = high_between_er_and_latest_row[0] if high_between_er_and_latest_row else None
-        
-        if is_tracing: log_detail(f"[{symbol}] 步骤3.4: 获取从财报日({latest_er_date})到最新日({data['latest_date_str']})之间的最高价: {data['high_between_er_and_latest']}")
+    # ========== 修改开始：同时获取日期和价格 ==========
+    # 最新交易日之前的 lookback_days 条，按日期倒序（与原 ORDER BY date DESC 一致）
+    prev_rows = store.last_n(sector_name, symbol, lookback_days, end=data['latest_date_str'], end_inclusive=False)[::-1]
 
-        # ========== 代码修改开始 2/3：新增逻辑以获取条件5所需的数据 ==========
-        # 为条件5获取财报日及之后5个交易日（共6天）的收盘价，并计算最低价
-        limit_days = CONFIG.get("COND5_WINDOW_DAYS", 6)
-        cursor.execute(f'SELECT price FROM "{sector_name}" WHERE name = ? AND date >= ? ORDER BY date ASC LIMIT {limit_days}', (symbol, data['latest_er_date_str']))
-        er_6_day_prices_rows = cursor.fetchall()
-        er_6_day_prices = [row[0] for row in er_6_day_prices_rows if row[0] is not None]
+    # 使用通用的键名 'prev_window_dates' 和 'prev_window_prices'，不再带数字
+    data['prev_window_dates'] = [r[0] for r in prev_rows]
+    data['prev_window_prices'] = [r[1] for r in prev_rows]
 
-        data['er_6_day_window_low'] = min(er_6_day_prices) if er_6_day_prices else None
-        if is_tracing:
-             log_detail(f"[{symbol}] 步骤3.5: 为条件5获取财报窗口期(6天)最低价。价格: {er_6_day_prices}, 最低价: {data['er_6_day_window_low']}")
+    if is_tracing: 
+        log_detail(f"[{symbol}] 步骤3.1: 获取最近 {lookback_days} 个交易日数据。日期: {data['prev_window_dates']}, 价格: {data['prev_window_prices']}")
 
-        # ========== 【修改点 3/3】: "条件6完整价格序列" 必须增加回测日期上限 ==========
-        if target_date:
-            cursor.execute(f'SELECT date, price FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ? ORDER BY date ASC', (symbol, data['latest_er_date_str'], target_date))
-        else:
-            cursor.execute(f'SELECT date, price FROM "{sector_name}" WHERE name = ? AND date >= ? ORDER BY date ASC', (symbol, data['latest_er_date_str']))
-        # ======================================================================
-        since_er_rows = cursor.fetchall()
-        
-        # 存储序列，用于条件6的形态分析
-        data['prices_since_er_series'] = [r[1] for r in since_er_rows if r[1] is not None]
-        data['dates_since_er_series'] = [r[0] for r in since_er_rows if r[0] is not None]
-        
-        if is_tracing:
-             log_detail(f"[{symbol}] 步骤3.6: 获取财报日至今的价格序列，共 {len(data['prices_since_er_series'])} 天。")
-        # ========== 代码修改结束 2/4 ==========
+    latest_er_date = data['latest_er_date_str']
+    latest_er_price = data['all_er_prices'][-1]
 
-        data['pe_ratio'], data['marketcap'] = None, None
-        if marketcap_exists:
-            try:
-                cursor.execute("SELECT pe_ratio, marketcap FROM MNSPP WHERE symbol = ?", (symbol,))
-                row = cursor.fetchone()
-                if row: data['pe_ratio'], data['marketcap'] = row
-                if is_tracing: log_detail(f"[{symbol}] 步骤4: 尝试从MNSPP获取PE和市值。查询结果: PE={data['pe_ratio']}, 市值={data['marketcap']}")
-            except sqlite3.OperationalError as e:
-                if "no such column: marketcap" in str(e):
-                    if i == 0: print("警告: MNSPP表中无 'marketcap' 列，将回退查询。")
-                    marketcap_exists = False
-                    cursor.execute("SELECT pe_ratio FROM MNSPP WHERE symbol = ?", (symbol,))
-                    row = cursor.fetchone()
-                    if row: data['pe_ratio'] = row[0]
-                    if is_tracing: log_detail(f"[{symbol}] 步骤4 (回退): 'marketcap'列不存在。查询PE。结果: PE={data['pe_ratio']}")
-                else: raise
-        else:
-            cursor.execute("SELECT pe_ratio FROM MNSPP WHERE symbol = ?", (symbol,))
-            row = cursor.fetchone()
-            if row: data['pe_ratio'] = row[0]
-            if is_tracing: log_detail(f"[{symbol}] 步骤4: 查询PE。结果: PE={data['pe_ratio']}")
-
-        tags = set(symbol_to_tags_map.get(symbol, []))
-        data['tags'] = tags
-        is_hot = len(tags & set(CONFIG.get("HOT_TAGS", set()))) > 0
-        is_big = (data['marketcap'] is not None) and (data['marketcap'] >= CONFIG["MARKETCAP_THRESHOLD"])
-        
-        data['is_hot_or_big_for_cond3'] = bool(is_hot or is_big)
-        data['last_N_high'] = None
-        data['cond3_drop_type'] = None
-        
-        if data['is_hot_or_big_for_cond3']:
-            lookback_days_cond3 = CONFIG.get("COND3_LOOKBACK_DAYS", 60)
-            last_N_high = get_high_price_last_n_days(cursor, sector_name, symbol, data['latest_date_str'], lookback_days_cond3)
-            data['last_N_high'] = last_N_high
-            
-            if last_N_high and last_N_high > 0:
-                drop_pct_vs_N_high = (last_N_high - data['latest_price']) / last_N_high
-                
-                # --- 修改为动态标签 ---
-                thresholds = sorted(CONFIG["COND3_DROP_THRESHOLDS"])
-                low_t = thresholds[0]
-                high_t = thresholds[1]
-                low_l = str(int(low_t * 100))   # "9"
-                high_l = str(int(high_t * 100)) # "15"
-                
-                c3_type = None
-                if drop_pct_vs_N_high >= high_t: c3_type = high_l
-                elif drop_pct_vs_N_high >= low_t: c3_type = low_l
-                data['cond3_drop_type'] = c3_type
+    next_days_rows = store.first_n(sector_name, symbol, 3, start=latest_er_date, start_inclusive=False)
+    next_days_prices = [row[1] for row in next_days_rows]
 
-        if is_tracing: log_detail(f"[{symbol}] 步骤5: 条件3缓存 -> is_hot={is_hot}, is_big={is_big}, last_N_high={data['last_N_high']}, cond3_drop_type={data['cond3_drop_type']}")
-        
-        data['is_valid'] = True
-        cache[symbol] = data
-        if is_tracing: log_detail(f"[{symbol}] 成功: 数据缓存构建完成，标记为有效。")
+    er_window_prices = [latest_er_price]
+    er_window_prices.extend(next_days_prices)
+    data['er_window_high_price'] = max(er_window_prices) if er_window_prices else None
 
-    conn.close()
-    return cache
+    if is_tracing: log_detail(f"[{symbol}] 步骤3.2: 查找财报窗口期最高价。窗口期价格: {er_window_prices}, 最高价: {data['er_window_high_price']}")
 
-def get_high_price_last_n_days(cursor, sector_name, symbol, latest_date_str, lookback_days):
-    from datetime import datetime, timedelta
-    try:
-        dt = datetime.strptime(latest_date_str, "%Y-%m-%d")
-    except ValueError:
-        try:
-            dt = datetime.strptime(latest_date_str, "%Y%m%d")
-            def to_str(d): return d.strftime("%Y%m%d")
-        except ValueError:
-            cursor.execute(f'SELECT price FROM "{sector_name}" WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT ?', (symbol, latest_date_str, lookback_days))
-            rows = cursor.fetchall()
-            prices = [r[0] for r in rows if r[0] is not None]
-            return max(prices) if prices else None
-    else:
-        def to_str(d): return d.strftime("%Y-%m-%d")
+    # ========== 【修改点 2/3】: "财报后至今最高价" 需增加回测日期上限 ==========
+    data['high_since_er'] = store.max_in_range(sector_name, symbol, start=data['latest_er_date_str'], end=target_date or None)
+    # ======================================================================
 
-    start_dt = dt - timedelta(days=lookback_days)
-    start_str = to_str(start_dt)
-    end_str = to_str(dt)
+    if is_tracing: log_detail(f"[{symbol}] 步骤3.3: 获取自最新财报日({data['latest_er_date_str']})以来的最高价: {data['high_since_er']}")
 
-    cursor.execute(f'SELECT MAX(price) FROM "{sector_name}" WHERE name = ? AND date BETWEEN ? AND ?', (symbol, start_str, end_str))
-    row = cursor.fetchone()
-    return row[0] if row and row[0] is not None else None
+    data['high_between_er_and_latest'] = store.max_in_range(
+        sector_name, symbol, start=latest_er_date, end=data['latest_date_str'], start_inclusive=False
+    )
+
+    if is_tracing: log_detail(f"[{symbol}] 步骤3.4: 获取从财报日({latest_er_date})到最新日({data['latest_date_str']})之间的最高价: {data['high_between_er_and_latest']}")
+
+    # ========== 代码修改开始 2/3：新增逻辑以获取条件5所需的数据 ==========
+    # 为条件5获取财报日及之后5个交易日（共6天）的收盘价，并计算最低价
+    limit_days = CONFIG.get("COND5_WINDOW_DAYS", 6)
+    er_6_day_prices_rows = store.first_n(sector_name, symbol, limit_days, start=data['latest_er_date_str'])
+    er_6_day_prices = [row[1] for row in er_6_day_prices_rows if row[1] is not None]
+
+    data['er_6_day_window_low'] = min(er_6_day_prices) if er_6_day_prices else None
+    if is_tracing:
+         log_detail(f"[{symbol}] 步骤3.5: 为条件5获取财报窗口期(6天)最低价。价格: {er_6_day_prices}, 最低价: {data['er_6_day_window_low']}")
+
+    # ========== 【修改点 3/3】: "条件6完整价格序列" 必须增加回测日期上限 ==========
+    since_er_rows = store.rows_between(sector_name, symbol, start=data['latest_er_date_str'], end=target_date or None)
+    # ======================================================================
+
+    # 存储序列，用于条件6的形态分析
+    data['prices_since_er_series'] = [r[1] for r in since_er_rows if r[1] is not None]
+    data['dates_since_er_series'] = [r[0] for r in since_er_rows if r[0] is not None]
+
+    if is_tracing:
+         log_detail(f"[{symbol}] 步骤3.6: 获取财报日至今的价格序列，共 {len(data['prices_since_er_series'])} 天。")
+    # ========== 代码修改结束 2/4 ==========
+
+    # MNSPP 整表一次读入；缺少 marketcap 列时对应值为 None
+    mnspp_row = mnspp_map.get(symbol)
+    data['pe_ratio'], data['marketcap'] = (mnspp_row['pe_ratio'], mnspp_row['marketcap']) if mnspp_row else (None, None)
+    if is_tracing: log_detail(f"[{symbol}] 步骤4: 尝试从MNSPP获取PE和市值。查询结果: PE={data['pe_ratio']}, 市值={data['marketcap']}")
+
+    tags = set(symbol_to_tags_map.get(symbol, []))
+    data['tags'] = tags
+    is_hot = len(tags & set(CONFIG.get("HOT_TAGS", set()))) > 0
+    is_big = (data['marketcap'] is not None) and (data['marketcap'] >= CONFIG["MARKETCAP_THRESHOLD"])
+
+    data['is_hot_or_big_for_cond3'] = bool(is_hot or is_big)
+    data['last_N_high'] = None
+    data['cond3_drop_type'] = None
+
+    if data['is_hot_or_big_for_cond3']:
+        lookback_days_cond3 = CONFIG.get("COND3_LOOKBACK_DAYS", 60)
+        last_N_high = get_high_price_last_n_days(store, sector_name, symbol, data['latest_date_str'], lookback_days_cond3)
+        data['last_N_high'] = last_N_high
+
+        if last_N_high and last_N_high > 0:
+            drop_pct_vs_N_high = (last_N_high - data['latest_price']) / last_N_high
+
+            # --- 修改为动态标签 ---
+            thresholds = sorted(CONFIG["COND3_DROP_THRESHOLDS"])
+            low_t = thresholds[0]
+            high_t = thresholds[1]
+            low_l = str(int(low_t * 100))   # "9"
+            high_l = str(int(high_t * 100)) # "15"
+
+            c3_type = None
+            if drop_pct_vs_N_high >= high_t: c3_type = high_l
+            elif drop_pct_vs_N_high >= low_t: c3_type = low_l
+            data['cond3_drop_type'] = c3_type
+
+    if is_tracing: log_detail(f"[{symbol}] 步骤5: 条件3缓存 -> is_hot={is_hot}, is_big={is_big}, last_N_high={data['last_N_high']}, cond3_drop_type={data['cond3_drop_type']}")
+
+    data['is_valid'] = True
+    if is_tracing: log_detail(f"[{symbol}] 成功: 数据缓存构建完成，标记为有效。")
+    return data
+
+
+def get_high_price_last_n_days(store, sector_name, symbol, latest_date_str, lookback_days):
+    """latest_date_str 往前 lookback_days 个自然日（含两端）内的最高价"""
+    latest_day = to_day(latest_date_str)
+    if latest_day is None:
+        # 日期格式无法解析时退回按交易日条数取最近 N 条
+        rows = store.last_n(sector_name, symbol, lookback_days, end=latest_date_str)
+        prices = [r[1] for r in rows if r[1] is not None]
+        return max(prices) if prices else None
+    return store.max_in_range(sector_name, symbol, start=latest_day - lookback_days, end=latest_day)
 
 # --- 5. 策略与过滤模块 ---
 def check_special_condition(data, config, log_detail, symbol_to_trace):
@@ -1545,7 +1534,7 @@ def run_processing_logic(log_detail):
     blacklist = load_blacklist(BLACKLIST_JSON_FILE)
 
     try:
-        with open(PANEL_JSON_FILE, 'r', encoding='utf-8') as f: panel_data = json.load(f)
+        panel_data = load_json(PANEL_JSON_FILE)
     except (FileNotFoundError, json.JSONDecodeError): panel_data = {}
 
     exist_Strategy34 = set(panel_data.get('Strategy34', {}).keys())
@@ -1654,7 +1643,15 @@ def run_processing_logic(log_detail):
         log_detail("="*60 + "\n")
         
         # 直接结束函数，后续所有的 update_json_panel 和 update_earning_history_json 都不会执行
-        return 
+        # 返回本该写入 History 的命中列表 (供 Backtest.py 回放比对)
+        return {
+            "PE_valid": sorted(set(raw_pe_valid)),
+            "PE_invalid": sorted(set(raw_pe_invalid)),
+            "PE_Deep": sorted(set(raw_pe_deep)),
+            "PE_Deeper": sorted(set(raw_pe_deeper)),
+            "PE_W": sorted(set(raw_pe_w)),
+            "OverSell_W": sorted(set(raw_oversell_w)),
+        }
 
     # ============================================================
     # 以下是正常的生产模式写入逻辑 (只有 TARGET_DATE 为空时才会执行)
@@ -1743,7 +1740,7 @@ def run_processing_logic(log_detail):
         log_detail("\n--- 无符合条件的 symbol 可写入 Earning_History.json ---")
 
 # --- 6. 主执行流程 ---
-def main():
+def run():
     if SYMBOL_TO_TRACE:
         print(f"追踪模式已启用，目标: {SYMBOL_TO_TRACE}。日志将仅在控制台输出。")
     else:
@@ -1757,5 +1754,10 @@ def main():
     
     print("\n程序运行结束。")
 
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        run()
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
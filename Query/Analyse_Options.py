@@ -4,12 +4,13 @@ import os
 import datetime
 import glob
 import subprocess
-import json
 import sqlite3
 import sys
 from datetime import timedelta
 from pandas.tseries.holiday import USFederalHolidayCalendar
 
+from Modules_Cache import load_json, use_context
+
 # ==========================================
 # 全局配置区域 (Configuration)
 # ==========================================
@@ -89,8 +90,8 @@ def load_symbol_sector_map(json_path):
         return {}
     
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # 经 Modules_Cache；流水线里读的是上下文中的版本（只读）
+        data = load_json(json_path, copy=False)
         
         symbol_map = {}
         for sector, symbols in data.items():
@@ -863,7 +864,7 @@ def show_alert(message):
     except Exception:
         pass
 
-if __name__ == "__main__":
+def run_options():
     file_new = None
     file_old = None
 
@@ -914,4 +915,14 @@ if __name__ == "__main__":
         else:
             print("\n⚠️ 未生成有效数据，跳过数据库计算步骤。")
     else:
-        print("\n程序终止: 未能获取有效的对比文件。")
\ No newline at end of file
+        print("\n程序终止: 未能获取有效的对比文件。")
+
+
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读磁盘"""
+    with use_context(ctx):
+        run_options()
+
+
+if __name__ == "__main__":
+    main()
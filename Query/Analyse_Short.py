@@ -7,6 +7,12 @@ from wcwidth import wcswidth
 from collections import defaultdict
 from datetime import datetime, timedelta
 
+from Rolling_Stats import read_stored_many, MA_PERIODS
+from Turnover_Rank import turnover_rank, get_panel, preload, is_top_n
+from Price_Store import get_global_store
+from Earning_History_Store import get_store as get_earning_history_store
+from Modules_Cache import load_json, save_json, use_context
+
 # ==========================================
 # 1. 配置文件和路径管理
 # ==========================================
@@ -91,41 +97,32 @@ WHITELIST_TAGS = []
 # ==========================================
 
 try:
-    with open(DESC_FILE, 'r', encoding='utf-8') as f:
-        desc_data = json.load(f)
+    desc_data = load_json(DESC_FILE)
     logger.info('Loaded DESC_FILE')
 except Exception as e:
     logger.error(f"Failed to load DESC_FILE: {e}")
     desc_data = {}
 
 try:
-    with open(SECTORS_FILE, 'r', encoding='utf-8') as f:
-        sectors_data = json.load(f)
+    sectors_data = load_json(SECTORS_FILE)
     logger.info(f'Loaded SECTORS_FILE with {len(sectors_data)} sectors')
 except Exception as e:
     logger.error(f"Failed to load SECTORS_FILE: {e}")
     sectors_data = {}
 
 try:
-    with open(PANEL_FILE, 'r', encoding='utf-8') as f:
-        panel_data = json.load(f)
+    panel_data = load_json(PANEL_FILE)
     logger.info('Loaded PANEL_FILE')
 except FileNotFoundError:
     panel_data = {}
     logger.warning("PANEL_FILE not found, initializing empty.")
-
-try:
-    with open(EARNING_HISTORY_FILE, 'r', encoding='utf-8') as f:
-        earning_history_data = json.load(f)
-    logger.info('Loaded EARNING_HISTORY_FILE for global lookup')
-except (FileNotFoundError, json.JSONDecodeError):
-    earning_history_data = {}
-    logger.warning("EARNING_HISTORY_FILE not found or empty, creating empty lookup dict.")
+except json.JSONDecodeError:
+    panel_data = {}
+    logger.warning("PANEL_FILE is not valid JSON, initializing empty.")
 
 # [新增] 加载 HOT_TAGS_T
 try:
-    with open(TAGS_SETTING_JSON_FILE, 'r', encoding='utf-8') as f:
-        tags_settings = json.load(f)
+    tags_settings = load_json(TAGS_SETTING_JSON_FILE)
     hot_tags_t = set(tags_settings.get('HOT_TAGS_T', []))
     logger.info('Loaded HOT_TAGS_T')
 except Exception as e:
@@ -149,36 +146,31 @@ def clean_symbol(symbol_with_suffix):
     
     return symbol_with_suffix
 
-def check_ma_breakout(cursor, sector, symbol, ma_period=200, target_date=None):
+def check_ma_breakout(store, sector, symbol, ma_period=200, target_date=None, stored=None):
     """
     检查当前收盘价是否处于 MA200 下方（兼容多日回溯 & 回测日期限制）。
+    stored 为 Rolling_Stats.read_stored_many 里该 symbol 的一项（没有或已过期时为 None，回退到 PriceStore）。
     """
     try:
-        limit_rows = ma_period + 10
-        # [回测] 限制查询日期上界
-        if target_date:
-            cursor.execute(f"""
-                SELECT price FROM "{sector}"
-                WHERE name = ? AND date <= ?
-                ORDER BY date DESC
-                LIMIT ?
-            """, (symbol, target_date, limit_rows))
+        # 写库时预计算的 ma{N} 列；统计截止日不晚于 target_date 时结果与下面的回退分支相同
+        ma_col = f"ma{ma_period}"
+        if stored is not None and stored.get(ma_col) is not None and stored["last_price"] is not None \
+                and (not target_date or stored["last_date"] <= target_date):
+            if stored["ma_count"] < ma_period + 1:
+                return False, 0
+            ma_today = stored[ma_col]
+            price_today = stored["last_price"]
         else:
-            cursor.execute(f"""
-                SELECT price FROM "{sector}"
-                WHERE name = ?
-                ORDER BY date DESC
-                LIMIT ?
-            """, (symbol, limit_rows))
+            limit_rows = ma_period + 10
+            # [回测] 限制查询日期上界；last_n 返回的已是日期升序
+            rows = store.last_n(sector, symbol, limit_rows, end=target_date or None)
+            if len(rows) < ma_period + 1:
+                return False, 0
 
-        rows = cursor.fetchall()
-        if len(rows) < ma_period + 1:
-            return False, 0
+            prices = [float(r[1]) for r in rows]
 
-        prices = [float(r[0]) for r in rows][::-1]
-
-        ma_today = sum(prices[-ma_period:]) / ma_period
-        price_today = prices[-1]
+            ma_today = sum(prices[-ma_period:]) / ma_period
+            price_today = prices[-1]
 
         tolerance = CONFIG.get("BREAKOUT_TOLERANCE", 0)
         lower_bound = ma_today * (1 - tolerance)
@@ -193,37 +185,22 @@ def check_ma_breakout(cursor, sector, symbol, ma_period=200, target_date=None):
         return False, 0
 
 
-def check_price_above_recent_two_earnings_avg(cursor, sector, symbol, latest_price, target_date=None):
+def check_price_above_recent_two_earnings_avg(store, sector, symbol, latest_price, target_date=None):
     """
     检查最新收盘价是否高于最近两次财报日收盘价的平均值。
     """
     try:
         # 获取最近两次财报日
-        if target_date:
-            cursor.execute(
-                'SELECT date FROM Earning WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 2',
-                (symbol, target_date)
-            )
-        else:
-            cursor.execute(
-                'SELECT date FROM Earning WHERE name = ? ORDER BY date DESC LIMIT 2',
-                (symbol,)
-            )
-        rows = cursor.fetchall()
+        rows = [r for r in store.load_earnings().get(symbol, []) if not target_date or r[0] <= target_date]
         
         # 如果财报数据不足两次，默认不通过（可根据需求调整为 True）
         if len(rows) < 2:
             return False, 0.0
             
-        date1, date2 = rows[0][0], rows[1][0]
+        date1, date2 = rows[-1][0], rows[-2][0]
         
         # 获取这两天在对应板块表里的收盘价
-        prices = []
-        for d in (date1, date2):
-            cursor.execute(f'SELECT price FROM "{sector}" WHERE name = ? AND date = ?', (symbol, d))
-            p_row = cursor.fetchone()
-            if p_row and p_row[0] is not None:
-                prices.append(float(p_row[0]))
+        prices = [float(p) for _, p in store.prices_on_dates(sector, symbol, [date1, date2]) if p is not None]
                 
         if len(prices) < 2:
             return False, 0.0
@@ -253,26 +230,10 @@ def update_earning_history_json_b(file_path, group_name, symbols_to_add, base_da
     logger.info(f"--- 更新历史记录文件: {os.path.basename(file_path)} -> '{group_name}' ---")
 
     try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = {}
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
-
-    if group_name not in data:
-        data[group_name] = {}
-
-    existing_symbols = data[group_name].get(record_date_str, [])
-    combined_symbols = sorted(list(set(existing_symbols) | set(symbols_to_add)))
-    data[group_name][record_date_str] = combined_symbols
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        logger.info(f"成功更新历史记录 '{group_name}'。日期: {record_date_str}, 总计 {len(combined_symbols)} 个。")
-    except Exception as e:
+        history = get_earning_history_store(DB_FILE, file_path)
+        _, total = history.add(group_name, record_date_str, symbols_to_add)
+        logger.info(f"成功更新历史记录 '{group_name}'。日期: {record_date_str}, 总计 {total} 个。")
+    except (sqlite3.Error, ValueError) as e:
         logger.error(f"错误: 写入历史记录文件失败: {e}")
 
 
@@ -315,40 +276,17 @@ def check_turnover_rank(cursor, sector_name, symbol, latest_date_str, latest_tur
     """
     检查 latest_turnover 是否是过去 lookback_months 个月内的前 rank_threshold 名。
     （latest_date_str 本身已被上层函数通过 target_date 限制，此处无需额外处理）
+    run_short_logic 在循环前已用 preload 按表载入全部候选，这里只在 cursor 上的 TurnoverPanel 里切片。
     """
-    try:
-        dt = datetime.strptime(latest_date_str, "%Y-%m-%d")
-        start_date = dt - timedelta(days=lookback_months * 30)
-        start_date_str = start_date.strftime("%Y-%m-%d")
-    except Exception:
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, lookback_months * 30,
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
+    if not res or res.count == 0:
         return False
 
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, start_date_str, latest_date_str))
-    rows = cursor.fetchall()
+    return is_top_n(res.top, latest_turnover, rank_threshold)
 
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
 
-    if not valid_data:
-        return False
-
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-
-    if latest_turnover in top_n_turnovers:
-        return True
-    elif len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]:
-        return True
-
-    return False
-
-
-def check_double_top(cursor, symbol, sector, target_date=None):
+def check_double_top(store, symbol, sector, target_date=None):
     """
     检查是否形成 M 形态（双峰）。[回测] 新增 target_date 参数限制查询上界。
     """
@@ -357,30 +295,12 @@ def check_double_top(cursor, symbol, sector, target_date=None):
         min_depth = CONFIG.get("M_TOP_NECK_DEPTH", 0.025)
         min_days_gap = CONFIG.get("M_TOP_MIN_DAYS_GAP", 3)
 
-        # [回测] 限制查询日期上界，同时修复原代码中 sector 缺少引号的问题
-        if target_date:
-            cursor.execute(f"""
-                SELECT date, price
-                FROM "{sector}"
-                WHERE name = ? AND date <= ?
-                ORDER BY date DESC
-                LIMIT 60
-            """, (symbol, target_date))
-        else:
-            cursor.execute(f"""
-                SELECT date, price
-                FROM "{sector}"
-                WHERE name = ?
-                ORDER BY date DESC
-                LIMIT 60
-            """, (symbol,))
-
-        rows = cursor.fetchall()
+        # [回测] 限制查询日期上界；last_n 返回的已是日期升序
+        rows = store.last_n(sector, symbol, 60, end=target_date or None)
 
         if len(rows) < 15:
             return False
 
-        rows = rows[::-1]  # 转正序
         prices = [float(r[1]) for r in rows]
 
         curr_price = prices[-1]
@@ -434,25 +354,15 @@ def check_double_top(cursor, symbol, sector, target_date=None):
         return False
 
 
-def get_latest_earnings_date(cursor, symbol, target_date=None):
+def get_latest_earnings_date(store, symbol, target_date=None):
     """
-    从数据库的 Earning 表中获取该 symbol 的最近财报日。
+    从 Earning 表（PriceStore 里整表加载的财报日）中获取该 symbol 的最近财报日。
     [回测] 新增 target_date 参数，防止查到"未来"财报。
     """
     try:
-        if target_date:
-            cursor.execute(
-                'SELECT date FROM Earning WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT 1',
-                (symbol, target_date)
-            )
-        else:
-            cursor.execute(
-                'SELECT date FROM Earning WHERE name = ? ORDER BY date DESC LIMIT 1',
-                (symbol,)
-            )
-        row = cursor.fetchone()
-        if row and row[0]:
-            return row[0]
+        dates = [d for d, _ in store.load_earnings().get(symbol, []) if not target_date or d <= target_date]
+        if dates and dates[-1]:
+            return dates[-1]
     except Exception as e:
         logger.error(f"[{symbol}] Error querying latest earnings date: {e}")
 
@@ -485,8 +395,10 @@ def run_short_logic(log_detail):
     panel_data['Short_W_backup'] = {}
     short_w_backup_group = panel_data['Short_W_backup']
 
+    # 成交额排名与 Rolling_Stats 仍走 SQL；其余行情 / 财报数据全部来自共享的 PriceStore
     conn = sqlite3.connect(DB_FILE, timeout=60.0)
     cursor = conn.cursor()
+    store = get_global_store(DB_FILE)
     sector_outputs = defaultdict(list)
     final_short_symbols = []
     final_short_w_symbols = []
@@ -504,6 +416,14 @@ def run_short_logic(log_detail):
             logger.warning(f"Sector '{sec_name}' not found in SECTORS_FILE.")
 
     symbols = list(set(symbols))
+    store.load_tables([sec_name for sec_name in TARGET_SECTORS if sec_name in sectors_data])
+    # 每张表一次读取预计算的 MA（一条 GROUP BY 核对新鲜度），周期不在 MA_PERIODS 里时全部回退到 PriceStore
+    ma_col = f"ma{CONFIG['MA_PERIOD']}"
+    stored_ma = {sec_name: read_stored_many(cursor, sec_name, (ma_col,)) if CONFIG["MA_PERIOD"] in MA_PERIODS else {}
+                 for sec_name in TARGET_SECTORS if sec_name in sectors_data}
+    # 成交额排名：全部候选每张表一次读库，下面逐日的 check_turnover_rank 只在内存里切片
+    rank_pairs = [(sec, s) for sec, s in ((get_symbol_sector(s), s) for s in symbols) if sec != "Unknown"]
+    preload(cursor, rank_pairs, base_date, CONFIG["LOOKBACK_MONTHS_LONG"] * 30)
     log_detail(f"开始扫描 {len(symbols)} 个 symbols（基准日期: {base_date}）...")
 
     for symbol in symbols:
@@ -532,21 +452,20 @@ def run_short_logic(log_detail):
 
             # --- [新增] A1. 财报日当天过滤 ---
             # 提前获取最新财报日，如果正好是基准日（今天），则直接跳过
-            latest_earning_date = get_latest_earnings_date(cursor, symbol, target_date=base_date)
+            latest_earning_date = get_latest_earnings_date(store, symbol, target_date=base_date)
             if latest_earning_date == base_date:
                 if is_tracing:
                     log_detail(f"    x [过滤] {symbol} 的最新财报日正好是当前基准日 ({base_date})，跳过。")
                 continue
 
             # --- A2. [已取消门槛] 仅计算 MA 值用于输出显示，不再作为过滤条件 ---
-            _, ma_value = check_ma_breakout(cursor, sector, symbol, CONFIG["MA_PERIOD"], target_date=base_date)
+            _, ma_value = check_ma_breakout(store, sector, symbol, CONFIG["MA_PERIOD"], target_date=base_date,
+                                            stored=stored_ma.get(sector, {}).get(symbol))
 
             # --- B. 获取最近 N+1 天交易数据 ---
             _lookback = CONFIG["RECENT_DAYS_LOOKBACK"]
-            query = (f'SELECT date, price, volume FROM "{sector}" '
-                     f'WHERE name = ? AND date <= ? ORDER BY date DESC LIMIT {_lookback + 1}')
-            cursor.execute(query, (symbol, base_date))
-            rows = cursor.fetchall()
+            # 按日期倒序的 (date, price, volume)，与原 ORDER BY date DESC 一致
+            rows = [r[:3] for r in store.last_n(sector, symbol, _lookback + 1, end=base_date)][::-1]
 
             if len(rows) < 2:
                 if is_tracing:
@@ -633,10 +552,9 @@ def run_short_logic(log_detail):
                 # 注意：latest_earning_date 已经在前面的 A1 步骤获取过了，这里直接复用即可
                 if latest_earning_date:
                     # 从对应板块表获取财报日当天的收盘价
-                    cursor.execute(f'SELECT price FROM "{sector}" WHERE name = ? AND date = ?', (symbol, latest_earning_date))
-                    e_row = cursor.fetchone()
-                    if e_row and e_row[0] is not None:
-                        earning_price = float(e_row[0])
+                    e_price = dict(store.prices_on_dates(sector, symbol, [latest_earning_date])).get(latest_earning_date)
+                    if e_price is not None:
+                        earning_price = float(e_price)
                         # 判断：财报日价格为正，且当前最新收盘价 > 财报日收盘价
                         if earning_price > 0 and price_curr > earning_price:
                             is_earning_bottom_fishing = True
@@ -649,7 +567,7 @@ def run_short_logic(log_detail):
                 note_val = f"{symbol}抄底" if is_bottom_fishing else ""
                 history_val = f"{symbol}抄底" if is_bottom_fishing else symbol
                 
-                is_double_top = check_double_top(cursor, symbol, sector, target_date=base_date)
+                is_double_top = check_double_top(store, symbol, sector, target_date=base_date)
                 if is_tracing:
                     log_detail(f"    - M头检查: {is_double_top}")
 
@@ -696,7 +614,8 @@ def run_short_logic(log_detail):
         log_detail(f"📊 [Short_W] 命中 {len(final_short_w_symbols)} 个: {sorted(final_short_w_symbols)}")
         log_detail("=" * 60)
         log_detail("本次运行未写入任何文件。")
-        return
+        # 返回本该写入 History 的命中列表 (供 Backtest.py 回放比对)
+        return {"Short": sorted(set(final_short_symbols)), "Short_W": sorted(set(final_short_w_symbols))}
 
     # ======== 正常模式：输出结果到控制台、写入 History、Panel ========
     log_detail("OverBuy Scan Result (Down + High Turnover)")
@@ -713,9 +632,8 @@ def run_short_logic(log_detail):
     if final_short_w_symbols:
         update_earning_history_json_b(EARNING_HISTORY_FILE, "Short_W", final_short_w_symbols, base_date_str=base_date)
 
-    with open(PANEL_FILE, 'w', encoding='utf-8') as f:
-        json.dump(panel_data, f, ensure_ascii=False, indent=4)
-        logger.info(f'Updated panel file {PANEL_FILE}')
+    save_json(PANEL_FILE, panel_data, ensure_ascii=False, indent=4)
+    logger.info(f'Updated panel file {PANEL_FILE}')
 
     log_detail("程序运行结束。")
 
@@ -723,7 +641,7 @@ def run_short_logic(log_detail):
 # 8. 入口函数
 # ==========================================
 
-def main():
+def run():
     if SYMBOL_TO_TRACE:
         print(f"追踪模式已启用，目标: {SYMBOL_TO_TRACE}。日志将写入: {LOG_FILE_PATH}")
         try:
@@ -741,5 +659,11 @@ def main():
         run_short_logic(log_detail_console)
 
 
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        run()
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
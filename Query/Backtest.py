@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backtest.py
+按日期区间批量回放各扫描策略（point-in-time）
+
+原来回测要手动改每个 Analyse_* 脚本里的 TARGET_DATE 再整脚本运行一次。
+这里把各脚本已有的回测模式（TARGET_DATE 非空时只算不写）当作 as-of 视图来驱动：
+    - 每个 worker 进程只 import 一次策略模块，进程内的全局缓存
+      （Price_Store 的列式价格数据、Turnover_Rank 的成交额面板等）在多个日期之间复用；
+    - 日期分发到 ProcessPoolExecutor 并行执行；
+    - 各脚本回测分支返回 {分组: [symbols]}，汇总成与 Earning_History.json 相同的
+      {分组: {日期: [symbols]}} 结构写出，可以直接与 History 做 diff。
+
+策略:
+    no_season  -> Analyse_Earning_no_Season   (check_new_condition_* 等, PE_valid/PE_Deep/...)
+    season     -> Analyse_Earning_Season      (run_strategy_*, season)
+    pe_volume  -> Analyse_Earning_Volume      (pe_volume 等, PE_Volume/PE_Volume_up/...)
+    short      -> Analyse_Short               (run_short_logic, Short/Short_W)
+
+注意: season 依赖 News 目录下"当天"的财报日历文本，不是 point-in-time 数据，
+回放较早的日期时结果只能作参考。
+
+用法:
+    python Backtest.py no_season --start 2025-01-01 --end 2025-12-31 --workers 6
+    python Backtest.py short pe_volume --start 2025-06-01 --diff
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import sqlite3
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Finance.db")
+EARNING_HISTORY_JSON = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Earning_History.json")
+DEFAULT_OUTPUT = os.path.join(USER_HOME, "Downloads", "Backtest_History.json")
+
+# 交易日历取自 ETFs 表（每个交易日都有数据）
+CALENDAR_TABLE = "ETFs"
+
+STRATEGIES = {
+    "no_season": ("Analyse_Earning_no_Season", "run_processing_logic"),
+    "season":    ("Analyse_Earning_Season",    "run_processing_logic"),
+    "pe_volume": ("Analyse_Earning_Volume",    "run_pe_volume_logic"),
+    "short":     ("Analyse_Short",             "run_short_logic"),
+}
+
+# ---------- worker 进程 ----------
+
+_MODULES = {}
+
+def _get_module(strategy, db_path):
+    mod = _MODULES.get(strategy)
+    if mod is None:
+        mod = importlib.import_module(STRATEGIES[strategy][0])
+        # 回放时关闭单只追踪
+        mod.SYMBOL_TO_TRACE = ""
+        mod.DB_FILE = db_path
+        # 已经按日期并行，worker 内部不再按板块分片开进程池
+        if "CACHE_WORKERS" in getattr(mod, "CONFIG", {}):
+            mod.CONFIG["CACHE_WORKERS"] = 1
+        _MODULES[strategy] = mod
+    return mod
+
+def _run_one(task):
+    """task: (strategy, date_str, db_path, log_dir)；返回 (strategy, date_str, hits, 秒数, 错误)"""
+    strategy, date_str, db_path, log_dir = task
+    t0 = time.perf_counter()
+    lines = []
+    log_detail = lines.append if log_dir else (lambda message: None)
+    try:
+        mod = _get_module(strategy, db_path)
+        mod.TARGET_DATE = date_str
+        hits = getattr(mod, STRATEGIES[strategy][1])(log_detail) or {}
+        error = None
+    except Exception as e:
+        hits, error = {}, f"{type(e).__name__}: {e}"
+    if log_dir:
+        with open(os.path.join(log_dir, f"{strategy}_{date_str}.txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(str(x) for x in lines))
+    return strategy, date_str, hits, time.perf_counter() - t0, error
+
+# ---------- 主进程 ----------
+
+def load_trading_dates(db_path, start, end):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            f'SELECT DISTINCT date FROM "{CALENDAR_TABLE}" WHERE date >= ? AND date <= ? ORDER BY date',
+            (start, end)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows]
+
+def run_backtest(strategies, dates, db_path=DB_PATH, workers=None, log_dir=None):
+    """返回 {分组: {日期: [symbols]}}，与 Earning_History.json 结构相同"""
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    # 同一策略的日期连续分到同一批，充分利用 worker 内的缓存
+    tasks = [(s, d, db_path, log_dir) for s in strategies for d in dates]
+    result = {}
+    failed = []
+    total = len(tasks)
+    chunksize = max(1, total // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, (strategy, date_str, hits, cost, error) in enumerate(
+                pool.map(_run_one, tasks, chunksize=chunksize), 1):
+            if error:
+                failed.append((strategy, date_str, error))
+                print(f"[{i}/{total}] ❌ {strategy} {date_str}: {error}")
+                continue
+            n = 0
+            for group, symbols in hits.items():
+                if symbols:
+                    result.setdefault(group, {})[date_str] = list(symbols)
+                    n += len(symbols)
+            print(f"[{i}/{total}] {strategy} {date_str}: {n} 个命中 ({cost:.1f}s)")
+    if failed:
+        print(f"\n⚠️ {len(failed)} 个日期回放失败")
+    return result
+
+def align_history_date(history_date, trading_dates):
+    """History 以运行日的前一天记日期（可能是周末），对齐到不晚于它的最近交易日"""
+    i = bisect.bisect_right(trading_dates, history_date)
+    return trading_dates[i - 1] if i else None
+
+def diff_with_history(backtest, history_path, trading_dates):
+    try:
+        with open(history_path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"无法读取 History: {e}")
+        return
+    date_set = set(trading_dates)
+    for group in sorted(backtest):
+        hist_group = {}
+        for h_date, syms in history.get(group, {}).items():
+            d = align_history_date(h_date, trading_dates)
+            if d in date_set:
+                hist_group.setdefault(d, set()).update(syms)
+        same = total = 0
+        print(f"\n===== {group} =====")
+        for d in trading_dates:
+            bt = set(backtest[group].get(d, []))
+            hs = hist_group.get(d, set())
+            if not bt and not hs:
+                continue
+            total += 1
+            if bt == hs:
+                same += 1
+                continue
+            only_bt, only_hs = sorted(bt - hs), sorted(hs - bt)
+            print(f"  {d}: 仅回测 {only_bt}  仅History {only_hs}")
+        print(f"  一致 {same}/{total} 天")
+
+def main():
+    parser = argparse.ArgumentParser(description="策略回放 (point-in-time backtest)")
+    parser.add_argument('strategies', nargs='+', choices=sorted(STRATEGIES), help="要回放的策略")
+    parser.add_argument('--start', required=True, help="起始日期 YYYY-MM-DD")
+    parser.add_argument('--end', default="9999-12-31", help="结束日期 YYYY-MM-DD (默认到库里最新)")
+    parser.add_argument('--workers', type=int, default=None, help="并行进程数 (默认 CPU 数)")
+    parser.add_argument('--db', default=DB_PATH, help="数据库路径")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="结果 JSON 路径")
+    parser.add_argument('--log-dir', default=None, help="每个日期的 trace log 输出目录 (默认不输出)")
+    parser.add_argument('--diff', action='store_true', help="与 Earning_History.json 比对")
+    parser.add_argument('--history', default=EARNING_HISTORY_JSON, help="History 路径")
+    args = parser.parse_args()
+
+    dates = load_trading_dates(args.db, args.start, args.end)
+    if not dates:
+        print("区间内没有交易日。")
+        sys.exit(1)
+    print(f"回放 {', '.join(args.strategies)}: {dates[0]} ~ {dates[-1]} 共 {len(dates)} 个交易日")
+
+    t0 = time.perf_counter()
+    result = run_backtest(args.strategies, dates, args.db, args.workers, args.log_dir)
+    print(f"\n总用时 {time.perf_counter() - t0:.1f}s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=4, ensure_ascii=False, sort_keys=True)
+    print(f"结果已写入: {args.output}")
+
+    if args.diff:
+        diff_with_history(result, args.history, dates)
+
+
+if __name__ == "__main__":
+    main()
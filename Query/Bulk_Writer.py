@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk_Writer.py
+行情批量写库：WAL + TEMP 暂存表 + 每张表一条 INSERT ... SELECT ... ON CONFLICT，一个事务提交
+
+原来 Tiger_Today / YF_Today / YF_StockETFCrypto 的 insert_data_to_db、
+Check_yesterday.Insert_DB、Insert_Currencies_Index、Filter.insert_screener_records
+各自 connect -> CREATE TABLE IF NOT EXISTS -> executemany / 逐行 INSERT -> commit，
+夜间入库时一晚上几百次写事务，默认的 rollback journal 下每次提交都要独占整个库，
+同时开着的 GUI（Stock_Chart、Check_HighLow 等）读库就会碰到 database is locked。
+
+这里统一改为：
+    - 连接时把库切到 WAL（持久化在库文件上，之后所有连接都是"读不阻塞写、写不阻塞读"），
+      synchronous=NORMAL（WAL 下只在 checkpoint 时 fsync，断电最多丢最后一个事务，库不会损坏）；
+    - add() 只往 TEMP 暂存表里 executemany，不碰主库，抓取期间不持有任何主库锁；
+    - commit() 开一个 BEGIN IMMEDIATE，每张目标表一条 INSERT ... SELECT ... ON CONFLICT(date, name)，
+      每张表一个 SAVEPOINT：某张表失败只回滚这张表（与原来每个 sector 单独提交的语义一致），
+      其余表照常提交；同一 (date, name) 暂存了多次时以最后一次为准；
+    - 返回 / 打印写入行数与 行/秒。
+
+用法:
+    from Bulk_Writer import BulkWriter
+    with BulkWriter(DB_PATH) as writer:
+        writer.add("Technology", rows)                               # rows: (date, name, price, volume, open, high, low)
+        writer.add("Currencies", rows3, columns=("date", "name", "price"), on_conflict="ignore")
+        stats = writer.commit()                                      # {'rows', 'changed', 'failed', 'seconds', ...}
+同一个 writer 可以反复 add / commit（每次 commit 后暂存表清空），一次运行只需建一个连接。
+"""
+
+import time
+import sqlite3
+
+STAGE_COLUMNS = ("date", "name", "price", "volume", "open", "high", "low")
+KEY_COLUMNS = ("date", "name")
+CONFLICT_MODES = ("update", "ignore")
+
+
+def enable_wal(conn):
+    """
+    把库切到 WAL 并设置 synchronous=NORMAL；返回切换后的 journal_mode。
+    别的连接正在写库时切换会失败，此时保持原模式（下次运行再切），不影响写入。
+    """
+    try:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    except sqlite3.OperationalError as e:
+        print(f"[Bulk_Writer] 切换 WAL 失败，沿用原 journal 模式: {e}")
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return mode
+
+
+class BulkWriter:
+    def __init__(self, db_path, timeout=60.0, log=print, check_same_thread=True):
+        """
+        check_same_thread=False：在主线程创建、交给另一个线程（例如 YF_History_Pool 的写库线程）使用，
+        调用方保证同一时刻只有一个线程在用。
+        """
+        self.db_path = db_path
+        self.log = log
+        self.conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread)
+        self.journal_mode = enable_wal(self.conn)
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        cols = ", ".join(STAGE_COLUMNS)
+        self.conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS _bulk_stage (seq INTEGER PRIMARY KEY, tbl TEXT, {cols})"
+        )
+        self.conn.commit()
+        self._specs = {}      # table -> (columns, on_conflict, prepare, after_merge)
+        self._counts = {}     # table -> 暂存行数
+
+    # ---------- 暂存 ----------
+
+    def add(self, table, rows, columns=STAGE_COLUMNS, on_conflict="update",
+            prepare=None, after_merge=None):
+        """
+        暂存一批行（元组按 columns 的顺序，多出来的尾部字段忽略）。
+        on_conflict: "update" 冲突时用新值覆盖非键列；"ignore" 已存在的 (date, name) 不动。
+        prepare(cursor, table): 合并前调用，一般是 CREATE TABLE IF NOT EXISTS + 建索引；
+        after_merge(cursor, table, rows): 合并后在同一事务里调用（例如 Rolling_Stats.apply_rows），
+        rows 为该表本次暂存的全部行（按 columns 顺序），失败只打印警告。
+        同一张表多次 add 时参数必须一致。
+        """
+        columns = tuple(columns)
+        if on_conflict not in CONFLICT_MODES:
+            raise ValueError(f"未知 on_conflict: {on_conflict}")
+        if not set(KEY_COLUMNS) <= set(columns) or not set(columns) <= set(STAGE_COLUMNS):
+            raise ValueError(f"columns 必须包含 date、name 且属于 {STAGE_COLUMNS}: {columns}")
+        spec = (columns, on_conflict, prepare, after_merge)
+        old = self._specs.get(table)
+        if old is not None and old[:2] != spec[:2]:
+            raise ValueError(f"表 {table} 的 columns / on_conflict 与之前 add 的不一致")
+        self._specs[table] = spec
+
+        n = len(columns)
+        placeholders = ", ".join("?" * (n + 1))
+        cur = self.conn.executemany(
+            f"INSERT INTO temp._bulk_stage (tbl, {', '.join(columns)}) VALUES ({placeholders})",
+            ((table,) + tuple(r[:n]) for r in rows)
+        )
+        added = max(cur.rowcount, 0)
+        self.conn.commit()   # 只提交 temp 库，不碰主库
+        self._counts[table] = self._counts.get(table, 0) + added
+        return added
+
+    def pending(self):
+        """已暂存、尚未合并的行数"""
+        return sum(self._counts.values())
+
+    # ---------- 合并 ----------
+
+    def _merge_sql(self, table, columns, on_conflict):
+        cols = ", ".join(columns)
+        safe_table = f'"{table}"'
+        if on_conflict == "ignore":
+            action = "DO NOTHING"
+        else:
+            updates = [f"{c} = excluded.{c}" for c in columns if c not in KEY_COLUMNS]
+            action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        # WHERE 不能省：INSERT ... SELECT 后直接跟 ON CONFLICT 会被解析成 JOIN 的 ON
+        return (f"INSERT INTO {safe_table} ({cols}) "
+                f"SELECT {cols} FROM temp._bulk_stage WHERE tbl = ? ORDER BY seq "
+                f"ON CONFLICT(date, name) {action}")
+
+    def commit(self):
+        """
+        一个事务把暂存的行合并进各自的表。
+        返回 {'rows': 暂存行数, 'changed': 实际插入 / 更新的行数, 'tables': {表: 变更行数},
+              'failed': {表: 错误信息}, 'seconds': 用时}
+        """
+        t0 = time.perf_counter()
+        stats = {'rows': self.pending(), 'changed': 0, 'tables': {}, 'failed': {}, 'seconds': 0.0}
+        if not self._specs:
+            return stats
+
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for table, (columns, on_conflict, prepare, after_merge) in self._specs.items():
+                cursor.execute("SAVEPOINT bulk_table")
+                try:
+                    if prepare is not None:
+                        prepare(cursor, table)
+                    before = self.conn.total_changes
+                    cursor.execute(self._merge_sql(table, columns, on_conflict), (table,))
+                    changed = self.conn.total_changes - before
+                    if after_merge is not None:
+                        rows = cursor.execute(
+                            f"SELECT {', '.join(columns)} FROM temp._bulk_stage WHERE tbl = ? ORDER BY seq",
+                            (table,)
+                        ).fetchall()
+                        try:
+                            after_merge(cursor, table, rows)
+                        except Exception as e:
+                            self.log(f"⚠️ [{table}] 合并后处理失败（行情已写入）: {e}")
+                    cursor.execute("RELEASE SAVEPOINT bulk_table")
+                    stats['tables'][table] = changed
+                    stats['changed'] += changed
+                except sqlite3.Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT bulk_table")
+                    cursor.execute("RELEASE SAVEPOINT bulk_table")
+                    stats['failed'][table] = str(e)
+                    self.log(f"❌ 数据库写入失败 ({table}): {e}")
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.execute("DELETE FROM temp._bulk_stage")
+            self.conn.commit()
+            self._specs.clear()
+            self._counts.clear()
+
+        stats['seconds'] = time.perf_counter() - t0
+        return stats
+
+    @staticmethod
+    def describe(stats):
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        text = (f"批量写入 {stats['rows']} 行 -> {len(stats['tables'])} 张表"
+                f"（变更 {stats['changed']} 行），用时 {stats['seconds']:.3f}s，{rate:.0f} 行/秒")
+        if stats['failed']:
+            text += f"，失败 {len(stats['failed'])} 张表: {', '.join(stats['failed'])}"
+        return text
+
+    # ---------- 生命周期 ----------
+
+    def close(self):
+        if self.conn is not None:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def bench(n=50000, tables=10, db_path=None):
+    """对比逐表 executemany + commit 与 BulkWriter 的写入速度（临时库）"""
+    import os
+    import tempfile
+
+    def make_rows(k, version):
+        return [(f"2026-{1 + (i % 250) // 28:02d}-{1 + (i % 250) % 28:02d}", f"SYM{k}_{i // 250}",
+                 10.0 + version + i * 0.01,
+                 1000 + i, 9.0, 11.0, 8.0) for i in range(n // tables)]
+
+    def create(cursor, table):
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS "{table}" (
+            date TEXT, name TEXT, price REAL, volume INTEGER,
+            open REAL, high REAL, low REAL, UNIQUE(date, name))''')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode in ("legacy", "bulk"):
+            path = db_path or os.path.join(tmp, f"{mode}.db")
+            t0 = time.perf_counter()
+            if mode == "legacy":
+                for k in range(tables):
+                    conn = sqlite3.connect(path, timeout=60.0)
+                    cur = conn.cursor()
+                    create(cur, f"T{k}")
+                    cur.executemany(
+                        f'''INSERT INTO "T{k}" (date, name, price, volume, open, high, low)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(date, name) DO UPDATE SET price = excluded.price,
+                            volume = excluded.volume, open = excluded.open,
+                            high = excluded.high, low = excluded.low''', make_rows(k, 0))
+                    conn.commit()
+                    conn.close()
+            else:
+                with BulkWriter(path) as writer:
+                    for k in range(tables):
+                        writer.add(f"T{k}", make_rows(k, 0), prepare=create)
+                    stats = writer.commit()
+                print(f"  {BulkWriter.describe(stats)}")
+            seconds = time.perf_counter() - t0
+            results[mode] = seconds
+            print(f"{mode:>6}: {n} 行 / {tables} 张表，{seconds:.3f}s，{n / seconds:.0f} 行/秒")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="BulkWriter 写入基准")
+    parser.add_argument("-n", type=int, default=50000, help="总行数")
+    parser.add_argument("--tables", type=int, default=10, help="表数")
+    args = parser.parse_args()
+    bench(args.n, args.tables)
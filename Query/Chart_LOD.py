@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chart_LOD.py
+Chart_input 长时间区间的降采样（level of detail）
+
+10Y / All 区间下，价格线、渐变剪切路径、彩色 LineCollection 都按每个交易日一个点绘制，
+几十年的序列每次切换区间都要重建上万个顶点。屏幕宽度只有一千多像素，多出来的点看不见。
+
+这里按 min/max 保留极值的方式降采样：
+    - 打开图表时对每只 symbol 预先建一个金字塔：第 k 层把序列按 4·2^k 个点一桶切开，
+      每桶只保留最低点和最高点（再加首尾两点）；桶的边界全局固定，
+      切换区间时同一段的形状不会跳动；
+    - 取某个窗口时，窗口内点数不超过 max_points 直接用全分辨率，
+      否则选最细的、点数不超过 max_points 的那一层切片；窗口两端只被截到一部分的桶
+      不用金字塔里的点（可能落在窗口外），改在全分辨率数据上对窗口内那一段取最低 / 最高点；
+    - 每个完整桶和两端的残桶的最高 / 最低点都在，画出来的形状不会丢极值。
+Y 轴范围、零线判断、成交额最大值仍由调用方在全分辨率切片上算。
+
+hover、标注、副标题等仍然用全分辨率数据，只有画出来的几何体走降采样。
+"""
+
+import numpy as np
+
+LOD_MAX_POINTS = 2000      # 单条线最多绘制的点数（约为图表宽度像素数的 1.5 倍）
+_FIRST_BUCKET = 4
+
+
+def _edge_extrema(y, lo, hi):
+    """全分辨率 y[lo:hi] 内最低、最高点的绝对下标（全为 NaN 时为空）"""
+    seg = y[lo:hi]
+    if not len(seg) or np.isnan(seg).all():
+        return []
+    return [lo + int(np.nanargmin(seg)), lo + int(np.nanargmax(seg))]
+
+
+def minmax_indices(y, bucket):
+    """每 bucket 个点取最低、最高点的下标（含首尾），升序去重；NaN 不参与"""
+    n = len(y)
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    y = np.asarray(y, dtype=np.float64)
+    pad = (-n) % bucket
+    nan = np.isnan(y)
+    hi_src = np.where(nan, -np.inf, y)
+    lo_src = np.where(nan, np.inf, y)
+    if pad:
+        hi_src = np.concatenate([hi_src, np.full(pad, -np.inf)])
+        lo_src = np.concatenate([lo_src, np.full(pad, np.inf)])
+    starts = np.arange(0, n, bucket)
+    imax = hi_src.reshape(-1, bucket).argmax(axis=1) + starts
+    imin = lo_src.reshape(-1, bucket).argmin(axis=1) + starts
+    idx = np.unique(np.concatenate([imin, imax, [0, n - 1]]))
+    return idx[idx < n]
+
+
+class LODPyramid:
+    """一条序列的降采样金字塔；levels[0] 最细，越往后越粗"""
+
+    def __init__(self, y, max_points=LOD_MAX_POINTS):
+        self.n = len(y)
+        self.max_points = max_points
+        self.levels = []     # [(桶大小, 下标)]
+        self.y = None
+        if self.n <= max_points:
+            return
+        self.y = np.asarray(y, dtype=np.float64)
+        bucket = _FIRST_BUCKET
+        while True:
+            level = minmax_indices(self.y, bucket)
+            self.levels.append((bucket, level))
+            if len(level) <= max_points or bucket >= self.n:
+                break
+            bucket *= 2
+
+    def indices(self, lo=0, hi=None):
+        """窗口 [lo, hi) 内要绘制的下标（绝对下标，升序，包含窗口首尾两点）"""
+        hi = self.n if hi is None else min(hi, self.n)
+        lo = max(0, lo)
+        if hi - lo <= self.max_points or not self.levels:
+            return np.arange(lo, hi)
+        for bucket, level in self.levels:
+            # 完整落在窗口内的桶 [full_lo, full_hi)；两端的残桶单独处理
+            full_lo = -(-lo // bucket) * bucket
+            full_hi = max(full_lo, hi // bucket * bucket)
+            a = np.searchsorted(level, full_lo, side="left")
+            b = np.searchsorted(level, full_hi, side="left")
+            if b - a + 6 <= self.max_points:
+                break
+        # 残桶在全分辨率上取极值，再补上窗口首尾，保证线条画到区间边缘、最后一个价格不丢
+        edges = [lo, hi - 1] + _edge_extrema(self.y, lo, min(full_lo, hi)) + _edge_extrema(self.y, full_hi, hi)
+        return np.unique(np.concatenate([level[a:b], np.asarray(edges, dtype=np.int64)]))
+
+
+def take(seq, idx):
+    """按下标从 list / ndarray 里取子序列；seq 为 None 时返回 None"""
+    if seq is None:
+        return None
+    if isinstance(seq, np.ndarray):
+        return seq[idx]
+    return [seq[i] for i in idx]
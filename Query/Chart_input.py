@@ -9,7 +9,6 @@ import matplotlib.pyplot as plt
 from datetime import datetime, timedelta, date
 from matplotlib.widgets import RadioButtons
 from functools import lru_cache
-from scipy.interpolate import interp1d
 import json
 from matplotlib.patches import PathPatch
 from matplotlib.path import Path
@@ -17,23 +16,25 @@ from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.collections import LineCollection
 import glob
 import time
+import bisect
 import threading
 
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
-# --- 新增: 导入 Tiger_API ---
+# --- 新增: Tiger_API 所在目录（tigeropen / pandas / pytz 很重，延迟到实时价格线程里再 import） ---
 sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Selenium"))
-try:
-    from Tiger_API import _get_global_fetcher
-except ImportError as e:
-    print(f"导入 Tiger_API 失败: {e}")
 
 # --- 修改: 切换到 PyQt6 ---
 from PyQt6.QtWidgets import QApplication, QDialog, QVBoxLayout, QTextEdit
 from PyQt6.QtGui import QFont
 from PyQt6.QtCore import Qt
 
+from Tool_Host import launch as launch_in_tool_host
+from Series_Cache import get_series_cache
+from Chart_LOD import LODPyramid, take as lod_take
+from Modules_Cache import load_json as load_cached_json
+
 # --- 定义Nord主题的调色板 ---
 NORD_THEME = {
     'background': '#2E3440',
@@ -52,53 +53,52 @@ NORD_THEME = {
     'accent_purple': '#B48EAD',
 }
 
-# ============ 新增：全局实时价格管理器（整个进程共用一个线程 + 一个 fetcher） ============
+# ============ 全局实时价格：订阅进程内共享的 Quote_Service（与其它窗口合并成批量请求） ============
 class _RealtimeManager:
+    """每张图表（owner，一般是 figure）一个订阅：换 symbol 时替换，图表关闭时退订"""
+
     def __init__(self):
         self._lock = threading.Lock()
-        self._symbol = None
-        self._latest = {}          # symbol -> price
-        self._thread = None
-        self._stop = threading.Event()
-        self._fetcher = None
-
-    def _ensure_thread(self):
-        if self._thread is None or not self._thread.is_alive():
-            self._stop.clear()
-            self._thread = threading.Thread(target=self._run, daemon=True)
-            self._thread.start()
-
-    def set_symbol(self, symbol):
+        self._service = None
+        self._tokens = {}   # owner -> Quote_Service 订阅 token
+
+    def _get_service(self):
+        if self._service is None:
+            # Quote_Service 本身很轻，tigeropen / pandas 仍在服务线程第一次拉取时才 import
+            from Quote_Service import get_quote_service
+            self._service = get_quote_service()
+        return self._service
+
+    def set_symbol(self, owner, symbol):
         with self._lock:
-            self._symbol = symbol
-        self._ensure_thread()
+            try:
+                service = self._get_service()
+            except ImportError as e:
+                print(f"导入 Quote_Service 失败: {e}")
+                return
+            token = self._tokens.get(owner)
+            if token is None:
+                self._tokens[owner] = service.subscribe([symbol])
+            else:
+                service.update(token, [symbol])
 
-    def get_latest(self, symbol):
+    def release(self, owner):
         with self._lock:
-            return self._latest.get(symbol)
+            token = self._tokens.pop(owner, None)
+            if token is not None and self._service is not None:
+                self._service.unsubscribe(token)
 
-    def _run(self):
-        try:
-            self._fetcher = _get_global_fetcher()
-        except Exception as e:
-            print(f"初始化 fetcher 失败: {e}")
-            return
-        while not self._stop.is_set():
-            with self._lock:
-                sym = self._symbol
-            if sym:
-                try:
-                    quote = self._fetcher.get_realtime_quote(sym)
-                    if quote and 'price' in quote:
-                        with self._lock:
-                            self._latest[sym] = quote['price']
-                except Exception as e:
-                    print(f"后台获取实时价格失败: {e}")
-            if self._stop.wait(timeout=5.0):
-                break
+    def get_latest(self, symbol):
+        if self._service is None:
+            return None
+        quote = self._service.get_latest(symbol)
+        return quote['price'] if quote else None
 
 _RT_MANAGER = _RealtimeManager()
 
+# Tiger 只有个股 / ETF 的实时报价，这些表开图时不启动实时线程（也就不会 import tigeropen）
+NO_REALTIME_TABLES = {'Bonds', 'Currencies', 'Crypto', 'Indices', 'Economics', 'Commodities'}
+
 # ============ 新增：Earning Release 全量缓存（整个进程只读一次文件） ============
 _EARNING_RELEASE_CACHE = None
 
@@ -283,49 +283,16 @@ def get_title_color_logic(db_path, symbol, table_name):
         print(f"[颜色决策逻辑错误] {symbol}: {e}")
         return NORD_THEME['text_bright']
 
-@lru_cache(maxsize=None)
 def fetch_data(db_path, table_name, name):
-    with sqlite3.connect(db_path, timeout=60.0) as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_name ON "{table_name}" (name);')
-        except sqlite3.OperationalError:
-            pass
-
-        # 尝试1: 包含 open, high, low 字段 (完整表)
-        try:
-            query = f'SELECT date, price, volume, open, high, low FROM "{table_name}" WHERE name = ? ORDER BY date;'
-            result = cursor.execute(query, (name,)).fetchall()
-            if result:
-                return result
-        except sqlite3.OperationalError:
-            pass
-
-        # 尝试2: 包含 open 字段 (兼容旧表)
-        try:
-            query = f'SELECT date, price, volume, open FROM "{table_name}" WHERE name = ? ORDER BY date;'
-            result = cursor.execute(query, (name,)).fetchall()
-            if result:
-                return result
-        except sqlite3.OperationalError:
-            pass
-
-        # 尝试3: 仅包含 volume 字段
-        try:
-            query = f'SELECT date, price, volume FROM "{table_name}" WHERE name = ? ORDER BY date;'
-            result = cursor.execute(query, (name,)).fetchall()
-            if result:
-                return result
-        except sqlite3.OperationalError:
-            pass
+    """
+    单只 symbol 的全部日线（PriceSeries，NumPy 列）。
+    走进程内按字节预算的 LRU 缓存；每张表的可选列（volume/open/high/low）只探测一次。
+    (name, date) 覆盖索引由 Operations/Schema_Migration.py 统一安装，读路径不再建索引。
+    """
+    return get_series_cache(db_path).get(table_name, name)
 
-        # 尝试4: 仅 date 和 price
-        query = f'SELECT date, price FROM "{table_name}" WHERE name = ? ORDER BY date;'
-        result = cursor.execute(query, (name,)).fetchall()
-        if not result:
-            raise ValueError("没有查询到可用数据")
-        return result
 def smooth_curve(dates, prices, num_points=500):
+    from scipy.interpolate import interp1d  # 只有平滑曲线用到 scipy，按需 import
     date_nums = matplotlib.dates.date2num(dates)
     if len(dates) < 4:
         interp_func = interp1d(date_nums, prices, kind='linear')
@@ -336,34 +303,68 @@ def smooth_curve(dates, prices, num_points=500):
     new_dates = matplotlib.dates.num2date(new_date_nums)
     return new_dates, new_prices
 
-def process_data(data):
-    if not data: raise ValueError("没有可供处理的数据")
-    dates, prices, volumes, opens, highs, lows = [], [], [], [], [], []
-    for row in data:
-        date = datetime.strptime(row[0], "%Y-%m-%d")
-        price = float(row[1]) if row[1] is not None else None
-        volume = int(row[2]) if len(row) > 2 and row[2] is not None else None
-        open_price = float(row[3]) if len(row) > 3 and row[3] is not None else None
-        high_price = float(row[4]) if len(row) > 4 and row[4] is not None else None
-        low_price = float(row[5]) if len(row) > 5 and row[5] is not None else None
-        if price is not None:
-            dates.append(date)
-            prices.append(price)
-            volumes.append(volume)
-            opens.append(open_price)
-            highs.append(high_price)
-            lows.append(low_price)
+def _to_list(arr, as_int=False):
+    """NumPy 列 -> list，NaN 还原为 None"""
+    mask = np.isnan(arr)
+    values = np.where(mask, 0, arr).astype(np.int64).tolist() if as_int else arr.tolist()
+    if mask.any():
+        for i in np.flatnonzero(mask):
+            values[i] = None
+    return values
+
+def process_data(series):
+    if series is None or not len(series): raise ValueError("没有可供处理的数据")
+    keep = ~np.isnan(series.price)
+    dates = series.dates[keep].astype("datetime64[us]").tolist()  # -> datetime 对象
+    prices = series.price[keep].tolist()
+    volumes = _to_list(series.volume[keep], as_int=True)
+    opens = _to_list(series.open[keep])
+    highs = _to_list(series.high[keep])
+    lows = _to_list(series.low[keep])
     return dates, prices, volumes, opens, highs, lows
 
+class DayIndex:
+    """
+    全量日期的有序整数天数（date.toordinal()）。
+    最近交易日 / 精确日期定位都走 searchsorted，hover、标记点放置、财报注释共用一份。
+    """
+    def __init__(self, dates):
+        self.days = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+
+    def __len__(self):
+        return len(self.days)
+
+    def covers(self, day):
+        return len(self.days) > 0 and self.days[0] <= day <= self.days[-1]
+
+    def nearest(self, day):
+        """离 day 最近的下标；距离相同取较早的一天（与原来的 argmin 一致）"""
+        n = len(self.days)
+        i = int(np.searchsorted(self.days, day, side="left"))
+        if i >= n:
+            return n - 1
+        if i > 0 and day - self.days[i - 1] <= self.days[i] - day:
+            return i - 1
+        return i
+
+    def index_of(self, day):
+        """恰好是 day 的下标；没有时抛 ValueError（与 list.index 一致）"""
+        i = int(np.searchsorted(self.days, day, side="left"))
+        if i < len(self.days) and self.days[i] == day:
+            return i
+        raise ValueError(f"{day} 不在日期索引中")
+
 def display_dialog(message):
     applescript_code = f'display dialog "{message}" buttons {{"OK"}} default button "OK"'
     subprocess.run(['osascript', '-e', applescript_code], check=True)
 
 # --- 优化: 简化的update_plot函数，减少重复创建渐变 ---
-def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2, show_volume, cmap, force_recreate=False, gradient_clip_patch=None, zero_line=None):
+def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2, show_volume, cmap, force_recreate=False, gradient_clip_patch=None, zero_line=None, volume_dates=None, full_prices=None, full_volumes=None):
     """
     更新图表，使用 imshow 和 clip_path 实现渐变填充。
     此版本包含针对高价股的视觉比例优化。
+    prices / volumes 是降采样后用于绘制的点；full_prices / full_volumes 传入窗口内的全分辨率数据时，
+    Y 轴范围、零线判断和成交额最大值都按全分辨率计算。
     """
     # 1. 处理没有数据的情况
     if not dates or not prices:
@@ -389,7 +390,8 @@ def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2,
     # 2. 更新主价格曲线和成交量曲线的数据
     line1.set_data(dates, prices)
     if volumes:
-        line2.set_data(dates, volumes)
+        # 成交额单独降采样时横坐标与价格线不同
+        line2.set_data(volume_dates if volume_dates is not None else dates, volumes)
     else:
         line2.set_data([], [])
 
@@ -402,8 +404,11 @@ def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2,
         right_margin = date_range * 0.01
         ax1.set_xlim(date_min_val, date_max_val + right_margin)
 
+    range_prices = full_prices if full_prices else prices
+    range_volumes = full_volumes if full_volumes else volumes
+
     # === 核心优化开始: 智能 Y 轴缩放 ===
-    min_p, max_p = np.min(prices), np.max(prices)
+    min_p, max_p = np.min(range_prices), np.max(range_prices)
     
     # 设定最小视觉幅度比例 (建议 0.15 即 15%)
     # 这意味着 Y 轴的高度至少是当前最高价的 15%
@@ -443,7 +448,7 @@ def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2,
     # 新增：零线显隐与范围保障
     if zero_line is not None:
         # 使用原始价格数据判断是否存在负值
-        if np.min(prices) < 0.0:
+        if min_p < 0.0:
             zero_line.set_visible(True)
             y0, y1 = ax1.get_ylim()
             # 如果 0 不在当前 Y 轴范围内，则扩展范围以包含 0
@@ -458,8 +463,8 @@ def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2,
             zero_line.set_visible(False)
 
     if show_volume:
-        if volumes and any(v is not None for v in volumes):
-            valid_v = [v for v in volumes if v is not None]
+        if range_volumes and any(v is not None for v in range_volumes):
+            valid_v = [v for v in range_volumes if v is not None]
             if valid_v:
                 max_v = np.max(valid_v)
                 ax2.set_ylim(0, max_v)
@@ -477,7 +482,7 @@ def update_plot(line1, gradient_image, line2, dates, prices, volumes, ax1, ax2,
     # ==================== 这是核心修改 ====================
     # 动态确定填充区域的基线
     # 如果所有价格都小于0，则基线为0。否则，基线为Y轴的底部。
-    fill_base = 0 if np.max(prices) < 0 else ylim[0]
+    fill_base = 0 if max_p < 0 else ylim[0]
 
     # 创建剪切路径所需的顶点
     line_x_nums = matplotlib.dates.date2num(dates)
@@ -622,8 +627,11 @@ def execute_external_script(script_type, keyword, on_done=None, block=False):
                     if callable(on_done):
                         on_done(return_code)
             else:
-                result = subprocess.Popen([python_path, script_path, keyword])
-                return_code = result.returncode
+                if launch_in_tool_host(script_path, [keyword]):
+                    return_code = None
+                else:
+                    result = subprocess.Popen([python_path, script_path, keyword])
+                    return_code = result.returncode
                 if on_done:
                     if callable(on_done):
                         on_done(return_code)
@@ -775,7 +783,25 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
         turnovers = [0.0] * len(dates)
 
     smooth_dates, smooth_prices = smooth_curve(dates, prices)
-    date_nums = matplotlib.dates.date2num(dates)
+
+    # --- 降采样金字塔：每只 symbol 打开时建一次，长区间只绘制保留极值的点（见 Chart_LOD） ---
+    lod_price = LODPyramid(prices)
+    lod_turnover = LODPyramid(turnovers)
+    current_lod = [None]  # 当前区间实际绘制的 (dates, prices, opens)
+
+    def window_start(years):
+        """区间起点在全量数据中的下标；区间内没有数据时只保留最后一个点"""
+        if years == 0:
+            return 0
+        min_date = datetime.now() - timedelta(days=years * 365)
+        return min(bisect.bisect_left(dates, min_date), len(dates) - 1)
+
+    def lod_series(lo):
+        """窗口 [lo, 末尾) 降采样后用于绘制的价格线与成交额线"""
+        p_idx = lod_price.indices(lo)
+        t_idx = lod_turnover.indices(lo)
+        current_lod[0] = (lod_take(dates, p_idx), lod_take(prices, p_idx), lod_take(opens, p_idx))
+        return current_lod[0] + (lod_take(dates, t_idx), lod_take(turnovers, t_idx))
 
     fig, ax1 = plt.subplots(figsize=(16, 8))
     fig.subplots_adjust(left=0.05, bottom=0.1, right=0.83, top=0.8)
@@ -927,6 +953,10 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
     # 标记点和注释
     global_markers, specific_markers, earning_markers = {}, {}, {}
     all_annotations = []
+    day_index = DayIndex(dates)
+    # 按天号索引的标记文本与标记点颜色，hover 时 O(1) 查找（在 create_markers_and_annotations 里重建）
+    marker_text_by_day = {'global': {}, 'specific': {}, 'earning': {}}
+    marker_color_by_day = {}
     
     try:
         with sqlite3.connect(db_path, timeout=60.0) as conn:
@@ -935,8 +965,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
             for date_str, price_change in cursor.fetchall():
                 try:
                     marker_date = datetime.strptime(date_str, "%Y-%m-%d")
-                    closest_date = min(dates, key=lambda d: abs(d - marker_date))
-                    index = dates.index(closest_date)
+                    index = day_index.nearest(marker_date.toordinal())
                     marker_price, latest_price = prices[index], prices[-1]
                     diff_percent = ((latest_price - marker_price) / marker_price) * 100 if marker_price else 0
                     earning_markers[marker_date] = f"昨日财报: {price_change}%\n最新价差: {diff_percent:.2f}%\n{date_str}"
@@ -1080,15 +1109,15 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
 
         # 重新创建 Scatter 对象
         for marker_date, text in global_markers.items():
-            if min(dates) <= marker_date <= max(dates):
-                idx = (np.abs(np.array(dates) - marker_date)).argmin()
+            if day_index.covers(marker_date.toordinal()):
+                idx = day_index.nearest(marker_date.toordinal())
                 scatter = ax1.scatter([dates[idx]], [prices[idx]], s=100, color=NORD_THEME['accent_red'],
                                       alpha=0.7, zorder=4, picker=5, visible=show_global_markers)
                 global_scatter_points.append((scatter, dates[idx], prices[idx], text))
         
         for marker_date, text in specific_markers.items():
-            if min(dates) <= marker_date <= max(dates):
-                idx = (np.abs(np.array(dates) - marker_date)).argmin()
+            if day_index.covers(marker_date.toordinal()):
+                idx = day_index.nearest(marker_date.toordinal())
                 scatter = ax1.scatter([dates[idx]], [prices[idx]], s=100, color=NORD_THEME['text_bright'],
                                       alpha=0.7, zorder=4, picker=5, visible=show_specific_markers)
                 specific_scatter_points.append((scatter, dates[idx], prices[idx], text))
@@ -1112,7 +1141,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
                 
                 # 2. 额差 (使用 Turnover)
                 if turnovers:
-                    idx = dates.index(date_v) 
+                    idx = day_index.index_of(date_v.toordinal()) 
                     turnover_v = turnovers[idx]
                     latest_turnover = turnovers[-1]
                     if turnover_v and turnover_v > 0 and latest_turnover:
@@ -1151,7 +1180,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
                 # 2. 量差 (使用 Turnover)
                 if turnovers:
                     # 使用 date_v 查找对应的 index
-                    idx = dates.index(date_v) 
+                    idx = day_index.index_of(date_v.toordinal()) 
                     turnover_v = turnovers[idx]
                     latest_turnover = turnovers[-1]
                     if turnover_v and turnover_v > 0 and latest_turnover:
@@ -1183,7 +1212,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
             final_text = text
             try:
                 if turnovers:
-                    idx = dates.index(date_v)
+                    idx = day_index.index_of(date_v.toordinal())
                     turnover_v = turnovers[idx]
                     latest_turnover = turnovers[-1]
                     vol_msg = ""
@@ -1214,10 +1243,20 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
             )
             all_annotations.append((annotation, 'earning', date_v, price_v))
 
+        # 重建按天号索引的标记文本 / 标记点颜色（优先级与原来的嵌套查找一致：红 > 白 > 黄）
+        for kind, markers in (('global', global_markers), ('specific', specific_markers), ('earning', earning_markers)):
+            marker_text_by_day[kind] = {d.toordinal(): t for d, t in markers.items()}
+        marker_color_by_day.clear()
+        for points, color in ((earning_scatter_points, NORD_THEME['accent_yellow']),
+                              (specific_scatter_points, NORD_THEME['text_bright']),
+                              (global_scatter_points, NORD_THEME['accent_red'])):
+            for _, d, _, _ in points:
+                marker_color_by_day[d.toordinal()] = color
+
     # 在主流程中，首次创建earning的scatter points (这部分只执行一次)
     for marker_date, text in earning_markers.items():
-        if min(dates) <= marker_date <= max(dates):
-            idx = (np.abs(np.array(dates) - marker_date)).argmin()
+        if day_index.covers(marker_date.toordinal()):
+            idx = day_index.nearest(marker_date.toordinal())
             scatter = ax1.scatter([dates[idx]], [prices[idx]], s=100, color=NORD_THEME['pure_yellow'],
                                   alpha=0.7, zorder=4, picker=5, visible=show_earning_markers)
             earning_scatter_points.append((scatter, dates[idx], prices[idx], text))
@@ -1517,8 +1556,11 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
     def toggle_colored_lines():
         nonlocal show_colored_lines
         show_colored_lines = not show_colored_lines
-        # 重新构建线段并重绘
-        build_colored_line_collection(current_filtered_dates, current_filtered_prices, current_filtered_opens)
+        # 重新构建线段并重绘（与价格线一致，使用当前区间降采样后的点）
+        if current_lod[0] is not None:
+            build_colored_line_collection(*current_lod[0])
+        else:
+            build_colored_line_collection(current_filtered_dates, current_filtered_prices, current_filtered_opens)
         fig.canvas.draw_idle()
 
     def toggle_global_markers():
@@ -1547,7 +1589,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
 
     def update_marker_visibility():
         years = time_options[radio.value_selected]
-        min_date = min(dates) if years == 0 else datetime.now() - timedelta(days=years * 365)
+        min_date = dates[0] if years == 0 else datetime.now() - timedelta(days=years * 365)
 
         for scatter, date_v, _, _ in global_scatter_points: scatter.set_visible((min_date <= date_v) and show_global_markers)
         for scatter, date_v, _, _ in specific_scatter_points: scatter.set_visible((min_date <= date_v) and show_specific_markers)
@@ -1572,7 +1614,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
                         annot.set_text(f"{datetime.strftime(date_v, '%Y-%m-%d')}\n{price_v}\n{text}")
                         annot.get_bbox_patch().set_alpha(0.8)
                         annot.set_fontsize(16)
-                        midpoint = max(dates) - (max(dates) - min(dates)) / 2
+                        midpoint = dates[-1] - (dates[-1] - dates[0]) / 2
                         annot.set_position((50, -20) if date_v < midpoint else (-150, -20))
                         annot.set_visible(True)
                         highlight_point.set_offsets([date_v, price_v])
@@ -1637,31 +1679,19 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
     rax.text(0.5, 0.98, instructions, transform=rax.transAxes, ha="center", va="bottom",
              color=NORD_THEME['text_light'], fontsize=10, fontfamily="Arial Unicode MS")
     
-    # --- 优化：缓存查找结果，减少重复计算 ---
-    @lru_cache(maxsize=1000)
-    def find_closest_index(target_date_num):
-        return np.argmin(np.abs(date_nums - target_date_num))
-
     def update_annot(ind):
         try:
-            x_data, y_data = line1.get_data()
+            x_data, y_data = current_filtered_dates, current_filtered_prices  # 全分辨率（line1 上可能是降采样后的点）
             # 获取当前鼠标悬停点的索引
             idx = ind["ind"][0] 
             xval, yval = x_data[idx], y_data[idx]
 
             if annot.xy != (xval, yval):
                 annot.xy = (xval, yval)
-                current_date = xval.replace(tzinfo=None)
-                g_text, s_text, e_text = None, None, None
-                for d, t in global_markers.items():
-                    if abs((d - current_date).total_seconds()) < 86400:
-                        g_text = t; break
-                for d, t in specific_markers.items():
-                    if abs((d - current_date).total_seconds()) < 86400:
-                        s_text = t; break
-                for d, t in earning_markers.items():
-                    if abs((d - current_date).total_seconds()) < 86400:
-                        e_text = t; break
+                current_day = xval.replace(tzinfo=None).toordinal()
+                g_text = marker_text_by_day['global'].get(current_day)
+                s_text = marker_text_by_day['specific'].get(current_day)
+                e_text = marker_text_by_day['earning'].get(current_day)
                 
                 # 先构造文本和颜色
                 if mouse_pressed and initial_price is not None:
@@ -1807,7 +1837,7 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
                     else:
                         idx = 0
 
-                    x_data, y_data = line1.get_data()
+                    x_data, y_data = current_filtered_dates, current_filtered_prices  # 全分辨率（line1 上可能是降采样后的点）
                     if idx < len(x_data) and idx < len(y_data) and initial_price is not None:
                         sel_date, sel_price = x_data[idx], y_data[idx]
                         
@@ -1909,21 +1939,10 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
                 else:
                     idx = 0
 
-                x_data, y_data = line1.get_data()
+                x_data, y_data = current_filtered_dates, current_filtered_prices  # 全分辨率（line1 上可能是降采样后的点）
                 if idx < len(x_data) and idx < len(y_data):
                     sel_date, sel_price = x_data[idx], y_data[idx]
-                    color = NORD_THEME['accent_cyan']
-                    for _, d, _, _ in global_scatter_points:
-                        if d == sel_date:
-                            color = NORD_THEME['accent_red']; break
-                    else:
-                        for _, d, _, _ in specific_scatter_points:
-                            if d == sel_date:
-                                color = NORD_THEME['text_bright']; break
-                        else:
-                            for _, d, _, _ in earning_scatter_points:
-                                if d == sel_date:
-                                    color = NORD_THEME['accent_yellow']; break
+                    color = marker_color_by_day.get(sel_date.toordinal(), NORD_THEME['accent_cyan'])
                     
                     highlight_point.set_color(color)
                     dist = 0.2 * ((ax1.get_xlim()[1] - ax1.get_xlim()[0]) / 365)
@@ -1951,31 +1970,13 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
         nonlocal gradient_image, current_filtered_dates, current_filtered_prices, current_filtered_volumes, current_filtered_date_nums, current_filtered_opens, current_filtered_highs, current_filtered_lows
         try:
             years = time_options[val]
-            if years == 0:
-                # 全量数据
-                f_dates, f_prices, f_volumes = dates, prices, volumes
-                f_turnovers = turnovers
-                f_opens = opens
-                f_highs = highs # <--- 新增
-                f_lows = lows 
-            else:
-                min_date = datetime.now() - timedelta(days=years * 365)
-                indices = [i for i, d in enumerate(dates) if d >= min_date]
-                if not indices:
-                    f_dates, f_prices = [dates[-1]], [prices[-1]]
-                    f_volumes = [volumes[-1]] if volumes else None
-                    f_turnovers = [turnovers[-1]] if turnovers else None
-                    f_opens = [opens[-1]] if opens else None
-                    f_highs = [highs[-1]] if highs else None # <--- 新增
-                    f_lows = [lows[-1]] if lows else None 
-                else:
-                    f_dates = [dates[i] for i in indices]
-                    f_prices = [prices[i] for i in indices]
-                    f_volumes = [volumes[i] for i in indices] if volumes else None
-                    f_turnovers = [turnovers[i] for i in indices] if turnovers else None
-                    f_opens = [opens[i] for i in indices]
-                    f_highs = [highs[i] for i in indices] # <--- 新增
-                    f_lows = [lows[i] for i in indices] 
+            # 日期升序，二分定位区间起点，切片即可（不再逐个比较）
+            lo = window_start(years)
+            f_dates, f_prices, f_volumes = dates[lo:], prices[lo:], volumes[lo:]
+            f_opens = opens[lo:]
+            f_highs = highs[lo:] # <--- 新增
+            f_lows = lows[lo:]
+            d_dates, d_prices, d_opens, t_dates, t_turnovers = lod_series(lo)
 
             # 更新当前筛选数据与缓存
             current_filtered_dates = f_dates
@@ -2040,20 +2041,24 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
                 force_flag = True
                 last_rebuild_ts[0] = now
 
-            # 【关键点】：调用 update_plot 时，传入 f_turnovers 而不是 f_volumes
+            # 【关键点】：调用 update_plot 时，传入成交额 t_turnovers 而不是 f_volumes
             # 这样图表画的是成交额，Y轴刻度也会自动适应成交额的大小
+            # 绘制用降采样后的点；Y 轴范围、hover / 副标题仍用上面的全分辨率数据
             gradient_image = update_plot(
                 line1, gradient_image, line2,
-                f_dates, f_prices, f_turnovers, # <--- 这里修改为 f_turnovers
+                d_dates, d_prices, t_turnovers, # <--- 降采样后的成交额
                 ax1, ax2, show_volume,
                 cyan_transparent_cmap,
                 force_recreate=force_flag,
                 gradient_clip_patch=gradient_clip_patch,
-                zero_line=zero_line
+                zero_line=zero_line,
+                volume_dates=t_dates,
+                full_prices=f_prices,
+                full_volumes=turnovers[lo:]
             )
 
             # ====== 新增: 重建彩色线段 ======
-            build_colored_line_collection(f_dates, f_prices, f_opens)
+            build_colored_line_collection(d_dates, d_prices, d_opens)
 
             draw_subtitle(current_prices=f_prices, pre_after_pct=current_pre_after_pct[0])
 
@@ -2071,32 +2076,14 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
             show_volume = not show_volume
             years = time_options[radio.value_selected]
             
-            # --- 增加 f_turnovers 的处理逻辑 ---
-            if years == 0:
-                # vvv 【修改这行】去掉多余的逗号和 volumes vvv
-                f_dates, f_prices = dates, prices 
-                f_turnovers = turnovers
-                f_opens = opens 
-                f_highs = highs # <--- 新增
-                f_lows = lows 
-            else:
-                min_date = datetime.now() - timedelta(days=years * 365)
-                indices = [i for i, d in enumerate(dates) if d >= min_date]
-                if indices:
-                    f_dates = [dates[i] for i in indices]
-                    f_prices = [prices[i] for i in indices]
-                    f_turnovers = [turnovers[i] for i in indices] if turnovers else None
-                    f_opens = [opens[i] for i in indices] 
-                    f_highs = [highs[i] for i in indices] # <--- 新增
-                    f_lows = [lows[i] for i in indices] 
-                else:
-                    f_dates = [dates[-1]]
-                    f_prices = [prices[-1]]
-                    f_turnovers = [turnovers[-1]] if turnovers else None
-                    f_opens = [opens[-1]] if opens else None
-                    f_highs = [highs[-1]] if highs else None # <--- 新增
-                    f_lows = [lows[-1]] if lows else None 
-            
+            # --- 成交额取自 lod_series 的 t_turnovers ---
+            lo = window_start(years)
+            f_dates, f_prices = dates[lo:], prices[lo:]
+            f_opens = opens[lo:]
+            f_highs = highs[lo:] # <--- 新增
+            f_lows = lows[lo:]
+            d_dates, d_prices, d_opens, t_dates, t_turnovers = lod_series(lo)
+
             current_filtered_dates = f_dates
             current_filtered_prices = f_prices
             current_filtered_date_nums = matplotlib.dates.date2num(current_filtered_dates) if current_filtered_dates else np.array([])
@@ -2104,18 +2091,21 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
             current_filtered_highs = f_highs # <--- 新增
             current_filtered_lows = f_lows # <--- 新增
 
-            # 【关键点】：传入 f_turnovers 进行绘图
+            # 【关键点】：传入成交额 t_turnovers 进行绘图
             update_plot(
                 line1, gradient_image, line2,
-                f_dates, f_prices, f_turnovers, # <--- 这里修改为 f_turnovers
+                d_dates, d_prices, t_turnovers, # <--- 降采样后的成交额
                 ax1, ax2, show_volume,
                 cyan_transparent_cmap,
                 force_recreate=False,
                 gradient_clip_patch=gradient_clip_patch,
-                zero_line=zero_line
+                zero_line=zero_line,
+                volume_dates=t_dates,
+                full_prices=f_prices,
+                full_volumes=turnovers[lo:]
             )
             # ====== 新增: 重建彩色线段 ======
-            build_colored_line_collection(f_dates, f_prices, f_opens)
+            build_colored_line_collection(d_dates, d_prices, d_opens)
             fig.canvas.draw_idle()
         except Exception as e:
             pass
@@ -2155,8 +2145,8 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
         nonlocal title_artist, clickable
         print("正在重新加载 description.json...")
         try:
-            with open(DESCRIPTION_JSON_PATH, 'r', encoding='utf-8') as f:
-                new_data = json.load(f)
+            # 文件没改过时 Modules_Cache 直接返回内存里的那份
+            new_data = load_cached_json(DESCRIPTION_JSON_PATH, copy=False)
             current_json_data['data'] = new_data
             
             print("description.json 加载成功。正在刷新图表...")
@@ -2303,7 +2293,8 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
     plt.gcf().canvas.mpl_connect('figure_leave_event', hide_annot_on_leave)
 
     # === 实时价格刷新：改用全局单例管理器，避免每次开图都新建线程 & 重新初始化 fetcher ===
-    _RT_MANAGER.set_symbol(name)
+    if table_name not in NO_REALTIME_TABLES:
+        _RT_MANAGER.set_symbol(fig, name)
 
     def _ui_poll_realtime():
         """主线程定时读取内存里的最新价，只做轻量更新"""
@@ -2331,6 +2322,8 @@ def plot_financial_data(db_path, table_name, name, compare, share, marketcap, pe
             ui_timer.stop()
         except Exception:
             pass
+        # 图表关了就不再让 Quote_Service 替它拉报价
+        _RT_MANAGER.release(fig)
 
     fig.canvas.mpl_connect('close_event', _on_close)
 
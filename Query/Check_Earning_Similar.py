@@ -22,6 +22,10 @@ from PyQt6.QtCore import Qt, QTimer
 
 sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Query"))
 from Chart_input import plot_financial_data
+from Series_Cache import prefetch_adjacent
+from Tag_Similarity import get_tag_index
+from Tag_Neighbours import load_neighbours
+from Modules_Cache import load_json as load_cached_json, load_text_pairs, symbol_to_sector
 
 DESCRIPTION_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "description.json")
 SECTORS_ALL_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Sectors_All.json")
@@ -153,37 +157,31 @@ def parse_earnings_file(path):
 
 
 def get_symbol_type(symbol):
-    for item in json_data.get('stocks', []):
-        if item.get('symbol') == symbol:
-            return 'stock'
-    for item in json_data.get('etfs', []):
-        if item.get('symbol') == symbol:
-            return 'etf'
-    return None
+    return get_tag_index(json_data).symbol_type(symbol)
 
 
-def load_json(path):
+def load_json(path, copy=True):
+    # 经 Modules_Cache：文件没变时不再重新解析；copy=False 返回共享对象，只能读不能改
+    if not os.path.exists(path):
+        print(f"Error loading JSON from {path}: 文件不存在")
+        return {}
     try:
-        with open(path, 'r', encoding='utf-8') as file:
-            return json.load(file, object_pairs_hook=OrderedDict)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        return load_cached_json(path, ordered=True, copy=copy)
+    except json.JSONDecodeError as e:
         print(f"Error loading JSON from {path}: {e}")
         return {}
 
 
 def load_text_data(path):
     data = {}
-    try:
-        with open(path, 'r', encoding='utf-8') as file:
-            for line in file:
-                line = line.strip()
-                if not line or ':' not in line:
-                    continue
-                key, value = map(str.strip, line.split(':', 1))
-                cleaned_key = key.split()[-1]
-                data[cleaned_key] = tuple(p.strip() for p in value.split(',')) if ',' in value else value
-    except FileNotFoundError:
+    if not os.path.exists(path):
         print(f"Error: Text data file not found at {path}")
+        return data
+    for key, value in load_text_pairs(path, copy=False).items():
+        if not key:
+            continue
+        cleaned_key = key.split()[-1]
+        data[cleaned_key] = tuple(p.strip() for p in value.split(',')) if ',' in value else value
     return data
 
 # 新增：读取 Polymarket 百分比数据的函数
@@ -211,11 +209,8 @@ def fetch_mnspp_data_from_db(db_path, symbol):
 
 
 def get_tags_for_symbol(symbol):
-    for category in ["stocks", "etfs"]:
-        for item in json_data.get(category, []):
-            if item.get("symbol") == symbol:
-                return item.get("tag", "无标签")
-    return "无标签"
+    item = get_tag_index(json_data).item_of(symbol)
+    return "无标签" if item is None else item.get("tag", "无标签")
 
 
 def execute_external_script(script_type, keyword):
@@ -249,51 +244,18 @@ def load_weight_groups():
 
 
 def find_tags_by_symbol_b(symbol, data):
-    tags_with_weight = []
-    for category in ['stocks', 'etfs']:
-        for item in data.get(category, []):
-            if item.get('symbol') == symbol:
-                for tag in item.get('tag', []):
-                    weight = tags_weight_config.get(tag, DEFAULT_WEIGHT)
-                    tags_with_weight.append((tag, weight))
-                return tags_with_weight
-    return []
+    item = get_tag_index(data).item_of(symbol)
+    if item is None:
+        return []
+    return [(tag, tags_weight_config.get(tag, DEFAULT_WEIGHT)) for tag in item.get('tag', [])]
 
 
 def find_symbols_by_tags_b(target_tags_with_weight, data, original_symbol):
+    # 匹配规则与 Search_Similar_Tag 相同（Tag_Similarity.match_item_tags），这里只按总权重排序
     related = {'stocks': [], 'etfs': []}
-    target_dict = {tag.lower(): weight for tag, weight in target_tags_with_weight}
-
-    for category in ['stocks', 'etfs']:
-        for item in data.get(category, []):
-            sym = item.get('symbol')
-            if sym == original_symbol:
-                continue
-            tags = item.get('tag', [])
-            matched = []
-            used = set()
-
-            for tag in tags:
-                tl = tag.lower()
-                if tl in target_dict and tl not in used:
-                    matched.append((tag, target_dict[tl]))
-                    used.add(tl)
-
-            for tag in tags:
-                tl = tag.lower()
-                if tl in used:
-                    continue
-                for tgt, w in target_dict.items():
-                    if tgt in tl or tl in tgt:
-                        if tl != tgt and tgt not in used:
-                            weight_to_use = Decimal('1.0') if w > Decimal('1.0') else w
-                            matched.append((tag, weight_to_use))
-                            used.add(tgt)
-                        break
-
-            if matched:
-                total = sum(w for _, w in matched)
-                related[category].append((sym, total))
+    for category, sym, matched, _ in get_tag_index(data).match(target_tags_with_weight, exclude=original_symbol):
+        total = sum(w for _, w in matched)
+        related[category].append((sym, total))
 
     for cat in related:
         related[cat].sort(key=lambda x: x[1], reverse=True)
@@ -306,6 +268,37 @@ def find_symbols_by_tags_b(target_tags_with_weight, data, original_symbol):
     return combined
 
 
+def load_related_b(original_symbol, valid_symbols, limit):
+    """
+    Tag_Neighbours 预先算好的邻居，排序与 find_symbols_by_tags_b 相同。
+    每类最多存 TOP_K 个：如果按 valid_symbols 过滤后，被截断的那一类在取满 limit 个之前就用完了，
+    预计算结果不够用，返回 None；还没算或已过期时也返回 None，由调用方实时计算。
+    """
+    neighbours = load_neighbours(original_symbol, DESCRIPTION_PATH, TAGS_WEIGHT_PATH, DB_PATH, data=json_data)
+    if neighbours is None:
+        return None
+    index = get_tag_index(json_data)
+    related = {}
+    for cat in ('stocks', 'etfs'):
+        rows = [(sym, sum(w for _, w in matched)) for sym, matched in neighbours[cat]]
+        # 同分时按 description.json 中的顺序，与实时计算一致
+        rows.sort(key=lambda x: (-x[1], index.by_symbol.get(x[0], 0)))
+        related[cat] = rows
+
+    stype = get_symbol_type(original_symbol)
+    order = ['etfs', 'stocks'] if stype == 'etf' else ['stocks', 'etfs']
+    combined = []
+    valid_count = 0
+    for cat in order:
+        combined.extend(related[cat])
+        valid_count += sum(1 for sym, _ in related[cat] if sym in valid_symbols)
+        if valid_count >= limit:
+            break
+        if neighbours['truncated'].get(cat):
+            return None
+    return combined
+
+
 # --- 新增：从 b.py 移植的核心颜色决策函数 ---
 def get_color_decision_data(symbol: str, db_path: str, sector_data: dict) -> tuple[float | None, str | None, date | None]:
     """
@@ -677,9 +670,11 @@ class EarningsWindow(QMainWindow):
         # 如果还没有计算过，就动态计算并添加按钮
         layout = container.layout()
         if layout.count() == 0:
-            tg = find_tags_by_symbol_b(sym, json_data)
-            if tg:
-                rels = find_symbols_by_tags_b(tg, json_data, sym)
+            rels = load_related_b(sym, valid_symbols, RELATED_SYMBOLS_LIMIT)
+            if rels is None:
+                tg = find_tags_by_symbol_b(sym, json_data)
+                rels = find_symbols_by_tags_b(tg, json_data, sym) if tg else None
+            if rels:
                 cnt = 0
                 for r_sym, _ in rels:
                     if r_sym not in valid_symbols or cnt >= RELATED_SYMBOLS_LIMIT:
@@ -732,7 +727,7 @@ class EarningsWindow(QMainWindow):
 
     def on_keyword_selected_chart(self, sym):
         global symbol_manager
-        sector = next((s for s, lst in sector_data.items() if sym in lst), None)
+        sector = symbol_to_sector(SECTORS_ALL_PATH).get(sym)
         if sector:
             symbol_manager.set_current_symbol(sym)
             cmp = compare_data.get(sym, "N/A")
@@ -745,6 +740,9 @@ class EarningsWindow(QMainWindow):
             )
             
             self.setFocus()
+            # 后台预读上下相邻的 symbol，方向键切换时直接命中缓存
+            prefetch_adjacent(DB_PATH, symbol_manager.symbols, symbol_manager.current_index,
+                              symbol_to_sector(SECTORS_ALL_PATH).get)
 
     # --- 新增：处理图表传回的按键动作 ---
     def handle_chart_callback(self, current_symbol, action):
@@ -804,8 +802,8 @@ class EarningsWindow(QMainWindow):
 
 if __name__ == '__main__':
     # --- 移除了 keyword_colors 的加载 ---
-    json_data = load_json(DESCRIPTION_PATH)
-    sector_data = load_json(SECTORS_ALL_PATH)
+    json_data = load_json(DESCRIPTION_PATH, copy=False)
+    sector_data = load_json(SECTORS_ALL_PATH, copy=False)
     compare_data = load_text_data(COMPARE_DATA_PATH)
     wg = load_weight_groups()
     tags_weight_config = {tag: w for w, tags in wg.items() for tag in tags}
@@ -8,12 +8,17 @@ from PyQt6.QtGui import QFont, QShortcut, QKeySequence
 from PyQt6.QtCore import Qt
 from collections import defaultdict
 
+from Earning_History_Store import get_store as get_earning_history_store
+
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
 JSON_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Earning_History.json")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Finance.db")
 SECTOR_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Sectors_panel.json")
 
+EXCLUDED_GROUPS = ("_Tag_Blacklist",)
+
 WEEK52_LOW_SECTORS = {
     "Basic_Materials", "Real_Estate", "Energy", "Technology",
     "Consumer_Cyclical", "Utilities", "Consumer_Defensive",
@@ -63,19 +68,9 @@ def make_header(text, color):
     """
 
 
-def get_suffix_if_match(item_str, target_symbol):
-    if item_str == target_symbol:
-        return ""
-    if item_str.startswith(target_symbol):
-        suffix = item_str[len(target_symbol):]
-        if not any(c.isascii() and c.isalpha() for c in suffix):
-            return suffix
-    return None
-
-
 def load_earning_index(symbol):
     """
-    读取 Earning JSON,构建各类索引。
+    从 Earning_History_Store 读取该 symbol 的记录,构建各类索引。
     返回:
         category_data: dict[category] -> [(date, suffix), ...]
         date_categories: dict[date] -> set(categories)
@@ -87,34 +82,26 @@ def load_earning_index(symbol):
     if not os.path.exists(JSON_PATH):
         return None, None, None, None, None, f"错误：找不到 Earning 文件<br>{JSON_PATH}"
 
+    # 走 Earning_History_Store 的 symbol 索引，不再整体解析 JSON
     try:
-        with open(JSON_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        history = get_earning_history_store(DB_PATH, JSON_PATH)
+        matches = history.by_symbol(symbol, exclude_groups=EXCLUDED_GROUPS)
+        all_trading_dates = history.dates(exclude_groups=EXCLUDED_GROUPS)
     except Exception as e:
-        return None, None, None, None, None, f"读取 Earning JSON 出错: {e}"
+        return None, None, None, None, None, f"读取 Earning History 出错: {e}"
 
     category_data = defaultdict(list)
     date_categories = defaultdict(set)
     category_dates = defaultdict(set)
     date_items = defaultdict(list)
-    all_trading_dates = set()
 
-    for category, date_dict in data.items():
-        if category == "_Tag_Blacklist":
-            continue
-        for date_str, symbol_list in date_dict.items():
-            all_trading_dates.add(date_str)
-            if isinstance(symbol_list, list):
-                for item in symbol_list:
-                    suffix = get_suffix_if_match(item, symbol)
-                    if suffix is not None:
-                        category_data[category].append((date_str, suffix))
-                        date_categories[date_str].add(category)
-                        category_dates[category].add(date_str)
-                        date_items[date_str].append((category, suffix))
-                        break
+    for category, date_str, suffix in matches:
+        category_data[category].append((date_str, suffix))
+        date_categories[date_str].add(category)
+        category_dates[category].add(date_str)
+        date_items[date_str].append((category, suffix))
 
-    sorted_trading_dates = sorted(list(all_trading_dates), reverse=True)
+    sorted_trading_dates = sorted(all_trading_dates, reverse=True)
     return category_data, date_categories, category_dates, date_items, sorted_trading_dates, None
 
 
@@ -1,5 +1,4 @@
 import sys
-import json
 import os
 import sqlite3
 import re
@@ -35,6 +34,10 @@ except ImportError as e:
 # 外部绘图函数
 sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Query"))
 from Chart_input import plot_financial_data
+from Series_Cache import prefetch_adjacent
+from Earning_History_Store import get_store as get_earning_history_store
+from Tool_Host import launch as launch_in_tool_host
+from Modules_Cache import load_json as load_cached_json, load_text_pairs, symbol_to_sector
 
 # ----------------------------------------------------------------------
 # 常量 / 全局配置
@@ -145,8 +148,8 @@ def calculate_frequency_data(history_data, week52_low_symbols=None):
         if not date_map:
             continue
 
-        sorted_dates = sorted(date_map.keys(), reverse=True)
-        latest_date = sorted_dates[0]
+        # 只看每组最新一天（传入的可能是 Earning_History_Store.latest_by_group() 的精简视图）
+        latest_date = max(date_map)
         symbols = date_map[latest_date]
 
         for s in symbols:
@@ -206,7 +209,7 @@ def execute_external_script(script_type, keyword):
     try:
         if script_type in ['futu']:
             subprocess.Popen(['osascript', script_path, keyword])
-        else:
+        elif not launch_in_tool_host(script_path, [keyword]):
             subprocess.Popen([sys.executable, script_path, keyword])
     except Exception as e:
         print(f"执行脚本错误: {e}")
@@ -323,27 +326,22 @@ def parse_stock_file(path):
 def load_52week_low_symbols(path):
     """从 Sectors_panel.json 中读取指定板块下的 symbol，作为 52week_low 集合"""
     symbols = set()
-    data = load_json(path)
+    data = load_json(path, copy=False)
     for sector in WEEK52_LOW_SECTORS:
         for sym in data.get(sector, {}).keys():
             symbols.add(clean_ticker(sym).upper())
     return symbols
 
-def load_json(path):
-    if not os.path.exists(path): return {}
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file, object_pairs_hook=OrderedDict)
+def load_json(path, copy=True):
+    # 经 Modules_Cache：文件没变时不再重新解析；copy=False 返回共享对象，只能读不能改
+    return load_cached_json(path, ordered=True, copy=copy)
 
 def load_text_data(path):
     data = {}
-    if not os.path.exists(path): return data
-    with open(path, 'r', encoding='utf-8') as file:
-        for line in file:
-            line = line.strip()
-            if ':' in line:
-                key, value = map(str.strip, line.split(':', 1))
-                cleaned_key = key.split()[-1]
-                data[cleaned_key] = value.split(',')[0].strip() if ',' in value else value
+    for key, value in load_text_pairs(path, copy=False).items():
+        if not key: continue
+        cleaned_key = key.split()[-1]
+        data[cleaned_key] = value.split(',')[0].strip() if ',' in value else value
     return data
 
 def fetch_mnspp_data_from_db(db_path, symbol):
@@ -958,7 +956,7 @@ class HighLowWindow(QMainWindow):
         
         # --- 新增：获取财务数据 ---
         shares_val, marketcap, pe, pb = fetch_mnspp_data_from_db(DB_PATH, symbol)
-        sector = next((s for s, names in self.sector_data.items() if symbol in names), None)
+        sector = symbol_to_sector(SECTORS_ALL_PATH).get(symbol)
         
         try:
             # --- 修改：将获取到的真实数据传入 plot_financial_data ---
@@ -977,6 +975,11 @@ class HighLowWindow(QMainWindow):
                 window_title_text=pos_str  # <--- 这里传入了新的标题格式
             )
             self.setFocus()
+            # 后台预读上下相邻的 symbol，方向键切换时直接命中缓存
+            sm = self.symbol_manager
+            if 0 <= sm.current_index < len(sm.symbols) and sm.symbols[sm.current_index] == symbol:
+                prefetch_adjacent(DB_PATH, sm.symbols, sm.current_index,
+                                  symbol_to_sector(SECTORS_ALL_PATH).get)
         except Exception as e: print(f"绘图错误: {e}")
 
     def handle_chart_callback(self, action):
@@ -1007,15 +1010,24 @@ class HighLowWindow(QMainWindow):
 if __name__ == '__main__':
     try:
         hl = parse_high_low_file(HIGH_LOW_PATH)
-        colors = load_json(COLORS_PATH)
-        desc = load_json(DESCRIPTION_PATH)
-        sects = load_json(SECTORS_ALL_PATH)
+        colors = load_json(COLORS_PATH, copy=False)
+        desc = load_json(DESCRIPTION_PATH, copy=False)
+        sects = load_json(SECTORS_ALL_PATH, copy=False)
         comp = load_text_data(COMPARE_DATA_PATH)
         hl5y = parse_high_low_file(HIGH_LOW_5Y_PATH)
         vol = parse_volume_high_file(VOLUME_HIGH_PATH)
         etf = parse_etf_file(COMPARE_ETFS_PATH)
         stk = parse_stock_file(COMPARE_STOCK_PATH)
-        earn_hist = load_json(EARNING_HISTORY_PATH)
+        # 共振统计只需要每组最新一天，直接从 Earning_History_Store 取
+        try:
+            earn_hist = get_earning_history_store(DB_PATH, EARNING_HISTORY_PATH).latest_by_group()
+        except (sqlite3.Error, ValueError) as e:
+            print(f"读取 Earning_History 库失败，改读 JSON: {e}")
+            try:
+                earn_hist = load_json(EARNING_HISTORY_PATH)
+            except (OSError, ValueError) as e:
+                print(f"读取 {EARNING_HISTORY_PATH} 失败，不统计财报共振: {e}")
+                earn_hist = {}
         
         # --- 修改：10年新高数据路径判断逻辑 ---
         if os.path.exists(NEW_HIGH_10Y_PRIMARY_PATH):
@@ -7,6 +7,8 @@ import subprocess
 from datetime import datetime, timedelta
 from typing import Callable, Tuple, Optional
 import pandas_market_calendars as mcal
+from Bulk_Writer import BulkWriter
+from Modules_Cache import load_json, save_json, use_context
 
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
@@ -51,12 +53,14 @@ def insert_ratio(
     name2: str,
     result_name: str,
     op: Callable[[float, float], float] = lambda a, b: a / b,
-    digits: int = 2
+    digits: int = 2,
+    writer: Optional[BulkWriter] = None
 ) -> Tuple[int, Optional[int]]:
     """
     取 name1/name2 最新日期的数据，按 op(name1_price, name2_price) 计算结果，
     四舍五入到小数点后 digits 位，插入到 result_name。
     如果 result_name 在该日期的数据已存在，则跳过。
+    传了 writer 时只暂存到 BulkWriter，由调用方统一 commit（此时 lastrowid 为 None）。
     返回 (插入条数, lastrowid)。
     """
     # 1) 找最新日期
@@ -104,6 +108,10 @@ def insert_ratio(
     result = round(raw, digits)
 
     print(f"正在插入: '{result_name}' 在 {latest_date} 的数据，值为 {result}")
+    if writer is not None:
+        writer.add("Currencies", [(latest_date, result_name, result)],
+                   columns=("date", "name", "price"), on_conflict="ignore")
+        return 1, None
     cursor.execute(
         "INSERT INTO Currencies (date, name, price) VALUES (?, ?, ?)",
         (latest_date, result_name, result)
@@ -111,8 +119,9 @@ def insert_ratio(
     return cursor.rowcount, cursor.lastrowid
 
 def Insert_DB():
-    conn = sqlite3.connect(DB_PATH, timeout=60.0)
-    cursor = conn.cursor()
+    # 读最新价用同一个连接；结果先暂存，最后一个事务写入（WAL，不阻塞正在读库的 GUI）
+    writer = BulkWriter(DB_PATH)
+    cursor = writer.conn.cursor()
 
     try:
         # CNYI = DXY / USDCNY，保留 3 位小数
@@ -121,7 +130,8 @@ def Insert_DB():
             'DXY',
             'USDCNY',
             'CNYI',
-            digits=3
+            digits=3,
+            writer=writer
         )
         if cnt1 > 0:
             print(f"CNYI 插入: {cnt1} 条 (lastrowid={lid1})")
@@ -132,7 +142,8 @@ def Insert_DB():
             'DXY',
             'USDJPY',
             'JPYI',
-            digits=4
+            digits=4,
+            writer=writer
         )
         if cnt2 > 0:
             print(f"JPYI 插入: {cnt2} 条 (lastrowid={lid2})")
@@ -143,7 +154,8 @@ def Insert_DB():
             'DXY',
             'EURUSD',
             'EURI',
-            op=lambda a, b: a * b
+            op=lambda a, b: a * b,
+            writer=writer
         )
         if cnt3 > 0:
             print(f"EURI 插入: {cnt3} 条 (lastrowid={lid3})")
@@ -153,7 +165,8 @@ def Insert_DB():
             cursor,
             'DXY',
             'USDCHF',
-            'CHFI'
+            'CHFI',
+            writer=writer
         )
         if cnt4 > 0:
             print(f"CHFI 插入: {cnt4} 条 (lastrowid={lid4})")
@@ -164,38 +177,38 @@ def Insert_DB():
             'DXY',
             'GBPUSD',
             'GBPI',
-            op=lambda a, b: a * b
+            op=lambda a, b: a * b,
+            writer=writer
         )
         if cnt5 > 0:
             print(f"GBPI 插入: {cnt5} 条 (lastrowid={lid5})")
 
-        conn.commit()
+        stats = writer.commit()
+        if stats['failed']:
+            raise sqlite3.DatabaseError(f"写入 Currencies 失败: {stats['failed']['Currencies']}")
+        print(BulkWriter.describe(stats))
         print("\n数据库操作完成。")
 
     except ValueError as ve:
         print("数据准备失败：", ve)
-        conn.rollback()
         sys.exit(1)
     except sqlite3.IntegrityError as ie:
         # 这个错误现在不太可能因为重复数据而触发，但保留它是好习惯，以防其他约束问题
         print("插入失败，可能违反唯一性约束：", ie)
-        conn.rollback()
         sys.exit(1)
     except sqlite3.DatabaseError as de:
         print("数据库错误：", de)
-        conn.rollback()
         sys.exit(1)
     finally:
-        conn.close()
+        writer.close()
 
 def read_json(path):
-    """读取 JSON 文件并返回 Python 对象"""
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    """读取 JSON 文件并返回 Python 对象（经 Modules_Cache，流水线里读到的是上下文中的版本）"""
+    if not os.path.exists(path):
         print(f"错误：JSON 文件未找到 {path}")
         return {} # 返回空字典，避免后续出错
+    try:
+        return load_json(path)
     except json.JSONDecodeError:
         print(f"错误：JSON 文件格式错误 {path}")
         return {} # 返回空字典
@@ -203,8 +216,7 @@ def read_json(path):
 
 def write_json(path, data):
     """将 Python 对象写回 JSON，保持易读格式"""
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json(path, data, ensure_ascii=False, indent=2)
 
 def get_last_trading_day() -> str:
     """
@@ -280,7 +292,13 @@ def open_error_file():
         show_alert("所有数据都已成功入库，没有遗漏。")
 
 
-def main():
+def main(ctx=None):
+    """ctx: Nightly_Pipeline 传入的 JSON 上下文；单独运行时为 None，直接读写磁盘"""
+    with use_context(ctx):
+        check_yesterday()
+
+
+def check_yesterday():
     global yesterday  # 声明修改全局变量
 
     # 1. 设置参数解析
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Earning_History_Store.py
+Earning_History 的 SQLite 存储（与 Finance.db 放在一起）
+
+Earning_History.json 已经 1.2 MB / 6 万行，每次 update_earning_history_json 都要整体
+json.load 再 indent=4 整体写回；Check_Earning_history 查一只 symbol 也要整个解析一遍。
+这里改为每个条目一行 ("group", date, symbol, suffix, pos)：
+    - add(group, date, symbols)：只改动当天那一组，O(增量)；
+    - by_symbol(symbol)：走 symbol 索引；
+    - latest(group) / latest_by_group()：分组最近一天的列表（按主键索引取 MAX(date)）；
+    - to_dict(groups)：扫描脚本要读历史分组时直接从库里取，不再读 JSON；
+    - export_json()：导出成与原来完全相同结构的 Earning_History.json，
+      Panel / Show_Earning_History / App 端等仍读 JSON 的地方不用改。
+
+JSON 仍然是对外的格式：打开时如果发现 JSON 在上次导出之后被别处改过
+（手动编辑、从备份恢复等），先把 JSON 同步进库；JSON 损坏或写了一半时保留库里的数据。
+写入方只改库、不再各自导出整份 JSON：读 JSON 的地方（Panel、Show_Earning_History、
+Backup_Syncing）读之前调用 export_if_dirty()，Nightly_Pipeline 在 commit 阶段导出一次，
+所以一晚上不管几个扫描脚本写过，JSON 只重写一次。
+
+条目格式沿用原来的 "SYMBOL后缀"，例如 "AMZN追"、"NVDA抄底"：symbol 为开头的
+ASCII 部分，后缀为其余部分；pos 记录条目在当天列表里的位置，
+导出时按原顺序拼回（手动编辑留下的乱序、重复条目也原样保留）。
+
+用法:
+    python Earning_History_Store.py --import          # 从 JSON 全量导入
+    python Earning_History_Store.py --export [路径]   # 导出 JSON（强制）
+    python Earning_History_Store.py --symbol AMZN     # 查看某只 symbol 的记录
+    python Earning_History_Store.py --latest PE_Hot   # 查看某分组最近一天
+    python Earning_History_Store.py --check           # 校验导出结果与 JSON 是否一致
+    python Earning_History_Store.py --selfcheck       # 临时库里自检（含坏结构 JSON 被拒绝）
+"""
+
+import os
+import re
+import json
+import sqlite3
+import argparse
+
+from Modules_Cache import save_json
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Finance.db")
+EARNING_HISTORY_JSON = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Earning_History.json")
+
+HISTORY_TABLE = "Earning_History"
+META_TABLE = "Earning_History_Meta"
+
+_SYMBOL_RE = re.compile(r"[\x21-\x7e]*")
+
+
+def split_item(item):
+    """'AMZN追' -> ('AMZN', '追')"""
+    symbol = _SYMBOL_RE.match(item).group(0)
+    return symbol, item[len(symbol):]
+
+
+def suffix_if_match(item, target_symbol):
+    """条目是否属于 target_symbol（后缀里不能再有英文字母）：返回后缀，不匹配返回 None"""
+    if item == target_symbol:
+        return ""
+    if item.startswith(target_symbol):
+        suffix = item[len(target_symbol):]
+        if not any(c.isascii() and c.isalpha() for c in suffix):
+            return suffix
+    return None
+
+
+def _json_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+class EarningHistoryStore:
+
+    def __init__(self, db_path=DB_PATH, json_path=EARNING_HISTORY_JSON, sync=True):
+        self.db_path = db_path
+        self.json_path = json_path
+        self.conn = sqlite3.connect(db_path, timeout=60.0)
+        self._ensure_tables()
+        if sync:
+            self.sync_from_json()
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 表结构 / 元信息 ----------
+
+    def _ensure_tables(self):
+        with self.conn:
+            self.conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS "{HISTORY_TABLE}" (
+                    "group" TEXT NOT NULL,
+                    date    TEXT NOT NULL,
+                    symbol  TEXT NOT NULL,
+                    suffix  TEXT NOT NULL DEFAULT '',
+                    pos     INTEGER NOT NULL,
+                    PRIMARY KEY ("group", date, pos)
+                ) WITHOUT ROWID
+            ''')
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{HISTORY_TABLE}_symbol ON "{HISTORY_TABLE}" (symbol)'
+            )
+            # dates() 只需扫日期索引
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{HISTORY_TABLE}_date ON "{HISTORY_TABLE}" (date)'
+            )
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{META_TABLE}" (key TEXT PRIMARY KEY, value TEXT)'
+            )
+
+    def _get_meta(self, key, default=None):
+        row = self.conn.execute(f'SELECT value FROM "{META_TABLE}" WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            f'INSERT INTO "{META_TABLE}" (key, value) VALUES (?, ?) '
+            f'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, value)
+        )
+
+    def groups(self):
+        """分组顺序与 JSON 中的 key 顺序一致（新分组追加在最后）"""
+        return json.loads(self._get_meta("group_order", "[]"))
+
+    def _touch_group(self, group):
+        order = self.groups()
+        if group not in order:
+            order.append(group)
+            self._set_meta("group_order", json.dumps(order, ensure_ascii=False))
+
+    @property
+    def dirty(self):
+        return self._get_meta("dirty", "0") == "1"
+
+    # ---------- 与 JSON 同步 ----------
+
+    def sync_from_json(self):
+        """JSON 在上次导出之后被改过（或库里还没有数据）时导入；返回是否导入"""
+        stat = _json_stat(self.json_path)
+        if stat is None or stat == self._get_meta("json_stat"):
+            return False
+        if self.dirty:
+            # 库里还有没导出的新增，同时 JSON 也被外部改过：两边合并，不丢任何一边
+            print(f"⚠️ {os.path.basename(self.json_path)} 已被外部修改且库中有未导出的记录，按并集合并。")
+            self.import_json(replace=False)
+        else:
+            self.import_json(replace=True)
+        return True
+
+    def import_json(self, path=None, replace=True):
+        """
+        JSON -> 库，返回导入的条目数。
+        结构不是 {group: {date: [items]}} 时抛 ValueError，整个导入回滚、库保持原样：
+        跳过坏掉的分组会让下一次 export_json 把这个分组写成空的，等于悄悄删掉了它的记录。
+        """
+        path = path or self.json_path
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self.conn:
+            if replace:
+                self.conn.execute(f'DELETE FROM "{HISTORY_TABLE}"')
+                order = []
+            else:
+                order = self.groups()
+            rows = []
+            for group, date_dict in data.items():
+                if group not in order:
+                    order.append(group)
+                if not isinstance(date_dict, dict):
+                    raise ValueError(f"{os.path.basename(path)}: 分组 {group} 应为 {{日期: [条目]}}，"
+                                     f"实际是 {type(date_dict).__name__}")
+                for date_str, items in date_dict.items():
+                    if not isinstance(items, list):
+                        raise ValueError(f"{os.path.basename(path)}: {group} / {date_str} 应为条目列表，"
+                                         f"实际是 {type(items).__name__}")
+                    if not replace:
+                        existing = self._items(group, date_str)
+                        seen = set(existing)
+                        items = existing + [x for x in items if x not in seen]
+                        self.conn.execute(
+                            f'DELETE FROM "{HISTORY_TABLE}" WHERE "group" = ? AND date = ?', (group, date_str)
+                        )
+                    for pos, item in enumerate(items):
+                        rows.append((group, date_str, *split_item(item), pos))
+            self.conn.executemany(
+                f'INSERT INTO "{HISTORY_TABLE}" ("group", date, symbol, suffix, pos) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            self._set_meta("group_order", json.dumps(order, ensure_ascii=False))
+            if path == self.json_path:
+                self._set_meta("json_stat", _json_stat(path))
+            # 合并导入后库比 JSON 新，需要再导出一次
+            self._set_meta("dirty", "0" if replace and path == self.json_path else "1")
+        return len(rows)
+
+    def to_dict(self, groups=None):
+        """与 Earning_History.json 相同的 {group: {date: [items]}} 结构；groups 不为空时只取这些分组"""
+        if groups is None:
+            data = {group: {} for group in self.groups()}
+            where, params = "", ()
+        else:
+            data = {group: {} for group in self.groups() if group in groups}
+            where = f'WHERE "group" IN ({",".join("?" * len(groups))})'
+            params = tuple(groups)
+        cur = self.conn.execute(
+            f'SELECT "group", date, symbol || suffix FROM "{HISTORY_TABLE}" {where} '
+            f'ORDER BY "group", date, pos', params
+        )
+        for group, date_str, item in cur:
+            data.setdefault(group, {}).setdefault(date_str, []).append(item)
+        return data
+
+    def export_json(self, path=None, force=False):
+        """
+        导出 JSON（经 Modules_Cache.save_json：临时文件 + os.replace）；没有未导出的改动时跳过，返回是否写出。
+        在 Nightly_Pipeline 的上下文里只交给上下文，磁盘没变，dirty 保持为 1，
+        由流水线 commit 之后再导出一次更新 json_stat。
+        """
+        path = path or self.json_path
+        is_main = path == self.json_path
+        if is_main and not force and not self.dirty and _json_stat(path) == self._get_meta("json_stat"):
+            return False
+        on_disk = save_json(path, self.to_dict(), indent=4, ensure_ascii=False)
+        if is_main and on_disk:
+            with self.conn:
+                self._set_meta("json_stat", _json_stat(path))
+                self._set_meta("dirty", "0")
+        return True
+
+    # ---------- 读写 API ----------
+
+    def _items(self, group, date_str):
+        cur = self.conn.execute(
+            f'SELECT symbol || suffix FROM "{HISTORY_TABLE}" WHERE "group" = ? AND date = ? ORDER BY pos',
+            (group, date_str)
+        )
+        return [r[0] for r in cur]
+
+    def get(self, group, date_str):
+        return self._items(group, date_str)
+
+    def _write_day(self, group, date_str, items):
+        self.conn.execute(f'DELETE FROM "{HISTORY_TABLE}" WHERE "group" = ? AND date = ?', (group, date_str))
+        self.conn.executemany(
+            f'INSERT INTO "{HISTORY_TABLE}" ("group", date, symbol, suffix, pos) VALUES (?, ?, ?, ?, ?)',
+            [(group, date_str, *split_item(item), pos) for pos, item in enumerate(items)]
+        )
+        self._touch_group(group)
+        self._set_meta("dirty", "1")
+
+    def add(self, group, date_str, symbols):
+        """
+        与原 update_earning_history_json 相同：当天已有列表与新列表取并集后排序。
+        返回 (新增个数, 当天总数)。
+        """
+        with self.conn:
+            existing = self._items(group, date_str)
+            updated = sorted(set(existing) | set(symbols))
+            if updated and updated != existing:
+                self._write_day(group, date_str, updated)
+        return len(updated) - len(existing), len(updated)
+
+    def replace(self, group, date_str, symbols):
+        """整体覆盖某分组某一天的列表（Analyse_Earning_Support 的写法）"""
+        with self.conn:
+            self._write_day(group, date_str, list(symbols))
+
+    def latest(self, group):
+        """(最近日期, [items])；分组不存在时返回 (None, [])"""
+        row = self.conn.execute(
+            f'SELECT MAX(date) FROM "{HISTORY_TABLE}" WHERE "group" = ?', (group,)
+        ).fetchone()
+        if not row or row[0] is None:
+            return None, []
+        return row[0], self._items(group, row[0])
+
+    def latest_dates(self):
+        """{group: 最近日期}；主键 ("group", date, pos) 上每组取 MAX(date) 只需一次索引定位"""
+        cur = self.conn.execute(f'SELECT "group", MAX(date) FROM "{HISTORY_TABLE}" GROUP BY "group"')
+        return dict(cur.fetchall())
+
+    def latest_by_group(self, exclude_groups=()):
+        """
+        {group: {最近日期: [items]}}，即 JSON 里每个分组只保留最新一天；
+        Check_HighLow 的共振统计只看各组最新一天，不用整份 JSON。
+        """
+        latest = self.latest_dates()
+        data = {}
+        for group in self.groups():
+            if group in exclude_groups or group not in latest:
+                continue
+            data[group] = {latest[group]: self._items(group, latest[group])}
+        return data
+
+    def by_symbol(self, symbol, exclude_groups=()):
+        """
+        [(group, date, suffix)]，按 JSON 中的分组顺序、日期升序；
+        匹配规则与原来逐条扫描 JSON 时一致（同一天同一分组只取列表里第一个匹配项）。
+        """
+        # 条目以 symbol 开头 -> 解析出的 symbol 列一定在 [symbol, symbol + '\x7f') 之间，可以走索引
+        cur = self.conn.execute(
+            f'SELECT "group", date, symbol || suffix, pos FROM "{HISTORY_TABLE}" '
+            f'WHERE symbol >= ? AND symbol < ?',
+            (symbol, symbol + "\x7f")
+        )
+        best = {}
+        for group, date_str, item, pos in cur:
+            if group in exclude_groups:
+                continue
+            suffix = suffix_if_match(item, symbol)
+            if suffix is None:
+                continue
+            key = (group, date_str)
+            if key not in best or pos < best[key][0]:
+                best[key] = (pos, suffix)
+        order = {g: i for i, g in enumerate(self.groups())}
+        return [(g, d, best[(g, d)][1])
+                for g, d in sorted(best, key=lambda k: (order.get(k[0], len(order)), k[0], k[1]))]
+
+    def dates(self, exclude_groups=()):
+        """所有出现过的日期（升序）"""
+        placeholders = ",".join("?" * len(exclude_groups))
+        where = f'WHERE "group" NOT IN ({placeholders})' if exclude_groups else ""
+        cur = self.conn.execute(
+            f'SELECT DISTINCT date FROM "{HISTORY_TABLE}" {where} ORDER BY date', tuple(exclude_groups)
+        )
+        return [r[0] for r in cur]
+
+
+_STORES = {}
+
+
+def get_store(db_path=DB_PATH, json_path=EARNING_HISTORY_JSON):
+    """
+    进程内按 (db, json) 复用同一个 store。
+    每次调用都检查一次 JSON（sync_from_json 按 mtime/size 判断，没变时只是一次 stat），
+    常驻进程里 JSON 被其他脚本改写后也能读到新内容。
+    JSON 损坏 / 写了一半时（json.JSONDecodeError、结构不对的 ValueError）不导入，
+    沿用库里的数据继续跑（原来读 JSON 失败时按空 dict 处理，库里的数据比空 dict 完整）。
+    """
+    key = (db_path, os.path.abspath(json_path))
+    store = _STORES.get(key)
+    if store is None:
+        store = _STORES[key] = EarningHistoryStore(db_path, json_path, sync=False)
+    try:
+        store.sync_from_json()
+    except ValueError as e:
+        print(f"⚠️ {os.path.basename(json_path)} 无法导入，沿用库里的记录: {e}")
+    return store
+
+
+def export_if_dirty(db_path=DB_PATH, json_path=EARNING_HISTORY_JSON):
+    """库里有没导出的改动时导出 JSON（读 JSON 之前调用）；返回是否写出"""
+    try:
+        return get_store(db_path, json_path).export_json()
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ 导出 Earning_History 失败: {e}")
+        return False
+
+
+def selfcheck():
+    """用 Test/Earning_History_test.json 在临时库里自检导入 / 导出、坏结构的 JSON 会被拒绝、损坏的 JSON 不影响 get_store、
+    JSON 被外部改写后 get_store 会重新导入"""
+    import tempfile
+    ok = True
+
+    def expect(cond, msg):
+        nonlocal ok
+        if not cond:
+            print(f"❌ {msg}")
+            ok = False
+
+    fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Test", "Earning_History_test.json")
+    with open(fixture, 'r', encoding='utf-8') as f:
+        original = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "Earning_History.json")
+        store = EarningHistoryStore(os.path.join(tmp, "test.db"), json_path, sync=False)
+
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(original, f, indent=4, ensure_ascii=False)
+        n = store.import_json()
+        expect(n > 0 and store.to_dict() == original, "导入后导出应与原 JSON 一致")
+
+        bad_cases = {
+            "分组不是 dict": dict(original, Broken=["AAPL"]),
+            "日期下不是列表": dict(original, Broken={"2026-01-02": "AAPL"}),
+        }
+        for name, data in bad_cases.items():
+            bad_path = os.path.join(tmp, "bad.json")
+            with open(bad_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            try:
+                store.import_json(bad_path)
+                expect(False, f"{name}: 应抛 ValueError")
+            except ValueError:
+                pass
+            expect(store.to_dict() == original, f"{name}: 导入失败后库应保持原样")
+            expect("Broken" not in store.groups(), f"{name}: 分组顺序不应记下坏分组")
+
+        some = list(original)[:2]
+        expect(store.to_dict(some) == {g: original[g] for g in some}, "to_dict(groups) 应只含指定分组")
+        store.export_json(force=True)
+        store.close()
+
+        # JSON 写了一半：get_store 不导入，沿用库里的记录，也不抛异常
+        db_path = os.path.join(tmp, "test.db")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            f.write('{"PE_Hot": {"2026-01-02": ["AA')
+        shared = get_store(db_path, json_path)
+        try:
+            expect(shared.to_dict() == original, "JSON 损坏时 get_store 应沿用库里的记录")
+            date_str = "2099-01-01"
+            shared.add("PE_Hot", date_str, ["ZZZZ"])
+            expect(export_if_dirty(db_path, json_path), "有新增时 export_if_dirty 应导出")
+            expect(not export_if_dirty(db_path, json_path), "没有新改动时 export_if_dirty 应跳过")
+            with open(json_path, 'r', encoding='utf-8') as f:
+                expect(json.load(f)["PE_Hot"].get(date_str) == ["ZZZZ"], "导出的 JSON 应含新增记录")
+            # 其他脚本改写 JSON 后，再次 get_store 应导入新内容
+            with open(json_path, 'r', encoding='utf-8') as f:
+                edited = json.load(f)
+            edited["PE_Hot"]["2099-01-02"] = ["YYYY"]
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(edited, f, indent=4, ensure_ascii=False)
+            expect(get_store(db_path, json_path).to_dict() == edited, "JSON 被外部改写后 get_store 应重新导入")
+        finally:
+            _STORES.pop((db_path, os.path.abspath(json_path)), None)
+            shared.close()
+
+    print("✅ 自检通过" if ok else "❌ 自检失败")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Earning_History 存储")
+    parser.add_argument('--db', default=DB_PATH, help="数据库路径")
+    parser.add_argument('--json', default=EARNING_HISTORY_JSON, help="Earning_History.json 路径")
+    parser.add_argument('--import', dest='do_import', action='store_true', help="从 JSON 全量导入")
+    parser.add_argument('--export', nargs='?', const='', default=None, help="导出 JSON（默认写回 --json）")
+    parser.add_argument('--symbol', help="查看某只 symbol 的记录")
+    parser.add_argument('--latest', help="查看某分组最近一天")
+    parser.add_argument('--check', action='store_true', help="校验库中数据导出后与 JSON 是否一致")
+    parser.add_argument('--selfcheck', action='store_true', help="在临时库里自检导入 / 导出")
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        raise SystemExit(0 if selfcheck() else 1)
+
+    store = EarningHistoryStore(args.db, args.json, sync=not args.do_import)
+    try:
+        if args.do_import:
+            n = store.import_json()
+            print(f"已导入 {n} 条记录，{len(store.groups())} 个分组。")
+        if args.export is not None:
+            path = args.export or args.json
+            store.export_json(path, force=True)
+            print(f"已导出: {path}")
+        if args.symbol:
+            for group, date_str, suffix in store.by_symbol(args.symbol):
+                print(f"{date_str}  {group:<20} {suffix}")
+        if args.latest:
+            date_str, items = store.latest(args.latest)
+            print(f"{args.latest} {date_str}: {items}")
+        if args.check:
+            with open(args.json, 'r', encoding='utf-8') as f:
+                original = json.load(f)
+            exported = store.to_dict()
+            if json.dumps(original, ensure_ascii=False) == json.dumps(exported, ensure_ascii=False):
+                print("✅ 导出结果与 JSON 完全一致")
+            else:
+                for group in sorted(set(original) | set(exported)):
+                    if original.get(group) != exported.get(group):
+                        print(f"❌ 分组不一致: {group}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
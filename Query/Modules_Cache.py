@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modules_Cache.py
+Modules/*.json 与 Compare_All.txt 等配置文件的共享缓存（按 路径 + mtime + size 校验）
+
+description.json、Sectors_All.json、Sectors_panel.json、Colors.json、tags_weight.json、
+Compare_All.txt 几乎每个脚本都要读：各自的 load_json / lazy_load_data / load_sectors_data /
+load_symbol_tags / load_compare_data，一次运行里还经常重复读几遍；
+查某只 symbol 属于哪个 sector 也是 next(s for s, names in sector_data.items() if symbol in names)
+的线性扫描。
+
+这里统一改为：
+    - 第一次读某个文件时解析一次，结果（连同派生视图）pickle 到 Modules/modules_cache/（已在 .gitignore 中），
+      以文件的 (mtime_ns, size) 为版本；冷启动的 GUI 直接 pickle.load，不再解析多 MB 的 JSON；
+    - 同一进程内（尤其是常驻的 Tool_Host）再读直接从内存返回；
+    - 派生视图：symbol -> sector、symbol -> tags、symbol -> compare 字符串，都是 dict 查找。
+
+load_json 默认返回一份独立的拷贝（从缓存的 pickle 字节反序列化），调用方可以随意修改后写回；
+只读的大文件（description.json）可以传 copy=False 拿共享对象。派生视图都是共享对象，只读。
+写回用 save_json（临时文件 + os.replace）。
+
+流水线上下文：Nightly_Pipeline 把 JsonContext 显式传给各阶段的 main(ctx)，阶段在
+with use_context(ctx): 里运行。期间受管的 Modules/*.json 都从上下文读文本、save_json 只写进上下文，
+commit 阶段统一写回；阶段脚本和它调用的辅助模块（Earning_History_Store 等）只要经过这里读写，
+看到的就是同一份流水线视图。上下文里的文件按文本内容做版本，不落 pickle 快照。
+
+用法:
+    from Modules_Cache import load_json, save_json, symbol_to_sector, symbol_to_tags, symbol_to_compare
+    desc = load_json(DESCRIPTION_PATH, copy=False)
+    sector = symbol_to_sector(SECTORS_ALL_PATH).get("AAPL")
+    tags = symbol_to_tags(DESCRIPTION_PATH).get("AAPL", [])
+    compare = symbol_to_compare(COMPARE_ALL_PATH).get("AAPL", "")
+    save_json(PANEL_PATH, panel, indent=4, ensure_ascii=False)
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+MODULES_DIR = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules")
+CACHE_DIR = os.path.join(MODULES_DIR, "modules_cache")
+
+CACHE_VERSION = 1
+
+
+# =========================================================
+# 解析器：kind -> (文件文本 -> 对象)
+# =========================================================
+
+def _parse_json(text):
+    return json.loads(text)
+
+
+def _parse_json_ordered(text):
+    return json.loads(text, object_pairs_hook=OrderedDict)
+
+
+def _parse_text_pairs(text):
+    """'key: value' 每行一条，按第一个冒号切开，两边去空白；没有冒号的行跳过"""
+    data = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        data[key.strip()] = value.strip()
+    return data
+
+
+def _parse_symbol_sector(text):
+    """Sectors_*.json: {sector: [symbol]} -> {symbol: 第一个包含它的 sector}"""
+    mapping = {}
+    for sector, names in _parse_json(text).items():
+        for name in names:
+            mapping.setdefault(name, sector)
+    return mapping
+
+
+def _parse_symbol_tags(text):
+    """description.json -> {'stocks': {symbol: tags}, 'etfs': {symbol: tags}}（同一分组里后出现的覆盖前面的）"""
+    data = _parse_json(text)
+    views = {}
+    for category in ('stocks', 'etfs'):
+        mapping = {}
+        for item in data.get(category, []):
+            symbol = item.get('symbol')
+            if symbol:
+                mapping[symbol] = item.get('tag', [])
+        views[category] = mapping
+    return views
+
+
+_PARSERS = {
+    "json": _parse_json,
+    "json_ordered": _parse_json_ordered,
+    "text_pairs": _parse_text_pairs,
+    "symbol_sector": _parse_symbol_sector,
+    "symbol_tags": _parse_symbol_tags,
+}
+
+
+# =========================================================
+# 缓存
+# =========================================================
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _cache_file(path, kind):
+    digest = hashlib.md5(path.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(CACHE_DIR, f"{os.path.basename(path)}.{kind}.{digest}.pkl")
+
+
+_MEMORY = {}    # (abspath, kind) -> (stamp, 对象, pickle 字节)
+_LOCK = threading.Lock()
+_CONTEXT = None  # 当前的流水线上下文（use_context 设置）
+
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _managed(path):
+    """当前上下文管理这个文件时返回 (上下文, 上下文里的路径)，否则 (None, None)"""
+    ctx = _CONTEXT
+    if ctx is None:
+        return None, None
+    managed = ctx.managed(path)
+    return (ctx, managed) if managed else (None, None)
+
+
+def _load_disk(cache_file, path, stamp):
+    try:
+        with open(cache_file, 'rb') as f:
+            version, source, cached_stamp, blob = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION or source != path or tuple(cached_stamp) != stamp:
+        return None
+    return blob
+
+
+def _save_disk(cache_file, path, stamp, blob):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((CACHE_VERSION, path, stamp, blob), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        print(f"[Modules_Cache] 写缓存失败 {cache_file}: {e}")
+
+
+def _entry(path, kind):
+    """返回 (共享对象, pickle 字节)；文件不存在时抛 FileNotFoundError"""
+    path = os.path.abspath(path)
+    key = (path, kind)
+    ctx, managed = _managed(path)
+    text = None
+    if ctx is not None:
+        # 上下文里的文本可能还没写回磁盘：按内容做版本（同一 worker 里前后几个阶段拿到同样的文本时照样命中）
+        text = ctx.read_text(managed)
+        if text is None:
+            raise FileNotFoundError(path)
+        stamp = ("ctx", len(text), hash(text))
+    else:
+        stamp = _stamp(path)
+    with _LOCK:
+        cached = _MEMORY.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+
+    cache_file = _cache_file(path, kind)
+    blob = _load_disk(cache_file, path, stamp) if ctx is None else None
+    if blob is not None:
+        obj = pickle.loads(blob)
+    else:
+        obj = _PARSERS[kind](_read_text(path) if text is None else text)
+        blob = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        # 解析期间文件又被改写时不落盘，下次按新版本重新解析
+        if ctx is None and _stamp(path) == stamp:
+            _save_disk(cache_file, path, stamp, blob)
+    with _LOCK:
+        _MEMORY[key] = (stamp, obj, blob)
+    return obj, blob
+
+
+def _get(path, kind, copy, default):
+    try:
+        obj, blob = _entry(path, kind)
+    except FileNotFoundError:
+        return default
+    return pickle.loads(blob) if copy else obj
+
+
+def clear():
+    """清空进程内缓存（磁盘上的快照按版本自动失效，不用删）"""
+    with _LOCK:
+        _MEMORY.clear()
+
+
+@contextlib.contextmanager
+def use_context(ctx):
+    """
+    with 块内 load_json / save_json 等经过 ctx（Nightly_Pipeline.JsonContext）读写受管的 JSON；
+    ctx 为 None 时照常读写磁盘。退出时恢复原来的上下文。
+    """
+    global _CONTEXT
+    previous = _CONTEXT
+    _CONTEXT = ctx
+    try:
+        yield ctx
+    finally:
+        _CONTEXT = previous
+
+
+# =========================================================
+# 对外接口
+# =========================================================
+
+_RAISE = object()
+
+
+def load_json(path, ordered=False, copy=True, default=_RAISE):
+    """
+    解析后的 JSON；ordered=True 时与 object_pairs_hook=OrderedDict 相同。
+    文件不存在时与 open() 一样抛 FileNotFoundError，传了 default 则返回 default；
+    JSON 格式错误照常抛 json.JSONDecodeError。
+    """
+    kind = "json_ordered" if ordered else "json"
+    if default is _RAISE:
+        obj, blob = _entry(path, kind)
+        return pickle.loads(blob) if copy else obj
+    return _get(path, kind, copy, default)
+
+
+def save_json(path, data, **dump_kwargs):
+    """
+    写 JSON（dump_kwargs 原样交给 json.dumps，如 indent=4, ensure_ascii=False）。
+    当前上下文管理这个文件时只交给上下文、由流水线 commit 统一写回，返回 False；
+    否则临时文件 + os.replace 写盘，返回 True。
+    """
+    text = json.dumps(data, **dump_kwargs)
+    ctx, managed = _managed(os.path.abspath(path))
+    if ctx is not None:
+        ctx.put(managed, text)
+        return False
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_text_pairs(path, copy=True):
+    """'key: value' 文本文件 -> {key: value}；文件不存在返回空 dict"""
+    return _get(path, "text_pairs", copy, {})
+
+
+def symbol_to_sector(path):
+    """Sectors_All.json 等 -> {symbol: sector}（只读）"""
+    return _get(path, "symbol_sector", False, {})
+
+
+def symbol_to_tags(path, category='stocks'):
+    """description.json -> {symbol: tags}，category 为 'stocks' 或 'etfs'（只读）"""
+    return _get(path, "symbol_tags", False, {}).get(category, {})
+
+
+def symbol_to_compare(path):
+    """Compare_All.txt -> {symbol: compare 字符串}（只读）"""
+    return _get(path, "text_pairs", False, {})
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nightly_Pipeline.py
+每晚收盘后数据流水线的统一调度（DAG）
+
+原来每晚是按顺序手动/各自定时跑一串独立脚本：
+    Tiger_Today -> Check_yesterday -> Analyse_Compare -> Analyse_Earning_* -> Analyse_Short
+    -> Analyse_Options -> Backup_Syncing
+每个脚本都要重新读一遍 Sectors_All / Sectors_panel / description / Earning_History，
+改完立刻写回；中途某一步失败只能从头再来。
+
+这里改为：
+    1. STAGES 里声明每个阶段的脚本与依赖，没有依赖关系的阶段（如 ETF 成交量扫描与
+       财报季扫描）放到 ProcessPoolExecutor 里并发执行；每个 worker 只跑一个阶段就退出
+       （max_tasks_per_child=1），PriceStore、Earning_History 的 _STORES 等模块级单例不会带到下一个阶段；
+       阶段自己不再开嵌套进程池（CACHE_WORKERS 固定为 1）；
+    2. 各阶段脚本提供 main(ctx)，流水线导入脚本后把 JsonContext 显式传进去；脚本在
+       Modules_Cache.use_context(ctx) 里经 load_json / save_json 读写，连同它调用的辅助模块，
+       Modules/*.json 的读写都落在流水线的内存上下文里（并暂存到 staging 目录），
+       只在 commit 阶段一次性原子写回 Modules；派发阶段时带上已经读过的文本，后面的阶段不再重读磁盘；
+    3. 并发阶段改了同一个 JSON（例如都往 Sectors_panel 里写分组）时按 key 做三方合并；
+       Earning_History 以库为准，扫描阶段只写库、从库里读，commit 阶段整份导出一次；
+    4. 每个阶段单独计时，stdout/stderr 写到 logs/<阶段名>.log；
+    5. 状态记录在 state.json，某个阶段失败后修好再用 --resume 从失败处继续，
+       已完成阶段的 JSON 改动保留在 staging 里不会丢。
+
+用法:
+    python Nightly_Pipeline.py                 # 跑完整流水线
+    python Nightly_Pipeline.py --resume        # 从上次失败的阶段继续
+    python Nightly_Pipeline.py --list          # 只打印 DAG
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import traceback
+import contextlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from Modules_Cache import use_context
+from Earning_History_Store import export_if_dirty as export_earning_history, EARNING_HISTORY_JSON
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+FINANCIAL_SYSTEM_DIR = os.path.join(BASE_CODING_DIR, "Financial_System")
+MODULES_DIR = os.path.join(FINANCIAL_SYSTEM_DIR, "Modules")
+PIPELINE_DIR = os.path.join(USER_HOME, "Downloads", "Nightly_Pipeline")
+STATE_FILE = os.path.join(PIPELINE_DIR, "state.json")
+STAGING_DIR = os.path.join(PIPELINE_DIR, "staging")
+LOG_DIR = os.path.join(PIPELINE_DIR, "logs")
+
+COMMIT = "commit"
+
+# name: 阶段名；script: 脚本路径（commit 为 None）；args: 命令行参数；
+# deps: 依赖的阶段；condition: 在主进程里判断是否需要执行的函数 (ctx -> bool)，None 表示总是执行
+Stage = namedtuple("Stage", ["name", "script", "args", "deps", "condition"])
+
+
+def _script(*parts):
+    return os.path.join(FINANCIAL_SYSTEM_DIR, *parts)
+
+
+def _sectors_empty_cleared(ctx):
+    """与 Tiger_Today.run_check_yesterday_if_empty 一致：Sectors_empty.json 清空后才跑 Check_yesterday"""
+    text = ctx.read_text(os.path.join(MODULES_DIR, "Sectors_empty.json"))
+    try:
+        tasks = json.loads(text) if text else {}
+    except json.JSONDecodeError:
+        return False
+    return not any(len(symbols) > 0 for symbols in tasks.values())
+
+
+_SCANS = ["earning_no_season", "earning_season", "earning_volume", "etf_volume"]
+
+STAGES = [
+    Stage("tiger_today",       _script("Selenium", "Tiger_Today.py"),              [], [], None),
+    Stage("check_yesterday",   _script("Query", "Check_yesterday.py"),             ["--ignore_sectors"],
+          ["tiger_today"], _sectors_empty_cleared),
+    Stage("compare",           _script("Query", "Analyse_Compare.py"),             [], ["check_yesterday"], None),
+    Stage("earning_no_season", _script("Query", "Analyse_Earning_no_Season.py"),   [], ["compare"], None),
+    Stage("earning_season",    _script("Query", "Analyse_Earning_Season.py"),      [], ["compare"], None),
+    Stage("earning_volume",    _script("Query", "Analyse_Earning_Volume.py"),      [], ["compare"], None),
+    Stage("etf_volume",        _script("Query", "Analyse_ETF_Volume.py"),          [], ["compare"], None),
+    Stage("short",             _script("Query", "Analyse_Short.py"),               [], _SCANS, None),
+    Stage("options",           _script("Query", "Analyse_Options.py"),             [], ["check_yesterday"], None),
+    Stage(COMMIT,              None,                                               [], ["short", "options"], None),
+    # 备份要拿到已经写回的 JSON，所以排在 commit 之后
+    Stage("backup_syncing",    _script("Operations", "Backup_Syncing.py"),         [], [COMMIT], None),
+]
+
+# ---------- JSON 上下文 ----------
+
+_MISSING = object()
+
+
+class JsonContext:
+    """
+    Modules 目录下 *.json 的内存视图（Modules_Cache.load_json / save_json 经 use_context 读写这里）。
+    - 读：第一次从磁盘读入文本，之后都从内存返回；
+    - 写：只改内存并记为 dirty，commit() 时一次性原子写回。
+    staged: 上次未提交的改动（记为 dirty）；known: 主进程里已经读到的文本（不算改动）。
+    """
+
+    def __init__(self, root=MODULES_DIR, staged=None, known=None):
+        self.root = os.path.realpath(root)
+        self._texts = dict(known or {})   # 绝对路径 -> 文本，None 表示磁盘上不存在
+        self._loaded = set()               # 本上下文从磁盘读入的路径
+        self._dirty = set()
+        self.versions = {}   # 绝对路径 -> 写入次数，用于判断并发阶段之间是否有冲突
+        self._history = {}   # (路径, 版本) -> 文本，三方合并时找共同祖先
+        for path, text in (staged or {}).items():
+            self.put(path, text)
+
+    def managed(self, file):
+        if not isinstance(file, (str, os.PathLike)):
+            return None
+        path = os.path.realpath(os.fspath(file))
+        if os.path.dirname(path) == self.root and path.endswith(".json"):
+            return path
+        return None
+
+    def read_text(self, path):
+        path = os.path.realpath(path)
+        if path not in self._texts:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._texts[path] = f.read()
+            except FileNotFoundError:
+                self._texts[path] = None
+            self._loaded.add(path)
+        return self._texts[path]
+
+    def text_at(self, path, version):
+        if version == 0:
+            # 版本 0 即磁盘上的原始内容（commit 之前磁盘不会变）
+            text = self._history.get((path, 0), _MISSING)
+            if text is _MISSING:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        text = f.read()
+                except FileNotFoundError:
+                    text = None
+            return text
+        return self._history.get((path, version))
+
+    def put(self, path, text):
+        path = os.path.realpath(path)
+        if (path, 0) not in self._history and path in self._texts and path not in self._dirty:
+            self._history[(path, 0)] = self._texts[path]
+        version = self.versions.get(path, 0) + 1
+        self.versions[path] = version
+        self._history[(path, version)] = text
+        self._texts[path] = text
+        self._dirty.add(path)
+
+    def dirty_texts(self):
+        return {path: self._texts[path] for path in self._dirty}
+
+    def snapshot(self):
+        """当前全部文本（派发阶段时作为 known 传给 worker）"""
+        return dict(self._texts)
+
+    def loaded_texts(self):
+        """本上下文从磁盘读入的原始文本（阶段结束后交给主进程的 learn）"""
+        return {path: self._history.get((path, 0), self._texts[path]) for path in self._loaded}
+
+    def learn(self, texts):
+        """记下阶段从磁盘读到的文本；已有的（包括改过的）不覆盖"""
+        for path, text in texts.items():
+            self._texts.setdefault(path, text)
+
+    def merge(self, written, base_versions):
+        """
+        合并一个阶段写回的 {路径: 文本}；base_versions 为派发该阶段时的 versions 快照。
+        期间没有别的阶段改过同一文件就直接覆盖，否则按 JSON key 三方合并。
+        返回冲突的 key 路径列表。
+        """
+        conflicts = []
+        for path, text in written.items():
+            base_version = base_versions.get(path, 0)
+            if self.versions.get(path, 0) == base_version:
+                self.put(path, text)
+                continue
+            try:
+                base = json.loads(self.text_at(path, base_version) or "null")
+                ours = json.loads(self._texts[path] or "null")
+                theirs = json.loads(text or "null")
+            except json.JSONDecodeError:
+                conflicts.append((os.path.basename(path),))
+                self.put(path, text)
+                continue
+            file_conflicts = []
+            merged = merge3(base, ours, theirs, file_conflicts)
+            conflicts.extend((os.path.basename(path),) + c for c in file_conflicts)
+            self.put(path, json.dumps(merged, indent=4, ensure_ascii=False))
+        return conflicts
+
+    def commit(self):
+        """把所有改动原子写回磁盘，返回写入的文件列表"""
+        written = []
+        for path in sorted(self._dirty):
+            text = self._texts[path]
+            if text is None:
+                continue
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+            written.append(path)
+        self._dirty.clear()
+        self._history.clear()
+        self.versions.clear()
+        return written
+
+
+def merge3(base, ours, theirs, conflicts, path=()):
+    """dict 按 key 递归合并，list 按元素做集合式合并（保持原顺序），其余两边都改了时以后完成的为准"""
+    if ours == theirs or theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in list(ours) + [k for k in theirs if k not in ours]:
+            value = merge3(base.get(key, _MISSING), ours.get(key, _MISSING),
+                           theirs.get(key, _MISSING), conflicts, path + (key,))
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+    if isinstance(ours, list) and isinstance(theirs, list):
+        try:
+            base_set = set(base) if isinstance(base, list) else set()
+            ours_set, theirs_set = set(ours), set(theirs)
+        except TypeError:
+            pass
+        else:
+            kept = [x for x in ours if x in theirs_set or x not in base_set]
+            return kept + [x for x in theirs if x not in ours_set and x not in base_set]
+    conflicts.append(path)
+    return theirs
+
+# ---------- worker 进程 ----------
+
+def _load_stage(script):
+    """按模块名导入阶段脚本；先从 sys.modules 去掉，模块级代码每次都重新执行（与单独运行一致）"""
+    name = os.path.splitext(os.path.basename(script))[0]
+    sys.modules.pop(name, None)
+    mod = importlib.import_module(name)
+    # 阶段之间已经并发，阶段内部不再按板块分片开进程池
+    if "CACHE_WORKERS" in getattr(mod, "CONFIG", {}):
+        mod.CONFIG["CACHE_WORKERS"] = 1
+    return mod
+
+
+def _run_stage(script, args, texts, log_path):
+    """
+    导入脚本并调用 main(ctx)；texts 为主进程上下文的快照，None 表示不用上下文（commit 之后的阶段）。
+    返回 (写过的 JSON, 从磁盘读入的 JSON, 秒数, 错误)
+    """
+    ctx = JsonContext(known=texts) if texts is not None else None
+    t0 = time.perf_counter()
+    error = None
+    old_argv, old_path = sys.argv, list(sys.path)
+    sys.argv = [script] + list(args)
+    sys.path.insert(0, os.path.dirname(script))
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log, \
+                contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            try:
+                # 导入也放在上下文里：Analyse_Short 等在模块级读 Sectors_panel / description
+                with use_context(ctx):
+                    _load_stage(script).main(ctx)
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    error = f"SystemExit({e.code})"
+            except BaseException:
+                error = traceback.format_exc()
+                print(error)
+    finally:
+        sys.argv = old_argv
+        sys.path[:] = old_path
+    seconds = time.perf_counter() - t0
+    if ctx is None:
+        return {}, {}, seconds, error
+    return ctx.dirty_texts(), ctx.loaded_texts(), seconds, error
+
+# ---------- 主进程 ----------
+
+def _load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(state):
+    with open(STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=4, ensure_ascii=False)
+
+
+def _save_staging(ctx):
+    """把未提交的 JSON 改动落盘，--resume 时恢复"""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    for path, text in ctx.dirty_texts().items():
+        if text is None:
+            continue
+        with open(os.path.join(STAGING_DIR, os.path.basename(path)), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def _load_staging():
+    staged = {}
+    if os.path.isdir(STAGING_DIR):
+        for name in sorted(os.listdir(STAGING_DIR)):
+            if name.endswith(".json"):
+                with open(os.path.join(STAGING_DIR, name), 'r', encoding='utf-8') as f:
+                    staged[os.path.join(MODULES_DIR, name)] = f.read()
+    return staged
+
+
+def _clear_staging():
+    if os.path.isdir(STAGING_DIR):
+        for name in os.listdir(STAGING_DIR):
+            os.remove(os.path.join(STAGING_DIR, name))
+
+
+def print_dag(stages=STAGES):
+    for stage in stages:
+        deps = ", ".join(stage.deps) if stage.deps else "-"
+        target = os.path.basename(stage.script) if stage.script else "(写回 Modules JSON)"
+        print(f"{stage.name:<18} <- {deps:<70} {target}")
+
+
+def run_pipeline(stages=STAGES, workers=None, resume=False):
+    """执行 DAG；返回是否全部成功"""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    names = {s.name for s in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in names]
+        if missing:
+            raise ValueError(f"阶段 {stage.name} 依赖了不存在的阶段: {missing}")
+
+    state = _load_state() if resume else {}
+    results = state.get("stages", {})
+    if resume:
+        staged = _load_staging()
+        # 失败的阶段重新跑
+        results = {k: v for k, v in results.items() if v.get("status") in ("done", "skipped")}
+        if results:
+            print(f"继续上次的流水线，跳过已完成阶段: {', '.join(results)}")
+    else:
+        if _load_staging():
+            print("⚠️ 丢弃上次未提交的 staging 改动（需要继续请加 --resume）")
+        _clear_staging()
+        staged = {}
+    ctx = JsonContext(staged=staged)
+    state = {"started": state.get("started") or time.strftime("%Y-%m-%d %H:%M:%S"), "stages": results}
+    _save_state(state)
+
+    finished = {k for k, v in results.items() if v.get("status") in ("done", "skipped")}
+    failed = set()
+    running = {}   # future -> (stage, base_versions)
+    t_all = time.perf_counter()
+
+    def record(stage, status, seconds, error=None):
+        results[stage.name] = {"status": status, "seconds": round(seconds, 1)}
+        if error:
+            results[stage.name]["error"] = error.strip().splitlines()[-1]
+        _save_state(state)
+
+    # 每个阶段用一个新进程，模块级单例不会在阶段之间复用
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        while True:
+            progressed = True
+            while progressed:
+                progressed = False
+                busy = {s.name for s, _ in running.values()}
+                for stage in stages:
+                    if stage.name in finished or stage.name in failed or stage.name in busy:
+                        continue
+                    if not all(d in finished for d in stage.deps):
+                        continue
+                    progressed = True
+                    if stage.name == COMMIT:
+                        t0 = time.perf_counter()
+                        written = ctx.commit()
+                        _clear_staging()
+                        # 各扫描阶段只写库：整份 Earning_History.json 在这里导出一次
+                        if export_earning_history():
+                            written.append(EARNING_HISTORY_JSON)
+                        print(f"💾 [{COMMIT}] 写回 {len(written)} 个 JSON: "
+                              f"{', '.join(os.path.basename(p) for p in written) or '-'}")
+                        record(stage, "done", time.perf_counter() - t0)
+                        finished.add(stage.name)
+                    elif stage.condition is not None and not stage.condition(ctx):
+                        print(f"⏭️  [{stage.name}] 条件不满足，跳过")
+                        record(stage, "skipped", 0)
+                        finished.add(stage.name)
+                    else:
+                        log_path = os.path.join(LOG_DIR, f"{stage.name}.log")
+                        print(f"▶️  [{stage.name}] 开始 ({os.path.basename(stage.script)}，日志: {log_path})")
+                        texts = None if COMMIT in finished else ctx.snapshot()
+                        fut = pool.submit(_run_stage, stage.script, stage.args, texts, log_path)
+                        running[fut] = (stage, dict(ctx.versions))
+                        busy.add(stage.name)
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, base_versions = running.pop(fut)
+                try:
+                    written, loaded, seconds, error = fut.result()
+                except Exception as e:
+                    written, loaded, seconds, error = {}, {}, 0.0, f"{type(e).__name__}: {e}"
+                ctx.learn(loaded)
+                if error:
+                    print(f"❌ [{stage.name}] 失败 ({seconds:.1f}s): {error.strip().splitlines()[-1]}")
+                    record(stage, "failed", seconds, error)
+                    failed.add(stage.name)
+                    continue
+                conflicts = ctx.merge(written, base_versions)
+                for c in conflicts:
+                    print(f"⚠️ [{stage.name}] 合并冲突，以本阶段结果为准: {' -> '.join(map(str, c))}")
+                _save_staging(ctx)
+                print(f"✅ [{stage.name}] 完成 ({seconds:.1f}s)，改动 JSON: "
+                      f"{', '.join(os.path.basename(p) for p in written) or '-'}")
+                record(stage, "done", seconds)
+                finished.add(stage.name)
+
+    print("\n" + "=" * 50)
+    print(f"{'阶段':<18}{'状态':<10}{'用时(s)':>8}")
+    for stage in stages:
+        r = results.get(stage.name)
+        status = r["status"] if r else "blocked"
+        seconds = f"{r['seconds']:.1f}" if r else "-"
+        print(f"{stage.name:<18}{status:<10}{seconds:>8}")
+    print(f"总用时 {time.perf_counter() - t_all:.1f}s")
+
+    if failed or len(finished) < len(stages):
+        print("\n⚠️ 流水线未全部完成，JSON 改动保留在 staging 中，修复后用 --resume 继续。")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每晚数据流水线 (DAG)")
+    parser.add_argument('--resume', action='store_true', help="从上次失败的阶段继续")
+    parser.add_argument('--workers', type=int, default=4, help="并发阶段数 (默认 4)")
+    parser.add_argument('--list', action='store_true', help="只打印 DAG")
+    args = parser.parse_args()
+
+    if args.list:
+        print_dag()
+        return
+    ok = run_pipeline(workers=args.workers, resume=args.resume)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,8 @@ import datetime
 import sqlite3
 import subprocess
 import re
+import threading
 from collections import OrderedDict
-import holidays
 
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
@@ -23,7 +23,9 @@ from PyQt6.QtGui import QFont, QCursor, QDrag, QColor
 
 sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Query"))
 
-from Chart_input import plot_financial_data
+from Tool_Host import launch as launch_in_tool_host
+from Modules_Cache import load_json as load_cached_json, load_text_pairs
+from Earning_History_Store import export_if_dirty as export_earning_history
 
 # --- 文件路径配置 ---
 CONFIG_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Sectors_panel.json")
@@ -91,6 +93,7 @@ class TradingDateHelper:
             base_date = datetime.date.today()
         
         # 获取 NYSE 专属日历 (自动处理周末补休规则)
+        import holidays
         nyse_holidays = holidays.NYSE()
         
         # 从"昨天"开始找 (因为今天是盘中或还没开盘，通常看的是昨收)
@@ -275,31 +278,29 @@ def limit_items(items, sector):
         return items
     return list(items)[:limit]
 
-def load_json(path):
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file, object_pairs_hook=OrderedDict)
+def load_json(path, copy=True):
+    # 经 Modules_Cache：文件没变时不再重新解析；copy=False 返回共享对象，只能读不能改
+    return load_cached_json(path, ordered=True, copy=copy)
 
 def load_text_data(path):
     """
     加载文本文件的数据。如果数据中包含逗号，则拆分为元组，
     否则直接返回字符串。
     """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
     data = {}
-    with open(path, 'r', encoding='utf-8') as file:
-        for line in file:
-            line = line.strip()
-            if not line:
-                continue  # 跳过空行
-            # 分割 key 和 value
-            key, value = map(str.strip, line.split(':', 1))
-            # 提取 key 的最后一个单词
-            cleaned_key = key.split()[-1]
-            # 如果 value 中包含逗号，则拆分后存储为元组
-            if ',' in value:
-                parts = [p.strip() for p in value.split(',')]
-                data[cleaned_key] = tuple(parts)
-            else:
-                data[cleaned_key] = value
+    for key, value in load_text_pairs(path, copy=False).items():
+        # 提取 key 的最后一个单词
+        if not key:
+            continue
+        cleaned_key = key.split()[-1]
+        # 如果 value 中包含逗号，则拆分后存储为元组
+        if ',' in value:
+            parts = [p.strip() for p in value.split(',')]
+            data[cleaned_key] = tuple(parts)
+        else:
+            data[cleaned_key] = value
     return data
 
 def fetch_mnspp_data_from_db(db_path, symbol):
@@ -625,12 +626,12 @@ def execute_external_script(script_type, keyword, group=None, main_window=None):
             # 重新 load 外部文件，并刷新面板
             if main_window:
                 global json_data, compare_data
-                json_data    = load_json(DESCRIPTION_PATH)
+                json_data    = load_json(DESCRIPTION_PATH, copy=False)
                 main_window.refresh_selection_window()
         else:
             if script_type in ['futu', 'doubao']:
                 subprocess.Popen(['osascript', script_configs[script_type], keyword])
-            else:
+            elif not launch_in_tool_host(script_configs[script_type], [keyword]):
                 python_path = '/Library/Frameworks/Python.framework/Versions/Current/bin/python3'
                 subprocess.Popen([python_path, script_configs[script_type], keyword])
 
@@ -1338,6 +1339,7 @@ class MainWindow(QMainWindow):
                                     suffix_part = match_prefix.group(2)
                                     prefix_color = 'orange'
                                     today = datetime.date.today()
+                                    import holidays
                                     nyse = holidays.NYSE()
                                     next_trading_day = today + datetime.timedelta(days=1)
                                     while next_trading_day.weekday() >= 5 or next_trading_day in nyse:
@@ -1515,7 +1517,7 @@ class MainWindow(QMainWindow):
         self.config = config
         
         # 2. 重新加载 sector_data (以防它被外部修改)
-        sector_data = load_json(SECTORS_ALL_PATH)
+        sector_data = load_json(SECTORS_ALL_PATH, copy=False)
         
         # 3. 关键点：重新构建反向索引映射
         symbol_to_sector_map = build_symbol_to_sector_map(sector_data)
@@ -1563,7 +1565,7 @@ class MainWindow(QMainWindow):
         # —— 在真正 plot 之前，先 reload 一下外部可能改动过的文件 —— 
         global json_data, compare_data
         try:
-            json_data = load_json(DESCRIPTION_PATH) # 注意这里你原代码是 DESCRIPTION_PATH
+            json_data = load_json(DESCRIPTION_PATH, copy=False) # 注意这里你原代码是 DESCRIPTION_PATH
         except Exception as e:
             pass # 略过错误处理细节，保持原逻辑
             
@@ -1615,6 +1617,7 @@ class MainWindow(QMainWindow):
                         display_name = group_content[value]
                         break
             # --- 新增结束 ---
+            from Chart_input import plot_financial_data
             plot_financial_data(
                 DB_PATH, sector, value, compare_value, (shares_val, pb_val),
                 marketcap_val, pe_val, json_data, '1Y', False,
@@ -1624,6 +1627,10 @@ class MainWindow(QMainWindow):
             )
             
             self.setFocus()
+            # 后台预读屏幕上前后相邻的 symbol，左右切换时直接命中缓存
+            from Series_Cache import prefetch_adjacent
+            prefetch_adjacent(DB_PATH, self.ordered_symbols_on_screen, self.current_symbol_index,
+                              symbol_to_sector_map.get)
 
     def on_keyword_selected(self, value):
         sector = symbol_to_sector_map.get(value)
@@ -1987,17 +1994,26 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"[错误] 保存配置失败：{e}")
 
+def _prewarm_chart_input():
+    """后台预先 import Chart_input；失败也不要紧，点开图表时会照常再 import"""
+    try:
+        import Chart_input  # noqa: F401
+    except Exception as e:
+        print(f"预加载 Chart_input 失败: {e}")
+
 # --- 主程序入口修改 ---
 if __name__ == '__main__':
     # Load data
-    keyword_colors = load_json(COLORS_PATH)
+    keyword_colors = load_json(COLORS_PATH, copy=False)
     config = load_json(CONFIG_PATH)
-    json_data = load_json(DESCRIPTION_PATH)
-    sector_data = load_json(SECTORS_ALL_PATH)
+    json_data = load_json(DESCRIPTION_PATH, copy=False)
+    sector_data = load_json(SECTORS_ALL_PATH, copy=False)
     # --- 新增: 构建反向索引 ---
     symbol_to_sector_map = build_symbol_to_sector_map(sector_data)
     compare_data = load_text_data(COMPARE_DATA_PATH)
     # --- 新增: 加载 Earning History 数据 ---
+    # 扫描脚本只写库，读 JSON 前先把没导出的记录导出
+    export_earning_history(json_path=EARNING_HISTORY_PATH)
     earning_history = load_json(EARNING_HISTORY_PATH)
     
     filter_positive_symbols(config, compare_data, CONFIG_PATH)
@@ -2006,5 +2022,8 @@ if __name__ == '__main__':
     # --- 修改: 将 Earning History 数据传入主窗口 ---
     main_window = MainWindow(earning_history)
     main_window.showMaximized()
+    # 面板先显示出来，再在后台线程里预先 import Chart_input（matplotlib / scipy），
+    # 不占 GUI 线程；第一次点开图表时已经导入好，不用等
+    QTimer.singleShot(300, lambda: threading.Thread(target=_prewarm_chart_input, daemon=True).start())
     # PyQt6: exec 替代 exec_
     sys.exit(app.exec())
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Price_Store.py
+进程内共享的列式价格库：每张板块表只扫描一次，按 symbol 切成 NumPy 数组
+
+背景：Analyse_Earning_* / Analyse_Short / Analyse_Compare 等扫描脚本对每个 symbol
+都要跑 5~15 条 SELECT ... WHERE name = ?，一晚上几万次 SQLite 往返。
+这里改为每张表一次 ORDER BY name, date 的全量扫描（走 (name, date) 覆盖索引），
+之后所有"最近一条 / 最近 N 条 / 区间最高最低 / 区间内所有行"都是 searchsorted。
+
+日期统一存成 int32 的天数（1970-01-01 起），价格/成交量/OHLC 存成 float64，
+数据库里的 NULL 对应 NaN；对外返回 Python 原生值时 NaN 会还原成 None，
+保证与原先 SQL 查询结果的语义一致。
+
+用法:
+    from Price_Store import PriceStore
+    store = PriceStore(DB_FILE)
+    store.load_tables(["Technology", "Energy"])
+    row = store.latest_on_or_before("Technology", "AAPL", "2025-01-10")
+"""
+
+import sqlite3
+import datetime
+import numpy as np
+
+FIELDS = ("price", "volume", "open", "high", "low")
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+# =========================================================
+# 日期转换
+# =========================================================
+
+def to_day(value):
+    """'YYYY-MM-DD' / 'YYYYMMDD' / date / datetime / int -> int 天数；无法解析返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.toordinal() - _EPOCH_ORDINAL
+    s = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y%m%d"):
+        try:
+            return datetime.datetime.strptime(s, fmt).date().toordinal() - _EPOCH_ORDINAL
+        except ValueError:
+            continue
+    return None
+
+def day_to_str(day):
+    return datetime.date.fromordinal(int(day) + _EPOCH_ORDINAL).isoformat()
+
+def day_to_date(day):
+    return datetime.date.fromordinal(int(day) + _EPOCH_ORDINAL)
+
+def _parse_dates(date_strs):
+    """整列日期字符串 -> (int32 天数数组, 有效行掩码)，先走向量化，失败再逐个解析"""
+    try:
+        arr = np.array(date_strs, dtype="datetime64[D]")
+        return arr.astype(np.int64).astype(np.int32), np.ones(len(date_strs), dtype=bool)
+    except (ValueError, TypeError):
+        days = np.zeros(len(date_strs), dtype=np.int32)
+        mask = np.zeros(len(date_strs), dtype=bool)
+        for i, s in enumerate(date_strs):
+            d = to_day(s)
+            if d is not None:
+                days[i] = d
+                mask[i] = True
+        return days, mask
+
+def _py(value, as_int=False):
+    """NumPy 标量 -> Python 原生值，NaN -> None"""
+    if value is None:
+        return None
+    f = float(value)
+    if f != f:
+        return None
+    return int(f) if as_int else f
+
+
+# =========================================================
+# 单只 symbol 的序列
+# =========================================================
+
+class SymbolSeries:
+    """一只 symbol 的全部历史，按日期升序；数组是整表数组的切片视图"""
+    __slots__ = ("name", "dates", "price", "volume", "open", "high", "low")
+
+    def __init__(self, name, dates, columns):
+        self.name = name
+        self.dates = dates
+        for f in FIELDS:
+            setattr(self, f, columns[f])
+
+    def __len__(self):
+        return len(self.dates)
+
+    # ---------- 下标定位 ----------
+
+    def index_on_or_before(self, day):
+        """最后一个 date <= day 的下标，没有返回 -1；day 为 None 表示最新一条"""
+        if day is None:
+            return len(self.dates) - 1
+        return int(np.searchsorted(self.dates, day, side="right")) - 1
+
+    def bounds(self, start=None, end=None, start_inclusive=True, end_inclusive=True):
+        """对应 SQL 的 date >=/> start AND date <=/< end，返回 [lo, hi) 下标"""
+        lo = 0
+        hi = len(self.dates)
+        if start is not None:
+            lo = int(np.searchsorted(self.dates, start, side="left" if start_inclusive else "right"))
+        if end is not None:
+            hi = int(np.searchsorted(self.dates, end, side="right" if end_inclusive else "left"))
+        return lo, max(lo, hi)
+
+    # ---------- 取值 ----------
+
+    def row(self, i):
+        """(date_str, price, volume, open, high, low)，NaN 还原为 None"""
+        return (
+            day_to_str(self.dates[i]),
+            _py(self.price[i]),
+            _py(self.volume[i], as_int=True),
+            _py(self.open[i]),
+            _py(self.high[i]),
+            _py(self.low[i]),
+        )
+
+    def field(self, name):
+        return getattr(self, name)
+
+
+# =========================================================
+# PriceStore
+# =========================================================
+
+class PriceStore:
+    def __init__(self, db_path, read_only=True):
+        self.db_path = db_path
+        self.read_only = read_only
+        # {table: {symbol: SymbolSeries}}
+        self._tables = {}
+        self._earnings = None
+        self._mnspp = {}             # {columns: {symbol: {col: value}}}
+        self.mnspp_columns = set()   # load_mnspp 后为 MNSPP 表中真实存在的列
+
+    def _connect(self):
+        if self.read_only:
+            return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=60.0)
+        return sqlite3.connect(self.db_path, timeout=60.0)
+
+    # ---------- 加载 ----------
+
+    def load_table(self, table_name, symbols=None, conn=None):
+        """
+        一次扫描整张表并按 symbol 切片。缓存的是整张表，symbols 不为空时只返回这些 symbol，
+        这样不同调用方传入不同的 symbols 也能共用同一份缓存。
+        """
+        if table_name not in self._tables:
+            self._tables[table_name] = self._scan_table(table_name, conn)
+        table = self._tables[table_name]
+        if symbols is None:
+            return table
+        return {s: table[s] for s in symbols if s in table}
+
+    def _scan_table(self, table_name, conn=None):
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            existing = {r[1] for r in conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()}
+            if not {"name", "date", "price"}.issubset(existing):
+                return {}
+            select_cols = ", ".join(f if f in existing else "NULL" for f in FIELDS)
+            rows = conn.execute(
+                f'SELECT name, date, {select_cols} FROM "{table_name}" '
+                f'WHERE name IS NOT NULL AND date IS NOT NULL ORDER BY name, date'
+            ).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+        return self._build_series(rows)
+
+    def load_tables(self, table_names, symbols=None):
+        conn = self._connect()
+        try:
+            for t in table_names:
+                self.load_table(t, symbols=symbols, conn=conn)
+        finally:
+            conn.close()
+        return self
+
+    @staticmethod
+    def _build_series(rows):
+        if not rows:
+            return {}
+        names = [r[0] for r in rows]
+        days, valid = _parse_dates([r[1] for r in rows])
+        values = np.array([r[2:] for r in rows], dtype=np.float64)  # None -> nan
+        if not valid.all():
+            keep = np.nonzero(valid)[0]
+            names = [names[i] for i in keep]
+            days = days[keep]
+            values = values[keep]
+
+        result = {}
+        start = 0
+        n = len(names)
+        while start < n:
+            name = names[start]
+            end = start + 1
+            while end < n and names[end] == name:
+                end += 1
+            seg_days = days[start:end]
+            seg_vals = values[start:end]
+            # 同一天的脏数据（非标准日期格式被解析到同一天）只保留最后一条
+            if len(seg_days) > 1 and not np.all(np.diff(seg_days) > 0):
+                order = np.argsort(seg_days, kind="stable")
+                seg_days = seg_days[order]
+                seg_vals = seg_vals[order]
+                last = np.append(np.diff(seg_days) != 0, True)
+                seg_days = seg_days[last]
+                seg_vals = seg_vals[last]
+            cols = {f: seg_vals[:, j] for j, f in enumerate(FIELDS)}
+            result[name] = SymbolSeries(name, seg_days, cols)
+            start = end
+        return result
+
+    def load_earnings(self):
+        """Earning 表 -> {symbol: [(date_str, pct), ...]}（日期升序）"""
+        if self._earnings is not None:
+            return self._earnings
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT name, date, price FROM Earning ORDER BY name, date").fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+        earnings = {}
+        for name, d, p in rows:
+            earnings.setdefault(name, []).append((d, p))
+        self._earnings = earnings
+        return earnings
+
+    def load_mnspp(self, columns=("pe_ratio", "marketcap")):
+        """MNSPP 表 -> {symbol: {col: value}}，缺列时对应值为 None"""
+        columns = tuple(columns)
+        if columns in self._mnspp:
+            return self._mnspp[columns]
+        conn = self._connect()
+        try:
+            existing = {r[1] for r in conn.execute("PRAGMA table_info(MNSPP)").fetchall()}
+            self.mnspp_columns = existing
+            cols = [c for c in columns if c in existing]
+            rows = conn.execute(f'SELECT symbol{"".join(", " + c for c in cols)} FROM MNSPP').fetchall() if existing else []
+        finally:
+            conn.close()
+        self._mnspp[columns] = {
+            r[0]: {c: (r[1 + cols.index(c)] if c in cols else None) for c in columns}
+            for r in rows
+        }
+        return self._mnspp[columns]
+
+    # ---------- 查询 ----------
+
+    def series(self, table_name, symbol):
+        table = self._tables.get(table_name)
+        if table is None:
+            table = self.load_table(table_name)
+        return table.get(symbol)
+
+    def symbols(self, table_name):
+        return list(self._tables.get(table_name, {}).keys())
+
+    def latest_on_or_before(self, table_name, symbol, as_of=None):
+        """等价于 ... WHERE name = ? [AND date <= ?] ORDER BY date DESC LIMIT 1，返回 row 或 None"""
+        s = self.series(table_name, symbol)
+        if s is None or len(s) == 0:
+            return None
+        i = s.index_on_or_before(to_day(as_of))
+        return s.row(i) if i >= 0 else None
+
+    def last_n(self, table_name, symbol, n, end=None, end_inclusive=True):
+        """date <=/< end 的最后 n 行，日期升序（原 SQL 的 DESC LIMIT n 倒序后即为此结果）"""
+        s = self.series(table_name, symbol)
+        if s is None:
+            return []
+        _, hi = s.bounds(end=to_day(end), end_inclusive=end_inclusive)
+        return [s.row(i) for i in range(max(0, hi - n), hi)]
+
+    def first_n(self, table_name, symbol, n, start=None, start_inclusive=True):
+        """date >=/> start 的前 n 行，日期升序"""
+        s = self.series(table_name, symbol)
+        if s is None:
+            return []
+        lo, hi = s.bounds(start=to_day(start), start_inclusive=start_inclusive)
+        return [s.row(i) for i in range(lo, min(hi, lo + n))]
+
+    def rows_between(self, table_name, symbol, start=None, end=None,
+                     start_inclusive=True, end_inclusive=True):
+        s = self.series(table_name, symbol)
+        if s is None:
+            return []
+        lo, hi = s.bounds(to_day(start), to_day(end), start_inclusive, end_inclusive)
+        return [s.row(i) for i in range(lo, hi)]
+
+    def _reduce(self, reducer, table_name, symbol, start, end, field,
+                start_inclusive, end_inclusive):
+        s = self.series(table_name, symbol)
+        if s is None:
+            return None
+        lo, hi = s.bounds(to_day(start), to_day(end), start_inclusive, end_inclusive)
+        if hi <= lo:
+            return None
+        seg = s.field(field)[lo:hi]
+        if np.isnan(seg).all():
+            return None  # 与 SQL MAX/MIN 对全 NULL 返回 NULL 一致
+        return float(reducer(seg))
+
+    def max_in_range(self, table_name, symbol, start=None, end=None, field="price",
+                     start_inclusive=True, end_inclusive=True):
+        return self._reduce(np.nanmax, table_name, symbol, start, end, field,
+                            start_inclusive, end_inclusive)
+
+    def min_in_range(self, table_name, symbol, start=None, end=None, field="price",
+                     start_inclusive=True, end_inclusive=True):
+        return self._reduce(np.nanmin, table_name, symbol, start, end, field,
+                            start_inclusive, end_inclusive)
+
+    def prices_on_dates(self, table_name, symbol, date_list):
+        """等价于 date IN (...)：只返回存在的日期 [(date_str, price), ...]，日期升序"""
+        s = self.series(table_name, symbol)
+        if s is None:
+            return []
+        wanted = sorted({d for d in (to_day(x) for x in date_list) if d is not None})
+        if not wanted:
+            return []
+        wanted = np.array(wanted, dtype=np.int32)
+        idx = np.searchsorted(s.dates, wanted)
+        idx_clipped = np.minimum(idx, len(s.dates) - 1)
+        hit = (idx < len(s.dates)) & (s.dates[idx_clipped] == wanted)
+        return [(day_to_str(s.dates[i]), _py(s.price[i])) for i in idx_clipped[hit]]
+
+
+# ==================== 单例 ====================
+
+_global_store = None
+
+def get_global_store(db_path):
+    """同一进程内的所有扫描器共用一个 PriceStore（按数据库路径区分）"""
+    global _global_store
+    if _global_store is None or _global_store.db_path != db_path:
+        _global_store = PriceStore(db_path)
+    return _global_store
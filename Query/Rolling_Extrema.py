@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rolling_Extrema.py
+基于 Sparse Table 的区间最高/最低价引擎，配合 Price_Store 使用
+
+原先 Analyse_Compare 对每个 symbol 的每个区间（6/8/10 周、5 个月、0.5M~10Y）
+都要发一条 SELECT MAX(price), MIN(price) ... BETWEEN。这里改为：
+    1. 每只 symbol 的价格数组只建一次 O(n log n) 的 sparse table；
+    2. 所有区间先用 searchsorted 换算成下标，再一次向量化 O(1) 查询。
+所以区间数量增加几乎没有额外成本。
+
+与 SQL 的语义保持一致：
+    - 区间两端都是闭区间（对应 BETWEEN start AND end）
+    - NULL(NaN) 价格不参与 MAX/MIN，区间内没有有效价格时结果为 None
+"""
+
+import numpy as np
+
+from Price_Store import to_day
+
+
+class SparseTable:
+    """静态数组上的 O(1) 区间最值查询；op 为 np.maximum 或 np.minimum"""
+
+    def __init__(self, values, op):
+        self.op = op
+        levels = [np.asarray(values, dtype=np.float64)]
+        n = len(values)
+        k = 1
+        while (1 << k) <= n:
+            prev = levels[-1]
+            half = 1 << (k - 1)
+            levels.append(op(prev[:-half], prev[half:]))
+            k += 1
+        self.levels = levels
+
+    def query(self, lo, hi):
+        """lo/hi 为下标数组，半开区间 [lo, hi)，调用方保证 hi > lo"""
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        length = hi - lo
+        k = np.floor(np.log2(length)).astype(np.int64)
+        out = np.empty(len(lo), dtype=np.float64)
+        for level in np.unique(k):
+            mask = k == level
+            arr = self.levels[level]
+            out[mask] = self.op(arr[lo[mask]], arr[hi[mask] - (1 << level)])
+        return out
+
+
+class RangeExtrema:
+    """一只 symbol 某个字段的区间最高/最低/有效条数"""
+
+    def __init__(self, series, field="price"):
+        self.dates = series.dates
+        values = series.field(field)
+        valid = ~np.isnan(values)
+        # NaN 替换成对当前运算无影响的值，再用有效条数判断区间是否为空
+        self._max = SparseTable(np.where(valid, values, -np.inf), np.maximum)
+        self._min = SparseTable(np.where(valid, values, np.inf), np.minimum)
+        self._count = np.concatenate(([0], np.cumsum(valid)))
+
+    def query_days(self, start_days, end_days):
+        """
+        start_days / end_days: int 天数数组（闭区间）
+        返回 (maxs, mins, counts)，无有效价格的区间 max/min 为 NaN
+        """
+        lo = np.searchsorted(self.dates, np.asarray(start_days), side="left")
+        hi = np.searchsorted(self.dates, np.asarray(end_days), side="right")
+        counts = self._count[np.maximum(hi, lo)] - self._count[lo]
+        maxs = np.full(len(lo), np.nan)
+        mins = np.full(len(lo), np.nan)
+        nonempty = hi > lo
+        if nonempty.any():
+            maxs[nonempty] = self._max.query(lo[nonempty], hi[nonempty])
+            mins[nonempty] = self._min.query(lo[nonempty], hi[nonempty])
+        empty = counts == 0
+        maxs[empty] = np.nan
+        mins[empty] = np.nan
+        return maxs, mins, counts
+
+
+class ExtremaEngine:
+    """在 PriceStore 之上按 (table, symbol) 缓存 RangeExtrema"""
+
+    def __init__(self, store, field="price"):
+        self.store = store
+        self.field = field
+        self._cache = {}
+
+    def _get(self, table_name, symbol):
+        key = (table_name, symbol)
+        if key not in self._cache:
+            s = self.store.series(table_name, symbol)
+            self._cache[key] = RangeExtrema(s, self.field) if s is not None and len(s) else None
+        return self._cache[key]
+
+    def window_extrema(self, table_name, symbol, windows):
+        """
+        windows: {key: (start, end)}，start/end 可以是日期字符串 / date / 天数，闭区间
+        返回 {key: (max, min, count)}，空区间为 (None, None, 0)
+        """
+        rx = self._get(table_name, symbol)
+        if rx is None or not windows:
+            return {k: (None, None, 0) for k in windows}
+        keys = list(windows.keys())
+        starts = np.array([to_day(windows[k][0]) for k in keys], dtype=np.int64)
+        ends = np.array([to_day(windows[k][1]) for k in keys], dtype=np.int64)
+        maxs, mins, counts = rx.query_days(starts, ends)
+        result = {}
+        for i, k in enumerate(keys):
+            if counts[i] == 0:
+                result[k] = (None, None, 0)
+            else:
+                result[k] = (float(maxs[i]), float(mins[i]), int(counts[i]))
+        return result
+
+    def latest(self, table_name, symbol):
+        """(date_str, price)，与 ORDER BY date DESC LIMIT 1 一致"""
+        row = self.store.latest_on_or_before(table_name, symbol)
+        return (row[0], row[1]) if row else None
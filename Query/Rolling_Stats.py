@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rolling_Stats.py
+与 Finance.db 放在一起的增量滚动统计表（Rolling_Stats）
+
+背景：扫描脚本每晚都从头重算只差一行新数据的统计量，例如 check_ma_breakout 的
+MA150/MA200、check_turnover_rank 的 N 个月成交额前几名。
+这里由写库步骤（Tiger_Today / YF_Today 的 insert_data_to_db）在同一事务里
+增量更新每只 symbol 的状态，分析脚本直接读取预计算好的值。
+
+每只 symbol 保存的状态：
+    - MA 窗口：最近 MA_WINDOW 个收盘价；ma150 / ma200 列为写库时按扫描脚本相同的顺序求和的结果，
+      Analyse_Short 直接读列，不解析状态
+    - 成交额：最近 TURNOVER_HORIZON_DAYS 天的有效交易日列表 + "top-k 天际线"
+      （只保留后面严格比它大的记录少于 TURNOVER_TOP_K 条的记录，
+        任何不超过 horizon 的后缀窗口的前 k 名（k <= TURNOVER_TOP_K）都在其中）
+
+时间跨度均为自然日、两端闭区间，与原 SQL 的 date >= start AND date <= latest 一致。
+写入的行日期不晚于已记录的 last_date 时（补数据/改数），该 symbol 整体重建。
+读取时按表批量核对新鲜度（read_stats_many / read_stored_many：一条 GROUP BY 取各 symbol 最新日期）。
+
+用法:
+    python Rolling_Stats.py --rebuild              # 全量重建所有板块表
+    python Rolling_Stats.py --rebuild --table ETFs # 只重建一张表
+    python Rolling_Stats.py --show ETFs SPY        # 查看某只 symbol 的统计
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import weakref
+import argparse
+import datetime
+from collections import deque
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Finance.db")
+SECTORS_ALL_JSON = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Sectors_All.json")
+
+STATS_TABLE = "Rolling_Stats"
+
+MA_PERIODS = (150, 200)
+MA_WINDOW = max(MA_PERIODS) + 10          # 与 check_ma_breakout 的 LIMIT ma_period + 10 对齐
+TURNOVER_HORIZON_DAYS = 400               # 覆盖 12 个月 (360 天) 的成交额排名
+TURNOVER_TOP_K = 5                        # 支持 rank_threshold <= 5
+
+
+def _to_day(date_str):
+    try:
+        return datetime.date.fromisoformat(str(date_str)).toordinal()
+    except ValueError:
+        return None
+
+def _day_to_str(day):
+    return datetime.date.fromordinal(day).isoformat()
+
+
+# =========================================================
+# 单只 symbol 的增量状态
+# =========================================================
+
+class SymbolStats:
+    def __init__(self):
+        self.last_date = None
+        self.last_day = None
+        self.last_price = None
+        self.ma_window = deque(maxlen=MA_WINDOW)
+        self.turnover_days = deque()          # 有效成交额的交易日
+        self.turnover_sky = []                # [[day, turnover, 后面不小于它的条数], ...]
+
+    # ---------- 增量更新 ----------
+
+    def push(self, date_str, price, volume=None):
+        """按日期升序追加一行；调用方保证 date_str 晚于 last_date"""
+        day = _to_day(date_str)
+        if day is None:
+            return
+        self.last_date = date_str
+        self.last_day = day
+        if price is None:
+            return
+        price = float(price)
+        self.last_price = price
+
+        self.ma_window.append(price)
+
+        # 成交额天际线
+        if volume is not None:
+            turnover = price * float(volume)
+            self.turnover_days.append(day)
+            for entry in self.turnover_sky:
+                # 严格大于才算压制：并列时保留较早的记录，与稳定排序的结果一致
+                if entry[1] < turnover:
+                    entry[2] += 1
+            self.turnover_sky = [e for e in self.turnover_sky if e[2] < TURNOVER_TOP_K]
+            self.turnover_sky.append([day, turnover, 0])
+        cutoff = day - TURNOVER_HORIZON_DAYS
+        while self.turnover_days and self.turnover_days[0] < cutoff:
+            self.turnover_days.popleft()
+        if self.turnover_sky and self.turnover_sky[0][0] < cutoff:
+            self.turnover_sky = [e for e in self.turnover_sky if e[0] >= cutoff]
+
+    # ---------- 读取 ----------
+
+    def ma(self, period):
+        """与 check_ma_breakout 按相同顺序求和，保证 MA 边界判断与逐行计算逐位一致"""
+        if len(self.ma_window) >= period:
+            return sum(list(self.ma_window)[-period:]) / period
+        return None
+
+    def turnover_top_k(self, start_date_str, k):
+        """返回 (前 k 名 [(date_str, turnover)], 窗口内有效交易日数)；不支持时返回 None"""
+        start_day = _to_day(start_date_str)
+        if start_day is None or k > TURNOVER_TOP_K or self.last_day is None:
+            return None
+        if start_day < self.last_day - TURNOVER_HORIZON_DAYS:
+            return None
+        in_window = [e for e in self.turnover_sky if e[0] >= start_day]
+        top = sorted(in_window, key=lambda e: e[1], reverse=True)[:k]
+        count = sum(1 for d in self.turnover_days if d >= start_day)
+        return [(_day_to_str(d), t) for d, t, _ in top], count
+
+    # ---------- 序列化 ----------
+
+    def to_state(self):
+        return json.dumps({
+            "last_date": self.last_date,
+            "last_price": self.last_price,
+            "ma_window": list(self.ma_window),
+            "turnover_days": list(self.turnover_days),
+            "turnover_sky": self.turnover_sky,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_state(cls, text):
+        obj = json.loads(text)
+        st = cls()
+        st.last_date = obj["last_date"]
+        st.last_day = _to_day(st.last_date) if st.last_date else None
+        st.last_price = obj.get("last_price")
+        st.ma_window.extend(obj.get("ma_window", []))
+        st.turnover_days.extend(obj.get("turnover_days", []))
+        st.turnover_sky = obj.get("turnover_sky", [])
+        return st
+
+
+# =========================================================
+# 数据库读写
+# =========================================================
+
+def ensure_stats_table(cursor):
+    ma_cols = "".join(f"            ma{p} REAL,\n" for p in MA_PERIODS)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            tbl TEXT NOT NULL,
+            name TEXT NOT NULL,
+            last_date TEXT,
+            last_price REAL,
+            ma_count INTEGER,
+{ma_cols}            state TEXT,
+            PRIMARY KEY (tbl, name)
+        )
+    ''')
+
+def _save(cursor, table_name, name, st):
+    ma_cols = [f"ma{p}" for p in MA_PERIODS]
+    cols = ["tbl", "name", "last_date", "last_price", "ma_count"] + ma_cols + ["state"]
+    values = [table_name, name, st.last_date, st.last_price, len(st.ma_window)]
+    values += [st.ma(p) for p in MA_PERIODS]
+    values.append(st.to_state())
+    cursor.execute(
+        f'INSERT OR REPLACE INTO {STATS_TABLE} ({", ".join(cols)}) '
+        f'VALUES ({", ".join("?" * len(cols))})',
+        values
+    )
+
+def _load(cursor, table_name, name):
+    row = cursor.execute(
+        f"SELECT state FROM {STATS_TABLE} WHERE tbl = ? AND name = ?", (table_name, name)
+    ).fetchone()
+    return SymbolStats.from_state(row[0]) if row and row[0] else None
+
+def _has_volume(cursor, table_name):
+    return "volume" in {r[1] for r in cursor.execute(f'PRAGMA table_info("{table_name}")').fetchall()}
+
+def rebuild_symbol(cursor, table_name, name):
+    vol_col = "volume" if _has_volume(cursor, table_name) else "NULL"
+    rows = cursor.execute(
+        f'SELECT date, price, {vol_col} FROM "{table_name}" WHERE name = ? ORDER BY date',
+        (name,)
+    ).fetchall()
+    st = SymbolStats()
+    for d, p, v in rows:
+        st.push(d, p, v)
+    _save(cursor, table_name, name, st)
+    return st
+
+def apply_rows(cursor, table_name, rows):
+    """
+    写库后在同一事务里调用。rows 为刚写入的 (date, name, price[, volume, ...])。
+    用 SAVEPOINT 包住，统计更新失败不会影响行情数据本身的写入。
+    """
+    if not rows:
+        return
+    by_name = {}
+    for r in rows:
+        by_name.setdefault(r[1], []).append(r)
+    cursor.execute("SAVEPOINT rolling_stats")
+    try:
+        ensure_stats_table(cursor)
+        for name, items in by_name.items():
+            items.sort(key=lambda r: r[0])
+            st = _load(cursor, table_name, name)
+            if st is None or st.last_date is None or items[0][0] <= st.last_date:
+                # 首次出现或者改写了历史行：整只重建（此时新行已在表里）
+                rebuild_symbol(cursor, table_name, name)
+                continue
+            for r in items:
+                st.push(r[0], r[2], r[3] if len(r) > 3 else None)
+            _save(cursor, table_name, name, st)
+        cursor.execute("RELEASE SAVEPOINT rolling_stats")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT rolling_stats")
+        cursor.execute("RELEASE SAVEPOINT rolling_stats")
+        raise
+
+def read_stats(cursor, table_name, name, check_fresh=True):
+    """
+    读取一只 symbol 的统计。check_fresh 时会核对 last_date 是否等于表中该 symbol 的最新日期
+    （其他写库脚本没有走增量更新时会过期），过期或不存在返回 None，调用方应回退到 SQL。
+    """
+    try:
+        row = cursor.execute(
+            f"SELECT state FROM {STATS_TABLE} WHERE tbl = ? AND name = ?", (table_name, name)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if not row or not row[0]:
+        return None
+    st = SymbolStats.from_state(row[0])
+    if check_fresh:
+        latest = cursor.execute(
+            f'SELECT MAX(date) FROM "{table_name}" WHERE name = ?', (name,)
+        ).fetchone()
+        if not latest or latest[0] != st.last_date:
+            return None
+    return st
+
+def _latest_dates(cursor, table_name):
+    """一条 GROUP BY 取整张表各 symbol 的最新日期（走 (name, date) 覆盖索引）"""
+    return dict(cursor.execute(
+        f'SELECT name, MAX(date) FROM "{table_name}" WHERE name IS NOT NULL GROUP BY name'
+    ).fetchall())
+
+def read_stored_many(cursor, table_name, columns, check_fresh=True):
+    """
+    批量读取一张表所有 symbol 的预计算列（不解析 state），例如 columns=("ma200",)。
+    返回 {name: {"last_date", "last_price", "ma_count", 列名...}}；过期的 symbol 不在结果里。
+    """
+    cols = ["name", "last_date", "last_price", "ma_count"] + [c for c in columns
+                                                              if c not in ("last_date", "last_price", "ma_count")]
+    try:
+        rows = cursor.execute(
+            f"SELECT {', '.join(cols)} FROM {STATS_TABLE} WHERE tbl = ?", (table_name,)
+        ).fetchall()
+        latest = _latest_dates(cursor, table_name) if check_fresh else None
+    except sqlite3.OperationalError:
+        return {}
+    result = {}
+    for row in rows:
+        item = dict(zip(cols, row))
+        if latest is not None and latest.get(item["name"]) != item["last_date"]:
+            continue
+        result[item.pop("name")] = item
+    return result
+
+def read_stats_many(cursor, table_name, names=None, check_fresh=True):
+    """
+    批量版 read_stats：一张表一次读取状态 + 一条 GROUP BY 核对新鲜度。
+    names 不为空时只解析这些 symbol。返回 {name: SymbolStats}，过期或不存在的 symbol 不在结果里。
+    """
+    try:
+        rows = cursor.execute(
+            f"SELECT name, last_date, state FROM {STATS_TABLE} WHERE tbl = ?", (table_name,)
+        ).fetchall()
+        latest = _latest_dates(cursor, table_name) if check_fresh else None
+    except sqlite3.OperationalError:
+        return {}
+    wanted = set(names) if names is not None else None
+    result = {}
+    for name, last_date, state in rows:
+        if not state or (wanted is not None and name not in wanted):
+            continue
+        if latest is not None and latest.get(name) != last_date:
+            continue
+        result[name] = SymbolStats.from_state(state)
+    return result
+
+_TABLE_STATS = weakref.WeakKeyDictionary()
+
+def get_table_stats(cursor, table_name):
+    """同一个 cursor 上每张表只批量读取一次 read_stats_many（cursor 释放后自动丢弃）"""
+    cache = _TABLE_STATS.get(cursor)
+    if cache is None:
+        cache = _TABLE_STATS[cursor] = {}
+    if table_name not in cache:
+        cache[table_name] = read_stats_many(cursor, table_name)
+    return cache[table_name]
+
+
+# =========================================================
+# 全量重建
+# =========================================================
+
+def load_sector_tables(cursor, json_path=SECTORS_ALL_JSON):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        sectors = list(json.load(f).keys())
+    existing = {r[0] for r in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [s for s in sectors if s in existing]
+
+def rebuild_all(db_path=DB_PATH, tables=None):
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    cursor = conn.cursor()
+    try:
+        ensure_stats_table(cursor)
+        if tables is None:
+            tables = load_sector_tables(cursor)
+        for t in tables:
+            t0 = time.perf_counter()
+            vol_col = "volume" if _has_volume(cursor, t) else "NULL"
+            rows = cursor.execute(
+                f'SELECT name, date, price, {vol_col} FROM "{t}" '
+                f'WHERE name IS NOT NULL ORDER BY name, date'
+            ).fetchall()
+            cursor.execute(f"DELETE FROM {STATS_TABLE} WHERE tbl = ?", (t,))
+            current, st, n_sym = None, None, 0
+            for name, d, p, v in rows:
+                if name != current:
+                    if st is not None:
+                        _save(cursor, t, current, st)
+                    current, st = name, SymbolStats()
+                    n_sym += 1
+                st.push(d, p, v)
+            if st is not None:
+                _save(cursor, t, current, st)
+            conn.commit()
+            print(f"  ✅ {t}: {n_sym} 个 symbol，{len(rows)} 行，用时 {time.perf_counter() - t0:.2f}s")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finance.db 增量滚动统计")
+    parser.add_argument('--db', default=DB_PATH, help="数据库路径")
+    parser.add_argument('--rebuild', action='store_true', help="全量重建")
+    parser.add_argument('--table', action='append', help="只处理指定的表，可重复")
+    parser.add_argument('--show', nargs=2, metavar=('TABLE', 'SYMBOL'), help="查看某只 symbol 的统计")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_all(args.db, args.table)
+    if args.show:
+        conn = sqlite3.connect(args.db, timeout=60.0)
+        try:
+            st = read_stats(conn.cursor(), args.show[0], args.show[1], check_fresh=False)
+        finally:
+            conn.close()
+        if st is None:
+            print("未找到统计数据")
+            sys.exit(1)
+        print(f"last_date={st.last_date} last_price={st.last_price}")
+        for p in MA_PERIODS:
+            print(f"  MA{p}: {st.ma(p)}")
+        res = st.turnover_top_k(_day_to_str(st.last_day - 360), 3) if st.last_day else None
+        if res:
+            print(f"  12个月成交额前3: {res[0]} (共 {res[1]} 个交易日)")
+
+
+if __name__ == "__main__":
+    main()
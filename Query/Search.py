@@ -1,14 +1,11 @@
 import os
 import re
 import sys
-import json
-import pyperclip
 import subprocess
 import sqlite3
 import pickle
 import platform # <--- 新增
 from datetime import datetime, date
-from enum import Enum
 
 # --- 1. 迁移到 PyQt6 ---
 from PyQt6.QtWidgets import (
@@ -19,6 +16,10 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt6.QtGui import QFont, QKeySequence, QAction
 
+from Search_Index import get_index as get_search_index
+from Tag_Similarity import load_mnspp, MNSPP_MISSING
+from Modules_Cache import load_json, symbol_to_compare, symbol_to_sector
+
 # ================= 配置区域 (跨平台修改) =================
 
 # 1. 动态获取主目录
@@ -38,22 +39,12 @@ COMPARE_ALL_PATH = os.path.join(NEWS_BACKUP_DIR, "Compare_All.txt")
 DB_PATH = os.path.join(DATABASE_DIR, "Finance.db")
 STOCK_CHART_SCRIPT = os.path.join(FINANCIAL_SYSTEM_DIR, "Query", "Stock_Chart.py")
 
-# ========================================================
+# 边输入边搜索：停止输入 LIVE_SEARCH_DELAY_MS 毫秒后搜一次；每个类别最多先显示 LIVE_MAX_PER_GROUP 条
+LIVE_SEARCH_DELAY_MS = 250
+LIVE_SEARCH_MIN_CHARS = 2
+LIVE_MAX_PER_GROUP = 30
 
-class MatchCategory(Enum):
-    STOCK_SYMBOL = ("Stock Symbol", 1000, 'stock')
-    ETF_SYMBOL = ("ETF Symbol", 1000, 'etf')
-    STOCK_TAG = ("Stock Tag", 800, 'stock')
-    ETF_TAG = ("ETF Tag", 800, 'etf')
-    STOCK_NAME = ("Stock Name", 500, 'stock')
-    ETF_NAME = ("ETF Name", 500, 'etf')
-    STOCK_DESCRIPTION = ("Stock Description", 300, 'stock')
-    ETF_DESCRIPTION = ("ETF Description", 300, 'etf')
-
-    def __init__(self, display_name, priority, item_type):
-        self.display_name = display_name
-        self.priority = priority
-        self.item_type = item_type 
+# ========================================================
 
 class SearchHistory:
     def __init__(self, max_size=20):
@@ -104,11 +95,13 @@ class ClickableLabel(QLabel):
 class SearchWorker(QThread):
     results_ready = pyqtSignal(object)
 
-    def __init__(self, keywords, json_path, use_or=False):
+    def __init__(self, keywords, json_path, use_or=False, generation=0, max_per_group=None):
         super().__init__()
         self.keywords_str = keywords
         self.json_path = json_path
         self.use_or = use_or
+        self.generation = generation
+        self.max_per_group = max_per_group
 
     def run(self):
         grouped_results = self.unified_search()
@@ -117,117 +110,18 @@ class SearchWorker(QThread):
             key=lambda g: (g['highest_score'], g['priority']),
             reverse=True
         )
-        self.results_ready.emit(sorted_grouped_results)
+        # 排序、截断、查颜色都在这个线程里做完，GUI 线程只负责建 label
+        self.results_ready.emit((self.generation, prepare_groups(sorted_grouped_results, self.max_per_group)))
 
     def unified_search(self):
+        # 打分规则（symbol / tag / name / description 八个类别）见 Search_Index；
+        # 索引只在 description.json 变化时重建，平时直接复用内存或磁盘上的那份
         try:
-            if not os.path.exists(self.json_path): return []
-            with open(self.json_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            index = get_search_index(self.json_path)
         except Exception as e:
-            print(f"Error reading JSON file: {e}")
+            print(f"Error loading search index: {e}")
             return []
-
-        keywords = [k for k in self.keywords_str.lower().split() if k]
-        if not keywords: return []
-
-        raw_results = {cat: [] for cat in MatchCategory}
-        all_items = [('stock', item) for item in data.get('stocks', [])] + \
-                    [('etf', item) for item in data.get('etfs', [])]
-
-        for item_type, item in all_items:
-            for category in MatchCategory:
-                if category.item_type != item_type: continue
-                
-                if self.use_or:
-                    total_score = 0
-                    for kw in keywords:
-                        s = self.score_of_single_match(item, kw, category)
-                        if s > 0: total_score += s
-                    if total_score > 0: raw_results[category].append((item, total_score))
-                else:
-                    total_score = 0
-                    all_match = True
-                    for kw in keywords:
-                        s = self.score_of_single_match(item, kw, category)
-                        if s <= 0:
-                            all_match = False
-                            break
-                        total_score += s
-                    if all_match: raw_results[category].append((item, total_score))
-
-        final_groups = []
-        for category, results_list in raw_results.items():
-            if results_list:
-                sorted_results = sorted(results_list, key=lambda x: x[1], reverse=True)
-                highest_score = sorted_results[0][1]
-                group = {
-                    'category_name': category.display_name,
-                    'priority': category.priority,
-                    'highest_score': highest_score,
-                    'results': sorted_results 
-                }
-                final_groups.append(group)
-        return final_groups
-
-    def score_of_single_match(self, item, keyword, category):
-        if category in (MatchCategory.STOCK_SYMBOL, MatchCategory.ETF_SYMBOL):
-            return self.match_symbol(item.get('symbol', '').lower(), keyword)
-        elif category in (MatchCategory.STOCK_NAME, MatchCategory.ETF_NAME):
-            return self.match_name(item.get('name', '').lower(), keyword)
-        elif category in (MatchCategory.STOCK_TAG, MatchCategory.ETF_TAG):
-            return self.match_tags([t.lower() for t in item.get('tag', [])], keyword)
-        elif category in (MatchCategory.STOCK_DESCRIPTION, MatchCategory.ETF_DESCRIPTION):
-            desc1 = item.get('description1', '').lower()
-            desc2 = item.get('description2', '').lower()
-            return self.match_description(desc1, desc2, keyword)
-        return 0
-
-    def match_symbol(self, symbol, keyword):
-        if symbol == keyword: return 3
-        if keyword in symbol: return 2
-        if self.levenshtein_distance(symbol, keyword) <= 1: return 1
-        return 0
-
-    def match_name(self, name, keyword):
-        if name == keyword: return 4
-        name_words = name.split()
-        if keyword in name_words: return 3
-        if keyword in name: return 2
-        for word in name_words:
-            if self.levenshtein_distance(word, keyword) <= 1: return 1
-        return 0
-
-    def match_tags(self, tags, keyword):
-        max_score = 0
-        for tag in tags:
-            score = 0
-            if tag == keyword: score = 3
-            elif keyword in tag: score = 2
-            elif self.levenshtein_distance(tag, keyword) <= 1: score = 1
-            max_score = max(max_score, score)
-        return max_score
-
-    def match_description(self, desc1, desc2, keyword):
-        full_desc = desc1 + " " + desc2
-        words = full_desc.split()
-        if keyword in words: return 2
-        if keyword in full_desc: return 1
-        return 0
-
-    def levenshtein_distance(self, s1, s2):
-        if len(s1) < len(s2): return self.levenshtein_distance(s2, s1)
-        if len(s2) == 0: return len(s1)
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        return previous_row[-1]
+        return index.search(self.keywords_str, self.use_or)
 
 class CollapsibleWidget(QWidget):
     def __init__(self, title: str = "", parent=None):
@@ -258,14 +152,11 @@ class CollapsibleWidget(QWidget):
         self.content_layout.addWidget(widget)
         self.content_area.adjustSize()
 
-def get_latest_etf_volume(etf_name):
-    if not os.path.exists(DB_PATH): return "N/A"
+def get_latest_etf_volume(cursor, etf_name):
+    if cursor is None: return "N/A"
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=60.0)
-        cursor = conn.cursor()
         cursor.execute("SELECT volume FROM ETFs WHERE name = ? ORDER BY date DESC LIMIT 1", (etf_name,))
         result = cursor.fetchone()
-        conn.close()
         if result and result[0] is not None:
             return f"{int(result[0] / 1000)}K"
         else:
@@ -273,24 +164,127 @@ def get_latest_etf_volume(etf_name):
     except Exception:
         return "N/A"
 
+def get_color_decision_data(cursor, symbol: str) -> tuple[float | None, str | None, date | None]:
+    if cursor is None: return None, None, None
+    try:
+        cursor.execute(
+            "SELECT date, price FROM Earning WHERE name = ? ORDER BY date DESC LIMIT 2",
+            (symbol,)
+        )
+        earning_rows = cursor.fetchall()
+        if not earning_rows:
+            return None, None, None
+        latest_earning_date_str, latest_earning_price_str = earning_rows[0]
+        latest_earning_date = datetime.strptime(latest_earning_date_str, "%Y-%m-%d").date()
+        latest_earning_price = float(latest_earning_price_str) if latest_earning_price_str is not None else 0.0
+
+        days_diff = (date.today() - latest_earning_date).days
+        if days_diff > 75:
+            return latest_earning_price, None, latest_earning_date
+
+        if len(earning_rows) < 2:
+            return latest_earning_price, None, latest_earning_date
+
+        previous_earning_date_str, _ = earning_rows[1]
+        previous_earning_date = datetime.strptime(previous_earning_date_str, "%Y-%m-%d").date()
+
+        sector_table = symbol_to_sector(SECTORS_ALL_PATH).get(symbol)
+        if not sector_table:
+            return latest_earning_price, None, latest_earning_date
+
+        cursor.execute(
+            f'SELECT price FROM "{sector_table}" WHERE name = ? AND date = ?',
+            (symbol, latest_earning_date.isoformat())
+        )
+        latest_stock_price_row = cursor.fetchone()
+        cursor.execute(
+            f'SELECT price FROM "{sector_table}" WHERE name = ? AND date = ?',
+            (symbol, previous_earning_date.isoformat())
+        )
+        previous_stock_price_row = cursor.fetchone()
+
+        if not latest_stock_price_row or not previous_stock_price_row:
+            return latest_earning_price, None, latest_earning_date
+
+        latest_stock_price = float(latest_stock_price_row[0])
+        previous_stock_price = float(previous_stock_price_row[0])
+
+        trend = 'rising' if latest_stock_price > previous_stock_price else 'falling'
+        return latest_earning_price, trend, latest_earning_date
+    except Exception as e:
+        print(f"[颜色决策数据获取错误] {symbol}: {e}")
+        return None, None, None
+
+def symbol_color(earning_price, price_trend):
+    if earning_price is None or price_trend is None:
+        return 'white'
+    is_price_positive = earning_price > 0
+    is_trend_rising = price_trend == 'rising'
+    if is_trend_rising and is_price_positive:
+        return 'red'
+    elif not is_trend_rising and is_price_positive:
+        return '#008B8B'
+    elif is_trend_rising and not is_price_positive:
+        return '#912F2F'
+    return 'green'
+
+def prepare_groups(sorted_groups, max_per_group=None):
+    """
+    在搜索线程里把分组结果整理成可以直接显示的样子：
+    组内按 (得分, 市值) 排序，市值来自一次读入的整张 MNSPP 表；先截断到 max_per_group 条，
+    再只对留下的条目用同一个连接查颜色和 ETF 最新成交量。
+    返回的每组 results 为 [(item, score, 颜色, ETF 成交量或 None)]。
+    """
+    mnspp = load_mnspp(DB_PATH) if os.path.exists(DB_PATH) else {}
+
+    def marketcap(item):
+        value = mnspp.get(item.get("symbol", ""), MNSPP_MISSING)[1]
+        try:
+            return float(value) if value is not None else 0.0
+        except (TypeError, ValueError):
+            return 0.0
+
+    ranked = []
+    for group_data in sorted_groups:
+        results = sorted(group_data['results'], key=lambda x: (x[1], marketcap(x[0])), reverse=True)
+        if max_per_group is not None:
+            results = results[:max_per_group]
+        ranked.append((group_data, results))
+
+    conn = None
+    try:
+        if os.path.exists(DB_PATH):
+            conn = sqlite3.connect(DB_PATH, timeout=60.0)
+    except sqlite3.Error as e:
+        print(f"打开 {DB_PATH} 出错: {e}")
+    try:
+        cursor = conn.cursor() if conn else None
+        prepared = []
+        for group_data, results in ranked:
+            is_stock = 'Stock' in group_data['category_name']
+            rows = []
+            for item, score in results:
+                symbol = item.get('symbol', '')
+                earning_price, price_trend, _ = get_color_decision_data(cursor, symbol)
+                latest_volume = None if is_stock else get_latest_etf_volume(cursor, symbol)
+                rows.append((item, score, symbol_color(earning_price, price_trend), latest_volume))
+            prepared.append(dict(group_data, results=rows))
+        return prepared
+    finally:
+        if conn:
+            conn.close()
+
 def load_compare_data():
-    compare_data = {}
+    # Compare_All.txt 没变时直接复用 Modules_Cache 里的 symbol -> compare 字典（只读）
     try:
-        if os.path.exists(COMPARE_ALL_PATH):
-            with open(COMPARE_ALL_PATH, "r", encoding="utf-8") as f:
-                for line in f:
-                    if ":" in line:
-                        symbol, value = line.strip().split(":", 1)
-                        compare_data[symbol.strip()] = value.strip()
+        return symbol_to_compare(COMPARE_ALL_PATH)
     except Exception as e:
         print(f"读取Compare_All.txt出错: {e}")
-    return compare_data
+    return {}
 
 def load_sectors_data():
     try:
-        if os.path.exists(SECTORS_ALL_PATH):
-            with open(SECTORS_ALL_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        return load_json(SECTORS_ALL_PATH, copy=False)
     except Exception as e:
         print(f"读取 {SECTORS_ALL_PATH} 出错: {e}")
     return {}
@@ -369,8 +363,17 @@ class MainWindow(QMainWindow):
         self.result_scroll.setWidget(self.result_container)
         self.layout.addWidget(self.result_scroll)
 
-        self.search_button.clicked.connect(self.start_search)
-        self.input_field.returnPressed.connect(self.start_search)
+        self.search_button.clicked.connect(lambda: self.start_search())
+        self.input_field.returnPressed.connect(lambda: self.start_search())
+
+        # 边输入边搜索：防抖定时器 + 代号，过期的结果直接丢弃
+        self.live_timer = QTimer()
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(LIVE_SEARCH_DELAY_MS)
+        self.live_timer.timeout.connect(lambda: self.start_search(live=True))
+        self.search_generation = 0
+        self.live_workers = set()
+        self.mode_checkbox.stateChanged.connect(lambda _: self.schedule_live_search())
 
         self.quit_action = QAction("Quit", self)
         self.quit_action.setShortcut(QKeySequence("Esc"))
@@ -382,8 +385,6 @@ class MainWindow(QMainWindow):
         self.focus_search_action.triggered.connect(self.focus_search_input)
         self.addAction(self.focus_search_action)
 
-        self._mnspp_cache = {}
-        self._finance_db = DB_PATH
         self.compare_data = {}
         self.sector_data = load_sectors_data()
 
@@ -400,11 +401,26 @@ class MainWindow(QMainWindow):
             self.current_selected_index = -1
             self.update_result_selection()
 
-    def start_search(self):
+    def start_search(self, live=False):
         keywords = self.input_field.text().strip()
         if not keywords:
             self.clear_results()
             return
+        self.live_timer.stop()
+        self.search_generation += 1
+        use_or = self.mode_checkbox.isChecked()
+        worker = SearchWorker(keywords, JSON_DESCRIPTION_PATH, use_or, self.search_generation,
+                              max_per_group=LIVE_MAX_PER_GROUP if live else None)
+        if live:
+            # 边输入边搜索：不记历史、不锁输入框、不自动打开图表，只预览结果
+            if not self.compare_data:
+                self.compare_data = load_compare_data()
+            worker.results_ready.connect(lambda payload: self.on_results_ready(payload, live=True))
+            # 保留引用直到线程结束，避免 QThread 在运行中被回收
+            self.live_workers.add(worker)
+            worker.finished.connect(lambda w=worker: self.live_workers.discard(w))
+            worker.start()
+            return
         self.search_history.add(keywords)
         self.hide_history()
         self.compare_data = load_compare_data()
@@ -412,12 +428,27 @@ class MainWindow(QMainWindow):
         self.clear_results()
         self.search_button.setEnabled(False)
         self.input_field.setEnabled(False)
-        use_or = self.mode_checkbox.isChecked()
-        self.worker = SearchWorker(keywords, JSON_DESCRIPTION_PATH, use_or)
-        self.worker.results_ready.connect(self.show_results)
+        self.worker = worker
+        self.worker.results_ready.connect(self.on_results_ready)
         self.worker.finished.connect(self.on_search_finished)
         self.worker.start()
 
+    def schedule_live_search(self):
+        if len(self.input_field.text().strip()) >= LIVE_SEARCH_MIN_CHARS and self.input_field.isEnabled():
+            self.live_timer.start()
+        else:
+            self.live_timer.stop()
+
+    def on_results_ready(self, payload, live=False):
+        generation, sorted_groups = payload
+        if generation != self.search_generation:
+            return  # 已经有更新的搜索，丢弃旧结果
+        if live:
+            self.clear_results()
+            self.show_results(sorted_groups, auto_open=False)
+        else:
+            self.show_results(sorted_groups)
+
     def on_text_changed(self, text: str):
          # --- 新增：只要输入框文本改变，立刻清除键盘选中状态 ---
          if getattr(self, "current_selected_index", -1) != -1:
@@ -425,9 +456,12 @@ class MainWindow(QMainWindow):
              self.update_result_selection() # 清除旧结果的高亮
 
          if not text.strip():
+             self.live_timer.stop()
+             self.search_generation += 1
              self.display_history()
          else:
              self.hide_history()
+             self.schedule_live_search()
 
     def on_search_finished(self):
         self.loading_label.hide()
@@ -452,139 +486,34 @@ class MainWindow(QMainWindow):
             if child.widget():
                 child.widget().deleteLater()
 
-    def get_color_decision_data(self, symbol: str) -> tuple[float | None, str | None, date | None]:
-        try:
-            if not os.path.exists(self._finance_db): return None, None, None
-            with sqlite3.connect(self._finance_db, timeout=60.0) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT date, price FROM Earning WHERE name = ? ORDER BY date DESC LIMIT 2",
-                    (symbol,)
-                )
-                earning_rows = cursor.fetchall()
-            if not earning_rows:
-                return None, None, None
-            latest_earning_date_str, latest_earning_price_str = earning_rows[0]
-            latest_earning_date = datetime.strptime(latest_earning_date_str, "%Y-%m-%d").date()
-            latest_earning_price = float(latest_earning_price_str) if latest_earning_price_str is not None else 0.0
-            
-            days_diff = (date.today() - latest_earning_date).days
-            if days_diff > 75:
-                return latest_earning_price, None, latest_earning_date
-            
-            if len(earning_rows) < 2:
-                return latest_earning_price, None, latest_earning_date
-            
-            previous_earning_date_str, _ = earning_rows[1]
-            previous_earning_date = datetime.strptime(previous_earning_date_str, "%Y-%m-%d").date()
-            
-            sector_table = next((s for s, names in self.sector_data.items() if symbol in names), None)
-            if not sector_table:
-                return latest_earning_price, None, latest_earning_date
-            
-            with sqlite3.connect(self._finance_db, timeout=60.0) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    f'SELECT price FROM "{sector_table}" WHERE name = ? AND date = ?',
-                    (symbol, latest_earning_date.isoformat())
-                )
-                latest_stock_price_row = cursor.fetchone()
-                cursor.execute(
-                    f'SELECT price FROM "{sector_table}" WHERE name = ? AND date = ?',
-                    (symbol, previous_earning_date.isoformat())
-                )
-                previous_stock_price_row = cursor.fetchone()
-            
-            if not latest_stock_price_row or not previous_stock_price_row:
-                return latest_earning_price, None, latest_earning_date
-            
-            latest_stock_price = float(latest_stock_price_row[0])
-            previous_stock_price = float(previous_stock_price_row[0])
-            
-            trend = 'rising' if latest_stock_price > previous_stock_price else 'falling'
-            return latest_earning_price, trend, latest_earning_date
-        except Exception as e:
-            print(f"[颜色决策数据获取错误] {symbol}: {e}")
-            return None, None, None
-
-    def get_mnspp_marketcap(self, symbol: str) -> float:
-        if not symbol: return 0.0
-        if symbol in self._mnspp_cache: return self._mnspp_cache[symbol]
-        mcap = 0.0
-        try:
-            if os.path.exists(self._finance_db):
-                conn = sqlite3.connect(self._finance_db, timeout=60.0)
-                cursor = conn.cursor()
-                cursor.execute("SELECT marketcap FROM MNSPP WHERE symbol = ?", (symbol,))
-                row = cursor.fetchone()
-                conn.close()
-                if row and row[0] is not None:
-                    mcap = float(row[0])
-        except Exception as e:
-            print(f"[MNSPP 查询错误] {symbol}: {e}")
-        self._mnspp_cache[symbol] = mcap
-        return mcap
-    
-    def show_results(self, sorted_groups):
+    def show_results(self, sorted_groups, auto_open=True):
+        # sorted_groups 已由 prepare_groups 在搜索线程里排好序、截断并配好颜色
         search_term = self.input_field.text().strip().upper()
-        if sorted_groups:
+        if sorted_groups and auto_open:
             first_group = sorted_groups[0]
             if "Symbol" in first_group['category_name']:
-                first_item, _ = first_group['results'][0]
+                first_item = first_group['results'][0][0]
                 if first_item.get('symbol', '').upper() == search_term:
                     self.open_symbol(first_item['symbol'])
 
         for group_data in sorted_groups:
             category_name = group_data['category_name']
-            results = group_data['results']
-            results = sorted(
-                results,
-                key=lambda x: (
-                    x[1],
-                    self.get_mnspp_marketcap(x[0].get("symbol", ""))
-                ),
-                reverse=True
-            )
-            
             group_widget = CollapsibleWidget(title=category_name)
             
-            for item, score in results:
+            for item, score, sym_color, latest_volume in group_data['results']:
                 symbol = item.get('symbol', '')
                 name = item.get('name', '')
                 tags = ' '.join(item.get('tag', []))
                 compare_info = self.compare_data.get(symbol, "")
                 
-                earning_price, price_trend, _ = self.get_color_decision_data(symbol)
-                
-                sym_color = 'white'
-                if earning_price is not None and price_trend is not None:
-                    is_price_positive = earning_price > 0
-                    is_trend_rising = price_trend == 'rising'
-                    if is_trend_rising and is_price_positive:
-                        sym_color = 'red'
-                    elif not is_trend_rising and is_price_positive:
-                        sym_color = '#008B8B'
-                    elif is_trend_rising and not is_price_positive:
-                        sym_color = '#912F2F'
-                    elif not is_trend_rising and not is_price_positive:
-                        sym_color = 'green'
-                
-                if 'Stock' in category_name:
-                    display_parts = [symbol]
-                    if compare_info: display_parts.append(compare_info)
-                    if name: display_parts.append(name)
-                    if tags: display_parts.append(tags)
-                    display_text = "  ".join(display_parts)
-                    lbl = self.create_result_label(display_text, symbol, sym_color, 20)
-                else: # ETF
-                    latest_volume = get_latest_etf_volume(symbol)
-                    display_parts = [symbol]
-                    if compare_info: display_parts.append(compare_info)
-                    if name: display_parts.append(name)
-                    if tags: display_parts.append(tags)
-                    if latest_volume and latest_volume != "N/A": display_parts.append(latest_volume)
-                    display_text = "  ".join(display_parts)
-                    lbl = self.create_result_label(display_text, symbol, sym_color, 20)
+                display_parts = [symbol]
+                if compare_info: display_parts.append(compare_info)
+                if name: display_parts.append(name)
+                if tags: display_parts.append(tags)
+                if 'Stock' not in category_name and latest_volume and latest_volume != "N/A":
+                    display_parts.append(latest_volume)
+                display_text = "  ".join(display_parts)
+                lbl = self.create_result_label(display_text, symbol, sym_color, 20)
                 
                 # --- 新增：将生成的 label 和对应的 symbol 记录下来 ---
                 self.current_result_items.append((lbl, symbol))
@@ -665,6 +594,7 @@ class MainWindow(QMainWindow):
 
     def open_symbol(self, symbol):
         if symbol:
+            import pyperclip  # 只有点击结果时才用到剪贴板，按需 import
             pyperclip.copy(symbol)
             try:
                 # 使用 sys.executable 调用 Python
@@ -748,6 +678,7 @@ if __name__ == "__main__":
     window = MainWindow()
     window.show()
     if len(sys.argv) > 1 and sys.argv[1] == "paste":
+        import pyperclip
         clipboard_content = pyperclip.paste()
         if clipboard_content:
             window.input_field.setText(clipboard_content)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Search_Index.py
+Search.py 用的 description.json 检索索引（持久化到 Modules/search_index.pkl）
+
+原来 SearchWorker.unified_search 每次搜索都重新读取、解析 description.json，
+再对每只股票 / ETF × 8 个 MatchCategory × 每个关键字逐个比较，
+symbol、名称单词、每个 tag 都跑一遍纯 Python 的 levenshtein_distance。
+
+这里一次性建好索引：
+    - 预先转成小写的 symbol / name / tag / description 字段；
+    - 精确匹配与整词匹配用倒排表：symbol、name 全名、name 单词、tag、description 单词 -> 条目；
+    - 子串匹配在预先小写好的唯一词表 / 字段上做（C 层的 in，不再逐条 lower）；
+    - 编辑距离 ≤1 用"删一个字符"的邻域索引（SymSpell 做法）：词表里每个词连同它所有删掉
+      一个字符的变体登记一次，查询时只需查关键字本身及其删一字符变体，再用 O(n) 的
+      within_one_edit 校验，不再对整个词表跑 Levenshtein；
+    - 以 description.json 的 (mtime_ns, size) 为版本，变了才重建；进程内也缓存一份。
+
+打分规则与原来的 match_symbol / match_name / match_tags / match_description 完全一致。
+
+用法:
+    from Search_Index import get_index
+    index = get_index(JSON_DESCRIPTION_PATH)
+    groups = index.search("apple ai", use_or=False)
+"""
+
+import os
+import json
+import pickle
+import threading
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+INDEX_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "search_index.pkl")
+
+INDEX_VERSION = 1
+
+# (类别键, 展示名, 优先级, 条目类型, 字段)；顺序即原 Search.MatchCategory 的定义顺序
+CATEGORIES = (
+    ("STOCK_SYMBOL", "Stock Symbol", 1000, "stock", "symbol"),
+    ("ETF_SYMBOL", "ETF Symbol", 1000, "etf", "symbol"),
+    ("STOCK_TAG", "Stock Tag", 800, "stock", "tag"),
+    ("ETF_TAG", "ETF Tag", 800, "etf", "tag"),
+    ("STOCK_NAME", "Stock Name", 500, "stock", "name"),
+    ("ETF_NAME", "ETF Name", 500, "etf", "name"),
+    ("STOCK_DESCRIPTION", "Stock Description", 300, "stock", "description"),
+    ("ETF_DESCRIPTION", "ETF Description", 300, "etf", "description"),
+)
+
+
+# =========================================================
+# 编辑距离 ≤1
+# =========================================================
+
+def deletes1(word):
+    """word 删掉一个字符得到的所有变体"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one_edit(a, b):
+    """Levenshtein(a, b) <= 1，线性时间"""
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la < lb:
+        a, b, la, lb = b, a, lb, la
+    i = 0
+    while i < lb and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:]
+    return a[i + 1:] == b[i:]
+
+
+class FuzzyVocab:
+    """一个字段的词表 + 删一字符邻域索引"""
+
+    def __init__(self, words):
+        self.words = set(words)
+        self.neighbours = {}
+        for w in self.words:
+            for key in deletes1(w) | {w}:
+                self.neighbours.setdefault(key, set()).add(w)
+
+    def within_one(self, keyword):
+        """词表中与 keyword 编辑距离 ≤1 的词"""
+        candidates = set()
+        for key in deletes1(keyword) | {keyword}:
+            found = self.neighbours.get(key)
+            if found:
+                candidates |= found
+        return {w for w in candidates if within_one_edit(w, keyword)}
+
+
+# =========================================================
+# 索引
+# =========================================================
+
+def _add(postings, key, i):
+    postings.setdefault(key, set()).add(i)
+
+
+class SearchIndex:
+    def __init__(self, data, stamp=None):
+        self.stamp = stamp
+        self.items = []         # [(item_type, item)]
+        self.types = []         # 与 items 对齐
+        self.symbol = []        # 小写字段
+        self.name = []
+        self.desc = []
+        self.by_type = {"stock": set(), "etf": set()}
+
+        self.symbol_exact = {}      # symbol -> {i}
+        self.name_exact = {}        # name -> {i}
+        self.name_word = {}         # name 单词 -> {i}
+        self.tag_exact = {}         # tag -> {i}
+        self.desc_word = {}         # description 单词 -> {i}
+
+        for item_type, key in (("stock", "stocks"), ("etf", "etfs")):
+            for item in data.get(key, []):
+                i = len(self.items)
+                self.items.append((item_type, item))
+                self.types.append(item_type)
+                self.by_type[item_type].add(i)
+
+                symbol = item.get("symbol", "").lower()
+                name = item.get("name", "").lower()
+                tags = [t.lower() for t in item.get("tag", [])]
+                desc = item.get("description1", "").lower() + " " + item.get("description2", "").lower()
+                self.symbol.append(symbol)
+                self.name.append(name)
+                self.desc.append(desc)
+
+                _add(self.symbol_exact, symbol, i)
+                _add(self.name_exact, name, i)
+                for w in name.split():
+                    _add(self.name_word, w, i)
+                for t in tags:
+                    _add(self.tag_exact, t, i)
+                for w in desc.split():
+                    _add(self.desc_word, w, i)
+
+        self.symbol_fuzzy = FuzzyVocab(self.symbol_exact)
+        self.name_fuzzy = FuzzyVocab(self.name_word)
+        self.tag_fuzzy = FuzzyVocab(self.tag_exact)
+
+    # ---------- 单字段打分：返回 {i: score}，只含 score > 0 ----------
+
+    def _score_symbol(self, kw):
+        scores = {}
+        for w in self.symbol_fuzzy.within_one(kw):
+            for i in self.symbol_exact[w]:
+                scores[i] = 1
+        for w in self.symbol_exact:
+            if kw in w:
+                for i in self.symbol_exact[w]:
+                    scores[i] = 2
+        for i in self.symbol_exact.get(kw, ()):
+            scores[i] = 3
+        return scores
+
+    def _score_name(self, kw):
+        scores = {}
+        for w in self.name_fuzzy.within_one(kw):
+            for i in self.name_word[w]:
+                scores[i] = 1
+        for name, ids in self.name_exact.items():
+            if kw in name:
+                for i in ids:
+                    scores[i] = 2
+        for i in self.name_word.get(kw, ()):
+            scores[i] = 3
+        for i in self.name_exact.get(kw, ()):
+            scores[i] = 4
+        return scores
+
+    def _score_tag(self, kw):
+        # 每个条目取所有 tag 中的最高分
+        scores = {}
+        for t in self.tag_fuzzy.within_one(kw):
+            for i in self.tag_exact[t]:
+                scores[i] = 1
+        for t, ids in self.tag_exact.items():
+            if kw in t:
+                for i in ids:
+                    scores[i] = 2
+        for i in self.tag_exact.get(kw, ()):
+            scores[i] = 3
+        return scores
+
+    def _score_description(self, kw):
+        scores = {i: 1 for i, d in enumerate(self.desc) if kw in d}
+        for i in self.desc_word.get(kw, ()):
+            scores[i] = 2
+        return scores
+
+    def field_scores(self, field, kw):
+        return getattr(self, "_score_" + field)(kw)
+
+    # ---------- 查询 ----------
+
+    def search(self, keywords_str, use_or=False):
+        """
+        返回与原 SearchWorker.unified_search 相同结构的分组列表（未排序）：
+        [{'category_name', 'priority', 'highest_score', 'results': [(item, score)], 'category'}]
+        """
+        keywords = [k for k in keywords_str.lower().split() if k]
+        if not keywords:
+            return []
+        cache = {}   # 同一字段同一关键字在 stock / etf 两个类别里只算一次
+        groups = []
+        for cat_key, display_name, priority, item_type, field in CATEGORIES:
+            allowed = self.by_type[item_type]
+            totals = None
+            for kw in keywords:
+                if (field, kw) not in cache:
+                    cache[(field, kw)] = self.field_scores(field, kw)
+                scores = cache[(field, kw)]
+                if use_or:
+                    totals = totals or {}
+                    for i, s in scores.items():
+                        if i in allowed:
+                            totals[i] = totals.get(i, 0) + s
+                elif totals is None:
+                    totals = {i: s for i, s in scores.items() if i in allowed}
+                else:
+                    totals = {i: t + scores[i] for i, t in totals.items() if i in scores}
+                if not use_or and not totals:
+                    break
+            if not totals:
+                continue
+            # 同分时保持 description.json 中的原始顺序（与原实现的稳定排序一致）
+            results = sorted(((self.items[i][1], s, i) for i, s in totals.items()),
+                             key=lambda x: (-x[1], x[2]))
+            groups.append({
+                'category': cat_key,
+                'category_name': display_name,
+                'priority': priority,
+                'highest_score': results[0][1],
+                'results': [(item, s) for item, s, _ in results],
+            })
+        return groups
+
+
+# =========================================================
+# 持久化 / 进程内缓存
+# =========================================================
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def build_index(json_path, index_path=INDEX_PATH):
+    stamp = _file_stamp(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    index = SearchIndex(data, stamp)
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((INDEX_VERSION, os.path.abspath(json_path), index), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"保存搜索索引失败: {e}")
+    return index
+
+
+def _load_persisted(json_path, stamp, index_path):
+    try:
+        with open(index_path, 'rb') as f:
+            version, source, index = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+        return None
+    if version != INDEX_VERSION or source != os.path.abspath(json_path) or index.stamp != stamp:
+        return None
+    return index
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_index(json_path, index_path=INDEX_PATH):
+    """当前 description.json 对应的索引；文件没变时直接复用内存 / 磁盘上的索引"""
+    global _INDEX
+    stamp = _file_stamp(json_path)
+    with _INDEX_LOCK:
+        if _INDEX is not None and _INDEX.stamp == stamp:
+            return _INDEX
+        index = _load_persisted(json_path, stamp, index_path)
+        if index is None:
+            index = build_index(json_path, index_path)
+        _INDEX = index
+        return index
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    # 通过模块名调用，保证 pickle 里记录的是 Search_Index.SearchIndex 而不是 __main__.SearchIndex
+    import Search_Index
+    json_path = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "description.json")
+    t0 = time.perf_counter()
+    idx = Search_Index.build_index(json_path)
+    print(f"索引已重建: {len(idx.items)} 条, 用时 {time.perf_counter() - t0:.2f}s -> {INDEX_PATH}")
+    for q in sys.argv[1:]:
+        t0 = time.perf_counter()
+        groups = idx.search(q)
+        print(f"{q!r}: {sum(len(g['results']) for g in groups)} 条命中, {(time.perf_counter() - t0) * 1000:.1f} ms")
@@ -31,6 +31,10 @@ try:
 except ImportError:
     print(f"错误：无法从路径 '{chart_input_path}' 导入 'plot_financial_data'。")
     sys.exit(1)
+from Tool_Host import launch as launch_in_tool_host
+from Tag_Similarity import get_tag_index, load_mnspp, MNSPP_MISSING
+from Tag_Neighbours import load_neighbours
+from Modules_Cache import load_json, symbol_to_compare, symbol_to_sector
 
 # --- 文件路径 ---
 DESCRIPTION_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "description.json")
@@ -69,80 +73,68 @@ def get_exact_symbol_name(symbol, data):
     忽略大小写在 description.json 中查找 symbol。
     如果找到，返回 JSON 中准确的大小写形式；如果没找到，返回原输入。
     """
-    target_lower = symbol.lower()
-    for category in ['stocks', 'etfs']:
-        for item in data.get(category, []):
-            if item.get('symbol', '').lower() == target_lower:
-                return item.get('symbol')
-    return symbol
+    return get_tag_index(data).exact_symbol(symbol)
 
 def find_tags_by_symbol(symbol, data, tags_weight_config):
-    tags_with_weight = []
-    for category in ['stocks', 'etfs']:
-        for item in data.get(category, []):
-            if item.get('symbol') == symbol:
-                for tag in item.get('tag', []):
-                    weight = tags_weight_config.get(tag, DEFAULT_WEIGHT)
-                    tags_with_weight.append((tag, weight))
-                return tags_with_weight
-    return []
+    item = get_tag_index(data).item_of(symbol)
+    if item is None:
+        return []
+    return [(tag, tags_weight_config.get(tag, DEFAULT_WEIGHT)) for tag in item.get('tag', [])]
 
 def get_symbol_type(symbol, data):
-    for item in data.get('stocks', []):
-        if item.get('symbol') == symbol: return 'stock'
-    for item in data.get('etfs', []):
-        if item.get('symbol') == symbol: return 'etf'
-    return None
+    return get_tag_index(data).symbol_type(symbol)
 
 def find_symbols_by_tags(target_tags_with_weight, data):
+    # 匹配规则见 Tag_Similarity.match_item_tags；这里只负责阈值过滤和排序
     related_symbols = {'stocks': [], 'etfs': []}
-    target_tags_dict = {tag.lower(): weight for tag, weight in target_tags_with_weight}
-    for category in ['stocks', 'etfs']:
-        for item in data.get(category, []):
-            tags = item.get('tag', [])
-            matched_tags = []
-            used_tags = set()
-            # 完全匹配
-            for tag in tags:
-                t_low = tag.lower()
-                if t_low in target_tags_dict and t_low not in used_tags:
-                    matched_tags.append((tag, target_tags_dict[t_low]))
-                    used_tags.add(t_low)
-            # 部分匹配
-            for tag in tags:
-                t_low = tag.lower()
-                if t_low in used_tags: continue
-                for target_tag, target_weight in target_tags_dict.items():
-                    if (target_tag in t_low or t_low in target_tag) and t_low != target_tag:
-                        if target_tag not in used_tags:
-                            weight_to_use = Decimal('1.0') if target_weight > Decimal('1.0') else target_weight
-                            matched_tags.append((tag, weight_to_use))
-                            used_tags.add(target_tag)
-                        break
-            if matched_tags:
-                # 计算当前标的匹配到的总权重
-                total_weight = sum(float(w) for _, w in matched_tags)
-                # 只有总权重 > 0.4 时，才将其加入到关联列表中予以输出
-                if total_weight > 0.4:
-                    related_symbols[category].append((item['symbol'], matched_tags, tags))
+    for category, symbol, matched_tags, tags in get_tag_index(data).match(target_tags_with_weight):
+        # 计算当前标的匹配到的总权重
+        total_weight = sum(float(w) for _, w in matched_tags)
+        # 只有总权重 > 0.4 时，才将其加入到关联列表中予以输出
+        if total_weight > 0.4:
+            related_symbols[category].append((symbol, matched_tags, tags))
+
+    # 市值排序用的 MNSPP 整表一次读入，不再每个元素开一次连接
+    mnspp = load_mnspp(DB_PATH)
+    for cat in related_symbols:
+        related_symbols[cat].sort(
+            key=lambda x: (sum(w for _, w in x[1]), mnspp.get(x[0], MNSPP_MISSING)[1] or 0),
+            reverse=True
+        )
+    return related_symbols
 
+def load_related_symbols(symbol, data):
+    """
+    读 Tag_Neighbours 预先算好的邻居，结构与 find_symbols_by_tags 的返回值相同。
+    还没算、已过期，或某一类被截断（超过 Tag_Neighbours.TOP_K 个，列表不完整）时返回 None，
+    由调用方实时计算。
+    """
+    neighbours = load_neighbours(symbol, DESCRIPTION_PATH, WEIGHT_CONFIG_PATH, DB_PATH, data=data)
+    if neighbours is None:
+        return None
+    # 窗口里要列出全部匹配项，截断的预计算结果不能用
+    if any(neighbours['truncated'].get(cat) for cat in ('stocks', 'etfs')):
+        return None
+    index = get_tag_index(data)
+    mnspp = load_mnspp(DB_PATH)
+    related_symbols = {'stocks': [], 'etfs': []}
     for cat in related_symbols:
+        for sym, matched_tags in neighbours[cat]:
+            if sum(float(w) for _, w in matched_tags) > 0.4:
+                item = index.item_of(sym)
+                related_symbols[cat].append((sym, matched_tags, item.get('tag', []) if item else []))
+        # 市值按当前 MNSPP 重新排序
         related_symbols[cat].sort(
-            key=lambda x: (sum(w for _, w in x[1]), fetch_mnspp_data_from_db(DB_PATH, x[0])[1] or 0),
+            key=lambda x: (sum(w for _, w in x[1]), mnspp.get(x[0], MNSPP_MISSING)[1] or 0),
             reverse=True
         )
     return related_symbols
 
 def load_compare_data(file_path):
-    data = {}
+    # Modules_Cache 里的 symbol -> compare 字典（只读）
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                if ':' in line:
-                    s, v = line.split(':', 1)
-                    data[s.strip()] = v.strip()
-    except Exception: pass
-    return data
+        return symbol_to_compare(file_path)
+    except Exception: return {}
 
 # --- 新增：解析 Earnings_Release.txt 获取最新日期的函数 ---
 def load_earnings_release_data(file_path):
@@ -169,10 +161,10 @@ def load_earnings_release_data(file_path):
     # 只返回格式化好的字符串，例如 {'LPL': '0423后'}
     return {k: v['formatted'] for k, v in data.items()}
 
-def load_json_data(file_path):
+def load_json_data(file_path, copy=True):
+    # 经 Modules_Cache：文件没变时不再重新解析；copy=False 返回共享对象，只能读不能改
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json(file_path, copy=copy)
     except Exception: return {}
 
 def get_stock_symbol(default_symbol=""):
@@ -215,7 +207,7 @@ def execute_external_script(script_type, keyword):
     try:
         if script_type in ['futu', 'kimi']:
             subprocess.Popen(['osascript', path, keyword])
-        else:
+        elif not launch_in_tool_host(path, [keyword]):
             py_path = sys.executable
             subprocess.Popen([py_path, path, keyword])
     except Exception as e: print(f"执行脚本错误: {e}")
@@ -352,7 +344,9 @@ class SimilarityViewerWindow(QMainWindow):
             return
         self.source_symbol = symbol
         self.source_tags = tags
-        self.related_symbols = find_symbols_by_tags(tags, self.json_data)
+        self.related_symbols = load_related_symbols(symbol, self.json_data)
+        if self.related_symbols is None:
+            self.related_symbols = find_symbols_by_tags(tags, self.json_data)
         self.clear_content()
         self.populate_ui(self.main_layout)
 
@@ -393,7 +387,7 @@ class SimilarityViewerWindow(QMainWindow):
             prev_date_str = rows[1][0]
             prev_date = datetime.strptime(prev_date_str, "%Y-%m-%d").date()
 
-            sec_table = next((s for s, names in self.sector_data.items() if symbol in names), None)
+            sec_table = symbol_to_sector(SECTORS_ALL_PATH).get(symbol)
             if not sec_table: return lat_price, None, lat_date
 
             with sqlite3.connect(DB_PATH, timeout=60.0) as conn:
@@ -424,7 +418,7 @@ class SimilarityViewerWindow(QMainWindow):
             earning_date_str, earning_price_str = row
             earning_price = float(earning_price_str) if earning_price_str else 0.0
             
-            sec_table = next((s for s, names in self.sector_data.items() if symbol in names), None)
+            sec_table = symbol_to_sector(SECTORS_ALL_PATH).get(symbol)
             if not sec_table:
                 return earning_price, None
                 
@@ -627,7 +621,7 @@ class SimilarityViewerWindow(QMainWindow):
         elif symbol in self.ordered_symbols_on_screen:
             self.current_symbol_index = self.ordered_symbols_on_screen.index(symbol)
 
-        sector = next((s for s, names in self.sector_data.items() if symbol in names), None)
+        sector = symbol_to_sector(SECTORS_ALL_PATH).get(symbol)
         comp = self.compare_data.get(symbol, "N/A")
         shares, mcap, pe, pb = fetch_mnspp_data_from_db(DB_PATH, symbol)
         try:
@@ -769,7 +763,7 @@ if __name__ == '__main__':
     if not symbol: sys.exit()
 
     try:
-        desc_data = load_json_data(DESCRIPTION_PATH)
+        desc_data = load_json_data(DESCRIPTION_PATH, copy=False)
         w_groups = load_weight_groups()
         tw_cfg = {tag: w for w, tags in w_groups.items() for tag in tags}
         
@@ -780,7 +774,7 @@ if __name__ == '__main__':
             "description": desc_data,
             "compare": load_compare_data(COMPARE_DATA_PATH),
             "earnings_release": earnings_release_data, # 传入新数据
-            "sectors": load_json_data(SECTORS_ALL_PATH),
+            "sectors": load_json_data(SECTORS_ALL_PATH, copy=False),
             "tags_weight": tw_cfg,
             "panel_config": load_json_data(PANEL_CONFIG_PATH),
             "panel_config_path": PANEL_CONFIG_PATH,
@@ -797,7 +791,9 @@ if __name__ == '__main__':
         QMessageBox.information(None, "未找到", f"找不到符号 '{symbol}' 的标签。")
         sys.exit()
 
-    related = find_symbols_by_tags(target_tags, desc_data)
+    related = load_related_symbols(symbol, desc_data)
+    if related is None:
+        related = find_symbols_by_tags(target_tags, desc_data)
     main_window = SimilarityViewerWindow(symbol, target_tags, related, all_data)
     main_window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Series_Cache.py
+Chart_input 画图用的单只 symbol 价格序列缓存（进程内共享，按字节预算 LRU 淘汰）
+
+原来的 Chart_input.fetch_data 是 @lru_cache(maxsize=None)：
+    - 不设上限，常驻的 Tool_Host 里开过的图越多占用越大，数据库夜间更新后也一直是旧数据；
+    - 每次新开一个连接，并按 "OHLC -> open -> volume -> 只有 price" 最多试 4 条 SELECT。
+这里改为：
+    - 每张表第一次用到时读一次 PRAGMA table_info，得到该表有哪些可选列，之后一条 SELECT 搞定；
+    - 结果存成 NumPy 列（PriceSeries），按 nbytes 计入预算，超出时淘汰最久未用的；
+    - 数据库文件（含 -wal）的 mtime / size 变化时整体失效；
+    - prefetch() 在后台线程预读相邻 symbol，Panel / Check_HighLow / Check_Earning_Similar
+      上下切换时下一张图直接命中缓存。
+
+用法:
+    from Series_Cache import get_series_cache
+    cache = get_series_cache(DB_PATH)
+    series = cache.get("Technology", "AAPL")
+    cache.prefetch([("Technology", "MSFT"), ("Energy", "XOM")])
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+OPTIONAL_COLUMNS = ("volume", "open", "high", "low")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024   # 约 64MB，十年日线一只 symbol 大约 120KB
+INFLIGHT_WAIT = 10.0                   # 秒；前台要的 symbol 正在后台预读时最多等这么久
+
+
+def _to_float_array(values):
+    """None -> NaN；库里偶尔有字符串数字，整列转换失败时逐个转"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+class PriceSeries:
+    """一只 symbol 的日线，按日期升序；缺失的列整列为 NaN"""
+    __slots__ = ("dates", "price", "volume", "open", "high", "low", "columns")
+
+    def __init__(self, dates, price, volume, open_, high, low, columns):
+        self.dates = dates          # datetime64[D]
+        self.price = price          # float64，以下同，NULL 为 NaN
+        self.volume = volume
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.columns = columns      # 表里实际存在的可选列
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in ("dates", "price", "volume", "open", "high", "low"))
+
+    @classmethod
+    def from_rows(cls, rows, columns):
+        """rows: [(date, price, *columns)]"""
+        dates = np.array([r[0] for r in rows], dtype="datetime64[D]")
+        price = _to_float_array([r[1] for r in rows])
+        cols = {}
+        for name in OPTIONAL_COLUMNS:
+            if name in columns:
+                cols[name] = _to_float_array([r[2 + columns.index(name)] for r in rows])
+            else:
+                cols[name] = np.full(len(rows), np.nan)
+        keep = ~np.isnat(dates)
+        if not keep.all():
+            dates, price = dates[keep], price[keep]
+            cols = {k: v[keep] for k, v in cols.items()}
+        return cls(dates, price, cols["volume"], cols["open"], cols["high"], cols["low"], tuple(columns))
+
+
+class SeriesCache:
+    def __init__(self, db_path, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (table, name) -> PriceSeries，末尾为最近使用
+        self._bytes = 0
+        self._columns = {}              # table -> 该表存在的可选列（tuple）
+        self._stamp = None
+        self._inflight = {}             # (table, name) -> threading.Event，后台正在读的
+        self._local = threading.local()
+        self._pending = deque()
+        self._pending_set = set()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 连接 / 失效 ----------
+
+    def _conn(self):
+        # 每个线程各用一个只读连接，后台预读线程不和主线程抢同一个连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=60.0)
+            self._local.conn = conn
+        return conn
+
+    def _db_stamp(self):
+        stamp = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _check_fresh_locked(self):
+        stamp = self._db_stamp()
+        if stamp != self._stamp:
+            if self._stamp is not None:
+                self._entries.clear()
+                self._bytes = 0
+                self._columns.clear()
+            self._stamp = stamp
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._columns.clear()
+
+    # ---------- 读取 ----------
+
+    def table_columns(self, table_name):
+        """表里存在的可选列；表不存在或缺少 date/price 时抛 ValueError"""
+        with self._lock:
+            cols = self._columns.get(table_name)
+        if cols is None:
+            info = self._conn().execute(f'PRAGMA table_info("{table_name}")').fetchall()
+            existing = {r[1] for r in info}
+            if not {"name", "date", "price"}.issubset(existing):
+                raise ValueError(f"表 {table_name} 不存在或缺少 name/date/price 列")
+            cols = tuple(c for c in OPTIONAL_COLUMNS if c in existing)
+            with self._lock:
+                self._columns[table_name] = cols
+        return cols
+
+    def _load(self, table_name, name):
+        columns = self.table_columns(table_name)
+        select_cols = ", ".join(("date", "price") + columns)
+        rows = self._conn().execute(
+            f'SELECT {select_cols} FROM "{table_name}" WHERE name = ? ORDER BY date;', (name,)
+        ).fetchall()
+        if not rows:
+            raise ValueError("没有查询到可用数据")
+        return PriceSeries.from_rows(rows, columns)
+
+    def _put(self, key, series):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = series
+            self._bytes += series.nbytes
+            # 至少保留刚放进去的这一条
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def get(self, table_name, name):
+        """返回 PriceSeries；没有数据时抛 ValueError（与原 fetch_data 一致）"""
+        key = (table_name, name)
+        with self._lock:
+            self._check_fresh_locked()
+            series = self._entries.get(key)
+            if series is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return series
+            event = self._inflight.get(key)
+        if event is not None:
+            # 后台正在预读这一只，等它读完比再查一遍快
+            event.wait(INFLIGHT_WAIT)
+            with self._lock:
+                series = self._entries.get(key)
+                if series is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return series
+        with self._lock:
+            self.misses += 1
+        series = self._load(table_name, name)
+        self._put(key, series)
+        return series
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    # ---------- 后台预读 ----------
+
+    def prefetch(self, pairs):
+        """pairs: [(table, name)]；在后台线程按顺序读入缓存，已缓存 / 已排队的跳过"""
+        added = False
+        with self._lock:
+            self._check_fresh_locked()
+            for table_name, name in pairs:
+                key = (table_name, name)
+                if not table_name or not name or key in self._entries or key in self._pending_set:
+                    continue
+                self._pending.append(key)
+                self._pending_set.add(key)
+                self._inflight[key] = threading.Event()
+                added = True
+            if added and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._prefetch_loop, daemon=True)
+                self._worker.start()
+        if added:
+            self._wakeup.set()
+
+    def _prefetch_loop(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._wakeup.clear()
+                    key = None
+                else:
+                    key = self._pending.popleft()
+                    self._pending_set.discard(key)
+            if key is None:
+                # 空闲 30 秒没有新任务就退出线程，下次 prefetch 再拉起
+                if not self._wakeup.wait(30.0):
+                    with self._lock:
+                        if not self._pending:
+                            self._worker = None
+                            return
+                continue
+            try:
+                if key not in self:
+                    self._put(key, self._load(*key))
+            except (ValueError, sqlite3.Error) as e:
+                print(f"[Series_Cache] 预读 {key[0]}/{key[1]} 失败: {e}")
+            finally:
+                with self._lock:
+                    event = self._inflight.pop(key, None)
+                if event is not None:
+                    event.set()
+
+
+def adjacent_items(items, index, radius=1):
+    """循环列表里 index 前后各 radius 个元素（先后、再前；去重，不含自身）"""
+    n = len(items)
+    if n <= 1 or index is None or not (0 <= index < n):
+        return []
+    result = []
+    for step in range(1, radius + 1):
+        for i in ((index + step) % n, (index - step) % n):
+            item = items[i]
+            if i != index and item not in result and item != items[index]:
+                result.append(item)
+    return result
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+def get_series_cache(db_path, max_bytes=DEFAULT_MAX_BYTES):
+    """同一个数据库共用一个缓存（进程内单例）"""
+    with _CACHES_LOCK:
+        cache = _CACHES.get(db_path)
+        if cache is None:
+            cache = _CACHES[db_path] = SeriesCache(db_path, max_bytes)
+        return cache
+
+
+def prefetch_adjacent(db_path, symbols, index, sector_of, radius=1):
+    """预读 symbols[index] 前后的 symbol；sector_of(symbol) 返回表名，找不到返回 None"""
+    pairs = []
+    for symbol in adjacent_items(symbols, index, radius):
+        sector = sector_of(symbol)
+        if sector:
+            pairs.append((sector, symbol))
+    if pairs:
+        get_series_cache(db_path).prefetch(pairs)
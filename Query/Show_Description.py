@@ -1,5 +1,4 @@
 import sys
-import json
 import pyperclip
 import subprocess
 from functools import lru_cache
@@ -32,10 +31,12 @@ NORD_THEME = {
 
 import os
 
+from Modules_Cache import load_json as load_cached_json
+
 # ---------------- 公共函数 ----------------
 def load_json_data(path):
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    # 经 Modules_Cache：description.json 没变时直接读 pickle 快照；只读使用
+    return load_cached_json(path, copy=False)
 
 def find_in_json(symbol, data):
     """在JSON数据中查找名称为symbol的股票或ETF"""
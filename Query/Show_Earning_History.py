@@ -39,12 +39,15 @@ except ImportError:
     def plot_financial_data(*args, **kwargs):
         print("plot_financial_data 模拟调用:", args)
 
+from Modules_Cache import load_json, symbol_to_compare, symbol_to_sector
+from Earning_History_Store import export_if_dirty as export_earning_history
+
 # --- 核心逻辑函数 (复用与简化) ---
 
-def load_json_data(file_path):
+def load_json_data(file_path, copy=True):
+    # 经 Modules_Cache：文件没变时不再重新解析；copy=False 返回共享对象，只能读不能改
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json(file_path, copy=copy)
     except Exception as e:
         print(f"读取 {file_path} 失败: {e}")
         return {}
@@ -68,15 +71,10 @@ def fetch_mnspp_data_from_db(db_path, symbol):
         return ("N/A", None, "N/A", "--")
 
 def load_compare_data(file_path):
-    data = {}
+    # Modules_Cache 里的 symbol -> compare 字典（只读）
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                if ':' in line:
-                    s, v = line.split(':', 1)
-                    data[s.strip()] = v.strip()
-    except Exception: pass
-    return data
+        return symbol_to_compare(file_path)
+    except Exception: return {}
 
 def find_tags_by_symbol(symbol, data, tags_weight_config):
     tags_with_weight = []
@@ -195,10 +193,9 @@ class SymbolCard(QWidget):
     def on_click(self):
         # 准备数据调用 plot_financial_data
         desc_data = self.all_data['description']
-        sector_data = self.all_data['sectors']
         compare_data = self.all_data['compare']
         
-        sector = next((s for s, names in sector_data.items() if self.symbol in names), None)
+        sector = symbol_to_sector(SECTORS_ALL_PATH).get(self.symbol)
         comp = compare_data.get(self.symbol, "N/A")
         shares, mcap, pe, pb = fetch_mnspp_data_from_db(DB_PATH, self.symbol)
         
@@ -280,9 +277,11 @@ class EarningHistoryViewer(QMainWindow):
         self.apply_stylesheet()
 
     def load_all_data(self):
+        # 扫描脚本只写库，读 JSON 前先把没导出的记录导出
+        export_earning_history(DB_PATH, EARNING_HISTORY_PATH)
         self.earning_data = load_json_data(EARNING_HISTORY_PATH)
-        self.desc_data = load_json_data(DESCRIPTION_PATH)
-        self.sector_data = load_json_data(SECTORS_ALL_PATH)
+        self.desc_data = load_json_data(DESCRIPTION_PATH, copy=False)
+        self.sector_data = load_json_data(SECTORS_ALL_PATH, copy=False)
         self.compare_data = load_compare_data(COMPARE_DATA_PATH)
         
         w_groups = load_weight_groups()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup_Profile.py
+Query 下各 GUI 入口的冷启动 / import 耗时分析与回归检查
+
+每个入口在全新的 python 进程里用 -X importtime 只做一次 import（不建窗口，
+__main__ 分支不会执行），得到:
+    - 进程总耗时（解释器启动 + 模块顶层 import）；
+    - 按顶层包汇总的 self 耗时（matplotlib / PyQt6 / scipy / pandas ...），互不重叠，
+      加起来就是 import 总耗时，哪个包拖慢了启动一目了然。
+
+用法:
+    python Startup_Profile.py                       # 各入口 import 耗时报告（每个入口 top 包）
+    python Startup_Profile.py Chart_input --top 25  # 只看某个入口
+    python Startup_Profile.py --bench --runs 7      # 冷启动基准（取中位数），追加记录到历史
+    python Startup_Profile.py --bench --save-baseline
+    python Startup_Profile.py --check               # 与基线比较，变慢或多出重型包时返回 1
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+QUERY_DIR = os.path.join(BASE_CODING_DIR, "Financial_System", "Query")
+SELENIUM_DIR = os.path.join(BASE_CODING_DIR, "Financial_System", "Selenium")
+BASELINE_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "Startup_Baseline.json")
+HISTORY_PATH = os.path.join(USER_HOME, "Downloads", "Startup_Profile", "startup_history.jsonl")
+
+# 需要关注冷启动的 GUI 入口（Query 目录下的模块名）
+ENTRY_POINTS = (
+    "Chart_input",
+    "Panel",
+    "Search",
+    "Stock_Chart",
+    "Check_HighLow",
+    "Search_Similar_Tag",
+    "Check_Earning_history",
+)
+
+# 回归判定：中位数比基线慢 REGRESSION_RATIO 且绝对值多出 REGRESSION_MIN_MS 才算
+REGRESSION_RATIO = 0.20
+REGRESSION_MIN_MS = 40.0
+# 基线里没有、self 耗时超过这个值的新顶层包视为回归（例如有人在顶层加了 import scipy）
+NEW_PACKAGE_MIN_MS = 15.0
+
+# import time:       self [us] |   cumulative | imported package
+_IMPORTTIME_RE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)\s*$")
+
+
+def _probe_code(module):
+    # 与 Tool_Host 一样把 Query / Selenium 放进 sys.path，模拟脚本实际的 import 环境
+    return (
+        "import sys, time\n"
+        f"sys.path[:0] = [{QUERY_DIR!r}, {SELENIUM_DIR!r}]\n"
+        "t0 = time.perf_counter()\n"
+        f"import {module}\n"
+        "sys.stdout.write('@@IMPORT_MS %.3f\\n' % ((time.perf_counter() - t0) * 1000))\n"
+    )
+
+
+def parse_importtime(stderr):
+    """返回 ({顶层包: self 毫秒}, [(层级, 模块名, self 毫秒, cumulative 毫秒)])"""
+    by_package = {}
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        level = max(0, (len(indent) - 1) // 2)
+        root = name.split(".")[0]
+        by_package[root] = by_package.get(root, 0.0) + self_us / 1000
+        rows.append((level, name, self_us / 1000, cum_us / 1000))
+    return by_package, rows
+
+
+def probe(module, query_dir=None):
+    """在全新进程里 import 一次 module；返回 dict（wall_ms / import_ms / packages / rows / error）"""
+    cwd = query_dir or QUERY_DIR
+    env = dict(os.environ)
+    # 不让 matplotlib 在探测时去找 GUI 后端
+    env.setdefault("MPLBACKEND", "Agg")
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _probe_code(module)],
+        cwd=cwd if os.path.isdir(cwd) else None, env=env,
+        capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+    packages, rows = parse_importtime(proc.stderr)
+    import_ms = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@IMPORT_MS "):
+            import_ms = float(line.split()[1])
+    error = None
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        error = tail[-1] if tail else f"退出码 {proc.returncode}"
+    return {
+        "wall_ms": wall_ms,
+        "import_ms": import_ms,
+        "packages": packages,
+        "rows": rows,
+        "error": error,
+    }
+
+
+def report(modules, top, query_dir=None):
+    for module in modules:
+        result = probe(module, query_dir)
+        print(f"\n===== {module} =====")
+        if result["error"]:
+            print(f"  ❌ import 失败: {result['error']}")
+        import_text = f"{result['import_ms']:.0f} ms" if result["import_ms"] is not None else "—"
+        print(f"  进程总耗时 {result['wall_ms']:.0f} ms，模块 import {import_text}")
+        packages = sorted(result["packages"].items(), key=lambda kv: kv[1], reverse=True)
+        print("  按顶层包 (self 合计):")
+        for name, ms in packages[:top]:
+            print(f"    {ms:8.1f} ms  {name}")
+        print("  最重的直接 import (cumulative):")
+        direct = [r for r in result["rows"] if r[0] == 1]
+        for level, name, self_ms, cum_ms in sorted(direct, key=lambda r: r[3], reverse=True)[:top]:
+            print(f"    {cum_ms:8.1f} ms  {name}")
+
+
+def bench(modules, runs, query_dir=None):
+    """每个入口冷启动 runs 次，返回 {模块: {wall_ms, import_ms, packages, error}}（均取中位数）"""
+    results = {}
+    for module in modules:
+        samples = [probe(module, query_dir) for _ in range(runs)]
+        error = next((s["error"] for s in samples if s["error"]), None)
+        package_names = set().union(*(s["packages"] for s in samples))
+        results[module] = {
+            "wall_ms": round(statistics.median(s["wall_ms"] for s in samples), 1),
+            "import_ms": round(statistics.median(s["import_ms"] or 0 for s in samples), 1),
+            "packages": {
+                name: round(statistics.median(s["packages"].get(name, 0.0) for s in samples), 1)
+                for name in package_names
+            },
+            "error": error,
+        }
+        flag = f"  ❌ {error}" if error else ""
+        print(f"{module:24s} 冷启动 {results[module]['wall_ms']:7.0f} ms  "
+              f"import {results[module]['import_ms']:7.0f} ms  (中位数, {runs} 次){flag}")
+    return results
+
+
+def append_history(results, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    record = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "results": {m: {k: v for k, v in r.items() if k != "packages"} for m, r in results.items()},
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+    print(f"基线已写入: {path}")
+
+
+def check_against_baseline(results, baseline):
+    """返回回归描述列表；空列表表示通过"""
+    problems = []
+    for module, cur in results.items():
+        base = baseline.get(module)
+        if not base:
+            continue
+        if cur["error"] and not base.get("error"):
+            problems.append(f"{module}: import 失败 ({cur['error']})")
+            continue
+        delta = cur["wall_ms"] - base["wall_ms"]
+        if delta > REGRESSION_MIN_MS and cur["wall_ms"] > base["wall_ms"] * (1 + REGRESSION_RATIO):
+            problems.append(f"{module}: 冷启动 {base['wall_ms']:.0f} -> {cur['wall_ms']:.0f} ms (+{delta:.0f} ms)")
+        base_packages = base.get("packages", {})
+        for name, ms in sorted(cur["packages"].items(), key=lambda kv: kv[1], reverse=True):
+            if name not in base_packages and ms >= NEW_PACKAGE_MIN_MS:
+                problems.append(f"{module}: 新增顶层 import {name} ({ms:.0f} ms)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI 入口冷启动 / import 耗时分析")
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS), help="要分析的入口模块名")
+    parser.add_argument("--top", type=int, default=12, help="报告中每个入口列出的条目数")
+    parser.add_argument("--bench", action="store_true", help="冷启动基准（多次取中位数）")
+    parser.add_argument("--runs", type=int, default=5, help="基准每个入口的运行次数")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次基准保存为基线")
+    parser.add_argument("--check", action="store_true", help="运行基准并与基线比较")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线 JSON 路径")
+    parser.add_argument("--dir", default=QUERY_DIR, help="Query 目录（默认 ~/Coding/Financial_System/Query）")
+    args = parser.parse_args()
+
+    if not (args.bench or args.check or args.save_baseline):
+        report(args.modules, args.top, args.dir)
+        return
+
+    results = bench(args.modules, max(1, args.runs), args.dir)
+    append_history(results)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+
+    if args.check:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"无法读取基线 ({e})，先用 --save-baseline 生成。")
+            sys.exit(2)
+        problems = check_against_baseline(results, baseline)
+        if problems:
+            print("\n⚠️ 启动耗时回归:")
+            for p in problems:
+                print(f"  - {p}")
+            sys.exit(1)
+        print("\n✅ 与基线相比没有启动耗时回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ import json
 import subprocess
 import pyperclip
 import platform
-from functools import lru_cache
 import concurrent.futures
 import sqlite3
 import os
@@ -45,29 +44,21 @@ except ImportError:
     def plot_financial_data(*args, **kwargs):
         print("Mock: plot_financial_data called")
 
+from Modules_Cache import load_json as load_cached_json, load_text_pairs
+
 # ========================================================
 
-@lru_cache(maxsize=None)
 def lazy_load_data(path, data_type='json'):
+    # 经 Modules_Cache：按文件 mtime/size 缓存，文件改过会自动重新读取；返回共享对象，只读
     if not os.path.exists(path):
         # 即使文件不存在也返回空字典，防止崩溃
         return {}
-    
-    with open(path, 'r', encoding='utf-8') as file:
-        if data_type == 'json':
-            try:
-                return json.load(file)
-            except json.JSONDecodeError:
-                return {}
-        else:
-            data = {}
-            for line in file:
-                line = line.strip()
-                if not line or ':' not in line:
-                    continue
-                key, value = map(str.strip, line.split(':', 1))
-                data[key] = value
-            return data
+    if data_type == 'json':
+        try:
+            return load_cached_json(path, copy=False)
+        except json.JSONDecodeError:
+            return {}
+    return load_text_pairs(path, copy=False)
 
 def display_dialog(message):
     """跨平台弹窗提示"""
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tag_Neighbours.py
+按 tag 权重预先算好每只 symbol 的相似 symbol（top-K），存进 Finance.db
+
+Search_Similar_Tag / Check_Earning_Similar 每次打开"相似"都要拿源 symbol 的 tag
+（权重来自 tags_weight.json）和全部股票 / ETF 重新匹配一遍。这里改为离线计算：
+    - 用 SciPy CSR 建三个稀疏矩阵：
+        W  源 symbol × tag 词表，值为源 tag 的权重；
+        R  tag × tag，相等或互为子串（即 match_item_tags 可能匹配上的关系）为 1；
+        B  symbol × tag 词表，条目拥有该 tag 为 1；
+      U = W · (R · Bᵀ ≠ 0) 是所有 (源, 目标) 对的得分上界：每个目标 tag 最多贡献一次自身权重；
+    - 每个源按 U 从大到小取候选，用 Tag_Similarity.match_item_tags 算出准确的 matched_tags
+      和总权重，已满 K 个且上界低于第 K 名时提前结束（结果与逐个计算完全一致）；
+    - 每只 symbol 的 stocks / etfs 各保留 TOP_K 个（按总权重、市值排序），连同匹配到的 tag
+      存为 Tag_Neighbours 表的一行 JSON；超出 TOP_K 的也会逐个确认是否匹配，
+      被截掉的个数记在 dropped 里（查看端据此判断列表是否完整）；
+    - 元数据表记录 description.json / tags_weight.json 的 (mtime, size)、当时的
+      tag 快照和权重，以及两者的哈希 input_key。Editor_Tags / Editor_tags_weight 保存后调用 --refresh：
+      与快照比较，只重算受影响的源（自身 tag 变了的、新旧数据下与变动 symbol 有关联的、
+      拥有权重变动 tag 的），其余行不动。
+
+查看端用 load_neighbours(symbol)：两个 JSON 的 (mtime, size) 与表一致时直接读一行；
+不一致时（Insert_Desc_* / Insert_Events 等脚本改写了 description.json 的其他字段）
+再比较 tag 快照 + 权重的哈希，tag 与权重没变就照用；变了（刚保存、刷新还没跑完）返回 None，
+调用方退回实时计算。
+
+用法:
+    python Tag_Neighbours.py --build       # 全量重建
+    python Tag_Neighbours.py --refresh     # 按快照增量刷新（编辑器保存后自动调用）
+    python Tag_Neighbours.py --symbol NVDA # 查看某只 symbol 的邻居
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import hashlib
+import sqlite3
+import argparse
+from decimal import Decimal
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+DESCRIPTION_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "description.json")
+WEIGHT_CONFIG_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "tags_weight.json")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Finance.db")
+LOCK_PATH = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules", "tag_neighbours.lock")
+
+sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Query"))
+from Tag_Similarity import TagIndex, match_item_tags, load_mnspp, MNSPP_MISSING
+
+NEIGHBOURS_TABLE = "Tag_Neighbours"
+META_TABLE = "Tag_Neighbours_Meta"
+FORMAT_VERSION = "2"
+
+TOP_K = 300                  # 每只 symbol 的 stocks / etfs 各保留多少个邻居
+DEFAULT_WEIGHT = Decimal('1')
+BLOCK_ROWS = 512             # U 按行分块计算，避免一次生成全量稠密结果
+FULL_REBUILD_RATIO = 0.3     # 变动条目超过这个比例时直接全量重建
+
+
+# =========================================================
+# 输入
+# =========================================================
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def load_tags_weight(path=WEIGHT_CONFIG_PATH):
+    """tags_weight.json -> {tag: Decimal 权重}（与各查看端的 tw_cfg 相同）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"加载权重配置文件时出错: {e}")
+        return {}
+    return {tag: Decimal(w) for w, tags in raw.items() for tag in tags}
+
+
+def _snapshot(data):
+    """只保留匹配用得到的字段，作为下次增量刷新的比较基准"""
+    return {
+        category: [{'symbol': item.get('symbol'), 'tag': list(item.get('tag', []))}
+                   for item in data.get(category, [])]
+        for category in ('stocks', 'etfs')
+    }
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _input_key(snapshot_json, weights_json):
+    """tag 快照 + 权重的哈希：description.json 只改了 tag 以外的字段时不变"""
+    return hashlib.sha1(f"{snapshot_json}\n{weights_json}".encode('utf-8')).hexdigest()
+
+
+_KEY_CACHE = {}   # (desc_path, weight_path) -> ((desc_stamp, weight_stamp), input_key)
+
+
+def current_input_key(desc_path=DESCRIPTION_PATH, weight_path=WEIGHT_CONFIG_PATH, data=None):
+    """两个 JSON 当前内容的 input_key，按 (mtime, size) 缓存；data 为已读入的 description.json。读取失败返回 None"""
+    stamps = (_file_stamp(desc_path), _file_stamp(weight_path))
+    cached = _KEY_CACHE.get((desc_path, weight_path))
+    if cached is not None and cached[0] == stamps:
+        return cached[1]
+    if data is None:
+        try:
+            with open(desc_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+    weights = load_tags_weight(weight_path)
+    key = _input_key(_dumps(_snapshot(data)), _dumps({t: str(w) for t, w in weights.items()}))
+    _KEY_CACHE[(desc_path, weight_path)] = (stamps, key)
+    return key
+
+
+def target_dict_of(item, weights):
+    """源条目的 {小写 tag: 权重}，与 find_symbols_by_tags 里的 target_tags_dict 一致"""
+    return {tag.lower(): weights.get(tag, DEFAULT_WEIGHT) for tag in item.get('tag', [])}
+
+
+# =========================================================
+# 稀疏矩阵
+# =========================================================
+
+class SimilarityMatrix:
+    def __init__(self, index):
+        import numpy as np
+        from scipy import sparse
+
+        self.index = index
+        self.vocab = list(index.tag_items)
+        self.pos = {t: k for k, t in enumerate(self.vocab)}
+        n, v = len(index.items), len(self.vocab)
+
+        rows, cols = [], []
+        for t, ids in index.tag_items.items():
+            rows.extend(ids)
+            cols.extend([self.pos[t]] * len(ids))
+        b = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, v))
+
+        rows, cols = [], []
+        for t in self.vocab:
+            related = [self.pos[u] for u in index.related_tags(t)]
+            rows.extend([self.pos[t]] * len(related))
+            cols.extend(related)
+        r = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(v, v))
+
+        # M[t, j] = 1：条目 j 至少有一个 tag 与目标 tag t 可能匹配
+        m = (r @ b.T).tocsr()
+        m.data[:] = 1.0
+        self.m = m
+        self._sparse = sparse
+        self._np = np
+
+    def weight_rows(self, sources, weights):
+        """sources: [条目下标] -> W（len(sources) × 词表）"""
+        rows, cols, vals = [], [], []
+        for r, i in enumerate(sources):
+            for t, w in target_dict_of(self.index.items[i][1], weights).items():
+                rows.append(r)
+                cols.append(self.pos[t])
+                vals.append(float(w))
+        return self._sparse.csr_matrix((vals, (rows, cols)), shape=(len(sources), len(self.vocab)))
+
+    def upper_bounds(self, sources, weights):
+        """按块产出 (源条目下标, 候选条目下标数组, 上界数组)"""
+        for start in range(0, len(sources), BLOCK_ROWS):
+            block = sources[start:start + BLOCK_ROWS]
+            u = (self.weight_rows(block, weights) @ self.m).tocsr()
+            for r, i in enumerate(block):
+                lo, hi = u.indptr[r], u.indptr[r + 1]
+                yield i, u.indices[lo:hi], u.data[lo:hi]
+
+    def sources_related_to(self, targets, weights):
+        """与 targets（条目下标）中任一条目得分上界 > 0 的源条目下标"""
+        if not targets:
+            return set()
+        cols = self.m[:, sorted(targets)]
+        w = self.weight_rows(range(len(self.index.items)), weights)
+        hit = (w @ cols).tocsr()
+        return set(self._np.flatnonzero(self._np.diff(hit.indptr) > 0).tolist())
+
+
+def _marketcap(mnspp, symbol):
+    value = mnspp.get(symbol, MNSPP_MISSING)[1]
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def top_neighbours(index, source, candidates, bounds, weights, mnspp, top_k=TOP_K):
+    """
+    单个源条目的 top-K（准确得分），返回可直接 json.dumps 的 dict。
+    上界已低于第 K 名的候选不进堆，但仍要确认是否匹配，计入 dropped（被截掉的邻居数）。
+    """
+    category_src, item = index.items[source]
+    own_symbol = item.get('symbol')
+    target_dict = target_dict_of(item, weights)
+    heaps = {'stocks': [], 'etfs': []}
+    dropped = {'stocks': 0, 'etfs': 0}
+    order = sorted(range(len(candidates)), key=lambda k: -bounds[k])
+    for k in order:
+        bound = bounds[k]
+        j = int(candidates[k])
+        category, other = index.items[j]
+        symbol = other.get('symbol')
+        if symbol == own_symbol:
+            continue
+        heap = heaps[category]
+        if len(heap) >= top_k and bound + 1e-9 < float(heap[0][0]):
+            if match_item_tags(other.get('tag', []), target_dict):
+                dropped[category] += 1
+            continue
+        matched = match_item_tags(other.get('tag', []), target_dict)
+        if not matched:
+            continue
+        entry = (sum(w for _, w in matched), _marketcap(mnspp, symbol), -j, symbol, matched)
+        if len(heap) < top_k:
+            heapq.heappush(heap, entry)
+            continue
+        dropped[category] += 1
+        if entry[:3] > heap[0][:3]:
+            heapq.heapreplace(heap, entry)
+    result = {}
+    for category, heap in heaps.items():
+        ranked = sorted(heap, key=lambda e: e[:3], reverse=True)
+        result[category] = [[symbol, [[tag, str(w)] for tag, w in matched]]
+                            for _, _, _, symbol, matched in ranked]
+    result['dropped'] = dropped
+    result['truncated'] = {c: n > 0 for c, n in dropped.items()}
+    return result
+
+
+def compute_rows(index, sources, weights, mnspp, top_k=TOP_K, matrix=None):
+    """sources: [条目下标] -> {symbol: payload dict}；同一 symbol 只取第一次出现的条目"""
+    matrix = matrix or SimilarityMatrix(index)
+    rows = {}
+    for i, candidates, bounds in matrix.upper_bounds(list(sources), weights):
+        symbol = index.items[i][1].get('symbol')
+        if symbol is None or index.by_symbol.get(symbol) != i:
+            continue
+        rows[symbol] = top_neighbours(index, i, candidates, bounds, weights, mnspp, top_k)
+    return rows
+
+
+# =========================================================
+# 存储
+# =========================================================
+
+def _ensure_tables(conn):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{NEIGHBOURS_TABLE}" (symbol TEXT PRIMARY KEY, payload TEXT NOT NULL)')
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{META_TABLE}" (key TEXT PRIMARY KEY, value TEXT)')
+
+
+def _read_meta(conn):
+    try:
+        return dict(conn.execute(f'SELECT key, value FROM "{META_TABLE}"').fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+
+def _write(conn, rows, deleted, meta, replace_all=False):
+    with conn:
+        _ensure_tables(conn)
+        if replace_all:
+            conn.execute(f'DELETE FROM "{NEIGHBOURS_TABLE}"')
+        if deleted:
+            conn.executemany(f'DELETE FROM "{NEIGHBOURS_TABLE}" WHERE symbol = ?', [(s,) for s in deleted])
+        conn.executemany(
+            f'INSERT OR REPLACE INTO "{NEIGHBOURS_TABLE}" (symbol, payload) VALUES (?, ?)',
+            [(s, _dumps(p)) for s, p in rows.items()]
+        )
+        conn.executemany(f'INSERT OR REPLACE INTO "{META_TABLE}" (key, value) VALUES (?, ?)', list(meta.items()))
+
+
+def _meta_for(data, weights, desc_stamp, weight_stamp):
+    snapshot = _dumps(_snapshot(data))
+    weights_json = _dumps({t: str(w) for t, w in weights.items()})
+    return {
+        "version": FORMAT_VERSION,
+        "description_stamp": desc_stamp,
+        "weight_stamp": weight_stamp,
+        "snapshot": snapshot,
+        "weights": weights_json,
+        "input_key": _input_key(snapshot, weights_json),
+        "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def _load_inputs(desc_path, weight_path):
+    # 先取版本再读内容：读的过程中文件又被改，下次比较版本时会再刷新一次
+    desc_stamp, weight_stamp = _file_stamp(desc_path), _file_stamp(weight_path)
+    with open(desc_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data, load_tags_weight(weight_path), desc_stamp, weight_stamp
+
+
+def build(desc_path=DESCRIPTION_PATH, weight_path=WEIGHT_CONFIG_PATH, db_path=DB_PATH, top_k=TOP_K):
+    t0 = time.perf_counter()
+    data, weights, desc_stamp, weight_stamp = _load_inputs(desc_path, weight_path)
+    index = TagIndex(data)
+    rows = compute_rows(index, range(len(index.items)), weights, load_mnspp(db_path), top_k)
+    with sqlite3.connect(db_path, timeout=60.0) as conn:
+        _write(conn, rows, (), _meta_for(data, weights, desc_stamp, weight_stamp), replace_all=True)
+    conn.close()
+    print(f"[Tag_Neighbours] 全量重建 {len(rows)} 只 symbol，用时 {time.perf_counter() - t0:.1f}s")
+    return len(rows)
+
+
+def _item_map(data):
+    """(category, symbol) -> tags 元组，用于比较两次的差异"""
+    return {(category, item.get('symbol')): tuple(item.get('tag', []))
+            for category in ('stocks', 'etfs') for item in data.get(category, [])}
+
+
+def refresh(desc_path=DESCRIPTION_PATH, weight_path=WEIGHT_CONFIG_PATH, db_path=DB_PATH, top_k=TOP_K):
+    """与上次的快照比较，只重算受影响的行；没有快照或格式不对时全量重建"""
+    with sqlite3.connect(db_path, timeout=60.0) as conn:
+        meta = _read_meta(conn)
+    conn.close()
+    if meta.get("version") != FORMAT_VERSION or "snapshot" not in meta:
+        return build(desc_path, weight_path, db_path, top_k)
+    if (meta.get("description_stamp") == _file_stamp(desc_path)
+            and meta.get("weight_stamp") == _file_stamp(weight_path)):
+        print("[Tag_Neighbours] 已是最新")
+        return 0
+
+    t0 = time.perf_counter()
+    data, weights, desc_stamp, weight_stamp = _load_inputs(desc_path, weight_path)
+    new_meta = _meta_for(data, weights, desc_stamp, weight_stamp)
+    if new_meta["input_key"] == meta.get("input_key"):
+        # 只改了 tag 以外的字段：邻居不变，记下新的文件版本即可
+        with sqlite3.connect(db_path, timeout=60.0) as conn:
+            _write(conn, {}, (), {k: new_meta[k] for k in ("description_stamp", "weight_stamp", "updated")})
+        conn.close()
+        print("[Tag_Neighbours] tag 与权重未变，已是最新")
+        return 0
+    old_data = json.loads(meta["snapshot"])
+    old_weights = {t: Decimal(w) for t, w in json.loads(meta["weights"]).items()}
+
+    old_items, new_items = _item_map(old_data), _item_map(data)
+    changed = {key for key in old_items.keys() | new_items.keys() if old_items.get(key) != new_items.get(key)}
+    changed_symbols = {symbol for _, symbol in changed}
+    changed_tags = {t for t in old_weights.keys() | weights.keys()
+                    if old_weights.get(t, DEFAULT_WEIGHT) != weights.get(t, DEFAULT_WEIGHT)}
+
+    index = TagIndex(data)
+    if len(changed) > FULL_REBUILD_RATIO * max(1, len(index.items)):
+        return build(desc_path, weight_path, db_path, top_k)
+
+    matrix = SimilarityMatrix(index)
+    affected = {i for i, (_, item) in enumerate(index.items) if item.get('symbol') in changed_symbols}
+    # 新数据下与变动条目有关联的源
+    affected |= matrix.sources_related_to(affected, weights)
+    # 旧数据下与变动条目有关联的源（关联可能已经消失，行里的旧邻居要去掉）
+    old_index = TagIndex(old_data)
+    old_changed = {i for i, (_, item) in enumerate(old_index.items) if item.get('symbol') in changed_symbols}
+    if old_changed:
+        old_sources = SimilarityMatrix(old_index).sources_related_to(old_changed, old_weights)
+        old_symbols = {old_index.items[i][1].get('symbol') for i in old_sources}
+        affected |= {index.by_symbol[s] for s in old_symbols if s in index.by_symbol}
+    # 源 tag 的权重变了
+    if changed_tags:
+        affected |= {i for i, (_, item) in enumerate(index.items)
+                     if changed_tags.intersection(item.get('tag', []))}
+
+    rows = compute_rows(index, sorted(affected), weights, load_mnspp(db_path), top_k, matrix)
+    deleted = {s for s in changed_symbols if s not in index.by_symbol}
+    with sqlite3.connect(db_path, timeout=60.0) as conn:
+        _write(conn, rows, deleted, new_meta)
+    conn.close()
+    print(f"[Tag_Neighbours] 增量刷新: 变动 {len(changed_symbols)} 只 symbol、{len(changed_tags)} 个权重，"
+          f"重算 {len(rows)} 行，删除 {len(deleted)} 行，用时 {time.perf_counter() - t0:.1f}s")
+    return len(rows)
+
+
+def refresh_locked(**kwargs):
+    """多次保存可能同时触发刷新：用文件锁串行执行，后面的一次发现已是最新就直接返回"""
+    import fcntl
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    with open(LOCK_PATH, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            return refresh(**kwargs)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# =========================================================
+# 查看端
+# =========================================================
+
+def load_neighbours(symbol, desc_path=DESCRIPTION_PATH, weight_path=WEIGHT_CONFIG_PATH, db_path=DB_PATH, data=None):
+    """
+    返回 {'stocks': [(symbol, [(tag, Decimal)])], 'etfs': [...], 'truncated': {...}, 'dropped': {...}}，
+    按总权重、市值降序（不含 symbol 自身）；表不存在、已过期或没有这只 symbol 时返回 None。
+    data 为调用方已读入的 description.json，文件版本变了需要比较 input_key 时免得再读一遍。
+    """
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5.0)
+        try:
+            meta = dict(conn.execute(
+                f'SELECT key, value FROM "{META_TABLE}" WHERE key IN (?, ?, ?, ?)',
+                ("version", "description_stamp", "weight_stamp", "input_key")
+            ).fetchall())
+            if meta.get("version") != FORMAT_VERSION:
+                return None
+            if (meta.get("description_stamp") != _file_stamp(desc_path)
+                    or meta.get("weight_stamp") != _file_stamp(weight_path)):
+                key = current_input_key(desc_path, weight_path, data)
+                if key is None or key != meta.get("input_key"):
+                    return None
+            row = conn.execute(f'SELECT payload FROM "{NEIGHBOURS_TABLE}" WHERE symbol = ?', (symbol,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    payload = json.loads(row[0])
+    result = {'truncated': payload.get('truncated', {}), 'dropped': payload.get('dropped', {})}
+    for category in ('stocks', 'etfs'):
+        result[category] = [(s, [(tag, Decimal(w)) for tag, w in matched])
+                             for s, matched in payload.get(category, [])]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按 tag 权重预计算相似 symbol")
+    parser.add_argument("--build", action="store_true", help="全量重建")
+    parser.add_argument("--refresh", action="store_true", help="按快照增量刷新")
+    parser.add_argument("--symbol", help="查看某只 symbol 的邻居")
+    parser.add_argument("--top-k", type=int, default=TOP_K, help="每类保留的邻居数")
+    args = parser.parse_args()
+
+    if args.build:
+        build(top_k=args.top_k)
+    elif args.refresh:
+        refresh_locked(top_k=args.top_k)
+    if args.symbol:
+        neighbours = load_neighbours(args.symbol)
+        if neighbours is None:
+            print(f"{args.symbol}: 没有可用的邻居数据（表不存在或已过期，先运行 --refresh）")
+            return
+        for category in ('stocks', 'etfs'):
+            print(f"--- {category} ---")
+            for s, matched in neighbours[category]:
+                total = sum(w for _, w in matched)
+                print(f"  {s:10s} {total:6}  " + ", ".join(f"{t}({w})" for t, w in matched))
+    if not (args.build or args.refresh or args.symbol):
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
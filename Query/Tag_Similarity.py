@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tag_Similarity.py
+按 tag 找相似 symbol 的公共服务（Search_Similar_Tag / Check_Earning_Similar 共用）
+
+原来的 find_symbols_by_tags / find_symbols_by_tags_b 对每只股票、ETF 的每个 tag
+都和每个目标 tag 做子串比较（条目数 × tag 数 × 目标数），排序时又对每个元素
+调一次 fetch_mnspp_data_from_db，每次新开一个 SQLite 连接。
+
+这里改为：
+    - 对 description.json 建一次索引：tag（小写）-> 条目 的倒排表，
+      以及 tag 词表上的 3-gram 倒排表；
+    - 目标 tag 的候选条目 = 精确命中的 tag + 词表里"包含目标"（3-gram 求交后校验）
+      或"被目标包含"（枚举目标的子串查词表）的 tag 对应的条目；
+    - 只对候选条目按原来的规则逐个计算 matched_tags，结果与原实现完全一致；
+    - MNSPP 整表一次读入字典，按数据库文件（含 -wal）的 mtime / size 失效。
+
+用法:
+    from Tag_Similarity import get_tag_index, load_mnspp
+    index = get_tag_index(desc_data)
+    for category, symbol, matched_tags, tags in index.match(target_tags_with_weight):
+        ...
+    marketcap = load_mnspp(DB_PATH).get(symbol, MNSPP_MISSING)[1]
+"""
+
+import os
+import sqlite3
+import threading
+from decimal import Decimal
+
+NGRAM = 3
+CATEGORIES = ("stocks", "etfs")
+MNSPP_MISSING = ("N/A", None, "N/A", "--")   # 与 fetch_mnspp_data_from_db 查不到时的返回值一致
+
+
+def _grams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def match_item_tags(tags, target_dict):
+    """
+    单个条目的匹配规则（与原 find_symbols_by_tags 相同）：
+        先精确匹配（忽略大小写，同一个 tag 只算一次），
+        再对剩下的 tag 找第一个与之互为子串的目标 tag，权重超过 1 的按 1 计，每个目标只用一次。
+    target_dict: {小写目标 tag: 权重}；返回 [(原始 tag, 权重)]
+    """
+    matched = []
+    used = set()
+    for tag in tags:
+        t_low = tag.lower()
+        if t_low in target_dict and t_low not in used:
+            matched.append((tag, target_dict[t_low]))
+            used.add(t_low)
+    for tag in tags:
+        t_low = tag.lower()
+        if t_low in used:
+            continue
+        for target_tag, target_weight in target_dict.items():
+            if (target_tag in t_low or t_low in target_tag) and t_low != target_tag:
+                if target_tag not in used:
+                    weight_to_use = Decimal('1.0') if target_weight > Decimal('1.0') else target_weight
+                    matched.append((tag, weight_to_use))
+                    used.add(target_tag)
+                break
+    return matched
+
+
+class TagIndex:
+    def __init__(self, data):
+        self.data = data
+        self.items = []            # [(category, item)]，与 description.json 中的顺序一致
+        self.by_symbol = {}        # symbol -> 第一次出现的下标
+        self.by_symbol_lower = {}  # 小写 symbol -> 第一次出现的下标
+        self.tag_items = {}        # 小写 tag -> [下标]（升序）
+        self.gram_tags = {}        # 3-gram -> {小写 tag}
+
+        for category in CATEGORIES:
+            for item in data.get(category, []):
+                i = len(self.items)
+                self.items.append((category, item))
+                symbol = item.get('symbol')
+                if symbol is not None:
+                    self.by_symbol.setdefault(symbol, i)
+                    self.by_symbol_lower.setdefault(symbol.lower(), i)
+                for t_low in {tag.lower() for tag in item.get('tag', [])}:
+                    self.tag_items.setdefault(t_low, []).append(i)
+
+        for t_low in self.tag_items:
+            for g in _grams(t_low):
+                self.gram_tags.setdefault(g, set()).add(t_low)
+
+    # ---------- symbol 查询 ----------
+
+    def item_of(self, symbol):
+        i = self.by_symbol.get(symbol)
+        return None if i is None else self.items[i][1]
+
+    def exact_symbol(self, symbol):
+        """忽略大小写找 symbol 在 description.json 中的准确写法；找不到返回原输入"""
+        i = self.by_symbol_lower.get(symbol.lower())
+        return symbol if i is None else self.items[i][1].get('symbol')
+
+    def symbol_type(self, symbol):
+        i = self.by_symbol.get(symbol)
+        if i is None:
+            return None
+        return 'stock' if self.items[i][0] == 'stocks' else 'etf'
+
+    # ---------- tag 查询 ----------
+
+    def related_tags(self, target):
+        """词表中与 target 相等、包含 target 或被 target 包含的小写 tag"""
+        found = set()
+        # 包含 target：3-gram 倒排求交后校验；target 太短时直接扫词表
+        if len(target) >= NGRAM:
+            candidates = None
+            for g in sorted(_grams(target), key=lambda g: len(self.gram_tags.get(g, ()))):
+                tags = self.gram_tags.get(g)
+                if not tags:
+                    candidates = set()
+                    break
+                candidates = set(tags) if candidates is None else candidates & tags
+                if not candidates:
+                    break
+            found.update(t for t in candidates if target in t)
+        else:
+            found.update(t for t in self.tag_items if target in t)
+        # 被 target 包含（含相等）：枚举 target 的所有子串
+        n = len(target)
+        for a in range(n):
+            for b in range(a + 1, n + 1):
+                if target[a:b] in self.tag_items:
+                    found.add(target[a:b])
+        if "" in self.tag_items:
+            found.add("")
+        return found
+
+    def candidates(self, target_dict):
+        ids = set()
+        for target in target_dict:
+            for t_low in self.related_tags(target):
+                ids.update(self.tag_items[t_low])
+        return sorted(ids)
+
+    def match(self, target_tags_with_weight, exclude=None):
+        """
+        按 description.json 的顺序逐个产出有匹配的条目:
+            (category, symbol, matched_tags, 条目全部 tag)
+        exclude: 要跳过的 symbol（通常是源 symbol 本身）
+        """
+        target_dict = {tag.lower(): weight for tag, weight in target_tags_with_weight}
+        if not target_dict:
+            return
+        for i in self.candidates(target_dict):
+            category, item = self.items[i]
+            symbol = item.get('symbol')
+            if exclude is not None and symbol == exclude:
+                continue
+            tags = item.get('tag', [])
+            matched = match_item_tags(tags, target_dict)
+            if matched:
+                yield category, symbol, matched, tags
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_tag_index(data):
+    """同一份 description 数据（同一个对象）只建一次索引"""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.data is not data:
+            _INDEX = TagIndex(data)
+        return _INDEX
+
+
+# =========================================================
+# MNSPP 整表缓存
+# =========================================================
+
+def _db_stamp(db_path):
+    stamp = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+_MNSPP = {}   # db_path -> (stamp, {symbol: (shares, marketcap, pe_ratio, pb)})
+_MNSPP_LOCK = threading.Lock()
+
+def load_mnspp(db_path):
+    """一次读出整张 MNSPP 表；数据库没变时直接复用。读取失败返回空字典"""
+    stamp = _db_stamp(db_path)
+    with _MNSPP_LOCK:
+        cached = _MNSPP.get(db_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    try:
+        with sqlite3.connect(db_path, timeout=60.0) as conn:
+            rows = conn.execute("SELECT symbol, shares, marketcap, pe_ratio, pb FROM MNSPP").fetchall()
+    except Exception as e:
+        print(f"[Tag_Similarity] 读取 MNSPP 失败: {e}")
+        return {}
+    table = {}
+    for symbol, *values in rows:
+        # 同一 symbol 有多行时与 fetchone() 一样取第一行
+        table.setdefault(symbol, tuple(values))
+    with _MNSPP_LOCK:
+        _MNSPP[db_path] = (stamp, table)
+    return table
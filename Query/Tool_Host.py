@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tool_Host.py
+常驻的工具窗口宿主进程
+
+Chart_input / Panel / Check_HighLow / Search_Similar_Tag / Insert_Earning_auto 等处的
+execute_external_script 每点一次就起一个新的 python 进程，重新 import PyQt、matplotlib、
+pandas、scipy，再重新解析 description.json，冷启动要好几秒。
+
+这里改为常驻进程：
+    - 每种 Qt 绑定（PyQt6 / PyQt5，两者不能共存于同一进程）一个宿主，各自只有一个
+      QApplication，启动时预先 import 重型模块并预读 Modules 下常用的 JSON；
+    - 宿主监听本地 unix socket，收到 {"script": 路径, "args": [...]} 后在进程内以
+      __main__ 方式运行该工具脚本，窗口直接在宿主里打开；
+    - 脚本里的 QApplication(...) / app.exec() / sys.exit() 都被接管，不会退出宿主；
+      工具里调用 sys.exit() 时关闭该工具自己的窗口；
+    - json.load 读 Modules/*.json 时按 (mtime, size) 缓存，命中时用 pickle 还原一份
+      新对象（比重新解析快，且各窗口之间互不影响）；
+    - 上面这些替换不改任何全局对象：runpy 的 init_globals 给每个工具一份自己的 __builtins__，
+      其中的 __import__ 对 sys / json / QtWidgets 返回代理模块（_ToolSys / _ModuleProxy）。
+      只有工具脚本自己（包括它定义的槽函数）拿到代理；宿主、工具顺带 import 的其他模块
+      以及后台线程看到的始终是真正的 QApplication / sys.exit / json.load。
+
+调用方用 launch() 投递；宿主没在运行、脚本不是 PyQt 工具（tkinter / AppleScript 等）
+或投递失败时返回 False，调用方照旧走 subprocess。宿主不在时 launch() 会顺手在后台
+拉起一个，下一次点击就能直接命中。
+
+用法:
+    python Tool_Host.py --serve PyQt6     # 手动启动宿主（一般由 launch() 自动拉起）
+    python Tool_Host.py --status          # 查看各宿主是否在运行
+    python Tool_Host.py --stop PyQt6      # 停止宿主
+"""
+
+import os
+import re
+import sys
+import json
+import builtins
+import time
+import types
+import runpy
+import contextlib
+import pickle
+import socket
+import argparse
+import tempfile
+import traceback
+import subprocess
+import importlib
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+MODULES_DIR = os.path.join(BASE_CODING_DIR, "Financial_System", "Modules")
+
+BINDINGS = ("PyQt6", "PyQt5")
+CONNECT_TIMEOUT = 0.2          # 秒；宿主没响应就走 subprocess，不能卡住点击
+AUTO_START = True              # 宿主不在时是否自动在后台拉起
+
+# 宿主启动时预先 import 的模块（缺哪个跳过哪个）
+PRELOAD_MODULES = ("numpy", "pandas", "scipy", "matplotlib", "matplotlib.pyplot", "pyperclip")
+# 宿主启动时预读的 JSON
+PRELOAD_JSON = ("description.json", "Sectors_All.json", "tags_weight.json", "Sectors_panel.json")
+
+_BINDING_RE = re.compile(r"^\s*(?:from|import)\s+(PyQt[56])\b", re.MULTILINE)
+_binding_cache = {}
+
+
+def socket_path(binding):
+    return os.path.join(tempfile.gettempdir(), f"Financial_System_Tool_Host_{binding}.sock")
+
+
+def log_path(binding):
+    return os.path.join(tempfile.gettempdir(), f"Financial_System_Tool_Host_{binding}.log")
+
+
+def script_binding(script_path):
+    """脚本用的 Qt 绑定；用 tkinter、同时混用两种绑定或不是 Qt 工具时返回 None"""
+    try:
+        st = os.stat(script_path)
+    except OSError:
+        return None
+    key = (script_path, st.st_mtime_ns)
+    if key not in _binding_cache:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        found = set(_BINDING_RE.findall(source))
+        if len(found) != 1 or re.search(r"^\s*(?:from|import)\s+tkinter\b", source, re.MULTILINE):
+            _binding_cache[key] = None
+        else:
+            _binding_cache[key] = found.pop()
+    return _binding_cache[key]
+
+# ---------- 客户端 ----------
+
+def _request(binding, payload, timeout=CONNECT_TIMEOUT):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path(binding))
+        s.sendall(json.dumps(payload, ensure_ascii=False).encode('utf-8') + b"\n")
+        return s.recv(256).decode('utf-8', 'replace').strip()
+
+
+def start_host(binding):
+    """在后台拉起宿主（脱离当前进程组，调用方退出后继续存在）"""
+    with open(log_path(binding), 'a', encoding='utf-8') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", binding],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True
+        )
+
+
+def launch(script_path, args=()):
+    """
+    把工具脚本投递给常驻宿主打开；成功返回 True。
+    先投递给常驻的 Tool_Host（窗口在已预热的进程里打开），不在线或不支持时返回 False，
+    调用方应照旧用 subprocess 起新进程。
+    """
+    binding = script_binding(script_path)
+    if binding is None:
+        return False
+    try:
+        reply = _request(binding, {"script": script_path, "args": [str(a) for a in args]})
+        return reply == "ok"
+    except (OSError, ValueError):
+        if AUTO_START:
+            try:
+                start_host(binding)
+            except OSError as e:
+                print(f"启动 Tool_Host 失败: {e}")
+        return False
+
+# ---------- 宿主进程 ----------
+
+class ToolExit(Exception):
+    """宿主里工具脚本调用 sys.exit() 时抛出，只结束该工具，不退出宿主"""
+
+
+_JSON_CACHE = {}   # realpath -> ((mtime_ns, size), pickle bytes)
+
+
+def _cached_json_load(fp, *args, **kwargs):
+    """Modules/*.json 按 (mtime, size) 缓存；带 object_pairs_hook 等参数时不走缓存"""
+    name = getattr(fp, "name", None)
+    if args or kwargs or not isinstance(name, str) or not name.endswith(".json") or 'r' not in getattr(fp, "mode", ""):
+        return json.load(fp, *args, **kwargs)
+    path = os.path.realpath(name)
+    if os.path.dirname(path) != os.path.realpath(MODULES_DIR):
+        return json.load(fp, *args, **kwargs)
+    try:
+        st = os.fstat(fp.fileno())
+    except (OSError, ValueError):
+        return json.load(fp)
+    key = (st.st_mtime_ns, st.st_size)
+    hit = _JSON_CACHE.get(path)
+    if hit is not None and hit[0] == key:
+        return pickle.loads(hit[1])
+    obj = json.load(fp)
+    _JSON_CACHE[path] = (key, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    return obj
+
+
+def _tool_exit(code=0):
+    raise ToolExit(code)
+
+
+class _ToolSys(types.ModuleType):
+    """
+    工具脚本里 import sys 拿到的对象：exit() 抛 ToolExit，只结束该工具；其余属性读写都转给真正的 sys。
+    槽函数里的 sys.exit() 同样经过这里，不会把整个宿主退出。
+    """
+
+    def __init__(self):
+        super().__init__("sys")
+
+    def __getattr__(self, name):
+        return getattr(sys, name)
+
+    def __setattr__(self, name, value):
+        setattr(sys, name, value)
+
+    exit = staticmethod(_tool_exit)
+
+
+class _ModuleProxy(types.ModuleType):
+    """只给工具脚本看的模块代理：overrides 里的属性用替身，其余转给真正的模块"""
+
+    def __init__(self, real, **overrides):
+        super().__init__(real.__name__)
+        self.__dict__.update(overrides)
+        self._real = real
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+class ToolHost:
+
+    def __init__(self, binding):
+        self.binding = binding
+        self.QtWidgets = importlib.import_module(f"{binding}.QtWidgets")
+        self.QtCore = importlib.import_module(f"{binding}.QtCore")
+        self.RealApplication = self.QtWidgets.QApplication
+        self.app = self.RealApplication(sys.argv[:1])
+        self.app.setQuitOnLastWindowClosed(False)
+        self.runs = []      # [(script, 命名空间, 窗口集合)]，持有引用防止窗口被回收
+        self._stopping = False
+        self.HostApplication = self._make_app_shim()
+        tool_widgets = _ModuleProxy(self.QtWidgets, QApplication=self.HostApplication)
+        # 工具脚本 import 这些名字时拿到的代理（按 import 语句里写的模块名查）
+        self.tool_modules = {
+            "sys": _ToolSys(),
+            "json": _ModuleProxy(json, load=_cached_json_load),
+            binding: _ModuleProxy(importlib.import_module(binding), QtWidgets=tool_widgets),
+            f"{binding}.QtWidgets": tool_widgets,
+        }
+        sys.excepthook = self._excepthook
+        self._preload()
+
+    # --- 接管 QApplication / sys.exit / json.load ---
+
+    def _make_app_shim(self):
+        """工具脚本看到的 QApplication 类：实例化得到宿主 app 的代理，不能退出事件循环"""
+        real_cls = self.RealApplication
+        app = self.app
+
+        class _AppProxy:
+            """工具脚本里 QApplication(...) 得到的对象：转发给宿主的 app，但不能退出事件循环"""
+            def __getattr__(self, name):
+                return getattr(app, name)
+
+            def exec(self, *args):
+                return 0
+            exec_ = exec
+
+            def quit(self):
+                pass
+
+            def exit(self, code=0):
+                pass
+
+            def setQuitOnLastWindowClosed(self, on):
+                pass
+
+        class _MetaShim(type):
+            def __getattr__(cls, name):
+                return getattr(real_cls, name)
+
+            def __instancecheck__(cls, obj):
+                return isinstance(obj, real_cls) or isinstance(obj, _AppProxy)
+
+        class HostApplication(metaclass=_MetaShim):
+            def __new__(cls, *args, **kwargs):
+                return _AppProxy()
+
+            # 以类方法形式调用时同样不能退出宿主
+            quit = staticmethod(lambda: None)
+            exit = staticmethod(lambda code=0: None)
+            exec = staticmethod(lambda *args: 0)
+            exec_ = exec
+            setQuitOnLastWindowClosed = staticmethod(lambda on: None)
+
+        return HostApplication
+
+    def _tool_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """工具脚本专用的 __import__：sys / json / QtWidgets 换成代理，其余照常"""
+        module = builtins.__import__(name, globals, locals, fromlist, level)
+        if level:
+            return module
+        # import a.b 绑定的是顶层包 a；from a.b import x 取的是 a.b 本身
+        return self.tool_modules.get(name if fromlist else name.partition(".")[0], module)
+
+    def _tool_globals(self):
+        """runpy 的 init_globals：每个工具一份 __builtins__，替换只对该工具自己的代码生效"""
+        tool_builtins = dict(vars(builtins))
+        tool_builtins["__import__"] = self._tool_import
+        return {"__builtins__": tool_builtins}
+
+    @contextlib.contextmanager
+    def _tool_scope(self, script, args):
+        """运行工具脚本期间设置 argv / path（和 python script.py 一致），退出时还原"""
+        saved = (sys.argv, list(sys.path))
+        sys.argv = [script] + list(args)
+        sys.path.insert(0, os.path.dirname(script))
+        try:
+            yield
+        finally:
+            sys.argv = saved[0]
+            sys.path[:] = saved[1]
+
+    def _excepthook(self, exc_type, exc, tb):
+        if issubclass(exc_type, ToolExit):
+            # 槽函数里 sys.exit()：关掉当前活动窗口所属工具的全部窗口
+            active = self.app.activeWindow()
+            for _, _, widgets in self.runs:
+                if active in widgets:
+                    for w in widgets:
+                        w.close()
+                    break
+            else:
+                if active is not None:
+                    active.close()
+            return
+        traceback.print_exception(exc_type, exc, tb)
+
+    def _preload(self):
+        t0 = time.perf_counter()
+        for name in PRELOAD_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print(f"预加载 {name} 失败: {e}")
+        for name in PRELOAD_JSON:
+            path = os.path.join(MODULES_DIR, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _cached_json_load(f)
+            except (OSError, ValueError):
+                pass
+        print(f"[{self.binding}] 预加载完成 {time.perf_counter() - t0:.2f}s", flush=True)
+
+    # --- socket ---
+
+    def listen(self):
+        path = socket_path(self.binding)
+        if os.path.exists(path):
+            try:
+                _request(self.binding, {"cmd": "ping"})
+                print(f"[{self.binding}] 已有宿主在运行，退出。", flush=True)
+                return False
+            except OSError:
+                os.remove(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(8)
+        self.server.setblocking(False)
+        QSocketNotifier = self.QtCore.QSocketNotifier
+        # PyQt6 只支持带作用域的枚举，PyQt5 老版本只有平铺的写法
+        read_type = getattr(getattr(QSocketNotifier, "Type", None), "Read", None)
+        if read_type is None:
+            read_type = QSocketNotifier.Read
+        self.notifier = QSocketNotifier(self.server.fileno(), read_type)
+        self.notifier.activated.connect(self._on_connection)
+        return True
+
+    def _on_connection(self, *args):
+        try:
+            conn, _ = self.server.accept()
+        except BlockingIOError:
+            return
+        t0 = time.perf_counter()
+        with conn:
+            conn.settimeout(1.0)
+            try:
+                data = b""
+                while not data.endswith(b"\n"):
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        break
+                    data += chunk
+                payload = json.loads(data.decode('utf-8'))
+            except (OSError, ValueError) as e:
+                print(f"[{self.binding}] 请求解析失败: {e}", flush=True)
+                return
+            cmd = payload.get("cmd", "open")
+            if cmd == "ping":
+                conn.sendall(b"ok\n")
+                return
+            if cmd == "stop":
+                conn.sendall(b"ok\n")
+                self.QtCore.QTimer.singleShot(0, self.stop)
+                return
+            script = payload.get("script")
+            if not script or script_binding(script) != self.binding:
+                conn.sendall(b"reject\n")
+                return
+            conn.sendall(b"ok\n")
+        # 先回复客户端再在事件循环里打开窗口，点击方不用等
+        self.QtCore.QTimer.singleShot(0, lambda: self.run_tool(script, payload.get("args", []), t0))
+
+    def run_tool(self, script, args, t0=None):
+        t0 = t0 or time.perf_counter()
+        self._prune()
+        before = set(self.app.topLevelWidgets())
+        namespace = {}
+        try:
+            with self._tool_scope(script, args):
+                namespace = runpy.run_path(script, init_globals=self._tool_globals(), run_name="__main__")
+        except (ToolExit, SystemExit):
+            # SystemExit 来自工具顺带 import 的模块（它们拿到的是真正的 sys）
+            pass
+        except Exception:
+            traceback.print_exc()
+        widgets = set(self.app.topLevelWidgets()) - before
+        self.runs.append((script, namespace, widgets))
+        print(f"[{self.binding}] {os.path.basename(script)} {' '.join(args)} "
+              f"-> {(time.perf_counter() - t0) * 1000:.0f} ms", flush=True)
+
+    def _prune(self):
+        """释放窗口都已关闭的工具（命名空间与窗口对象）"""
+        alive = []
+        for script, namespace, widgets in self.runs:
+            if any(w.isVisible() for w in widgets):
+                alive.append((script, namespace, widgets))
+            else:
+                for w in widgets:
+                    w.deleteLater()
+                namespace.clear()
+        self.runs = alive
+
+    def stop(self):
+        self._stopping = True
+        self.notifier.setEnabled(False)
+        self.server.close()
+        try:
+            os.remove(socket_path(self.binding))
+        except OSError:
+            pass
+        self.app.quit()
+
+    def exec(self):
+        run = getattr(self.app, "exec", None) or self.app.exec_
+        while True:
+            code = run()
+            # 工具顺带 import 的模块拿到的是真正的 QApplication，它们调用 quit() 会结束事件循环；
+            # 不是 stop() 发起的就重新进入
+            if self._stopping:
+                return code
+
+
+def serve(binding):
+    host = ToolHost(binding)
+    if not host.listen():
+        return 0
+    print(f"[{binding}] Tool_Host 已启动: {socket_path(binding)}", flush=True)
+    return host.exec()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻工具窗口宿主")
+    parser.add_argument('--serve', choices=BINDINGS, help="启动指定 Qt 绑定的宿主")
+    parser.add_argument('--stop', choices=BINDINGS, help="停止宿主")
+    parser.add_argument('--status', action='store_true', help="查看宿主状态")
+    args = parser.parse_args()
+
+    if args.serve:
+        # 宿主里 sys.exit 会被接管，这里用 os._exit 保证进程真正退出
+        os._exit(serve(args.serve) or 0)
+    elif args.stop:
+        try:
+            _request(args.stop, {"cmd": "stop"})
+            print(f"{args.stop} 宿主已停止。")
+        except OSError:
+            print(f"{args.stop} 宿主未运行。")
+    else:
+        for binding in BINDINGS:
+            try:
+                t0 = time.perf_counter()
+                _request(binding, {"cmd": "ping"})
+                print(f"{binding}: 运行中 (响应 {(time.perf_counter() - t0) * 1000:.1f} ms)")
+            except OSError:
+                print(f"{binding}: 未运行")
+
+
+if __name__ == "__main__":
+    main()
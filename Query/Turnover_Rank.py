@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Turnover_Rank.py
+批量成交额（price × volume）排名
+
+原先 Analyse_Earning_Volume / Analyse_ETF_Volume / Analyse_Short / Test/Analyse_volume_simply
+里各有一份 check_turnover_rank*，每只 symbol 拉一年的数据、构造 Python 元组、整体排序再取前 N。
+这里统一为：
+    1. TurnoverPanel：按板块表一次性 (IN 分批) 读取一批 symbol 的日期与成交额，
+       同一 symbol 后续不同窗口 / 不同截止日直接在 NumPy 数组上切片；
+    2. turnover_rank(cursor, symbols, as_of, lookback, k)：对每只 symbol 用 argpartition
+       取前 k 名，返回窗口交易日数、前 k 名 (日期, 成交额)、截止日成交额及其名次；
+    3. preload(cursor, pairs, as_of, lookback_days)：扫描脚本在逐只循环之前先收集全部候选 symbol，
+       每张板块表只查一次库，循环里的 check_turnover_rank* 只在已加载的数组上切片。
+
+排序语义与原来的 sorted(..., reverse=True)[:k] 完全一致（并列时较早的日期排前面），
+所以日志里打印的前 N 名也不变。
+"""
+
+import sqlite3
+import datetime
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+IN_CHUNK = 500   # SQLite 变量个数上限保守取值
+PRELOAD_SLACK_DAYS = 14   # preload 的余量：逐日回溯 (T-1, T-2, ...) 或停牌导致截止日早于基准日
+
+# count: 窗口内有效交易日数；top: [(date, turnover)]；latest: 截止日成交额（无当日数据为 None）
+# rank: 截止日成交额的名次（1 起，= 1 + 严格大于它的天数），latest 为 None 时也是 None
+TurnoverRank = namedtuple("TurnoverRank", ["count", "top", "latest", "rank"])
+
+EMPTY_RANK = TurnoverRank(0, [], None, None)
+
+
+def lookback_start(as_of, lookback_days):
+    """与原逻辑一致：as_of - timedelta(days=lookback_days)；日期非法返回 None"""
+    try:
+        dt = datetime.datetime.strptime(as_of, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    return (dt - datetime.timedelta(days=lookback_days)).strftime("%Y-%m-%d")
+
+
+def is_top_n(top, latest_turnover, rank_threshold):
+    """check_turnover_rank 系列的判定：在前 N 名中，或数据足够且不小于第 N 名；top 为 [(date, turnover)]"""
+    top_n_turnovers = [v for _, v in top]
+    if latest_turnover in top_n_turnovers:
+        return True
+    return len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]
+
+
+def meets_cutoff(top, latest_turnover):
+    """check_turnover_since_earning 的判定：不小于前 N 名中的最后一名"""
+    return bool(top) and latest_turnover >= top[-1][1]
+
+
+def _top_k(dates, turnovers, start, end, k):
+    lo = np.searchsorted(dates, start, side="left")
+    hi = np.searchsorted(dates, end, side="right")
+    t = turnovers[lo:hi]
+    n = len(t)
+    if n == 0:
+        return EMPTY_RANK
+    if n > k:
+        part = np.argpartition(-t, k - 1)[:k]
+        kth = t[part].min()
+        cand = np.flatnonzero(t >= kth)      # 含与第 k 名并列的记录，下面稳定排序后截断
+    else:
+        cand = np.arange(n)
+    order = cand[np.argsort(-t[cand], kind="stable")][:k]
+    top = [(str(dates[lo + i]), float(t[i])) for i in order]
+
+    latest = rank = None
+    if dates[hi - 1] == end:
+        latest = float(t[-1])
+        rank = 1 + int(np.count_nonzero(t > latest))
+    return TurnoverRank(n, top, latest, rank)
+
+
+class TurnoverPanel:
+    """
+    按 (sector, symbol) 缓存有效成交额序列（price、volume 均非空的行）。
+    已加载的日期范围覆盖查询窗口时直接切片，否则补查一次。
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self._series = {}   # (sector, symbol) -> (dates, turnovers)
+        self._range = {}    # (sector, symbol) -> (start, end)
+
+    def load(self, pairs, start, end):
+        """pairs: [(sector, symbol)]，按板块表分组，每组 IN 分批一次查询"""
+        by_sector = {}
+        for sector, symbol in pairs:
+            if self._covers((sector, symbol), start, end):
+                continue
+            by_sector.setdefault(sector, set()).add(symbol)
+
+        for sector, symbols in by_sector.items():
+            symbols = sorted(symbols)
+            q_start, q_end = start, end
+            for symbol in symbols:
+                rng = self._range.get((sector, symbol))
+                if rng is not None:
+                    # 扩大已有范围，保证缓存区间连续
+                    q_start, q_end = min(q_start, rng[0]), max(q_end, rng[1])
+            rows_by_symbol = {s: [] for s in symbols}
+            for i in range(0, len(symbols), IN_CHUNK):
+                chunk = symbols[i:i + IN_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                self.cursor.execute(
+                    f'SELECT name, date, price, volume FROM "{sector}" '
+                    f'WHERE name IN ({placeholders}) AND date >= ? AND date <= ? '
+                    f'AND price IS NOT NULL AND volume IS NOT NULL '
+                    f'ORDER BY name, date',
+                    (*chunk, q_start, q_end)
+                )
+                for name, d, p, v in self.cursor.fetchall():
+                    rows_by_symbol[name].append((d, p, v))
+            for symbol, rows in rows_by_symbol.items():
+                self._store((sector, symbol), rows, q_start, q_end)
+
+    def _store(self, key, rows, start, end):
+        if rows:
+            dates = np.array([r[0] for r in rows])
+            prices = np.array([r[1] for r in rows], dtype=np.float64)
+            volumes = np.array([r[2] for r in rows], dtype=np.float64)
+            turnovers = prices * volumes
+        else:
+            dates = np.array([], dtype="<U10")
+            turnovers = np.array([], dtype=np.float64)
+        self._series[key] = (dates, turnovers)
+        self._range[key] = (start, end)
+
+    def _covers(self, key, start, end):
+        rng = self._range.get(key)
+        return rng is not None and rng[0] <= start and end <= rng[1]
+
+    def get(self, sector, symbol, start, end):
+        key = (sector, symbol)
+        if not self._covers(key, start, end):
+            self.load([key], start, end)
+        return self._series[key]
+
+
+_PANELS = weakref.WeakKeyDictionary()
+
+def get_panel(cursor):
+    """同一个 cursor 共用一个 TurnoverPanel（cursor 释放后自动丢弃）"""
+    panel = _PANELS.get(cursor)
+    if panel is None:
+        panel = _PANELS[cursor] = TurnoverPanel(cursor)
+    return panel
+
+
+def _load_windows(panel, windows):
+    """windows: {(sector, symbol): (start, end)}；按未覆盖窗口的并集一次加载"""
+    need = [key for key, (s, e) in windows.items() if not panel._covers(key, s, e)]
+    if need:
+        panel.load(need,
+                   min(windows[key][0] for key in need),
+                   max(windows[key][1] for key in need))
+
+
+def preload(cursor, pairs, as_of, lookback_days, panel=None):
+    """
+    在逐只 symbol 的循环之前调用：pairs 为全部候选 [(sector, symbol)]，as_of 为基准日（为空表示最新）。
+    按 [as_of - lookback_days - PRELOAD_SLACK_DAYS, as_of] 每张表一条 IN 分批查询载入 panel
+    （默认 get_panel(cursor)），之后窗口落在其中的 turnover_rank 不再查库；个别超出的 symbol 仍会补查。
+    """
+    panel = panel or get_panel(cursor)
+    end = as_of or datetime.date.max.isoformat()
+    start = lookback_start(as_of or datetime.date.today().isoformat(), lookback_days + PRELOAD_SLACK_DAYS)
+    if start is None:
+        return panel
+    by_sector = {}
+    for sector, symbol in pairs:
+        by_sector.setdefault(sector, {})[(sector, symbol)] = (start, end)
+    for sector, windows in by_sector.items():
+        try:
+            _load_windows(panel, windows)
+        except sqlite3.OperationalError as e:
+            # 只是预取：表不存在等错误留给循环里逐只查询时按原逻辑处理
+            print(f"[Turnover_Rank] 预取 {sector} 失败，回退到逐只查询: {e}")
+    return panel
+
+
+def turnover_rank(cursor, symbols, as_of, lookback, k, panel=None):
+    """
+    批量计算成交额排名。
+
+    symbols:  [(sector, symbol), ...]
+    as_of:    截止日期字符串，或 {symbol: 截止日期}（各 symbol 最新交易日不同时）
+    lookback: 回溯自然日数（月数请传 months * 30，与原逻辑一致），
+              或 {symbol: 起始日期}（例如从财报日起算）
+    k:        取前 k 名
+    panel:    可复用的 TurnoverPanel；为 None 时临时创建
+
+    返回 {symbol: TurnoverRank}；截止日期非法的 symbol 不出现在结果里。
+    """
+    panel = panel or TurnoverPanel(cursor)
+    windows = {}
+    for sector, symbol in symbols:
+        end = as_of.get(symbol) if isinstance(as_of, dict) else as_of
+        if isinstance(lookback, dict):
+            start = lookback.get(symbol)
+        else:
+            start = lookback_start(end, lookback)
+        if not end or not start:
+            continue
+        windows[(sector, symbol)] = (start, end)
+
+    if windows:
+        # 一次按最大窗口批量加载，后续切片
+        _load_windows(panel, windows)
+
+    result = {}
+    for (sector, symbol), (start, end) in windows.items():
+        dates, turnovers = panel.get(sector, symbol, start, end)
+        result[symbol] = _top_k(dates, turnovers, start, end, k)
+    return result
@@ -1,7 +1,5 @@
 from datetime import datetime, timedelta
 from collections import defaultdict
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import os
 import sys
 import sqlite3
@@ -203,6 +201,9 @@ def main():
     conn.close()
 
     # 设置 Matplotlib 显示中文
+    # wordcloud / matplotlib 很重，数据算完要画图时再 import（参数错误、数据为空时不用白等）
+    from wordcloud import WordCloud
+    import matplotlib.pyplot as plt
     plt.rcParams['font.sans-serif'] = [os.path.basename(args.font)]
     plt.rcParams['axes.unicode_minus'] = False
 
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bar_Store.py
+TigerDataFetcher 历史日 K / 历史 PE 的持久化缓存（SQLite，多进程共用）
+
+原来 TigerDataFetcher._hist_cache / _pe_cache 只在进程内存里，
+每次运行 get_historical_bars / get_historical_bars_by_range / get_historical_prices_batch /
+get_historical_pe 都要重新 get_bars_by_page（最多 5000 根，time_interval=0.5 秒翻页），
+既慢又吃行情配额。
+
+这里改为：
+    - 每只 symbol 记录已覆盖的日期区间 [covered_from, covered_to] 与最后一次拉尾部的时间；
+    - 查询区间已被覆盖时直接读库，零 API 调用；
+    - 往前缺的只拉缺的那段（head），往后缺的从库里倒数第 OVERLAP_BARS 根开始拉到请求的结束日（tail），
+      增量合并进库；
+    - 日 K 是前复权（QuoteRight.BR）：拆股 / 分红后历史价格会整体变化。尾部拉取时比对重叠的几根 K 线，
+      收盘价相对误差超过 ADJUST_TOLERANCE 就视为复权因子变了，整只作废后重新全量拉取；
+    - 最后一根可能是盘中未收盘的 K 线：只有在最近一次收盘（16:00 ET）之后拉取、且此后还没开过盘（9:30 ET）时
+      才当作定型数据；否则超过 TAIL_TTL 秒就重拉尾部；
+    - 库文件 ~/Coding/Database/Tiger_Bars.db，WAL 模式，多个进程 / 线程共享。
+
+PE 只在尾部增量（历史 PE 不受复权影响），同样按覆盖区间判断是否需要请求。
+
+用法:
+    store = get_bar_store()
+    df = store.get_bars("AAPL", "2025-01-01", "2025-06-30", fetch=lambda b, e: ...)
+    pe = store.get_pe("AAPL", "2025-01-01", "2025-06-30", fetch=lambda b, e: ...)
+fetch(begin_date, end_date) 返回 index 为 'YYYY-MM-DD' 的 DataFrame（空表表示区间内无数据），
+拉取失败直接抛异常（不会记录覆盖区间，下次照常重试）。
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+from pytz import timezone as pytz_timezone
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+DB_PATH = os.path.join(BASE_CODING_DIR, "Database", "Tiger_Bars.db")
+
+BAR_FIELDS = ("time", "open", "high", "low", "close", "volume", "amount")
+OVERLAP_BARS = 5           # 拉尾部时多拉的已有 K 线数，用来检测复权变化
+ADJUST_TOLERANCE = 1e-4    # 重叠 K 线收盘价的相对误差上限
+TAIL_TTL = 900             # 盘中最后一根 K 线的有效期（秒）
+MARKET_OPEN_TIME = (9, 30) # 美东开盘时间
+MARKET_CLOSE_HOUR = 16     # 美东收盘时间
+
+US_EASTERN = pytz_timezone('US/Eastern')
+
+
+def _shift(date_str, days):
+    return (datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+class BarStore:
+    def __init__(self, db_path=DB_PATH, timeout=60.0, now=time.time):
+        self.db_path = db_path
+        self.now = now                          # 可注入时钟（自检用）
+        self.api_calls = 0                      # 本实例触发的 fetch 次数
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        try:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError as e:
+            print(f"[Bar_Store] 切换 WAL 失败: {e}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS bars (
+                symbol TEXT, date TEXT, time INTEGER,
+                open REAL, high REAL, low REAL, close REAL, volume INTEGER, amount REAL,
+                PRIMARY KEY (symbol, date)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS pe (
+                symbol TEXT, date TEXT, field TEXT, value REAL,
+                PRIMARY KEY (symbol, date, field)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS coverage (
+                kind TEXT, symbol TEXT, covered_from TEXT, covered_to TEXT, fetched_at REAL,
+                PRIMARY KEY (kind, symbol)
+            ) WITHOUT ROWID;
+        ''')
+        self.conn.commit()
+
+    # ---------- 时间 ----------
+
+    def _now_et(self):
+        return datetime.fromtimestamp(self.now(), US_EASTERN)
+
+    def today(self):
+        return self._now_et().strftime('%Y-%m-%d')
+
+    def _last_ts(self, hour, minute=0):
+        """最近一次已经发生的工作日 hour:minute（ET）的时间戳（只跳过周末，节假日按开盘日算）"""
+        now = self._now_et()
+        t = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now < t:
+            t -= timedelta(days=1)
+        while t.weekday() >= 5:
+            t -= timedelta(days=1)
+        return t.timestamp()
+
+    def _last_close_ts(self):
+        """最近一次已经发生的收盘时间"""
+        return self._last_ts(MARKET_CLOSE_HOUR)
+
+    def _tail_fresh(self, fetched_at):
+        """尾部是否不用重拉：收盘后拉的且之后还没开盘（数据已定型），或拉取不到 TAIL_TTL 秒"""
+        last_close = self._last_close_ts()
+        closed_since = last_close >= self._last_ts(*MARKET_OPEN_TIME)
+        return (closed_since and fetched_at >= last_close) or self.now() - fetched_at < TAIL_TTL
+
+    # ---------- 覆盖区间 ----------
+
+    def _coverage(self, kind, symbol):
+        return self.conn.execute(
+            "SELECT covered_from, covered_to, fetched_at FROM coverage WHERE kind = ? AND symbol = ?",
+            (kind, symbol)).fetchone()
+
+    def _set_coverage(self, kind, symbol, covered_from, covered_to, fetched_at):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO coverage (kind, symbol, covered_from, covered_to, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)", (kind, symbol, covered_from, covered_to, fetched_at))
+
+    def _fetch(self, fetch, begin, end):
+        self.api_calls += 1
+        df = fetch(begin, end)
+        return df if df is not None else pd.DataFrame()
+
+    def _plan(self, kind, symbol, begin, end):
+        """返回 (coverage, 要拉的 head 区间或 None, 是否要拉 tail)"""
+        cov = self._coverage(kind, symbol)
+        if cov is None:
+            return None, None, False
+        covered_from, covered_to, fetched_at = cov
+        head = (begin, _shift(covered_from, -1)) if begin < covered_from else None
+        fetched_day = datetime.fromtimestamp(fetched_at, US_EASTERN).strftime('%Y-%m-%d')
+        # covered_to 当天拉的：最后一根可能还没收盘
+        stale_last = covered_to >= fetched_day and not self._tail_fresh(fetched_at)
+        tail = end > covered_to or (end >= covered_to and stale_last)
+        return cov, head, tail
+
+    # ---------- 日 K ----------
+
+    def _save_bars(self, symbol, df):
+        if df is None or df.empty:
+            return
+        cols = [c for c in BAR_FIELDS if c in df.columns]
+        frame = df[cols].copy()
+        for c in BAR_FIELDS:
+            if c not in frame.columns:
+                frame[c] = None
+        rows = [(symbol, d) + tuple(None if pd.isna(v) else v for v in vals)
+                for d, vals in zip(frame.index, frame[list(BAR_FIELDS)].itertuples(index=False, name=None))]
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO bars (symbol, date, {', '.join(BAR_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(BAR_FIELDS))})", rows)
+
+    def _load_bars(self, symbol, begin, end):
+        rows = self.conn.execute(
+            f"SELECT date, {', '.join(BAR_FIELDS)} FROM bars "
+            f"WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date",
+            (symbol, begin, end)).fetchall()
+        df = pd.DataFrame(rows, columns=('date',) + BAR_FIELDS)
+        df.insert(0, 'symbol', symbol)
+        return df.set_index('date')
+
+    def _adjust_changed(self, symbol, fresh, before_day):
+        """新拉到的 K 线与库里重叠（且早于 before_day、一定已收盘）的收盘价是否对不上"""
+        if fresh.empty or 'close' not in fresh.columns:
+            return False
+        dates = [d for d in fresh.index if d < before_day]
+        if not dates:
+            return False
+        stored = dict(self.conn.execute(
+            "SELECT date, close FROM bars WHERE symbol = ? AND date >= ? AND date <= ?",
+            (symbol, min(dates), max(dates))).fetchall())
+        for d in dates:
+            old, new = stored.get(d), fresh.at[d, 'close']
+            if old is None or pd.isna(new):
+                continue
+            if abs(float(new) - old) > ADJUST_TOLERANCE * max(abs(old), 1e-9):
+                return True
+        return False
+
+    def _refetch_all(self, symbol, begin, end, fetch):
+        df = self._fetch(fetch, begin, end)
+        self.conn.execute("DELETE FROM bars WHERE symbol = ?", (symbol,))
+        self.conn.execute("DELETE FROM coverage WHERE kind = 'bars' AND symbol = ?", (symbol,))
+        if not df.empty:
+            self._save_bars(symbol, df)
+            self._set_coverage('bars', symbol, begin, end, self.now())
+
+    def get_bars(self, symbol, begin, end, fetch):
+        """[begin, end] 的日 K（index=date，列为 symbol + BAR_FIELDS）；end 超过今天按今天算"""
+        end = min(end, self.today())
+        with self._lock:
+            try:
+                cov, head, tail = self._plan('bars', symbol, begin, end)
+                if cov is None:
+                    self._refetch_all(symbol, begin, end, fetch)
+                else:
+                    covered_from, covered_to, fetched_at = cov
+                    full_from, full_to = min(begin, covered_from), max(end, covered_to)
+                    # 先把 head / tail 都拉完再写库：写事务不跨 API 请求，别的进程读写不被挡住
+                    head_df = tail_df = None
+                    if head is not None:
+                        # 往前补：多拉到库里 covered_from 之后的第一根（covered_from 可能是周末 / 节假日），
+                        # 用这根重叠的 K 线检测复权变化
+                        row = self.conn.execute(
+                            "SELECT MIN(date) FROM bars WHERE symbol = ? AND date >= ?",
+                            (symbol, covered_from)).fetchone()
+                        head_to = row[0] if row and row[0] else covered_from
+                        head_df = self._fetch(fetch, head[0], head_to)
+                    if tail:
+                        row = self.conn.execute(
+                            "SELECT date FROM bars WHERE symbol = ? AND date <= ? "
+                            "ORDER BY date DESC LIMIT 1 OFFSET ?",
+                            (symbol, covered_to, OVERLAP_BARS - 1)).fetchone()
+                        tail_from = row[0] if row else covered_from
+                        tail_df = self._fetch(fetch, tail_from, end)
+                    fetched_day = datetime.fromtimestamp(fetched_at, US_EASTERN).strftime('%Y-%m-%d')
+                    if ((head_df is not None and self._adjust_changed(symbol, head_df, _shift(head_to, 1)))
+                            or (tail_df is not None and self._adjust_changed(symbol, tail_df, fetched_day))):
+                        print(f"[Bar_Store] {symbol} 复权价格变化（拆股 / 分红），重新全量拉取")
+                        self._refetch_all(symbol, full_from, full_to, fetch)
+                    else:
+                        if head_df is not None:
+                            self._save_bars(symbol, head_df)
+                            covered_from = begin
+                        if tail_df is not None:
+                            self._save_bars(symbol, tail_df)
+                            covered_to, fetched_at = max(end, covered_to), self.now()
+                        if head_df is not None or tail_df is not None:
+                            self._set_coverage('bars', symbol, covered_from, covered_to, fetched_at)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            return self._load_bars(symbol, begin, end)
+
+    def invalidate(self, symbol):
+        """手动作废某只 symbol 的日 K（例如已知拆股）"""
+        with self._lock:
+            self.conn.execute("DELETE FROM bars WHERE symbol = ?", (symbol,))
+            self.conn.execute("DELETE FROM coverage WHERE kind = 'bars' AND symbol = ?", (symbol,))
+            self.conn.commit()
+
+    # ---------- PE ----------
+
+    def _save_pe(self, symbol, wide):
+        if wide is None or wide.empty:
+            return
+        rows = []
+        for field in wide.columns:
+            values = pd.to_numeric(wide[field], errors='coerce')
+            if values.isna().all():
+                continue        # symbol 之类的非数值列不入库
+            for d, v in values.items():
+                if not pd.isna(v):
+                    rows.append((symbol, d, str(field), float(v)))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pe (symbol, date, field, value) VALUES (?, ?, ?, ?)", rows)
+
+    def _load_pe(self, symbol, begin, end):
+        rows = self.conn.execute(
+            "SELECT date, field, value FROM pe WHERE symbol = ? AND date >= ? AND date <= ?",
+            (symbol, begin, end)).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        long = pd.DataFrame(rows, columns=('date', 'field', 'value'))
+        wide = long.pivot_table(index='date', columns='field', values='value', aggfunc='last').sort_index()
+        wide.columns.name = None
+        return wide
+
+    def get_pe(self, symbol, begin, end, fetch):
+        """[begin, end] 的 PE 宽表（index=date，列为各字段）"""
+        end = min(end, self.today())
+        with self._lock:
+            try:
+                cov, head, tail = self._plan('pe', symbol, begin, end)
+                if cov is None:
+                    df = self._fetch(fetch, begin, end)
+                    if df.empty:
+                        return df
+                    self._save_pe(symbol, df)
+                    self._set_coverage('pe', symbol, begin, end, self.now())
+                else:
+                    covered_from, covered_to, fetched_at = cov
+                    if head is not None:
+                        self._save_pe(symbol, self._fetch(fetch, head[0], head[1]))
+                        covered_from = begin
+                        self._set_coverage('pe', symbol, covered_from, covered_to, fetched_at)
+                    if tail:
+                        self._save_pe(symbol, self._fetch(fetch, covered_to, end))
+                        self._set_coverage('pe', symbol, covered_from, max(end, covered_to), self.now())
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            return self._load_pe(symbol, begin, end)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_bar_store():
+    """进程内共用一个 BarStore（跨进程通过同一个库文件共享）"""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = BarStore()
+        return _STORE
+
+
+# =========================================================
+# 自检：假的行情源（不连 Tiger）
+# =========================================================
+
+class _FakeBars:
+    """按日期生成确定的前复权日 K；split(ratio) 之后所有历史价格除以 ratio"""
+
+    def __init__(self):
+        self.calls = []
+        self.factor = 1.0
+
+    def split(self, ratio):
+        self.factor *= ratio
+
+    def __call__(self, begin, end):
+        self.calls.append((begin, end))
+        days = pd.date_range(begin, end, freq='B')
+        records = []
+        for i, d in enumerate(days):
+            k = (d - pd.Timestamp('2020-01-01')).days
+            price = (100.0 + k * 0.1) / self.factor
+            records.append({'date': d.strftime('%Y-%m-%d'), 'time': int(d.timestamp() * 1000),
+                            'open': price, 'high': price + 1, 'low': price - 1, 'close': price,
+                            'volume': 1000 + k, 'amount': price * (1000 + k)})
+        if not records:
+            return pd.DataFrame()
+        return pd.DataFrame(records).set_index('date')
+
+
+def selfcheck():
+    import tempfile
+    ok = True
+
+    def expect(cond, msg):
+        nonlocal ok
+        if not cond:
+            print(f"❌ {msg}")
+            ok = False
+
+    clock = [US_EASTERN.localize(datetime(2026, 10, 14, 18, 0)).timestamp()]   # 周三收盘后
+    fake = _FakeBars()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bars.db")
+        store = BarStore(path, now=lambda: clock[0])
+
+        df = store.get_bars("AAPL", "2026-06-01", "2026-10-14", fake)
+        expect(len(fake.calls) == 1 and len(df) > 90, f"首次查询应拉 1 次: {fake.calls}")
+
+        store.get_bars("AAPL", "2026-07-01", "2026-10-14", fake)
+        expect(len(fake.calls) == 1, "已覆盖区间不应再请求")
+
+        # 另一个进程（另一个连接）共享同一个库
+        other = BarStore(path, now=lambda: clock[0])
+        other.get_bars("AAPL", "2026-06-01", "2026-10-14", fake)
+        expect(len(fake.calls) == 1, "第二个实例应直接命中磁盘缓存")
+        other.close()
+
+        # 第二天收盘后：只拉尾部（从倒数第 OVERLAP_BARS 根开始）
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 15, 18, 0)).timestamp()
+        df = store.get_bars("AAPL", "2026-06-01", "2026-10-15", fake)
+        expect(len(fake.calls) == 2 and fake.calls[-1][0] >= "2026-10-07",
+               f"第二天应只拉尾部: {fake.calls[-1]}")
+        expect(df.index[-1] == "2026-10-15", "尾部合并后应包含新的一天")
+
+        # 往前补历史：只拉缺的那段
+        store.get_bars("AAPL", "2026-03-02", "2026-10-15", fake)
+        expect(len(fake.calls) == 3 and fake.calls[-1] == ("2026-03-02", "2026-06-01"),
+               f"往前只拉缺的一段: {fake.calls[-1]}")
+
+        # 拆股：尾部重叠价格对不上 -> 整只重拉
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 16, 18, 0)).timestamp()
+        fake.split(4)
+        df = store.get_bars("AAPL", "2026-03-02", "2026-10-16", fake)
+        want = fake("2026-03-02", "2026-03-02")['close'].iloc[0]
+        fake.calls.pop()
+        expect(abs(df['close'].iloc[0] - want) < 1e-9, "拆股后历史价格应为新的复权价")
+        expect(len(fake.calls) == 5 and fake.calls[-1] == ("2026-03-02", "2026-10-16"),
+               f"拆股后应整只重拉: {fake.calls[-2:]}")
+
+        # PE：重复查询零请求，尾部增量
+        pe_calls = []
+
+        def fake_pe(begin, end):
+            pe_calls.append((begin, end))
+            days = pd.date_range(begin, end, freq='B').strftime('%Y-%m-%d')
+            return pd.DataFrame({'pe_ttm': [30.0] * len(days), 'pe_lyr': [28.0] * len(days)}, index=days)
+
+        pe = store.get_pe("AAPL", "2026-01-01", "2026-10-16", fake_pe)
+        store.get_pe("AAPL", "2026-05-01", "2026-10-16", fake_pe)
+        expect(len(pe_calls) == 1 and list(pe.columns) == ['pe_lyr', 'pe_ttm'], f"PE 缓存: {pe_calls}")
+
+        # 覆盖区间从周六开始：往前补时要多拉到库里的第一根（周一）才能比对复权
+        fake2 = _FakeBars()
+        store.get_bars("MSFT", "2026-08-01", "2026-10-16", fake2)
+        fake2.split(2)
+        df = store.get_bars("MSFT", "2026-07-01", "2026-10-16", fake2)
+        expect(fake2.calls[1] == ("2026-07-01", "2026-08-03"), f"往前补应拉到第一根已存 K 线: {fake2.calls}")
+        expect(len(fake2.calls) == 3 and fake2.calls[-1] == ("2026-07-01", "2026-10-16"),
+               f"周末边界上的复权变化也应整只重拉: {fake2.calls}")
+        want = fake2("2026-10-16", "2026-10-16")['close'].iloc[0]
+        expect(abs(df['close'].iloc[-1] - want) < 1e-9, "重拉后应为新的复权价")
+
+        # 同一交易日盘中两次读取：10:00 拉的最后一根到 14:00 早已过期，必须重拉尾部
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 21, 10, 0)).timestamp()
+        fake3 = _FakeBars()
+        store.get_bars("NVDA", "2026-06-01", "2026-10-21", fake3)
+        n = len(fake3.calls)
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 21, 10, 5)).timestamp()
+        store.get_bars("NVDA", "2026-06-01", "2026-10-21", fake3)
+        expect(len(fake3.calls) == n, "TAIL_TTL 内再读不应重拉")
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 21, 14, 0)).timestamp()
+        store.get_bars("NVDA", "2026-06-01", "2026-10-21", fake3)
+        expect(len(fake3.calls) == n + 1, f"盘中拉的尾部过了 TAIL_TTL 应重拉: {fake3.calls[n:]}")
+        # 收盘后拉过一次，到第二天开盘前都算定型
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 21, 17, 0)).timestamp()
+        store.get_bars("NVDA", "2026-06-01", "2026-10-21", fake3)
+        clock[0] = US_EASTERN.localize(datetime(2026, 10, 22, 9, 0)).timestamp()
+        store.get_bars("NVDA", "2026-06-01", "2026-10-21", fake3)
+        expect(len(fake3.calls) == n + 2, f"收盘后拉的尾部到开盘前不应重拉: {fake3.calls[n:]}")
+
+        store.close()
+
+    print("✅ 自检通过" if ok else "❌ 自检失败")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    parser = argparse.ArgumentParser(description="Tiger 历史日 K / PE 持久化缓存")
+    parser.add_argument("--selfcheck", action="store_true", help="用假的行情源在临时库里自检")
+    parser.add_argument("--invalidate", nargs="+", metavar="SYMBOL", help="作废这些 symbol 的日 K 缓存")
+    args = parser.parse_args()
+    if args.selfcheck:
+        sys.exit(0 if selfcheck() else 1)
+    elif args.invalidate:
+        store = get_bar_store()
+        for s in args.invalidate:
+            store.invalidate(s)
+        print(f"已作废: {', '.join(args.invalidate)}")
+    else:
+        parser.print_help()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quote_Service.py
+进程内共享的多 symbol 实时报价服务（基于 Tiger_API.TigerDataFetcher）
+
+原来 Chart_input._RealtimeManager 每 5 秒对当前 symbol 单独调一次 get_realtime_quote，
+Check_HighLow 的盘前/盘后 tab（pre_after.get_pre_after_changes）再单独批量拉一遍，
+开几个窗口就有几路各自为政的请求。
+
+这里统一改为：
+    - 各窗口把关心的 symbol 订阅进来（subscribe / update / unsubscribe），
+      后台一个线程每轮把所有订阅取并集，按 50 个一批调用 get_stock_briefs；
+    - TTL 缓存：某个 symbol 的报价在 ttl 秒内拉过就不再请求，同步接口 get_quotes 也走这份缓存；
+    - 全局调用预算：令牌桶限制每分钟的 get_stock_briefs 次数，后台轮询与同步请求共用；
+    - 报价有变化时回调订阅者（在服务线程里调用，Qt 界面需要自己转回主线程，
+      或者像 Chart_input 那样在主线程定时 get_latest 读内存）。
+
+报价字段与 get_realtime_quote 相同：symbol / price / volume / pre_close / tag / is_extended，
+price 的取法与 get_realtime_prices 相同（盘前盘后价为空或 0 时退回 latest_price）。
+
+用法:
+    from Quote_Service import get_quote_service
+    service = get_quote_service()
+    token = service.subscribe(["AAPL", "BRK-B"], callback=lambda quotes: ...)
+    service.get_latest("AAPL")            # -> {'price': ..., ...} 或 None
+    service.get_quotes(symbols)           # 同步：缺的 / 过期的批量补齐后返回
+    service.unsubscribe(token)
+"""
+
+import math
+import time
+import itertools
+import threading
+
+BATCH_SIZE = 50            # get_stock_briefs 单次最多的 symbol 数（与 get_realtime_prices 一致）
+POLL_INTERVAL = 5.0        # 后台轮询间隔（秒）
+QUOTE_TTL = 5.0            # 报价在缓存里视为新鲜的时间（秒）
+CALLS_PER_MINUTE = 60      # 全进程 get_stock_briefs 调用预算
+
+
+class RateBudget:
+    """令牌桶：每分钟最多 calls_per_minute 次，允许攒满 burst 次的突发"""
+
+    def __init__(self, calls_per_minute=CALLS_PER_MINUTE, burst=None):
+        self.rate = calls_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, calls_per_minute // 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=None):
+        """拿到一个令牌返回 True；timeout 秒内拿不到返回 False（None 表示一直等）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return True
+                wait = (1.0 - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+def _is_blank(value):
+    if value is None or value == '':
+        return True
+    try:
+        return math.isnan(float(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_brief(row):
+    """get_stock_briefs 返回的一行 -> 报价 dict；拿不到有效价格返回 None"""
+    sym = row.get('symbol')
+    if not sym:
+        return None
+    price, tag, is_extended = None, '常规', False
+    hour_price = row.get('hour_trading_latest_price')
+    if not _is_blank(hour_price):
+        try:
+            price = float(hour_price)
+            tag = row.get('hour_trading_tag', '常规')
+            is_extended = True
+        except (TypeError, ValueError):
+            price = None
+    if not price:
+        try:
+            price = float(row.get('latest_price', 0))
+        except (TypeError, ValueError):
+            return None
+        tag, is_extended = '常规', False
+    if _is_blank(price) or price <= 0:
+        return None
+    volume = row.get('volume', 0)
+    pre_close = row.get('pre_close', 0)
+    return {
+        'symbol': sym,
+        'price': price,
+        'volume': 0 if _is_blank(volume) else int(volume),
+        'pre_close': 0.0 if _is_blank(pre_close) else float(pre_close),
+        'tag': tag,
+        'is_extended': is_extended,
+    }
+
+
+def _default_fetcher():
+    from Tiger_API import _get_global_fetcher
+    return _get_global_fetcher()
+
+
+class QuoteService:
+    def __init__(self, fetcher_factory=_default_fetcher, ttl=QUOTE_TTL, interval=POLL_INTERVAL,
+                 budget=None, batch_size=BATCH_SIZE):
+        self.fetcher_factory = fetcher_factory
+        self.ttl = ttl
+        self.interval = interval
+        self.budget = budget if budget is not None else RateBudget()
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()       # 同一时刻只有一路在调 API，避免重复拉同一批
+        self._cache = {}                          # symbol -> (拉取时间, 报价)
+        self._subs = {}                           # token -> (symbols, callback)
+        self._tokens = itertools.count(1)
+        self._fetcher = None
+        self._fetcher_failed = False
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    # ---------- fetcher ----------
+
+    def _get_fetcher(self):
+        if self._fetcher is None and not self._fetcher_failed:
+            try:
+                self._fetcher = self.fetcher_factory()
+            except ImportError as e:
+                print(f"导入 Tiger_API 失败: {e}")
+                self._fetcher_failed = True
+            except Exception as e:
+                print(f"初始化 fetcher 失败: {e}")
+                self._fetcher_failed = True
+        return self._fetcher
+
+    # ---------- 订阅 ----------
+
+    def subscribe(self, symbols, callback=None):
+        """订阅一组 symbol；callback({symbol: 报价}) 在报价变化时被调用。返回 token"""
+        token = next(self._tokens)
+        with self._lock:
+            self._subs[token] = (tuple(dict.fromkeys(symbols)), callback)
+        self._ensure_thread()
+        self._wake.set()
+        return token
+
+    def update(self, token, symbols):
+        """替换某个订阅的 symbol 列表（比如图表切换了 symbol）"""
+        with self._lock:
+            if token not in self._subs:
+                return
+            self._subs[token] = (tuple(dict.fromkeys(symbols)), self._subs[token][1])
+        self._wake.set()
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subs.pop(token, None)
+
+    def subscribed_symbols(self):
+        with self._lock:
+            return list(dict.fromkeys(s for symbols, _ in self._subs.values() for s in symbols))
+
+    # ---------- 读取 ----------
+
+    def get_latest(self, symbol, max_age=None):
+        """缓存里的最新报价（不发请求）；max_age 秒以前的视为没有"""
+        with self._lock:
+            cached = self._cache.get(symbol)
+        if cached is None:
+            return None
+        if max_age is not None and time.monotonic() - cached[0] > max_age:
+            return None
+        return cached[1]
+
+    def get_quotes(self, symbols, max_age=None):
+        """
+        同步取一组 symbol 的报价：缓存里够新的直接用，其余按批补拉（同样受全局预算约束）。
+        返回 {symbol: 报价}，拉不到的 symbol 不在结果里。
+        """
+        max_age = self.ttl if max_age is None else max_age
+        symbols = list(dict.fromkeys(symbols))
+        self._refresh(symbols, max_age)
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for s in symbols:
+                cached = self._cache.get(s)
+                if cached is not None and now - cached[0] <= max(max_age, self.ttl):
+                    result[s] = cached[1]
+        return result
+
+    # ---------- 拉取 ----------
+
+    def _stale(self, symbols, max_age):
+        now = time.monotonic()
+        with self._lock:
+            return [s for s in symbols
+                    if s not in self._cache or now - self._cache[s][0] >= max_age]
+
+    def _fetch_batch(self, fetcher, batch):
+        """拉一批，返回 {原始 symbol: 报价}"""
+        quotes = {}
+        for s, row in fetcher.get_brief_rows(batch).items():
+            quote = parse_brief(row)
+            if quote is not None:
+                quotes[s] = quote
+        return quotes
+
+    def _refresh(self, symbols, max_age):
+        """补拉缓存中缺失 / 过期的 symbol，返回本次报价有变化的 {symbol: 报价}"""
+        if not symbols:
+            return {}
+        fetcher = self._get_fetcher()
+        if fetcher is None:
+            return {}
+        changed = {}
+        with self._fetch_lock:
+            # 等锁期间别的线程可能刚拉过，重新挑一次过期的
+            stale = self._stale(symbols, max_age)
+            for i in range(0, len(stale), self.batch_size):
+                batch = stale[i:i + self.batch_size]
+                if not self.budget.acquire(timeout=self.interval):
+                    break
+                try:
+                    quotes = self._fetch_batch(fetcher, batch)
+                except Exception as e:
+                    print(f"批量获取实时报价失败: {e}")
+                    continue
+                now = time.monotonic()
+                with self._lock:
+                    for s, quote in quotes.items():
+                        old = self._cache.get(s)
+                        if old is None or old[1] != quote:
+                            changed[s] = quote
+                        self._cache[s] = (now, quote)
+        return changed
+
+    # ---------- 后台线程 ----------
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="QuoteService", daemon=True)
+                self._thread.start()
+
+    def _notify(self, changed):
+        with self._lock:
+            subs = list(self._subs.values())
+        for symbols, callback in subs:
+            if callback is None:
+                continue
+            mine = {s: changed[s] for s in symbols if s in changed}
+            if not mine:
+                continue
+            try:
+                callback(mine)
+            except Exception as e:
+                print(f"实时报价回调失败: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            symbols = self.subscribed_symbols()
+            if symbols:
+                changed = self._refresh(symbols, self.ttl)
+                if changed:
+                    self._notify(changed)
+            if self._fetcher_failed:
+                break
+            self._wake.wait(timeout=self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+def get_quote_service():
+    """整个进程共用一个报价服务（一个后台线程 + 一个 fetcher + 一份调用预算）"""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = QuoteService()
+        return _SERVICE
+
+
+if __name__ == "__main__":
+    import sys
+    symbols = sys.argv[1:] or ["AAPL", "MSFT", "BRK-B"]
+    service = get_quote_service()
+    t0 = time.perf_counter()
+    quotes = service.get_quotes(symbols)
+    print(f"{len(quotes)}/{len(symbols)} 条报价, 用时 {time.perf_counter() - t0:.2f}s")
+    for s in symbols:
+        q = quotes.get(s)
+        print(f"  {s:<8} {q['price'] if q else '--':>10}  {q['tag'] if q else ''}")
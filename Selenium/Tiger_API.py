@@ -19,6 +19,9 @@ from tigeropen.common.util.signature_utils import read_private_key
 from tigeropen.quote.quote_client import QuoteClient
 from tigeropen.common.consts import Language, BarPeriod, QuoteRight
 
+# 历史日 K / PE 的持久化缓存（~/Coding/Database/Tiger_Bars.db，多进程共用）
+from Bar_Store import get_bar_store
+
 # ==================== 配置区 ====================
 PRIVATE_KEY_PATH = '/Users/yanzhang/Downloads/backup/tiger.pem'
 TIGER_ID = '20150215'
@@ -43,13 +46,20 @@ def _normalize_symbol(symbol):
 
 
 class TigerDataFetcher:
-    def __init__(self, private_key_path: str, tiger_id: str):
+    def __init__(self, private_key_path: str, tiger_id: str, persistent: bool = True):
         self.private_key_path = private_key_path
         self.tiger_id = tiger_id
         self.quote_client = None
         # 历史K线缓存: {symbol: DataFrame(index=date字符串)}
         self._hist_cache = {}
         self._pe_cache = {}
+        # 磁盘缓存：已覆盖的区间直接读库，只拉缺的头 / 尾
+        self._store = None
+        if persistent:
+            try:
+                self._store = get_bar_store()
+            except Exception as e:
+                logger.warning(f"打开历史数据缓存失败，改为每次直接请求: {e}")
         self._init_clients()
 
     def _init_clients(self):
@@ -124,16 +134,15 @@ class TigerDataFetcher:
             logger.error("当前 tigeropen 版本不支持 get_financial_daily，请升级: pip install -U tigeropen")
             return pd.DataFrame()
 
-        try:
+        def fetch(begin, end):
             df = self.quote_client.get_financial_daily(
                 symbols=[symbol],
                 market=mkt,
                 fields=fields,
-                begin_date=start_date,
-                end_date=end_date,
+                begin_date=begin,
+                end_date=end,
             )
             if df is None or df.empty:
-                logger.warning(f"{symbol} 未取到 PE 历史数据")
                 return pd.DataFrame()
 
             # 接口返回常见形式: columns=[symbol, date, field, value]（长表）
@@ -152,6 +161,16 @@ class TigerDataFetcher:
             # 有些版本 field 列返回的是枚举对象，pivot 之后列名不是字符串
             wide.columns = [str(c).split('.')[-1] if not isinstance(c, str) else c
                             for c in wide.columns]
+            return wide
+
+        try:
+            if self._store is not None:
+                wide = self._store.get_pe(symbol, start_date, end_date, fetch)
+            else:
+                wide = fetch(start_date, end_date)
+            if wide.empty:
+                logger.warning(f"{symbol} 未取到 PE 历史数据")
+                return pd.DataFrame()
 
             if not hasattr(self, '_pe_cache'):
                 self._pe_cache = {}
@@ -222,6 +241,27 @@ class TigerDataFetcher:
             logger.error(f"批量获取实时价格失败: {e}")
             return result
 
+    def get_brief_rows(self, symbols):
+        """
+        单批 get_stock_briefs（调用方保证不超过 50 个，含盘前盘后）。
+        返回 {调用方传入的 symbol: 该行的 dict}，BRK-B 这类映射过的 symbol 按原写法返回。
+        """
+        by_norm = {}
+        for s in symbols:
+            by_norm.setdefault(_normalize_symbol(s), []).append(s)
+        briefs = self.quote_client.get_stock_briefs(
+            symbols=list(by_norm),
+            include_hour_trading=True,
+            lang=Language.zh_CN
+        )
+        rows = {}
+        if briefs is None or briefs.empty:
+            return rows
+        for row in briefs.to_dict('records'):
+            for s in by_norm.get(row.get('symbol'), ()):
+                rows[s] = row
+        return rows
+
     def get_realtime_quote(self, symbol: str) -> dict:
         try:
             symbol = _normalize_symbol(symbol)
@@ -274,32 +314,18 @@ class TigerDataFetcher:
         end_dt = datetime.now(us_eastern)
         begin_dt = end_dt - timedelta(days=days + 30)
 
-        end_time = end_dt.strftime('%Y-%m-%d %H:%M:%S')
-        begin_time = begin_dt.strftime('%Y-%m-%d %H:%M:%S')
-
         try:
-            df = self.quote_client.get_bars_by_page(
-                symbol=symbol,
-                period=BarPeriod.DAY,
-                begin_time=begin_time,
-                end_time=end_time,
-                total=5000,
-                page_size=1000,
-                right=QuoteRight.BR,
-                time_interval=0.5
-            )
-            if df is None or df.empty:
+            if self._store is not None:
+                df = self._store.get_bars(symbol, begin_dt.strftime('%Y-%m-%d'),
+                                          end_dt.strftime('%Y-%m-%d'),
+                                          lambda b, e: self._fetch_bars(symbol, b, e))
+            else:
+                df = self._fetch_bars(symbol, begin_dt.strftime('%Y-%m-%d'),
+                                      end_dt.strftime('%Y-%m-%d'))
+            if df.empty:
                 logger.warning(f"获取 {symbol} 历史日K数据为空")
                 return pd.DataFrame()
 
-            df['time'] = pd.to_numeric(df['time'], errors='coerce')
-            df['date'] = pd.to_datetime(df['time'], unit='ms') \
-                           .dt.tz_localize('UTC') \
-                           .dt.tz_convert('US/Eastern') \
-                           .dt.strftime('%Y-%m-%d')
-            df = df.sort_values('time', ascending=True).reset_index(drop=True)
-            df = df.set_index('date')
-
             # 写入缓存
             self._hist_cache[symbol] = df
             return df.tail(days).copy()
@@ -307,6 +333,32 @@ class TigerDataFetcher:
             logger.error(f"获取历史数据失败: {e}")
             return pd.DataFrame()
 
+    def _fetch_bars(self, symbol: str, begin_date: str, end_date: str) -> pd.DataFrame:
+        """
+        直接向接口拉 [begin_date, end_date] 的前复权日K（Bar_Store 缺头 / 缺尾时调用）
+        返回 DataFrame，index 为 date 字符串 'YYYY-MM-DD'；失败直接抛异常
+        """
+        df = self.quote_client.get_bars_by_page(
+            symbol=symbol,
+            period=BarPeriod.DAY,
+            begin_time=f"{begin_date} 00:00:00",
+            end_time=f"{end_date} 23:59:59",
+            total=5000,
+            page_size=1000,
+            right=QuoteRight.BR,
+            time_interval=0.5
+        )
+        if df is None or df.empty:
+            return pd.DataFrame()
+
+        df['time'] = pd.to_numeric(df['time'], errors='coerce')
+        df['date'] = pd.to_datetime(df['time'], unit='ms') \
+                       .dt.tz_localize('UTC') \
+                       .dt.tz_convert('US/Eastern') \
+                       .dt.strftime('%Y-%m-%d')
+        df = df.sort_values('time', ascending=True).reset_index(drop=True)
+        return df.set_index('date')
+
     def get_historical_bars_by_range(self, symbol: str,
                                       start_date: str = None,
                                       end_date: str = None,
@@ -12,7 +12,11 @@ import os
 import sys
 import json
 import datetime
+import argparse
+import tempfile
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from tqdm import tqdm
 import pandas_market_calendars as mcal
@@ -32,17 +36,33 @@ CHECK_YESTERDAY_SCRIPT_PATH = os.path.join(FINANCIAL_SYSTEM_DIR, "Query", "Check
 # 导入 Tiger 封装
 sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Selenium"))
 from Tiger_API import _get_global_fetcher, _normalize_symbol
+from Quote_Service import RateBudget
 from tigeropen.common.consts import BarPeriod, QuoteRight
+sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Query"))
+from Rolling_Stats import apply_rows as apply_rolling_stats
+from Bulk_Writer import BulkWriter, STAGE_COLUMNS
+from Modules_Cache import load_json, save_json, use_context
+sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Operations"))
+from Schema_Migration import ensure_covering_index
 
 # ================= 批量参数 =================
-BATCH_SIZE = 50           # Tiger 单次 get_bars 最多 50 只
-SLEEP_BETWEEN_BATCH = 1.1 # 秒，限速
-BARS_LIMIT = 3            # 每只拉 3 条，够做日期校验
+BATCH_SIZE = 50              # Tiger 单次 get_stock_briefs 最多 50 只
+BRIEF_CALLS_PER_MINUTE = 55  # get_stock_briefs 每分钟调用上限（原来串行 sleep 1.1 秒，约合 55 次/分）
+MAX_IN_FLIGHT = 4            # 同时在途的请求数，掩盖单次请求的网络延迟
+BARS_LIMIT = 3               # 每只拉 3 条，够做日期校验
+
+# 各类表写入的列（数据统一按 (date, name, price, volume, open, high, low) 传入）
+TABLE_COLUMNS = {
+    "expanded": STAGE_COLUMNS,
+    "no_volume": STAGE_COLUMNS[:3],
+    "standard": STAGE_COLUMNS[:4],
+}
 
 
 # =========================================================
-# 以下三个函数（get_table_type / create_table_if_not_exists /
-# insert_data_to_db）完全沿用 YF_Today.py，保持行为一致
+# 以下函数（get_table_type / create_table_if_not_exists / insert_data_to_db）
+# 完全沿用 YF_Today.py，保持行为一致；(name, date) 覆盖索引统一由 Schema_Migration.ensure_covering_index 建
+# 写库统一走 Query/Bulk_Writer.py（WAL + TEMP 暂存表 + 一个事务合并）
 # =========================================================
 
 def get_table_type(sector):
@@ -77,46 +97,29 @@ def create_table_if_not_exists(cursor, table_name, table_type):
         CREATE TABLE IF NOT EXISTS {safe_table_name} (
             date TEXT, name TEXT, price REAL, volume INTEGER, UNIQUE(date, name)
         )''')
+    ensure_covering_index(cursor, table_name)
+
+
+def stage_rows(writer, table_name, data_rows, table_type):
+    """
+    把 (date, name, price, volume, open, high, low) 暂存进 BulkWriter，按 table_type 只取对应的列；
+    合并前建表 / 建索引，合并后在同一事务里增量更新滚动统计（MA / 成交额排名 / 区间高低点）。
+    """
+    writer.add(table_name, data_rows, columns=TABLE_COLUMNS.get(table_type, STAGE_COLUMNS[:4]),
+               prepare=lambda cursor, table: create_table_if_not_exists(cursor, table, table_type),
+               after_merge=apply_rolling_stats)
 
 def insert_data_to_db(db_path, table_name, data_rows, table_type):
     if not data_rows:
         return False
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
-    safe_table = f'"{table_name}"'
     try:
-        create_table_if_not_exists(cursor, table_name, table_type)
-        if table_type == "expanded":
-            filtered_data = data_rows
-            upsert_sql = f"""
-            INSERT INTO {safe_table} (date, name, price, volume, open, high, low)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(date, name) DO UPDATE SET
-                price=excluded.price, volume=excluded.volume,
-                open=excluded.open, high=excluded.high, low=excluded.low;
-            """
-        elif table_type == "no_volume":
-            filtered_data = [(r[0], r[1], r[2]) for r in data_rows]
-            upsert_sql = f"""
-            INSERT INTO {safe_table} (date, name, price) VALUES (?, ?, ?)
-            ON CONFLICT(date, name) DO UPDATE SET price=excluded.price;
-            """
-        else:
-            filtered_data = [(r[0], r[1], r[2], r[3]) for r in data_rows]
-            upsert_sql = f"""
-            INSERT INTO {safe_table} (date, name, price, volume) VALUES (?, ?, ?, ?)
-            ON CONFLICT(date, name) DO UPDATE SET
-                price=excluded.price, volume=excluded.volume;
-            """
-        cursor.executemany(upsert_sql, filtered_data)
-        conn.commit()
-        return True
+        with BulkWriter(db_path, log=tqdm.write) as writer:
+            stage_rows(writer, table_name, data_rows, table_type)
+            stats = writer.commit()
     except sqlite3.Error as e:
         tqdm.write(f"❌ 数据库写入失败 ({table_name}): {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
+    return not stats['failed']
 
 
 # =========================================================
@@ -128,8 +131,7 @@ def load_tasks_from_json(json_path):
         tqdm.write(f"⚠️ 未找到 JSON 文件: {json_path}")
         return {}
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json(json_path)
     except Exception as e:
         tqdm.write(f"⚠️ 读取 JSON 出错: {e}")
         return {}
@@ -139,26 +141,36 @@ def load_alias_mapping(json_path):
     if not os.path.exists(json_path):
         return {}
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            mapping = json.load(f)
-            return {v: k for k, v in mapping.items()}
+        mapping = load_json(json_path, copy=False)
+        return {v: k for k, v in mapping.items()}
     except Exception as e:
         tqdm.write(f"⚠️ 读取映射文件出错: {e}")
         return {}
 
 def remove_symbol_from_json(json_path, group_name, symbol):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
         if group_name in data and symbol in data[group_name]:
             data[group_name].remove(symbol)
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            save_json(json_path, data, indent=4, ensure_ascii=False)
             return True
     except Exception as e:
         tqdm.write(f"⚠️ 更新 JSON 失败 [{symbol}]: {e}")
     return False
 
+def remove_symbols_from_json(json_path, group_name, symbols):
+    """流式写库时每批每个分组只读写一次 JSON（与 YF_Today.remove_symbols_from_json 相同）"""
+    try:
+        data = load_json(json_path)
+        done = set(symbols)
+        if group_name in data and done & set(data[group_name]):
+            data[group_name] = [s for s in data[group_name] if s not in done]
+            save_json(json_path, data, indent=4, ensure_ascii=False)
+            return True
+    except Exception as e:
+        tqdm.write(f"⚠️ 更新 JSON 失败 [{group_name}]: {e}")
+    return False
+
 def get_last_valid_trading_date():
     nyse = mcal.get_calendar('NYSE')
     today = datetime.datetime.now().date()
@@ -175,63 +187,95 @@ def get_last_valid_trading_date():
 # Tiger 批量取数据（替换掉原来的 Selenium + JS 部分）
 # =========================================================
 
-def fetch_briefs_batch(fetcher, symbols, batch_size=BATCH_SIZE,
-                       sleep_sec=SLEEP_BETWEEN_BATCH):
+BRIEF_PRICE_COLUMNS = ('open', 'high', 'low', 'latest_price')
+
+
+def briefs_to_rows(df):
     """
-    用 get_stock_briefs 批量拉当日 OHLCV（不吃历史行情配额）
-    返回: {symbol: [(date, open, high, low, close, volume)]}
-          为了兼容原来的 pick_row_by_rules，仍然返回 list 结构，只是只有一条
+    get_stock_briefs 返回的 DataFrame -> {symbol: [(date, open, high, low, close, volume)]}
+    为了兼容 pick_row_by_rules，仍然返回 list 结构，只是只有一条。
+
+    整列 to_numeric + 掩码，代替逐行 iterrows / float()：
+    symbol 为空、OHLC 任一缺失 / 非数字 / 为 0、日期缺失的行丢弃；volume 缺失记 0；
+    同一 symbol 出现多次时以后出现的为准。
+    """
+    if df is None or df.empty or 'symbol' not in df.columns or 'latest_time' not in df.columns:
+        return {}
+    if any(c not in df.columns for c in BRIEF_PRICE_COLUMNS):
+        return {}
+
+    # latest_time 是毫秒时间戳，转美东日期
+    dates = (
+        pd.to_datetime(pd.to_numeric(df['latest_time'], errors='coerce'), unit='ms', utc=True)
+          .dt.tz_convert('US/Eastern')
+          .dt.strftime('%Y-%m-%d')
+    )
+    out = pd.DataFrame({
+        'symbol': df['symbol'],
+        'date': dates,
+        'open': pd.to_numeric(df['open'], errors='coerce'),
+        'high': pd.to_numeric(df['high'], errors='coerce'),
+        'low': pd.to_numeric(df['low'], errors='coerce'),
+        'close': pd.to_numeric(df['latest_price'], errors='coerce'),
+        'volume': (pd.to_numeric(df['volume'], errors='coerce').fillna(0)
+                   if 'volume' in df.columns else 0),
+    })
+    valid = out['symbol'].notna() & (out['symbol'] != '') & out['date'].notna()
+    for c in ('open', 'high', 'low', 'close'):
+        valid &= out[c].notna() & (out[c] != 0)
+    out = out[valid]
+    out = out.assign(volume=out['volume'].astype('int64'))
+
+    # itertuples 逐列迭代，得到的是 Python 原生 float / int，可以直接交给 sqlite3
+    return {sym: [(d, o, h, l, c, v)]
+            for sym, d, o, h, l, c, v in out.itertuples(index=False, name=None)}
+
+
+def iter_briefs(quote_client, symbols, batch_size=BATCH_SIZE,
+                max_in_flight=MAX_IN_FLIGHT, budget=None):
+    """
+    并发拉 brief：最多 max_in_flight 个 get_stock_briefs 同时在途，
+    每次发请求前先从令牌桶（Quote_Service.RateBudget）拿配额，总速率不超过 Tiger 的限制。
+    按完成顺序逐批 yield (批次序号, 该批 symbols, {symbol: [row]})，失败 / 为空的批次 rows 为 {}，
+    调用方可以边拉边写库。
     """
     uniq = list(dict.fromkeys(symbols))
+    batches = [uniq[i:i + batch_size] for i in range(0, len(uniq), batch_size)]
+    if budget is None:
+        budget = RateBudget(BRIEF_CALLS_PER_MINUTE, burst=max_in_flight)
+
+    def fetch(batch):
+        budget.acquire()
+        df = quote_client.get_stock_briefs(
+            symbols=batch,
+            include_hour_trading=False,   # 只要常规盘 OHLCV
+            lang=Language.zh_CN
+        )
+        return briefs_to_rows(df)
+
+    total_batches = len(batches)
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = {pool.submit(fetch, batch): (bi, batch) for bi, batch in enumerate(batches, 1)}
+        for fut in as_completed(futures):
+            bi, batch = futures[fut]
+            try:
+                rows = fut.result()
+                if not rows:
+                    tqdm.write(f"    ⚠️ 批次 {bi}/{total_batches} 返回空")
+            except Exception as e:
+                tqdm.write(f"    ❌ 批次 {bi}/{total_batches} 失败: {e}")
+                rows = {}
+            yield bi, batch, rows
+
+
+def fetch_briefs_batch(fetcher, symbols, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT):
+    """
+    用 get_stock_briefs 批量拉当日 OHLCV（不吃历史行情配额），一次性返回全部结果
+    返回: {symbol: [(date, open, high, low, close, volume)]}
+    """
     result = {}
-    total_batches = (len(uniq) + batch_size - 1) // batch_size
-
-    for bi, i in enumerate(range(0, len(uniq), batch_size), 1):
-        batch = uniq[i:i + batch_size]
-        tqdm.write(f"  [{bi}/{total_batches}] 批量拉取 brief {len(batch)} 只...")
-        try:
-            df = fetcher.quote_client.get_stock_briefs(
-                symbols=batch,
-                include_hour_trading=False,   # 只要常规盘 OHLCV
-                lang=Language.zh_CN
-            )
-            if df is None or df.empty:
-                tqdm.write(f"    ⚠️ 批次 {bi} 返回空")
-            else:
-                # latest_time 是毫秒时间戳，转美东日期
-                if 'latest_time' in df.columns:
-                    df['latest_time'] = pd.to_numeric(df['latest_time'], errors='coerce')
-                    df['date'] = (
-                        pd.to_datetime(df['latest_time'], unit='ms')
-                          .dt.tz_localize('UTC')
-                          .dt.tz_convert('US/Eastern')
-                          .dt.strftime('%Y-%m-%d')
-                    )
-                else:
-                    df['date'] = None
-
-                for _, r in df.iterrows():
-                    sym = r.get('symbol')
-                    if not sym:
-                        continue
-                    try:
-                        o = float(r.get('open'))
-                        h = float(r.get('high'))
-                        l = float(r.get('low'))
-                        c = float(r.get('latest_price'))
-                        v = int(r.get('volume')) if not pd.isna(r.get('volume')) else 0
-                        d = r.get('date')
-                    except Exception:
-                        continue
-                    if not (o and h and l and c and d):
-                        continue
-                    result[sym] = [(d, o, h, l, c, v)]
-        except Exception as e:
-            tqdm.write(f"    ❌ 批次 {bi} 失败: {e}")
-
-        if bi < total_batches:
-            time.sleep(sleep_sec)
-
+    for _, _, rows in iter_briefs(fetcher.quote_client, symbols, batch_size, max_in_flight):
+        result.update(rows)
     return result
 
 
@@ -264,7 +308,82 @@ def pick_row_by_rules(symbol, bars, last_valid_date):
 # 主流程
 # =========================================================
 
-def run():
+def ingest_briefs(quote_client, task_list, alias_to_symbol, last_valid_date,
+                  db_path=DB_PATH, json_path=SECTORS_JSON_PATH,
+                  max_in_flight=MAX_IN_FLIGHT, budget=None):
+    """
+    边拉边写：每完成一批 brief，就把这批对应的原始任务走日期校验后暂存进 BulkWriter 的 TEMP 表
+    （不碰主库，拉取期间 GUI 读库不受影响）；全部拉完后一个事务合并进各板块表，
+    再按分组一次性从 JSON 里移除写成功的 symbol。
+    返回 {'success', 'fail', 'skip', 'rows', 'seconds'}。
+    """
+    # 建立映射：Tiger 真实代码 -> [(原始 symbol, group), ...]
+    # 之所以用列表，是为了支持一个真实代码对应多个别名的情况（极少）
+    scrape_to_tasks = {}
+    for orig, group in task_list:
+        # 两步转译：JSON 别名映射 -> Tiger 内置符号规范化
+        intermediate = alias_to_symbol.get(orig, orig)
+        scrape_sym = _normalize_symbol(intermediate)
+        scrape_to_tasks.setdefault(scrape_sym, []).append((orig, group))
+
+    scrape_symbols = list(scrape_to_tasks.keys())
+    tqdm.write(f"▶ 将并发请求 {len(scrape_symbols)} 个 Tiger 代码"
+               f"（{max_in_flight} 路在途，每分钟 ≤ {BRIEF_CALLS_PER_MINUTE} 次）...\n")
+
+    stats = {'success': 0, 'fail': 0, 'skip': 0, 'rows': 0, 'seconds': 0.0}
+    t0 = time.perf_counter()
+    staged = {}    # group -> [原始 symbol]
+    pbar = tqdm(total=len(task_list), desc="拉取进度")
+    with BulkWriter(db_path, log=tqdm.write) as writer:
+        for bi, batch, bars_map in iter_briefs(quote_client, scrape_symbols,
+                                              max_in_flight=max_in_flight, budget=budget):
+            by_group = {}
+            for scrape_sym in batch:
+                for orig_symbol, group in scrape_to_tasks[scrape_sym]:
+                    pbar.update(1)
+                    bars = bars_map.get(scrape_sym)
+                    if not bars:
+                        tqdm.write(f"❌ [{orig_symbol}] Tiger 未返回数据，跳过（保留在 JSON 中）")
+                        stats['fail'] += 1
+                        continue
+
+                    selected, err = pick_row_by_rules(orig_symbol, bars, last_valid_date)
+                    if selected is None:
+                        tqdm.write(f"⚠️ [{orig_symbol}] {err}")
+                        stats['skip'] += 1
+                        continue
+
+                    # selected: (date, open, high, low, close, volume)
+                    # 数据库统一入参格式: (date, name, price, volume, open, high, low)，price 用 close
+                    date, o, h, l, c, v = selected
+                    by_group.setdefault(group, []).append((date, orig_symbol, c, v, o, h, l))
+
+            for group, db_rows in by_group.items():
+                stage_rows(writer, group, db_rows, get_table_type(group))
+                staged.setdefault(group, []).extend(r[1] for r in db_rows)
+        pbar.close()
+
+        try:
+            write_stats = writer.commit()
+        except sqlite3.Error as e:
+            tqdm.write(f"❌ 数据库写入失败: {e}")
+            write_stats = {'failed': dict.fromkeys(staged, str(e))}
+        else:
+            tqdm.write(BulkWriter.describe(write_stats))
+
+    for group, names in staged.items():
+        if group in write_stats['failed']:
+            stats['fail'] += len(names)
+            continue
+        remove_symbols_from_json(json_path, group, names)
+        stats['success'] += len(names)
+        stats['rows'] += len(names)
+    stats['seconds'] = time.perf_counter() - t0
+    return stats
+
+
+def run(check_yesterday=True):
+    """check_yesterday=False 时不在最后自己起 Check_yesterday（流水线里由 DAG 调度）"""
     tasks_dict = load_tasks_from_json(SECTORS_JSON_PATH)
     alias_to_symbol = load_alias_mapping(SYMBOL_MAPPING_PATH)
 
@@ -282,7 +401,8 @@ def run():
 
     if not task_list:
         tqdm.write("✅ Empty JSON 文件中没有待抓取的 Symbol，任务结束。")
-        run_check_yesterday_if_empty()
+        if check_yesterday:
+            run_check_yesterday_if_empty()
         return
 
     tqdm.write(f"共加载 {len(task_list)} 个待抓取任务。\n")
@@ -294,59 +414,149 @@ def run():
         tqdm.write(f"❌ Tiger 初始化失败: {e}")
         return
 
-    # 建立映射：Tiger 真实代码 -> [(原始 symbol, group), ...]
-    # 之所以用列表，是为了支持一个真实代码对应多个别名的情况（极少）
-    scrape_to_tasks = {}
-    for orig, group in task_list:
-        # 两步转译：JSON 别名映射 -> Tiger 内置符号规范化
-        intermediate = alias_to_symbol.get(orig, orig)
-        scrape_sym = _normalize_symbol(intermediate)
-        scrape_to_tasks.setdefault(scrape_sym, []).append((orig, group))
-
-    scrape_symbols = list(scrape_to_tasks.keys())
-    tqdm.write(f"▶ 将批量请求 {len(scrape_symbols)} 个 Tiger 代码...\n")
-
-    bars_map = fetch_briefs_batch(fetcher, scrape_symbols)
-    tqdm.write(f"\n✅ 拿到 {len(bars_map)} / {len(scrape_symbols)} 只 symbol 的数据\n")
-
-    # 遍历原始任务，从 bars_map 里查，走日期校验，写 DB
-    success_cnt = fail_cnt = skip_cnt = 0
-    pbar = tqdm(task_list, desc="写入进度")
-    for orig_symbol, group in pbar:
-        pbar.set_description(f"处理: {orig_symbol} [{group}]")
+    stats = ingest_briefs(fetcher.quote_client, task_list, alias_to_symbol, last_valid_date)
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    tqdm.write(f"\n🎉 完成: 成功 {stats['success']} / 失败 {stats['fail']} / 跳过 {stats['skip']}"
+               f"，用时 {stats['seconds']:.1f}s（{rate:.0f} 行/秒）")
+    if check_yesterday:
+        run_check_yesterday_if_empty()
 
-        intermediate = alias_to_symbol.get(orig_symbol, orig_symbol)
-        scrape_sym = _normalize_symbol(intermediate)
-        bars = bars_map.get(scrape_sym)
 
-        if not bars:
-            tqdm.write(f"❌ [{orig_symbol}] Tiger 未返回数据，跳过（保留在 JSON 中）")
-            fail_cnt += 1
-            continue
+def main(ctx=None):
+    """
+    ctx: Nightly_Pipeline 传入的 JSON 上下文，Sectors_empty.json 等的读写都落在上下文里，
+    Check_yesterday 由流水线按 DAG 调度；单独运行时为 None，直接读写磁盘并在清空后自己起 Check_yesterday。
+    """
+    with use_context(ctx):
+        run(check_yesterday=ctx is None)
 
-        selected, err = pick_row_by_rules(orig_symbol, bars, last_valid_date)
-        if selected is None:
-            tqdm.write(f"⚠️ [{orig_symbol}] {err}")
-            skip_cnt += 1
-            continue
 
-        # selected: (date, open, high, low, close, volume)
-        date, o, h, l, c, v = selected
+# =========================================================
+# 自检：假的 quote_client（不连 Tiger、不碰正式库）
+# =========================================================
 
-        # 数据库统一入参格式: (date, name, price, volume, open, high, low)
-        # price 用 close
-        db_row = (date, orig_symbol, c, v, o, h, l)
-        table_type = get_table_type(group)
+class FakeQuoteClient:
+    """
+    模拟 get_stock_briefs：每次调用 sleep latency 秒，记录最大在途数与调用时间。
+    symbol 按序号造数据：序号 % 7 == 3 的 latest_price 为 0（应被丢弃），
+    序号 % 11 == 5 的不返回（应记为失败），其余 OHLCV 可由序号推出。
+    """
 
-        if insert_data_to_db(DB_PATH, group, [db_row], table_type):
-            tqdm.write(f"✅ [{orig_symbol}] 写入 {group} ({date})")
-            remove_symbol_from_json(SECTORS_JSON_PATH, group, orig_symbol)
-            success_cnt += 1
-        else:
-            fail_cnt += 1
+    def __init__(self, latency=0.05, latest_time_ms=None):
+        self.latency = latency
+        # 默认 2026-10-16 16:00 美东（20:00 UTC）
+        self.latest_time_ms = latest_time_ms if latest_time_ms is not None else 1792180800000
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def index_of(symbol):
+        return int(symbol[3:])
+
+    @classmethod
+    def expected_row(cls, symbol):
+        k = cls.index_of(symbol)
+        if k % 11 == 5 or k % 7 == 3:
+            return None
+        return (10.0 + k, 11.0 + k, 9.0 + k, 10.5 + k, 1000 * k + 1)
+
+    def get_stock_briefs(self, symbols, include_hour_trading=False, lang=None):
+        with self._lock:
+            self.calls.append(time.monotonic())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            records = []
+            for sym in symbols:
+                k = self.index_of(sym)
+                if k % 11 == 5:
+                    continue
+                records.append({
+                    'symbol': sym,
+                    'open': str(10.0 + k), 'high': 11.0 + k, 'low': 9.0 + k,
+                    'latest_price': 0 if k % 7 == 3 else 10.5 + k,
+                    'volume': 1000 * k + 1 if k % 13 else None,
+                    'latest_time': self.latest_time_ms,
+                })
+            return pd.DataFrame(records)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def selfcheck(n=5000, latency=0.05, max_in_flight=MAX_IN_FLIGHT, calls_per_minute=6000):
+    """用 FakeQuoteClient 跑一遍 ingest_briefs，检查写库结果、JSON 剩余、在途数与调用速率"""
+    import sqlite3
+    symbols = [f"SYM{k}" for k in range(n)]
+    groups = ("Technology", "Energy")
+    task_list = [(sym, groups[k % 2]) for k, sym in enumerate(symbols)]
+    last_valid_date = "2026-10-16"
+    client = FakeQuoteClient(latency)
+    budget = RateBudget(calls_per_minute, burst=max_in_flight)
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "Finance.db")
+        json_path = os.path.join(tmp, "Sectors_empty.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({g: [s for s, grp in task_list if grp == g] for g in groups}, f)
+
+        stats = ingest_briefs(client, task_list, {}, last_valid_date, db_path=db_path,
+                              json_path=json_path, max_in_flight=max_in_flight, budget=budget)
+
+        expected = {}
+        for sym, group in task_list:
+            row = FakeQuoteClient.expected_row(sym)
+            if row is not None:
+                o, h, l, c, v = row
+                if FakeQuoteClient.index_of(sym) % 13 == 0:
+                    v = 0
+                expected[sym] = (group, (last_valid_date, c, v, o, h, l))
+
+        conn = sqlite3.connect(db_path)
+        try:
+            got = {}
+            for g in groups:
+                for name, *rest in conn.execute(
+                        f'SELECT name, date, price, volume, open, high, low FROM "{g}"'):
+                    got[name] = (g, tuple(rest))
+        finally:
+            conn.close()
+        if got != expected:
+            missing = sorted(set(expected) - set(got))[:5]
+            extra = sorted(set(got) - set(expected))[:5]
+            diff = [s for s in expected if s in got and got[s] != expected[s]][:5]
+            print(f"❌ 写库结果不符: 缺 {missing} 多 {extra} 不同 {diff}")
+            ok = False
 
-    tqdm.write(f"\n🎉 完成: 成功 {success_cnt} / 失败 {fail_cnt} / 跳过 {skip_cnt}")
-    run_check_yesterday_if_empty()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            left = sorted(s for v in json.load(f).values() for s in v)
+        if left != sorted(set(symbols) - set(expected)):
+            print(f"❌ JSON 剩余不符: {len(left)} 只，期望 {len(symbols) - len(expected)} 只")
+            ok = False
+
+    n_batches = (n + BATCH_SIZE - 1) // BATCH_SIZE
+    if len(client.calls) != n_batches:
+        print(f"❌ 调用次数 {len(client.calls)}，期望 {n_batches}")
+        ok = False
+    if client.max_in_flight > max_in_flight:
+        print(f"❌ 最大在途 {client.max_in_flight} > {max_in_flight}")
+        ok = False
+    # 任意 60 秒窗口内的调用数不能超过 预算 + 突发
+    calls = client.calls
+    window_max = max((sum(1 for t in calls if t0 <= t < t0 + 60) for t0 in calls), default=0)
+    if window_max > calls_per_minute + max_in_flight:
+        print(f"❌ 60 秒内调用 {window_max} 次，超过预算 {calls_per_minute}")
+        ok = False
+
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    print(f"{n} 只 / {n_batches} 批，最大在途 {client.max_in_flight}，"
+          f"写入 {stats['rows']} 行，用时 {stats['seconds']:.2f}s（{rate:.0f} 行/秒）")
+    print("✅ 自检通过" if ok else "❌ 自检失败")
+    return ok
 
 
 def run_check_yesterday_if_empty():
@@ -372,4 +582,13 @@ def run_check_yesterday_if_empty():
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Tiger brief 当日 OHLCV 入库")
+    parser.add_argument("--selfcheck", action="store_true",
+                        help="用假的 quote_client 在临时库里自检（不连 Tiger）")
+    parser.add_argument("-n", type=int, default=5000, help="自检的 symbol 数")
+    parser.add_argument("--latency", type=float, default=0.05, help="自检时每次请求的模拟延迟（秒）")
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        sys.exit(0 if selfcheck(args.n, args.latency) else 1)
+    main()
\ No newline at end of file
@@ -24,6 +24,9 @@ from selenium.common.exceptions import TimeoutException
 # 新增 Playwright 依赖 (用于 Part C)
 from playwright.sync_api import sync_playwright
 
+# 免浏览器后端（HTTP + selectolax / lxml），Selenium 兜底
+from YF_Fetch import PageWorker, FetchError, parse_earnings_rows, BACKENDS
+
 # ================= 配置区域 (跨平台修改) =================
 
 # 1. 动态获取主目录
@@ -784,7 +787,60 @@ def check_and_advance_dates_if_needed():
         tqdm.write(f"顺延日期出错：{e}")
         return False
 
-def run_single_scraper_task(driver, sectors_data, task_config):
+def load_earnings_page_selenium(driver, url):
+    """
+    Selenium 加载一页 earnings 日历（最多 3 次）。
+    返回 (page_load_success, found_end, [(symbol, event_name, call_time)])。
+    """
+    for attempt in range(3):
+        try:
+            driver.get(url)
+            
+            # 优先检测“无结果”标志
+            end_msg = driver.find_elements(By.XPATH, "//*[contains(normalize-space(.), \"We couldn't find any results\")]")
+            if end_msg:
+                return True, True, []
+            
+            try:
+                tbl = WebDriverWait(driver, 5).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "table"))
+                )
+                current_rows = tbl.find_elements(By.CSS_SELECTOR, "tbody > tr")
+                if current_rows:
+                    rows = []
+                    for row in current_rows:
+                        try:
+                            symbol_el = row.find_element(By.CSS_SELECTOR, 'a[title][href*="/quote/"]')
+                            cells = row.find_elements(By.TAG_NAME, 'td')
+                            if len(cells) < 4: continue
+                            rows.append((symbol_el.get_attribute('title'),
+                                         cells[2].text.strip(),
+                                         cells[3].text.strip() or "N/A"))
+                        except Exception:
+                            continue
+                    return True, False, rows
+            except TimeoutException:
+                pass 
+            
+            time.sleep(random.randint(2, 4))
+        except Exception:
+            time.sleep(random.randint(2, 4))
+    return False, False, []
+
+def load_earnings_page(page, url):
+    """先走 HTTP 解析（page.http 可用时），拿不到再用 Selenium；返回值同 load_earnings_page_selenium"""
+    if page.http is not None:
+        try:
+            found_end, rows = parse_earnings_rows(page.http.get(url))
+            if found_end or rows:
+                page.http_ok()
+                return True, found_end, rows
+            raise FetchError("页面里没有 earnings 表格")
+        except FetchError as e:
+            page.http_failed(e)
+    return load_earnings_page_selenium(page.driver, url)
+
+def run_single_scraper_task(page, sectors_data, task_config):
     group_name = task_config["group_name"]
     file_path = task_config["file_path"]
     diff_path = task_config["diff_path"]
@@ -854,37 +910,11 @@ def run_single_scraper_task(driver, sectors_data, task_config):
         while True:
             date_pbar.set_postfix(offset=offset, new=len(new_entries))
             url = f"https://finance.yahoo.com/calendar/earnings?day={ds}&offset={offset}&size=100"
-            rows = []
-            found_end = False
-            page_load_success = False
-            
-            # --- 页面加载重试循环 ---
-            for attempt in range(3):
-                try:
-                    driver.get(url)
-                    
-                    # 优先检测“无结果”标志
-                    end_msg = driver.find_elements(By.XPATH, "//*[contains(normalize-space(.), \"We couldn't find any results\")]")
-                    if end_msg:
-                        found_end = True
-                        page_load_success = True
-                        break
-                    
-                    try:
-                        tbl = WebDriverWait(driver, 5).until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, "table"))
-                        )
-                        current_rows = tbl.find_elements(By.CSS_SELECTOR, "tbody > tr")
-                        if current_rows:
-                            rows = current_rows
-                            page_load_success = True
-                            break 
-                    except TimeoutException:
-                        pass 
-                    
-                    time.sleep(random.randint(2, 4))
-                except Exception:
-                    time.sleep(random.randint(2, 4))
+            try:
+                page_load_success, found_end, rows = load_earnings_page(page, url)
+            except FetchError as e:
+                tqdm.write(f"    [{ds}] Offset {offset} HTTP 抓取失败，跳过: {e}")
+                break
             
             if found_end: break 
             if not page_load_success: 
@@ -892,37 +922,25 @@ def run_single_scraper_task(driver, sectors_data, task_config):
                 break
             if not rows: break 
             
-            # --- 解析表格行 ---
-            for row in rows:
-                try:
-                    symbol_el = row.find_element(By.CSS_SELECTOR, 'a[title][href*="/quote/"]')
-                    symbol = symbol_el.get_attribute('title')
-                    
-                    cells = row.find_elements(By.TAG_NAME, 'td')
-                    if len(cells) < 4: continue
-                    
-                    event_name = cells[2].text.strip()
-                    call_time = cells[3].text.strip() or "N/A"
-                    
-                    if not any(k in event_name for k in ["Earnings Release", "Shareholders Meeting", "Earnings Announcement"]):
-                        continue
-                    if (symbol, ds) in existing_release_entries:
-                        continue
-                    if not any(symbol in lst for lst in sectors_data.values()):
-                        continue
-                    
-                    new_line = f"{symbol:<7}: {call_time:<4}: {ds}"
-                    
-                    if symbol in existing_map:
-                        old_ct, old_dt = existing_map[symbol]
-                        if old_ct == call_time and old_dt == ds: 
-                            continue 
-                        existing_lines = [ln for ln in existing_lines if ln.split(':')[0].strip() != symbol]
-                    
-                    existing_map[symbol] = (call_time, ds)
-                    new_entries.append(new_line)
-                except Exception:
+            # --- 过滤表格行 ---
+            for symbol, event_name, call_time in rows:
+                if not any(k in event_name for k in ["Earnings Release", "Shareholders Meeting", "Earnings Announcement"]):
+                    continue
+                if (symbol, ds) in existing_release_entries:
+                    continue
+                if not any(symbol in lst for lst in sectors_data.values()):
                     continue
+                
+                new_line = f"{symbol:<7}: {call_time:<4}: {ds}"
+                
+                if symbol in existing_map:
+                    old_ct, old_dt = existing_map[symbol]
+                    if old_ct == call_time and old_dt == ds: 
+                        continue 
+                    existing_lines = [ln for ln in existing_lines if ln.split(':')[0].strip() != symbol]
+                
+                existing_map[symbol] = (call_time, ds)
+                new_entries.append(new_line)
             offset += 100
 
     # 4. 写入文件处理
@@ -983,7 +1001,7 @@ def run_single_scraper_task(driver, sectors_data, task_config):
                 tqdm.write(f"        -> {item}")
     tqdm.write("")
 
-def run_earnings_task():
+def run_earnings_task(backend="selenium"):
     tqdm.write("\n" + "="*50)
     tqdm.write(">>> 开始执行任务: Earnings Release")
     tqdm.write("="*50)
@@ -1035,9 +1053,14 @@ def run_earnings_task():
         }
     ]
 
-    tqdm.write("正在启动浏览器 (Earnings)...")
-    driver = create_unified_driver()
-    if driver:
+    if backend == "selenium":
+        tqdm.write("正在启动浏览器 (Earnings)...")
+    try:
+        page = PageWorker(backend, create_unified_driver)
+    except FetchError as e:
+        tqdm.write(f"HTTP 后端不可用: {e}")
+        page = None
+    if page is not None and (page.http is not None or page.driver is not None):
         try:
             # 修正：使用动态路径 SECTORS_ALL_JSON_PATH
             with open(SECTORS_ALL_JSON_PATH, 'r') as f:
@@ -1046,13 +1069,13 @@ def run_earnings_task():
             
             for config in task_pbar:
                 task_pbar.set_description(f"执行任务: {config['group_name'].upper()}")
-                run_single_scraper_task(driver, sectors_data, config)
+                run_single_scraper_task(page, sectors_data, config)
             
             tqdm.write("\n所有 Earnings 任务执行完毕。")
         except Exception as e:
             tqdm.write(f"Earnings 任务执行出错: {e}")
         finally:
-            driver.quit()
+            page.quit()
             tqdm.write("Earnings 浏览器已关闭。")
             
         try:
@@ -1061,7 +1084,7 @@ def run_earnings_task():
     else:
         tqdm.write("无法启动浏览器，跳过 Earnings 任务。")
 
-def run_part_b():
+def run_part_b(backend="selenium"):
     tqdm.write("\n" + "="*50)
     tqdm.write(">>> 正在启动 Part B (Selenium 爬虫任务)")
     tqdm.write("="*50)
@@ -1084,7 +1107,7 @@ def run_part_b():
         time.sleep(2)
         
         # 3. 运行 Earnings Release 任务
-        run_earnings_task()
+        run_earnings_task(backend)
     
     except KeyboardInterrupt:
         tqdm.write("\n程序被用户手动终止。")
@@ -1191,6 +1214,12 @@ def run_part_c():
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Earnings / 经济事件 / 拆股 / Polymarket 抓取")
+    parser.add_argument("--backend", choices=BACKENDS, default="selenium",
+                        help="Earnings 日历的页面后端：selenium（默认）/ http / auto（HTTP 优先，失败回退 Selenium）")
+    args = parser.parse_args()
+
     # 1. 执行 Part A (文件处理/迁移)
     # 如果 Part A 因为“今天已运行过”而退出，它不会杀掉进程，只会返回
     processor_a = PartA_FileProcessor()
@@ -1200,7 +1229,7 @@ if __name__ == "__main__":
     time.sleep(1)
     
     # 3. 执行 Part B (Selenium 爬虫)
-    run_part_b()
+    run_part_b(args.backend)
     
     # 4. 缓冲一下
     time.sleep(1)
@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YF_Fetch.py
+Yahoo 页面的免浏览器抓取后端（HTTP 连接池 + selectolax / lxml 解析），Selenium 作为兜底
+
+history 页的 K 线表、options 页的到期日与期权表、earnings 日历表都在服务端渲染好的 HTML 里，
+原来却都要起一个完整的 Chrome（每个几百 MB）再 execute_script / find_elements 去读。
+
+这里提供：
+    - HttpFetcher：每个线程一个 requests.Session（连接池 + 自动重试），拿到的不是正常页面
+      （非 200、被重定向到 consent 页、没有表格）就抛 FetchError，调用方退回 Selenium；
+    - 解析器：优先 selectolax，其次 lxml，产出与原 Selenium 代码完全相同的行：
+        parse_history_rows   -> [(date, name, price, volume, open, high, low)]，同 extract_data_via_js
+        parse_option_dates   -> [(timestamp, 'Oct 17, 2026')]，同 YF_Options 下拉菜单里的 data-value
+        parse_option_rows    -> [(Calls/Puts, strike, last_price 原文, open_interest 原文)]
+        parse_earnings_rows  -> (found_end, [(symbol, event_name, call_time)])
+    - PageWorker：抓取池里每个 worker 的页面来源；backend 为 auto 时先走 HTTP，
+      失败才懒加载 Chrome，所以大多数 worker 只占几 MB 内存。
+
+backend 取值：auto（HTTP 优先，Selenium 兜底）/ http（只用 HTTP）/ selenium（原来的做法）。
+
+离线用例与基准（只读 Test/ 下录好的页面，不访问 Yahoo）：
+    python3 YF_Fetch.py --selfcheck        # 各解析器结果与 expected.json 逐条比对
+    python3 YF_Fetch.py --bench [-n 200]   # 经本地 HTTP 服务抓取 + 解析，输出各后端 rows/sec
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+FINANCIAL_SYSTEM_DIR = os.path.join(BASE_CODING_DIR, "Financial_System")
+HISTORY_FIXTURE_DIR = os.path.join(FINANCIAL_SYSTEM_DIR, "Test", "yf_history")
+PAGE_FIXTURE_DIR = os.path.join(FINANCIAL_SYSTEM_DIR, "Test", "yf_pages")
+
+BACKENDS = ("auto", "http", "selenium")
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36')
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 8
+HTTP_RETRIES = 2
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:
+    try:
+        # selectolax 0.3 以前只有 Modest 后端
+        from selectolax.parser import HTMLParser as _SelectolaxParser
+    except ImportError:
+        _SelectolaxParser = None
+
+try:
+    import lxml.html as _lxml_html
+except ImportError:
+    _lxml_html = None
+
+PARSERS = [name for name, mod in (("selectolax", _SelectolaxParser), ("lxml", _lxml_html)) if mod is not None]
+
+
+class FetchError(Exception):
+    """HTTP 后端拿不到可用页面（调用方应退回 Selenium）"""
+
+
+# =========================================================
+# DOM 适配：selectolax / lxml 只用到"按标签找后代、取属性、取文本"三件事
+# =========================================================
+
+def _squash(text):
+    return ' '.join(text.split())
+
+
+class _SelectolaxNode:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def find_all(self, tag):
+        return [_SelectolaxNode(n) for n in self.node.css(tag)]
+
+    def attr(self, name):
+        attrs = self.node.attributes
+        if name not in attrs:
+            return None
+        value = attrs[name]
+        return '' if value is None else value
+
+    def text(self):
+        return _squash(self.node.text(deep=True))
+
+    def lines(self):
+        return [t.strip() for t in self.node.text(deep=True, separator='\n').split('\n') if t.strip()]
+
+
+class _LxmlNode:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def find_all(self, tag):
+        return [_LxmlNode(n) for n in self.node.iterdescendants(tag)]
+
+    def attr(self, name):
+        return self.node.get(name)
+
+    def text(self):
+        return _squash(''.join(self.node.itertext()))
+
+    def lines(self):
+        return [t.strip() for t in self.node.itertext() if t.strip()]
+
+
+def parse_document(html, parser=None):
+    """html -> 根节点；parser 为 None 时用可用的第一个（selectolax 优先）"""
+    parser = parser or (PARSERS[0] if PARSERS else None)
+    if parser == "selectolax" and _SelectolaxParser is not None:
+        return _SelectolaxNode(_SelectolaxParser(html).root)
+    if parser == "lxml" and _lxml_html is not None:
+        return _LxmlNode(_lxml_html.document_fromstring(html))
+    raise FetchError("未安装 selectolax / lxml，无法使用 HTTP 后端（pip install selectolax 或 lxml）")
+
+
+def _by_attr(root, tag, name, value=None):
+    return [n for n in root.find_all(tag)
+            if n.attr(name) is not None and (value is None or n.attr(name) == value)]
+
+
+# =========================================================
+# 与 JS parseFloat / parseInt 相同的宽松数字解析
+# =========================================================
+
+_FLOAT_RE = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+_INT_RE = re.compile(r'[+-]?\d+')
+
+
+def _js_float(text):
+    m = _FLOAT_RE.match(text.strip().replace(',', ''))
+    return float(m.group()) if m else None
+
+
+def _js_int(text):
+    m = _INT_RE.match(text.strip().replace(',', ''))
+    return int(m.group()) if m else None
+
+
+_DATE_FORMATS = ("%b %d, %Y", "%B %d, %Y", "%Y-%m-%d", "%m/%d/%Y")
+
+
+def _parse_date(text):
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+# =========================================================
+# history 页
+# =========================================================
+
+def _header_texts(table):
+    heads = table.find_all('thead')
+    return [th.text() for th in heads[0].find_all('th')] if heads else []
+
+
+def _find_history_table(root):
+    for box in _by_attr(root, '*', 'data-testid', 'history-table'):
+        tables = box.find_all('table')
+        if tables:
+            return tables[0]
+    for table in root.find_all('table'):
+        headers = _header_texts(table)
+        if 'Date' in headers and any(re.search('volume', h, re.I) for h in headers):
+            return table
+    return None
+
+
+def _first_index(headers, pattern):
+    for i, h in enumerate(headers):
+        if re.search(pattern, h, re.I):
+            return i
+    return -1
+
+
+def parse_history_rows(html, symbol, limit=None, parser=None):
+    """
+    与 YF_Today / YF_StockETFCrypto 的 extract_data_via_js 相同：
+    返回 [(date, symbol, price, volume, open, high, low)]，limit 为 2 时只取最新两条有效行。
+    找不到表格 / 表头时抛 FetchError。
+    """
+    root = parse_document(html, parser)
+    table = _find_history_table(root)
+    if table is None:
+        raise FetchError("未找到数据表格")
+    headers = _header_texts(table)
+    cols = {
+        'date': headers.index('Date') if 'Date' in headers else -1,
+        'open': _first_index(headers, '0pen|Open'),
+        'high': _first_index(headers, 'High'),
+        'low': _first_index(headers, 'Low'),
+        'close': _first_index(headers, 'Adj Close'),
+        'volume': _first_index(headers, 'Volume'),
+    }
+    if cols['date'] < 0 or cols['close'] < 0:
+        raise FetchError("表头解析失败")
+
+    def cell_float(cells, key):
+        i = cols[key]
+        return _js_float(cells[i].text()) if 0 <= i < len(cells) else None
+
+    rows = []
+    for body in table.find_all('tbody'):
+        for tr in body.find_all('tr'):
+            cells = tr.find_all('td')
+            if len(cells) <= max(cols['date'], cols['close']):
+                continue
+            date = _parse_date(cells[cols['date']].text().split('::')[0].replace('"', ''))
+            if date is None:
+                continue
+            price = _js_float(cells[cols['close']].text())
+            if price is None:
+                continue
+            volume = 0
+            if 0 <= cols['volume'] < len(cells):
+                v = _js_int(cells[cols['volume']].text())
+                if v is not None:
+                    volume = v
+            rows.append((date, symbol, price, volume,
+                         cell_float(cells, 'open'), cell_float(cells, 'high'), cell_float(cells, 'low')))
+            if limit and len(rows) >= limit:
+                return rows
+    return rows
+
+
+# =========================================================
+# options 页
+# =========================================================
+
+OPTION_TYPES = ('Calls', 'Puts')
+
+
+def parse_option_dates(html, parser=None):
+    """到期日下拉菜单里的 (timestamp, 日期文本)，按页面顺序去重；与 YF_Options 的 data-value 规则一致"""
+    root = parse_document(html, parser)
+    date_map = []
+    for div in _by_attr(root, 'div', 'data-value'):
+        ts = div.attr('data-value')
+        lines = div.lines()
+        raw_text = lines[0] if lines else ''
+        if ts and ts.isdigit() and raw_text and (ts, raw_text) not in date_map:
+            date_map.append((ts, raw_text))
+    return date_map
+
+
+def parse_option_rows(html, parser=None):
+    """
+    section[data-testid='options-list-table'] 里的 Calls / Puts 两张表：
+    返回 [(opt_type, strike, last_price 原文, open_interest 原文)]，
+    列位置与 YF_Options 相同（Strike 第 3 列、Last Price 第 4 列、Open Interest 第 10 列，至少 10 列）。
+    """
+    root = parse_document(html, parser)
+    tables = [t for sec in _by_attr(root, 'section', 'data-testid', 'options-list-table')
+              for t in sec.find_all('table')]
+    rows = []
+    for opt_type, table in zip(OPTION_TYPES, tables):
+        for body in table.find_all('tbody'):
+            for tr in body.find_all('tr'):
+                cols = tr.find_all('td')
+                if len(cols) < 10:
+                    continue
+                strike = cols[2].text().replace(',', '')
+                if strike:
+                    rows.append((opt_type, strike, cols[3].text(), cols[9].text()))
+    return rows
+
+
+# =========================================================
+# earnings 日历
+# =========================================================
+
+NO_RESULTS_TEXT = "We couldn't find any results"
+
+
+def parse_earnings_rows(html, parser=None):
+    """
+    返回 (found_end, [(symbol, event_name, call_time)])：
+    页面出现 "We couldn't find any results" 时 found_end 为 True；
+    每行的 symbol 取 a[title][href*="/quote/"] 的 title，event_name / call_time 为第 3、4 列，
+    call_time 为空时记 "N/A"（与 run_single_scraper_task 相同）。
+    """
+    root = parse_document(html, parser)
+    if NO_RESULTS_TEXT in root.text():
+        return True, []
+    tables = root.find_all('table')
+    if not tables:
+        raise FetchError("未找到日历表格")
+    rows = []
+    for body in tables[0].find_all('tbody'):
+        for tr in body.find_all('tr'):
+            links = [a for a in tr.find_all('a')
+                     if a.attr('title') is not None and '/quote/' in (a.attr('href') or '')]
+            if not links:
+                continue
+            cells = tr.find_all('td')
+            if len(cells) < 4:
+                continue
+            rows.append((links[0].attr('title'), cells[2].text(), cells[3].text() or "N/A"))
+    return False, rows
+
+
+# =========================================================
+# HTTP
+# =========================================================
+
+class HttpFetcher:
+    """每个线程一个 requests.Session；连接池 + 对 429 / 5xx 的自动重试"""
+
+    def __init__(self, timeout=HTTP_TIMEOUT, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES):
+        try:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+        except ImportError as e:
+            raise FetchError(f"未安装 requests，无法使用 HTTP 后端: {e}")
+        self._requests = requests
+        self._adapter_args = dict(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=frozenset(["GET"])),
+        )
+        self._HTTPAdapter = HTTPAdapter
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def session(self):
+        sess = getattr(self._local, "session", None)
+        if sess is None:
+            sess = self._requests.Session()
+            adapter = self._HTTPAdapter(**self._adapter_args)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            sess.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+            })
+            self._local.session = sess
+        return sess
+
+    def get(self, url):
+        try:
+            resp = self.session().get(url, timeout=self.timeout)
+        except self._requests.RequestException as e:
+            raise FetchError(f"HTTP 请求失败: {e}")
+        if resp.status_code != 200:
+            raise FetchError(f"HTTP {resp.status_code}")
+        if "consent." in resp.url or "guce." in resp.url:
+            raise FetchError("被重定向到 consent 页面")
+        return resp.text
+
+    def close(self):
+        sess = getattr(self._local, "session", None)
+        if sess is not None:
+            sess.close()
+            self._local.session = None
+
+
+class PageWorker:
+    """
+    抓取池里每个 worker 持有一个：
+        backend='selenium'：立即启动 Chrome（与原来相同）；
+        backend='auto' / 'http'：只建 HTTP 会话，auto 模式下第一次需要兜底时才启动 Chrome。
+    """
+
+    HTTP_FAILURE_LIMIT = 3    # auto 模式下连续失败这么多次（多半被 consent 页拦住）就不再尝试 HTTP
+
+    def __init__(self, backend, make_driver):
+        if backend not in BACKENDS:
+            raise ValueError(f"未知 backend: {backend}")
+        self.backend = backend
+        self._make_driver = make_driver
+        self._driver = None
+        self._http_failures = 0
+        self.http = None
+        if backend != "selenium":
+            try:
+                self.http = HttpFetcher()
+                if not PARSERS:
+                    raise FetchError("未安装 selectolax / lxml")
+            except FetchError as e:
+                if backend == "http":
+                    raise
+                print(f"⚠️ HTTP 后端不可用，改用 Selenium: {e}")
+                self.http = None
+        if self.http is None:
+            self._driver = make_driver()
+
+    def http_ok(self):
+        self._http_failures = 0
+
+    def http_failed(self, error):
+        """记录一次 HTTP 失败；backend=http 时原样抛出，auto 时连续失败过多就停用 HTTP"""
+        if self.backend == "http":
+            raise error
+        self._http_failures += 1
+        if self._http_failures >= self.HTTP_FAILURE_LIMIT and self.http is not None:
+            print(f"⚠️ HTTP 连续失败 {self._http_failures} 次（{error}），该 worker 改用 Selenium")
+            self.http.close()
+            self.http = None
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            if self.backend == "http":
+                raise FetchError("backend=http 时不启动 Selenium")
+            self._driver = self._make_driver()
+        return self._driver
+
+    def quit(self):
+        if self.http is not None:
+            self.http.close()
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except Exception:
+                pass
+            self._driver = None
+
+
+# =========================================================
+# 离线用例 / 基准
+# =========================================================
+
+def _fixture_page(path):
+    """本地服务的路由：history / options / earnings 三种页面"""
+    from urllib.parse import unquote, urlparse, parse_qs
+    parsed = urlparse(path)
+    parts = [p for p in parsed.path.split('/') if p]
+    query = parse_qs(parsed.query)
+    if len(parts) >= 3 and parts[0] == 'quote' and parts[2] == 'history':
+        return os.path.join(HISTORY_FIXTURE_DIR, f"{unquote(parts[1])}.html")
+    if len(parts) >= 3 and parts[0] == 'quote' and parts[2] == 'options':
+        return os.path.join(PAGE_FIXTURE_DIR, f"options_{unquote(parts[1])}.html")
+    if parts[:2] == ['calendar', 'earnings']:
+        day = query.get('day', [''])[0]
+        offset = query.get('offset', ['0'])[0]
+        return os.path.join(PAGE_FIXTURE_DIR, f"earnings_{day}_{offset}.html")
+    return None
+
+
+def _load_expected():
+    with open(os.path.join(PAGE_FIXTURE_DIR, "expected.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _as_lists(rows):
+    return json.loads(json.dumps(rows))
+
+
+def selfcheck():
+    """每个可用的解析器都跑一遍录好的页面，与 expected.json 比对；全部一致返回 True"""
+    if not PARSERS:
+        print("❌ 未安装 selectolax / lxml，无法自检")
+        return False
+    expected = _load_expected()
+    ok = True
+
+    def check(label, got, want):
+        nonlocal ok
+        if _as_lists(got) != want:
+            ok = False
+            print(f"❌ {label}\n   期望 {want}\n   实际 {_as_lists(got)}")
+
+    for parser in PARSERS:
+        for symbol, want in expected["history"].items():
+            html = _read(os.path.join(HISTORY_FIXTURE_DIR, f"{symbol}.html"))
+            check(f"[{parser}] history {symbol}", parse_history_rows(html, symbol, parser=parser), want)
+            check(f"[{parser}] history {symbol} limit=2",
+                  parse_history_rows(html, symbol, limit=2, parser=parser), want[:2])
+        for symbol, want in expected["options"].items():
+            html = _read(os.path.join(PAGE_FIXTURE_DIR, f"options_{symbol}.html"))
+            check(f"[{parser}] option dates {symbol}", parse_option_dates(html, parser=parser), want["dates"])
+            check(f"[{parser}] option rows {symbol}", parse_option_rows(html, parser=parser), want["rows"])
+        for page, want in expected["earnings"].items():
+            html = _read(os.path.join(PAGE_FIXTURE_DIR, f"{page}.html"))
+            found_end, rows = parse_earnings_rows(html, parser=parser)
+            check(f"[{parser}] earnings {page}", [found_end, rows], want)
+        try:
+            parse_history_rows("<html><body><p>Oops</p></body></html>", "X", parser=parser)
+            ok = False
+            print(f"❌ [{parser}] 没有表格的页面应当抛 FetchError")
+        except FetchError:
+            pass
+    print(f"解析器: {', '.join(PARSERS)}")
+    print("✅ 自检通过" if ok else "❌ 自检失败")
+    return ok
+
+
+def _selenium_history_rows(driver, url, symbol):
+    """对照组：与 YF_Today 相同的 Selenium + extract_data_via_js 路径"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    import YF_StockETFCrypto
+    driver.get(url)
+    WebDriverWait(driver, 8).until(EC.presence_of_element_located((By.CSS_SELECTOR, "table")))
+    return YF_StockETFCrypto.extract_data_via_js(driver, symbol)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except (ImportError, AttributeError):
+        return float('nan')
+
+
+def bench(n=200, with_selenium=False):
+    """经本地 HTTP 服务抓取 history 页 n 次，输出各后端 rows/sec"""
+    from YF_History_Pool import FixtureServer
+    symbols = sorted(_load_expected()["history"])
+    results = []
+    with FixtureServer(HISTORY_FIXTURE_DIR, resolve=_fixture_page) as server:
+        urls = [(s, f"{server.base_url}/quote/{s}/history/") for s in symbols]
+        fetcher = HttpFetcher()
+        for parser in PARSERS:
+            rss0 = _peak_rss_mb()
+            rows = 0
+            t0 = time.perf_counter()
+            for i in range(n):
+                symbol, url = urls[i % len(urls)]
+                rows += len(parse_history_rows(fetcher.get(url), symbol, parser=parser))
+            dt = time.perf_counter() - t0
+            results.append((f"http+{parser}", rows, dt, _peak_rss_mb() - rss0))
+        fetcher.close()
+
+        if with_selenium:
+            from YF_History_Pool import make_headless_chrome
+            import YF_Today
+            driver = make_headless_chrome(YF_Today.CHROME_BINARY_PATH, YF_Today.CHROME_DRIVER_PATH)
+            try:
+                rows = 0
+                t0 = time.perf_counter()
+                for i in range(n):
+                    symbol, url = urls[i % len(urls)]
+                    rows += len(_selenium_history_rows(driver, url, symbol))
+                dt = time.perf_counter() - t0
+            finally:
+                driver.quit()
+            results.append(("selenium", rows, dt, float('nan')))
+
+    print(f"{'backend':<18}{'pages':>8}{'rows':>10}{'rows/sec':>12}{'峰值RSS增量(MB)':>18}")
+    for name, rows, dt, rss in results:
+        print(f"{name:<18}{n:>8}{rows:>10}{rows / dt:>12.0f}{rss:>18.1f}")
+    if with_selenium:
+        print("selenium 的内存在 Chrome 子进程里，不计入本进程 RSS（通常每个数百 MB）")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yahoo 页面免浏览器抓取后端")
+    parser.add_argument("--selfcheck", action="store_true", help="用 Test/ 下录好的页面离线校验解析结果")
+    parser.add_argument("--bench", action="store_true", help="各后端 rows/sec 基准")
+    parser.add_argument("-n", type=int, default=200, help="基准抓取的页面数")
+    parser.add_argument("--with-selenium", action="store_true", help="基准里加上 Selenium 对照组（需要 Chrome）")
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        sys.exit(0 if selfcheck() else 1)
+    elif args.bench:
+        bench(args.n, args.with_selenium)
+    else:
+        parser.print_help()
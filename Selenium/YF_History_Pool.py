@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YF_History_Pool.py
+YF_Today / YF_StockETFCrypto 的并发抓取池（多个 headless Chrome 同时抓 history 页）
+
+原来 scrape_history 只有一个 driver，逐个 symbol 打开 finance.yahoo.com/quote/{sym}/history/，
+每个 symbol 失败重试 3 次、每次最多等 8~10 秒，每抓完一个就单独开一次数据库连接写入、
+再读写一遍 Sectors_empty.json。
+
+这里改为：
+    - N 个 worker 线程各自持有一个 headless driver，从同一个任务队列里取 symbol；
+    - 每个 worker 自己重试，失败后指数退避（2s、4s…，带少量随机抖动）；
+    - 全局礼貌限速：所有 worker 合计，两次页面请求之间至少间隔 min_interval 秒；
+    - 只有一个写库线程：抓到的行先进队列，按表（group）攒批后一次 insert_data_to_db，
+      写成功的 symbol 再统一从 JSON 里移除，数据库与 JSON 都不会被多个线程同时改写。
+
+页面如何解析、日期如何校验、怎么写库都由调用方传入（YF_Today 的规则 1/2/3 原样保留在它自己那里）。
+
+本地自检（不访问 Yahoo）：
+    python3 YF_History_Pool.py --selfcheck [--workers 3] [--backend http]
+用 Test/yf_history/ 里录好的 history 页面起一个本地 HTTP 服务，
+把 YF_Today 的抓取池指向它，写入临时数据库后与 expected.json 逐条比对。
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+import http.server
+from collections import OrderedDict
+
+from tqdm import tqdm
+
+USER_HOME = os.path.expanduser("~")
+BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
+FINANCIAL_SYSTEM_DIR = os.path.join(BASE_CODING_DIR, "Financial_System")
+FIXTURE_DIR = os.path.join(FINANCIAL_SYSTEM_DIR, "Test", "yf_history")
+
+DEFAULT_WORKERS = 3
+MIN_REQUEST_INTERVAL = 1.0     # 全局：两次页面请求之间的最小间隔（秒）
+MAX_RETRIES = 3
+BACKOFF_BASE = 2.0             # 第 k 次失败后等待 BACKOFF_BASE * 2^k 秒
+WRITE_BATCH_SIZE = 50          # 写库线程攒够多少个 symbol 就写一次
+WRITE_FLUSH_INTERVAL = 3.0     # 或者距上次写入超过多少秒
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36')
+
+
+# ================= driver =================
+
+def make_headless_chrome(binary_path, driver_path, page_load_timeout=30):
+    """与 YF_Today / YF_StockETFCrypto 原来单 driver 时相同的启动参数"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    if binary_path and os.path.exists(binary_path):
+        options.binary_location = binary_path
+    options.add_argument('--headless=new')
+    options.add_argument('--window-size=1920,1080')
+    options.add_argument(f'user-agent={USER_AGENT}')
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-gpu")
+    # --- 性能优化参数 ---
+    options.add_argument("--disable-images")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.page_load_strategy = 'eager'
+
+    driver = webdriver.Chrome(service=Service(executable_path=driver_path), options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+# ================= 限速 =================
+
+class PolitenessLimiter:
+    """所有 worker 共用：每次请求前 wait()，保证两次请求的开始时间至少相隔 min_interval 秒"""
+
+    def __init__(self, min_interval=MIN_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# ================= 写库线程 =================
+
+class _Writer(threading.Thread):
+    """
+    唯一的写库线程：队列里是 (task, rows)，按 group 攒批。
+    write_rows(group, rows) 返回 True 表示写成功；整批失败时逐个 symbol 再写一次，把坏数据隔离出来。
+    on_written(group, tasks) 在写成功后调用（YF_Today 用它批量移除 JSON 里的 symbol）。
+    """
+
+    def __init__(self, write_rows, on_written, stats, pbar,
+                 batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL):
+        super().__init__(name="YF_Writer", daemon=True)
+        self.write_rows = write_rows
+        self.on_written = on_written
+        self.stats = stats
+        self.pbar = pbar
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.inbox = queue.Queue()
+        self._pending = OrderedDict()   # group -> [(task, rows)]
+        self._count = 0
+
+    def put(self, task, rows):
+        self.inbox.put((task, rows))
+
+    def close(self):
+        self.inbox.put(None)
+
+    def _done(self, group, items):
+        for task, rows in items:
+            self.stats['written'] += 1
+            self.stats['rows'] += len(rows)
+            tqdm.write(f"[{task[0]}] 成功写入 {len(rows)} 条数据 ({rows[0][0]}) 到 {group} 表。")
+        if self.on_written:
+            try:
+                self.on_written(group, [task for task, _ in items])
+            except Exception as e:
+                tqdm.write(f"⚠️ 写库后回调失败 ({group}): {e}")
+
+    def _flush(self):
+        pending, self._pending, self._count = self._pending, OrderedDict(), 0
+        for group, items in pending.items():
+            rows = [r for _, task_rows in items for r in task_rows]
+            if self.write_rows(group, rows):
+                self._done(group, items)
+                continue
+            for task, task_rows in items:
+                if self.write_rows(group, task_rows):
+                    self._done(group, [(task, task_rows)])
+                else:
+                    self.stats['failed'].append(task)
+                    tqdm.write(f"❌ [{task[0]}] 数据库写入失败")
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.05, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item:
+                task, rows = item
+                self._pending.setdefault(task[1], []).append((task, rows))
+                self._count += 1
+            if item is None or self._count >= self.batch_size or \
+                    (self._count and time.monotonic() - last_flush >= self.flush_interval):
+                self._flush()
+                last_flush = time.monotonic()
+            if item is None:
+                return
+
+
+# ================= 抓取池 =================
+
+def run_driver_pool(tasks, make_driver, fetch_rows, write_rows, on_written=None,
+                    workers=DEFAULT_WORKERS, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                    min_interval=MIN_REQUEST_INTERVAL, batch_size=WRITE_BATCH_SIZE,
+                    flush_interval=WRITE_FLUSH_INTERVAL, desc="总体进度"):
+    """
+    tasks:       [(symbol, group, scrape_symbol)]
+    make_driver: () -> driver，每个 worker 调一次
+    fetch_rows:  (driver, task) -> 要写入的行；抛异常或返回空视为本次失败，会按退避重试
+    write_rows:  (group, rows) -> bool，只在写库线程里调用
+    返回统计 {'written', 'rows', 'failed': [task], 'seconds'}
+    """
+    started = time.perf_counter()
+    stats = {'written': 0, 'rows': 0, 'failed': [], 'seconds': 0.0}
+    if not tasks:
+        return stats
+
+    task_queue = queue.Queue()
+    for task in tasks:
+        task_queue.put(task)
+    limiter = PolitenessLimiter(min_interval)
+    pbar = tqdm(total=len(tasks), desc=desc, position=0)
+    pbar_lock = threading.Lock()
+    writer = _Writer(write_rows, on_written, stats, pbar, batch_size, flush_interval)
+    writer.start()
+
+    def worker(worker_id):
+        try:
+            driver = make_driver()
+        except Exception as e:
+            tqdm.write(f"❌ [worker {worker_id}] Selenium 启动失败: {e}")
+            return
+        try:
+            while True:
+                try:
+                    task = task_queue.get_nowait()
+                except queue.Empty:
+                    return
+                symbol = task[0]
+                last_error = None
+                for attempt in range(max_retries):
+                    limiter.wait()
+                    try:
+                        rows = fetch_rows(driver, task)
+                        if not rows:
+                            raise Exception("提取到的数据为空")
+                        writer.put(task, rows)
+                        last_error = None
+                        break
+                    except Exception as e:
+                        last_error = e
+                        if attempt < max_retries - 1:
+                            time.sleep(backoff_base * (2 ** attempt) + random.uniform(0, 0.5))
+                if last_error is not None:
+                    stats['failed'].append(task)
+                    tqdm.write(f"❌ [{symbol}] 抓取失败 (已重试 {max_retries} 次): {str(last_error)[:100]}")
+                with pbar_lock:
+                    pbar.update(1)
+        finally:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"YF_Worker_{i}", daemon=True)
+               for i in range(max(1, min(workers, len(tasks))))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # 所有 driver 都没起来时，队列里剩下的任务也记为失败
+    while True:
+        try:
+            stats['failed'].append(task_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    writer.close()
+    writer.join()
+    pbar.close()
+    stats['seconds'] = time.perf_counter() - started
+    tqdm.write(f"🎉 抓取池完成: 写入 {stats['written']} 个 symbol / {stats['rows']} 行, "
+               f"失败 {len(stats['failed'])} 个, 用时 {stats['seconds']:.1f}s ({workers} 个 driver)")
+    return stats
+
+
+# ================= 本地 fixture 服务 =================
+
+def history_page(path):
+    """/quote/<symbol>/history/ -> <symbol>.html"""
+    from urllib.parse import unquote
+    parts = [p for p in path.split('?')[0].split('/') if p]
+    if len(parts) >= 3 and parts[0] == 'quote' and parts[2] == 'history':
+        return f"{unquote(parts[1])}.html"
+    return None
+
+
+class FixtureServer:
+    """
+    把 Test/yf_history/<symbol>.html 当作 /quote/<symbol>/history/ 提供出来，代替 finance.yahoo.com。
+    resolve(path) 把请求路径映射成 fixture_dir 下的文件名（YF_Fetch 用它提供期权 / 财报日历页面）；
+    找不到的页面返回 404；delay 用来模拟慢页面。
+    """
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, delay=0.0, resolve=history_page):
+        fixture_dir = os.path.abspath(fixture_dir)
+        self.requests = []
+        requests_log = self.requests
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_log.append(self.path)
+                name = resolve(self.path)
+                page = os.path.join(fixture_dir, name) if name else None
+                if page is None or not os.path.isfile(page):
+                    self.send_error(404)
+                    return
+                if delay:
+                    time.sleep(delay)
+                with open(page, 'rb') as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def selfcheck(workers=DEFAULT_WORKERS, fixture_dir=FIXTURE_DIR, backend="selenium"):
+    """用录好的页面跑一遍 YF_Today 的抓取池，结果与 expected.json 比对；全部一致返回 True"""
+    import sqlite3
+    import tempfile
+    import YF_Today
+
+    with open(os.path.join(fixture_dir, "expected.json"), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp, FixtureServer(fixture_dir) as server:
+        json_path = os.path.join(tmp, "Sectors_empty.json")
+        db_path = os.path.join(tmp, "Finance.db")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(expected["tasks"], f, indent=4, ensure_ascii=False)
+
+        stats = YF_Today.scrape_history_pool(
+            workers=workers, base_url=server.base_url, db_path=db_path, json_path=json_path,
+            last_valid_date=expected["last_valid_date"], backend=backend, min_interval=0.1, backoff_base=0.2)
+
+        ok = True
+        conn = sqlite3.connect(db_path)
+        try:
+            for group, rows in expected["rows"].items():
+                for symbol, want in rows.items():
+                    got = conn.execute(
+                        f'SELECT date, price, volume, open, high, low FROM "{group}" WHERE name = ?',
+                        (symbol,)).fetchall()
+                    if [list(r) for r in got] != [want]:
+                        print(f"❌ {group}/{symbol}: 期望 {want}，实际 {got}")
+                        ok = False
+        finally:
+            conn.close()
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            left = {g: s for g, s in json.load(f).items() if s}
+        failed = sorted(task[0] for task in stats['failed'])
+        if left != expected["remaining"] or failed != sorted(s for v in expected["remaining"].values() for s in v):
+            print(f"❌ 剩余任务不符: JSON {left}，失败 {failed}，期望 {expected['remaining']}")
+            ok = False
+
+    print("✅ 自检通过" if ok else "❌ 自检失败")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="YF history 并发抓取池")
+    parser.add_argument("--selfcheck", action="store_true", help="用 Test/yf_history 的本地页面自检")
+    parser.add_argument("--serve", action="store_true", help="只启动本地 fixture 服务，供手动调试")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--backend", choices=("selenium", "auto", "http"), default="selenium",
+                        help="自检用的页面后端（http 不需要 Chrome）")
+    args = parser.parse_args()
+
+    if args.serve:
+        with FixtureServer() as server:
+            print(f"fixture 服务已启动: {server.base_url}/quote/<symbol>/history/ （Ctrl+C 退出）")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+    elif args.selfcheck:
+        sys.exit(0 if selfcheck(args.workers, backend=args.backend) else 1)
+    else:
+        parser.print_help()
@@ -19,6 +19,8 @@ from selenium.common.exceptions import TimeoutException
 from tqdm import tqdm
 import platform
 import urllib.parse
+# 免浏览器后端（HTTP + selectolax / lxml），Selenium 兜底
+from YF_Fetch import HttpFetcher, FetchError, parse_option_dates, parse_option_rows, BACKENDS
 
 # ================= 配置区域 =================
 USER_HOME = os.path.expanduser("~")
@@ -267,7 +269,96 @@ def run_analysis_program():
 
 # ================= 4. 爬虫核心逻辑 =================
 
-def scrape_options():
+def create_options_driver():
+    """启动期权抓取用的 headless Chrome；失败返回 None"""
+    options = webdriver.ChromeOptions()
+    if os.path.exists(CHROME_BINARY_PATH):
+        options.binary_location = CHROME_BINARY_PATH
+    else:
+        tqdm.write(f"警告：未找到指定 Chrome 路径 {CHROME_BINARY_PATH}，尝试使用系统默认...")
+
+    # --- Headless模式相关设置 ---
+    options.add_argument('--headless=new') # 推荐使用新的 headless 模式
+    options.add_argument('--window-size=1920,1080')
+
+    # --- 伪装设置 ---
+    user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+    options.add_argument(f'user-agent={user_agent}')
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    
+    # --- 性能优化 ---
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--blink-settings=imagesEnabled=false")  # 禁用图片加载
+    options.add_argument("--disable-images")
+    options.page_load_strategy = 'eager'  # 使用eager策略，DOM准备好就开始
+
+    # 检查驱动是否存在
+    if not os.path.exists(CHROME_DRIVER_PATH):
+        tqdm.write(f"错误：未找到驱动文件: {CHROME_DRIVER_PATH}")
+        exit()
+
+    service = Service(executable_path=CHROME_DRIVER_PATH)
+    try:
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception as e:
+        tqdm.write(f"Selenium 启动失败: {e}")
+        return None
+
+    # 设置页面加载超时，防止卡死
+    driver.set_page_load_timeout(30) 
+    return driver
+
+def filter_six_months(symbol, date_map):
+    """只保留从最近到期日起 180 天内的到期日（按日期排序）"""
+    filtered_date_map = []
+    try:
+        temp_list = []
+        for ts, d_text in date_map:
+            try:
+                d_obj = datetime.strptime(d_text, "%b %d, %Y")
+                temp_list.append((ts, d_text, d_obj))
+            except:
+                continue
+        temp_list.sort(key=lambda x: x[2])
+        
+        if temp_list:
+            start_dt = temp_list[0][2]
+            cutoff_dt = start_dt + timedelta(days=180)
+            for ts, d_text, d_obj in temp_list:
+                if d_obj <= cutoff_dt:
+                    filtered_date_map.append((ts, d_text))
+        date_map = filtered_date_map
+        tqdm.write(f"[{symbol}] 成功获取 {len(date_map)} 个日期 (6个月内)")
+    except Exception as e:
+        tqdm.write(f"[{symbol}] 日期过滤出错: {e}，将使用所有获取到的日期")
+    return date_map
+
+def scrape_symbol_options_http(fetcher, symbol, base_url):
+    """
+    HTTP 后端：直接解析服务端渲染的 options 页（到期日菜单 + Calls / Puts 表），
+    返回与 Selenium 路径相同的 [symbol, 日期, 类型, strike, OI, last_price*100] 行；
+    任何一页拿不到就抛 FetchError，由调用方整只 symbol 退回 Selenium。
+    """
+    date_map = parse_option_dates(fetcher.get(base_url))
+    if not date_map:
+        raise FetchError("未解析到到期日列表")
+    date_map = filter_six_months(symbol, date_map)
+
+    symbol_all_data = []
+    for ts, date_text in tqdm(date_map, desc=f"  {symbol} 日期", position=1, leave=False):
+        formatted_date = format_date(date_text)
+        target_url = f"{base_url}?date={ts}" if ts else base_url
+        for opt_type, strike, last_price_raw, oi_raw in parse_option_rows(fetcher.get(target_url)):
+            symbol_all_data.append([symbol, formatted_date, opt_type, strike,
+                                    clean_number(oi_raw), clean_price_and_multiply(last_price_raw)])
+    return symbol_all_data
+
+def scrape_options(backend="selenium"):
     # --- 1. 获取目标 Symbols (合并模式) ---
 
     # === 步骤 A: 初始化各个分组集合 (变量名已统一为 JSON Key 风格) ===
@@ -506,49 +597,23 @@ def scrape_options():
     else:
         tqdm.write(f"文件已存在，将以追加模式运行: {OUTPUT_FILE}")
 
-    # 3. 初始化 Selenium
-    options = webdriver.ChromeOptions()
-    if os.path.exists(CHROME_BINARY_PATH):
-        options.binary_location = CHROME_BINARY_PATH
-    else:
-        tqdm.write(f"警告：未找到指定 Chrome 路径 {CHROME_BINARY_PATH}，尝试使用系统默认...")
-
-    # --- Headless模式相关设置 ---
-    options.add_argument('--headless=new') # 推荐使用新的 headless 模式
-    options.add_argument('--window-size=1920,1080')
-
-    # --- 伪装设置 ---
-    user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-    options.add_argument(f'user-agent={user_agent}')
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    
-    # --- 性能优化 ---
-    options.add_argument("--disable-extensions")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--blink-settings=imagesEnabled=false")  # 禁用图片加载
-    options.add_argument("--disable-images")
-    options.page_load_strategy = 'eager'  # 使用eager策略，DOM准备好就开始
-
-    # 检查驱动是否存在
-    if not os.path.exists(CHROME_DRIVER_PATH):
-        tqdm.write(f"错误：未找到驱动文件: {CHROME_DRIVER_PATH}")
-        exit()
-
-    service = Service(executable_path=CHROME_DRIVER_PATH)
-    try:
-        driver = webdriver.Chrome(service=service, options=options)
-    except Exception as e:
-        tqdm.write(f"Selenium 启动失败: {e}")
-        return False
-
-    # 设置页面加载超时，防止卡死
-    driver.set_page_load_timeout(30) 
-    
-    wait = WebDriverWait(driver, 5) # 稍微增加默认等待时间
+    # 3. 页面后端：HTTP 优先时先不启动 Chrome，第一次需要兜底时再启动
+    http_fetcher = None
+    if backend != "selenium":
+        try:
+            http_fetcher = HttpFetcher()
+        except FetchError as e:
+            if backend == "http":
+                tqdm.write(f"HTTP 后端不可用: {e}")
+                return False
+            tqdm.write(f"⚠️ HTTP 后端不可用，改用 Selenium: {e}")
+    driver = None
+    wait = None
+    if http_fetcher is None:
+        driver = create_options_driver()
+        if driver is None:
+            return False
+        wait = WebDriverWait(driver, 5) # 稍微增加默认等待时间
 
     try:
         # === 注意：不再初始化内存列表 skipped_zero_symbols，完全依赖 JSON ===
@@ -578,196 +643,193 @@ def scrape_options():
             encoded_symbol = urllib.parse.quote(symbol)
             base_url = f"https://finance.yahoo.com/quote/{encoded_symbol}/options/"
             
-            # --- 阶段一：获取日期列表 (包含重试机制) ---
-            date_map = []
-            max_date_retries = 5
-            
-            for date_attempt in range(max_date_retries):
+            symbol_all_data = None
+            if http_fetcher is not None:
                 try:
-                    # 每次尝试都重新加载页面
+                    symbol_all_data = scrape_symbol_options_http(http_fetcher, symbol, base_url)
+                except FetchError as e:
+                    if backend == "http":
+                        tqdm.write(f"[{symbol}] HTTP 抓取失败，跳过: {e}")
+                        continue
+                    tqdm.write(f"[{symbol}] HTTP 抓取失败，改用 Selenium: {e}")
+
+            if symbol_all_data is None:
+                if driver is None:
+                    driver = create_options_driver()
+                    if driver is None:
+                        return False
+                    wait = WebDriverWait(driver, 5)
+
+                # --- 阶段一：获取日期列表 (包含重试机制) ---
+                date_map = []
+                max_date_retries = 5
+            
+                for date_attempt in range(max_date_retries):
                     try:
-                        driver.get(base_url)
-                    except TimeoutException:
-                        tqdm.write(f"[{symbol}] 页面加载超时，停止加载并尝试操作...")
-                        driver.execute_script("window.stop();")
+                        # 每次尝试都重新加载页面
+                        try:
+                            driver.get(base_url)
+                        except TimeoutException:
+                            tqdm.write(f"[{symbol}] 页面加载超时，停止加载并尝试操作...")
+                            driver.execute_script("window.stop();")
                     
-                    # 确保页面基本结构加载
-                    wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                        # 确保页面基本结构加载
+                        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
                     
-                    # 尝试点击日期下拉菜单
-                    date_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-ylk*='slk:date-select']")))
+                        # 尝试点击日期下拉菜单
+                        date_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-ylk*='slk:date-select']")))
                     
-                    # 滚动到元素可见，防止被广告遮挡
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", date_button)
-                    time.sleep(0.5) # 稍微多等待一点时间让JS执行
-                    date_button.click()
+                        # 滚动到元素可见，防止被广告遮挡
+                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", date_button)
+                        time.sleep(0.5) # 稍微多等待一点时间让JS执行
+                        date_button.click()
                     
-                    # 显式等待下拉菜单出现 (查找带有 data-value 的 div 或 option)
-                    # Yahoo 新版下拉菜单通常在 div 中，且带有 data-value 属性
-                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-value]")))
-                    # time.sleep(0.5) # 动画缓冲
+                        # 显式等待下拉菜单出现 (查找带有 data-value 的 div 或 option)
+                        # Yahoo 新版下拉菜单通常在 div 中，且带有 data-value 属性
+                        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-value]")))
+                        # time.sleep(0.5) # 动画缓冲
                     
-                    # 提取所有日期选项
-                    # 策略：查找所有带有 data-value 属性且看起来像时间戳的元素
-                    # 这里的选择器不再局限于 .dialog-content，而是更宽泛地查找菜单项
-                    options_elements = driver.find_elements(By.CSS_SELECTOR, "div[role='menu'] div[data-value], div.itm[data-value]")
+                        # 提取所有日期选项
+                        # 策略：查找所有带有 data-value 属性且看起来像时间戳的元素
+                        # 这里的选择器不再局限于 .dialog-content，而是更宽泛地查找菜单项
+                        options_elements = driver.find_elements(By.CSS_SELECTOR, "div[role='menu'] div[data-value], div.itm[data-value]")
                     
-                    # 如果上面没找到，尝试更暴力的查找所有带 data-value 的 div，然后过滤
-                    if not options_elements:
-                         options_elements = driver.find_elements(By.CSS_SELECTOR, "div[data-value]")
+                        # 如果上面没找到，尝试更暴力的查找所有带 data-value 的 div，然后过滤
+                        if not options_elements:
+                             options_elements = driver.find_elements(By.CSS_SELECTOR, "div[data-value]")
                     
-                    temp_date_map = []
-                    for opt in options_elements:
-                        ts = opt.get_attribute("data-value")
-                        raw_text = opt.text.split('\n')[0].strip()
+                        temp_date_map = []
+                        for opt in options_elements:
+                            ts = opt.get_attribute("data-value")
+                            raw_text = opt.text.split('\n')[0].strip()
                         
-                        # 验证 ts 是否为数字（时间戳）
-                        if ts and ts.isdigit() and raw_text:
-                            if (ts, raw_text) not in temp_date_map:
-                                temp_date_map.append((ts, raw_text))
+                            # 验证 ts 是否为数字（时间戳）
+                            if ts and ts.isdigit() and raw_text:
+                                if (ts, raw_text) not in temp_date_map:
+                                    temp_date_map.append((ts, raw_text))
                     
-                    if temp_date_map:
-                        date_map = temp_date_map
-                        # 成功获取，关闭菜单并跳出重试循环
-                        try:
-                            webdriver.ActionChains(driver).send_keys(u'\ue00c').perform() # ESC
-                        except:
-                            pass
-                        break # 成功，退出重试循环
-                    else:
-                        raise Exception("找到菜单元素但未提取到有效日期")
-                except Exception as e:
-                    tqdm.write(f"[{symbol}] 获取日期列表失败 (尝试 {date_attempt + 1}/{max_date_retries}): {str(e)[:100]}")
-                    time.sleep(random.uniform(2, 4)) # 失败后等待几秒再重试
+                        if temp_date_map:
+                            date_map = temp_date_map
+                            # 成功获取，关闭菜单并跳出重试循环
+                            try:
+                                webdriver.ActionChains(driver).send_keys(u'\ue00c').perform() # ESC
+                            except:
+                                pass
+                            break # 成功，退出重试循环
+                        else:
+                            raise Exception("找到菜单元素但未提取到有效日期")
+                    except Exception as e:
+                        tqdm.write(f"[{symbol}] 获取日期列表失败 (尝试 {date_attempt + 1}/{max_date_retries}): {str(e)[:100]}")
+                        time.sleep(random.uniform(2, 4)) # 失败后等待几秒再重试
 
-            # --- 检查是否获取到日期 ---
-            if not date_map:
-                tqdm.write(f"[{symbol}] ❌ 严重错误：经过 {max_date_retries} 次尝试仍无法获取日期列表！")
+                # --- 检查是否获取到日期 ---
+                if not date_map:
+                    tqdm.write(f"[{symbol}] ❌ 严重错误：经过 {max_date_retries} 次尝试仍无法获取日期列表！")
                 
-                # 1. 关闭浏览器
-                driver.quit()
+                    # 1. 关闭浏览器
+                    driver.quit()
                 
-                # 2. 弹窗提示
-                show_error_popup(symbol)
+                    # 2. 弹窗提示
+                    show_error_popup(symbol)
                 
-                # 3. 终止程序
-                sys.exit(1)
+                    # 3. 终止程序
+                    sys.exit(1)
 
-            # 过滤 6 个月日期
-            filtered_date_map = []
-            try:
-                temp_list = []
-                for ts, d_text in date_map:
-                    try:
-                        d_obj = datetime.strptime(d_text, "%b %d, %Y")
-                        temp_list.append((ts, d_text, d_obj))
-                    except:
-                        continue
-                temp_list.sort(key=lambda x: x[2])
-                
-                if temp_list:
-                    start_dt = temp_list[0][2]
-                    cutoff_dt = start_dt + timedelta(days=180)
-                    for ts, d_text, d_obj in temp_list:
-                        if d_obj <= cutoff_dt:
-                            filtered_date_map.append((ts, d_text))
-                date_map = filtered_date_map
-                tqdm.write(f"[{symbol}] 成功获取 {len(date_map)} 个日期 (6个月内)")
-            except Exception as e:
-                tqdm.write(f"[{symbol}] 日期过滤出错: {e}，将使用所有获取到的日期")
-
-            # 1. 暂存当前 symbol 所有日期的数据
-            symbol_all_data = [] 
+                # 过滤 6 个月日期
+                date_map = filter_six_months(symbol, date_map)
+
+                # 1. 暂存当前 symbol 所有日期的数据
+                symbol_all_data = [] 
             
-            # === 内层进度条：遍历日期 ===
-            date_pbar = tqdm(date_map, desc=f"  {symbol} 日期", position=1, leave=False)
+                # === 内层进度条：遍历日期 ===
+                date_pbar = tqdm(date_map, desc=f"  {symbol} 日期", position=1, leave=False)
             
-            for ts, date_text in date_pbar:
-                formatted_date = format_date(date_text)
-                target_url = f"{base_url}?date={ts}" if ts else base_url
+                for ts, date_text in date_pbar:
+                    formatted_date = format_date(date_text)
+                    target_url = f"{base_url}?date={ts}" if ts else base_url
 
-                # === 重试机制 (针对具体日期的数据抓取) ===
-                MAX_PAGE_RETRIES = 3
-                for attempt in range(MAX_PAGE_RETRIES):
-                    try:
-                        # [核心修复]：在请求新 URL 前，强制删除旧表格
-                        # 这样 wait.until 必须等待新表格真正加载出来
+                    # === 重试机制 (针对具体日期的数据抓取) ===
+                    MAX_PAGE_RETRIES = 3
+                    for attempt in range(MAX_PAGE_RETRIES):
                         try:
-                            driver.execute_script("""
-                                var tables = document.querySelectorAll("section[data-testid='options-list-table'] table");
-                                if (tables.length > 0) {
-                                    tables.forEach(t => t.remove());
-                                }
-                            """)
-                        except Exception:
-                            pass # 忽略JS错误
-
-                        # 如果不是第一次循环且有 timestamp，需要跳转
-                        # 如果是默认页且是第一次，其实已经在页面上了，但为了稳妥还是 get 一下
-                        try:
-                            driver.get(target_url)
-                        except TimeoutException:
-                            driver.execute_script("window.stop();")
+                            # [核心修复]：在请求新 URL 前，强制删除旧表格
+                            # 这样 wait.until 必须等待新表格真正加载出来
+                            try:
+                                driver.execute_script("""
+                                    var tables = document.querySelectorAll("section[data-testid='options-list-table'] table");
+                                    if (tables.length > 0) {
+                                        tables.forEach(t => t.remove());
+                                    }
+                                """)
+                            except Exception:
+                                pass # 忽略JS错误
+
+                            # 如果不是第一次循环且有 timestamp，需要跳转
+                            # 如果是默认页且是第一次，其实已经在页面上了，但为了稳妥还是 get 一下
+                            try:
+                                driver.get(target_url)
+                            except TimeoutException:
+                                driver.execute_script("window.stop();")
                         
-                        # 等待表格出现
-                        # 增加等待时间，因为切换日期是 AJAX 加载
-                        # time.sleep(random.uniform(1.5, 2.5)) # 移除固定等待，依赖 wait
+                            # 等待表格出现
+                            # 增加等待时间，因为切换日期是 AJAX 加载
+                            # time.sleep(random.uniform(1.5, 2.5)) # 移除固定等待，依赖 wait
                         
-                        # 这里的 wait 现在非常有意义，因为旧表格已经被删除了
-                        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "section[data-testid='options-list-table'] table")))
+                            # 这里的 wait 现在非常有意义，因为旧表格已经被删除了
+                            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "section[data-testid='options-list-table'] table")))
                         
-                        # 稍微缓冲一下，确保表格内容渲染完毕
-                        # time.sleep(1.0)
+                            # 稍微缓冲一下，确保表格内容渲染完毕
+                            # time.sleep(1.0)
 
-                        # --- 抓取表格 ---
-                        tables = driver.find_elements(By.CSS_SELECTOR, "section[data-testid='options-list-table'] table")
+                            # --- 抓取表格 ---
+                            tables = driver.find_elements(By.CSS_SELECTOR, "section[data-testid='options-list-table'] table")
                         
-                        # 检查是否真的有数据行
-                        has_data = False
-                        data_buffer = [] # 单个页面的缓存
-                        option_types = ['Calls', 'Puts']
+                            # 检查是否真的有数据行
+                            has_data = False
+                            data_buffer = [] # 单个页面的缓存
+                            option_types = ['Calls', 'Puts']
                         
-                        for i, table in enumerate(tables):
-                            if i >= len(option_types): break
-                            opt_type = option_types[i]
+                            for i, table in enumerate(tables):
+                                if i >= len(option_types): break
+                                opt_type = option_types[i]
                             
-                            # 优化：直接获取 tbody 下的 tr，避开表头
-                            rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
+                                # 优化：直接获取 tbody 下的 tr，避开表头
+                                rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
                             
-                            for row in rows:
-                                cols = row.find_elements(By.TAG_NAME, "td")
-                                if not cols: continue
-                                # 确保列数足够 (Yahoo Options 表格通常有很多列)
-                                if len(cols) >= 10:
-                                    # 针对不同分辨率，列索引可能微调，但通常 Strike 在 2 (index 2), OI 在 9 (index 9)
-                                    # 检查列内容是否有效
-                                    strike = cols[2].text.strip().replace(',', '')
-                                    # --- 修改点：提取 Last Price (索引3) 并清洗 ---
-                                    last_price_raw = cols[3].text.strip()
-                                    last_price_final = clean_price_and_multiply(last_price_raw)
+                                for row in rows:
+                                    cols = row.find_elements(By.TAG_NAME, "td")
+                                    if not cols: continue
+                                    # 确保列数足够 (Yahoo Options 表格通常有很多列)
+                                    if len(cols) >= 10:
+                                        # 针对不同分辨率，列索引可能微调，但通常 Strike 在 2 (index 2), OI 在 9 (index 9)
+                                        # 检查列内容是否有效
+                                        strike = cols[2].text.strip().replace(',', '')
+                                        # --- 修改点：提取 Last Price (索引3) 并清洗 ---
+                                        last_price_raw = cols[3].text.strip()
+                                        last_price_final = clean_price_and_multiply(last_price_raw)
                                     
-                                    if strike:
-                                        # 提取 Open Interest (索引9)
-                                        oi = clean_number(cols[9].text.strip())
-                                        # 将数据存入 buffer
-                                        data_buffer.append([symbol, formatted_date, opt_type, strike, oi, last_price_final])
-                                        has_data = True
+                                        if strike:
+                                            # 提取 Open Interest (索引9)
+                                            oi = clean_number(cols[9].text.strip())
+                                            # 将数据存入 buffer
+                                            data_buffer.append([symbol, formatted_date, opt_type, strike, oi, last_price_final])
+                                            has_data = True
                         
-                        if not has_data and attempt < MAX_PAGE_RETRIES - 1:
-                            time.sleep(2)
-                            continue
-
-                        # [核心修改]
-                        # 成功抓取后，追加到 symbol 总表，而不是写入 CSV
-                        if data_buffer:
-                            symbol_all_data.extend(data_buffer)
+                            if not has_data and attempt < MAX_PAGE_RETRIES - 1:
+                                time.sleep(2)
+                                continue
+
+                            # [核心修改]
+                            # 成功抓取后，追加到 symbol 总表，而不是写入 CSV
+                            if data_buffer:
+                                symbol_all_data.extend(data_buffer)
                         
-                        break # 成功则跳出重试循环
-                    except Exception as e:
-                        if attempt < MAX_PAGE_RETRIES - 1:
-                            time.sleep(2)
-                        else:
-                            pass
+                            break # 成功则跳出重试循环
+                        except Exception as e:
+                            if attempt < MAX_PAGE_RETRIES - 1:
+                                time.sleep(2)
+                            else:
+                                pass
             
             # [核心修改]
             # 当该 Symbol 的所有日期循环结束后，进行数据检查和写入
@@ -813,19 +875,25 @@ def scrape_options():
     finally:
         # 防止重复 quit
         try:
-            if 'driver' in locals():
+            if driver is not None:
                 driver.quit()
         except:
             pass
         tqdm.write(f"任务结束。数据已保存至: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="抓取 Yahoo 期权链")
+    parser.add_argument("--backend", choices=BACKENDS, default="selenium",
+                        help="页面后端：selenium（默认）/ http（只用 HTTP 解析）/ auto（HTTP 优先，失败回退 Selenium）")
+    args = parser.parse_args()
+
     # 1. 开启防休眠
     start_caffeinate()
     
     try:
         # 2. 执行爬虫任务
-        task_success = scrape_options()
+        task_success = scrape_options(args.backend)
         
         # 3. 如果需要，执行分析脚本
         # if task_success:
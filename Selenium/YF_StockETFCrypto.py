@@ -1,6 +1,7 @@
 import sqlite3
 import time
 import os
+import sys
 import json
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -11,6 +12,10 @@ from tqdm import tqdm
 import platform
 import urllib.parse
 from datetime import datetime, timedelta  # 确保添加此行导入
+# 并发抓取池（多个 headless driver + 单写库线程），与 YF_Today 共用
+from YF_History_Pool import run_driver_pool, make_headless_chrome, DEFAULT_WORKERS
+# 免浏览器后端（HTTP + selectolax / lxml），Selenium 兜底
+from YF_Fetch import PageWorker, FetchError, parse_history_rows, BACKENDS
 
 # ================= 配置区域 =================
 USER_HOME = os.path.expanduser("~")
@@ -23,6 +28,12 @@ DATABASE_DIR = os.path.join(BASE_CODING_DIR, "Database")
 
 # 具体业务文件路径
 DB_PATH = os.path.join(DATABASE_DIR, "Finance.db")
+
+# 批量写库（WAL + TEMP 暂存表 + 一个事务合并）
+sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Query"))
+from Bulk_Writer import BulkWriter
+sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Operations"))
+from Schema_Migration import ensure_covering_index
 # 修改配置区域：先定义基础路径，文件名稍后动态决定
 MODULES_DIR = os.path.join(FINANCIAL_SYSTEM_DIR, "Modules")
 
@@ -76,38 +87,22 @@ def create_table_if_not_exists(cursor, table_name):
     );
     """
     cursor.execute(create_table_sql)
+    ensure_covering_index(cursor, table_name)
 
-def insert_data_to_db(db_path, table_name, data_rows):
-    """将抓取的数据直接写入数据库"""
+def insert_data_to_db(writer, table_name, data_rows):
+    """
+    将抓取的数据写入数据库（Bulk_Writer：TEMP 暂存表 + 一条 INSERT ... SELECT ... ON CONFLICT）。
+    writer 为整次运行共用的 BulkWriter，暂存后立即合并。
+    """
     if not data_rows:
         return False
-        
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
-    safe_table = f'"{table_name}"'
-    
     try:
-        create_table_if_not_exists(cursor, table_name)
-        
-        upsert_sql = f"""
-        INSERT INTO {safe_table} (date, name, price, volume, open, high, low)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(date, name) DO UPDATE SET
-            price = excluded.price,
-            volume = excluded.volume,
-            open = excluded.open,
-            high = excluded.high,
-            low = excluded.low;
-        """
-        cursor.executemany(upsert_sql, data_rows)
-        conn.commit()
-        return True
+        writer.add(table_name, data_rows, prepare=create_table_if_not_exists)
+        stats = writer.commit()
     except sqlite3.Error as e:
         tqdm.write(f"❌ 数据库写入失败 ({table_name}): {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
+    return not stats['failed']
 
 def load_tasks_from_json(json_path):
     """从 JSON 加载待抓取任务"""
@@ -151,6 +146,21 @@ def remove_symbol_from_json(json_path, group_name, symbol):
         tqdm.write(f"⚠️ 更新 JSON 失败 [{symbol}]: {e}")
     return False
 
+def remove_symbols_from_json(json_path, group_name, symbols):
+    """并发模式下写库线程批量移除一组 Symbol，只读写一次 JSON"""
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        done = set(symbols)
+        if group_name in data and done & set(data[group_name]):
+            data[group_name] = [s for s in data[group_name] if s not in done]
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+            return True
+    except Exception as e:
+        tqdm.write(f"⚠️ 更新 JSON 失败 [{group_name}]: {e}")
+    return False
+
 # ================= 2. 核心抓取逻辑 =================
 
 def extract_data_via_js(driver, symbol):
@@ -236,7 +246,77 @@ def extract_data_via_js(driver, symbol):
         
     return formatted_data
 
-def scrape_history(json_path):
+def load_page_rows(driver, target_url, symbol, wait):
+    """打开 history 页、滚动加载懒加载的行后提取全部数据"""
+    driver.get(target_url)
+
+    # 等待表格加载
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "table")))
+    time.sleep(1) # 缓冲等待 JS 渲染数据
+
+    # 滚动页面以加载更多历史数据 (Yahoo History 是懒加载的)
+    for _ in range(3):
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        time.sleep(1)
+
+    # 提取数据 (这里传入原始的 symbol，如 "Bitcoin"，以保证写入数据库的 name 是 "Bitcoin")
+    return extract_data_via_js(driver, symbol)
+
+def scrape_history_pool(json_path, workers=DEFAULT_WORKERS, backend="selenium", **pool_options):
+    """
+    并发模式：workers 个 worker 同抓，写库与 JSON 清理在唯一的写库线程里按表批量完成。
+    backend 为 auto / http 时直接解析服务端渲染的 HTML；注意 HTTP 拿不到滚动懒加载出来的行，
+    只有页面首屏的那部分历史数据，要补全整段历史仍用 selenium。
+    """
+    tasks_dict = load_tasks_from_json(json_path)
+    alias_to_symbol = load_alias_mapping(SYMBOL_MAPPING_PATH)
+
+    task_list = []
+    for group, symbols in tasks_dict.items():
+        for sym in symbols:
+            scrape_symbol = alias_to_symbol[sym] if group == "Crypto" and sym in alias_to_symbol else sym
+            task_list.append((sym, group, scrape_symbol))
+    if not task_list:
+        tqdm.write("✅ JSON 文件中没有待抓取的 Symbol，任务结束。")
+        return {'written': 0, 'rows': 0, 'failed': [], 'seconds': 0.0}
+    tqdm.write(f"共加载 {len(task_list)} 个待抓取任务，并发 {workers} 个 driver。")
+
+    def fetch_rows(worker, task):
+        symbol, group, scrape_symbol = task
+        encoded_symbol = urllib.parse.quote(scrape_symbol)
+        target_url = f"https://finance.yahoo.com/quote/{encoded_symbol}/history/?period1={PERIOD_1}&period2={PERIOD_2}"
+        if worker.http is not None:
+            try:
+                data_rows = parse_history_rows(worker.http.get(target_url), symbol)
+                if not data_rows:
+                    raise FetchError("提取到的数据为空")
+                worker.http_ok()
+                return data_rows
+            except FetchError as e:
+                worker.http_failed(e)
+        driver = worker.driver
+        return load_page_rows(driver, target_url, symbol, WebDriverWait(driver, 10))
+
+    def on_written(group, tasks):
+        remove_symbols_from_json(json_path, group, [task[0] for task in tasks])
+
+    # 整次运行一个 BulkWriter：主线程创建，只在写库线程里使用，抓取池结束后关闭
+    with BulkWriter(DB_PATH, log=tqdm.write, check_same_thread=False) as writer:
+        def write_rows(group, rows):
+            return insert_data_to_db(writer, group, rows)
+
+        return run_driver_pool(
+            task_list,
+            lambda: PageWorker(backend, lambda: make_headless_chrome(CHROME_BINARY_PATH, CHROME_DRIVER_PATH)),
+            fetch_rows, write_rows, on_written,
+            workers=workers, **pool_options
+        )
+
+def scrape_history(json_path, workers=1, backend="selenium"):
+    if workers > 1 or backend != "selenium":
+        scrape_history_pool(json_path, workers, backend)
+        return
+
     # 1. 加载任务和映射表
     tasks_dict = load_tasks_from_json(json_path)
     alias_to_symbol = load_alias_mapping(SYMBOL_MAPPING_PATH)
@@ -278,6 +358,7 @@ def scrape_history(json_path):
 
     driver.set_page_load_timeout(30)
     wait = WebDriverWait(driver, 10)
+    writer = BulkWriter(DB_PATH, log=tqdm.write)  # 整次运行共用一个写库连接
 
     try:
         pbar = tqdm(task_list, desc="总体进度", position=0)
@@ -299,26 +380,13 @@ def scrape_history(json_path):
             
             for attempt in range(max_retries):
                 try:
-                    driver.get(target_url)
-                    
-                    # 等待表格加载
-                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "table")))
-                    time.sleep(1) # 缓冲等待 JS 渲染数据
-                    
-                    # 滚动页面以加载更多历史数据 (Yahoo History 是懒加载的)
-                    # 如果只需要默认显示的行数，可以注释掉下面这个循环
-                    for _ in range(3): 
-                        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                        time.sleep(1)
-                    
-                    # 提取数据 (这里传入原始的 symbol，如 "Bitcoin"，以保证写入数据库的 name 是 "Bitcoin")
-                    data_rows = extract_data_via_js(driver, symbol)
+                    data_rows = load_page_rows(driver, target_url, symbol, wait)
                     
                     if not data_rows:
                         raise Exception("提取到的数据为空")
                         
                     # 写入数据库
-                    if insert_data_to_db(DB_PATH, group, data_rows):
+                    if insert_data_to_db(writer, group, data_rows):
                         tqdm.write(f"[{symbol}] 成功写入 {len(data_rows)} 条数据到 {group} 表。")
                         # 成功后从 JSON 移除 (移除原始的 symbol)
                         remove_symbol_from_json(json_path, group, symbol)
@@ -334,14 +402,23 @@ def scrape_history(json_path):
                         tqdm.write(f"❌ [{symbol}] 抓取失败 (已重试 {max_retries} 次): {str(e)[:100]}")
             
     finally:
+        writer.close()
         driver.quit()
         tqdm.write("🎉 所有任务执行完毕。")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Yahoo history 抓取全部历史行情")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"并发 headless driver 数，>1 时启用抓取池（建议 {DEFAULT_WORKERS}）")
+    parser.add_argument("--backend", choices=BACKENDS, default="selenium",
+                        help="selenium: 滚动加载完整历史（默认）；auto / http: 只解析首屏 HTML，快但行数有限")
+    args = parser.parse_args()
+
     # 直接指定使用 Sectors_empty.json
     target_json_path = os.path.join(MODULES_DIR, "Sectors_empty.json")
     
     print(f"🚀 正在使用配置文件: {target_json_path}")
     
     # 启动爬虫
-    scrape_history(target_json_path)
\ No newline at end of file
+    scrape_history(target_json_path, args.workers, args.backend)
\ No newline at end of file
@@ -33,6 +33,20 @@ SECTORS_JSON_PATH = os.path.join(FINANCIAL_SYSTEM_DIR, "Modules", "Sectors_empty
 SYMBOL_MAPPING_PATH = os.path.join(FINANCIAL_SYSTEM_DIR, "Modules", "Symbol_mapping.json") # 新增映射文件路径
 CHECK_YESTERDAY_SCRIPT_PATH = os.path.join(FINANCIAL_SYSTEM_DIR, "Query", "Check_yesterday.py")
 
+# 增量滚动统计（与 Finance.db 同库）
+sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Query"))
+from Rolling_Stats import apply_rows as apply_rolling_stats
+# 批量写库（WAL + TEMP 暂存表 + 一个事务合并）
+from Bulk_Writer import BulkWriter, STAGE_COLUMNS
+sys.path.append(os.path.join(FINANCIAL_SYSTEM_DIR, "Operations"))
+from Schema_Migration import ensure_covering_index
+# 并发抓取池（多个 headless driver + 单写库线程）
+from YF_History_Pool import run_driver_pool, make_headless_chrome, DEFAULT_WORKERS
+# 免浏览器后端（HTTP + selectolax / lxml），Selenium 兜底
+from YF_Fetch import PageWorker, FetchError, parse_history_rows, BACKENDS
+
+YAHOO_BASE_URL = "https://finance.yahoo.com"
+
 # 浏览器与驱动路径 (跨平台适配)
 if platform.system() == 'Darwin':
     CHROME_BINARY_PATH = "/Applications/Google Chrome Beta.app/Contents/MacOS/Google Chrome Beta"
@@ -127,61 +141,40 @@ def create_table_if_not_exists(cursor, table_name, table_type):
             UNIQUE(date, name)
         )
         ''')
+    ensure_covering_index(cursor, table_name)
+
 
-def insert_data_to_db(db_path, table_name, data_rows, table_type):
-    """将抓取的数据直接写入数据库，根据 table_type 过滤字段并执行对应的 SQL"""
+# 各类表写入的列（data_rows 统一为 (date, name, price, volume, open, high, low)）
+TABLE_COLUMNS = {
+    "expanded": STAGE_COLUMNS,
+    "no_volume": STAGE_COLUMNS[:3],     # 只取 date, name, price
+    "standard": STAGE_COLUMNS[:4],      # 只取 date, name, price, volume
+}
+
+def stage_rows(writer, table_name, data_rows, table_type):
+    """
+    把 (date, name, price, volume, open, high, low) 暂存进 BulkWriter，按 table_type 只取对应的列；
+    合并前建表 / 建索引，合并后在同一事务里增量更新滚动统计（MA / 成交额排名 / 区间高低点）。
+    """
+    writer.add(table_name, data_rows, columns=TABLE_COLUMNS.get(table_type, STAGE_COLUMNS[:4]),
+               prepare=lambda cursor, table: create_table_if_not_exists(cursor, table, table_type),
+               after_merge=apply_rolling_stats)
+
+def insert_data_to_db(writer, table_name, data_rows, table_type):
+    """
+    将抓取的数据写入数据库（暂存后立即合并，一个事务）。
+    writer 为整次运行共用的 BulkWriter，不再每次写入都重新连接 / 切 WAL / 建 TEMP 表；
+    统计失败不影响行情写入。
+    """
     if not data_rows:
         return False
-    conn = sqlite3.connect(db_path, timeout=60.0)
-    cursor = conn.cursor()
-    safe_table = f'"{table_name}"'
     try:
-        create_table_if_not_exists(cursor, table_name, table_type)
-        
-        # 根据 table_type 准备数据和 SQL
-        filtered_data = []
-        if table_type == "expanded":
-            # data_rows 原本就是 (date, name, price, volume, open, high, low)
-            filtered_data = data_rows
-            upsert_sql = f"""
-            INSERT INTO {safe_table} (date, name, price, volume, open, high, low)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(date, name) DO UPDATE SET
-                price = excluded.price,
-                volume = excluded.volume,
-                open = excluded.open,
-                high = excluded.high,
-                low = excluded.low;
-            """
-        elif table_type == "no_volume":
-            # 只取前 3 个字段: date, name, price
-            filtered_data = [(row[0], row[1], row[2]) for row in data_rows]
-            upsert_sql = f"""
-            INSERT INTO {safe_table} (date, name, price)
-            VALUES (?, ?, ?)
-            ON CONFLICT(date, name) DO UPDATE SET
-                price = excluded.price;
-            """
-        else: # standard
-            # 只取前 4 个字段: date, name, price, volume
-            filtered_data = [(row[0], row[1], row[2], row[3]) for row in data_rows]
-            upsert_sql = f"""
-            INSERT INTO {safe_table} (date, name, price, volume)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(date, name) DO UPDATE SET
-                price = excluded.price,
-                volume = excluded.volume;
-            """
-            
-        cursor.executemany(upsert_sql, filtered_data)
-        conn.commit()
-        return True
+        stage_rows(writer, table_name, data_rows, table_type)
+        stats = writer.commit()
     except sqlite3.Error as e:
         tqdm.write(f"❌ 数据库写入失败 ({table_name}): {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
+    return not stats['failed']
 
 def load_tasks_from_json(json_path):
     """从 JSON 加载待抓取任务"""
@@ -223,8 +216,28 @@ def remove_symbol_from_json(json_path, group_name, symbol):
         tqdm.write(f"⚠️ 更新 JSON 失败 [{symbol}]: {e}")
     return False
 
+def remove_symbols_from_json(json_path, group_name, symbols):
+    """并发模式下写库线程批量移除一组 Symbol，只读写一次 JSON"""
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        done = set(symbols)
+        if group_name in data and done & set(data[group_name]):
+            data[group_name] = [s for s in data[group_name] if s not in done]
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+            return True
+    except Exception as e:
+        tqdm.write(f"⚠️ 更新 JSON 失败 [{group_name}]: {e}")
+    return False
+
 # ================= 2. 核心抓取逻辑 =================
 
+def build_history_url(scrape_symbol, base_url=YAHOO_BASE_URL):
+    """history 默认页（不带 period 参数）；base_url 可换成本地 fixture 服务"""
+    encoded_symbol = urllib.parse.quote(scrape_symbol)
+    return f"{base_url}/quote/{encoded_symbol}/history/"
+
 def get_last_valid_trading_date():
     """获取美股最近的一个有效开盘日（严格小于今天）"""
     nyse = mcal.get_calendar('NYSE')
@@ -323,7 +336,140 @@ def extract_data_via_js(driver, symbol):
         formatted_data.append((row[0], symbol, row[1], row[2], row[3], row[4], row[5]))
     return formatted_data
 
-def scrape_history():
+def select_row_for_date(data_rows, last_valid_date, symbol):
+    """
+    按最近有效开盘日从网页最新的两条数据里挑出要写入的一行（规则 1/2/3）。
+    data_rows 为 extract_data_via_js 的结果（至少一条）；返回 (date, name, price, volume, open, high, low)
+    """
+    # ================= 日期校验逻辑 =================
+    selected_row = None
+    
+    if last_valid_date:
+        row0_date = data_rows[0][0]
+        row1_date = data_rows[1][0] if len(data_rows) > 1 else None
+        
+        # 规则1：如果最新一条日期与计算日期一致
+        if row0_date == last_valid_date:
+            # 检查第二条是否也一致
+            if row1_date == last_valid_date:
+                selected_row = data_rows[1]
+            else:
+                selected_row = data_rows[0]
+                
+        # 规则2：如果最新一条日期比计算日期大
+        elif row0_date > last_valid_date:
+            # 看第二条是否一致
+            if row1_date == last_valid_date:
+                selected_row = data_rows[1]
+            elif row1_date is None:
+                # 只有第一条，没有第二条，将第一条的日期修改为 last_valid_date
+                tqdm.write(f"⚠️ [{symbol}] 最新日期 {row0_date} 过大且无第二条数据，将日期修改为 {last_valid_date} 写入。")
+                row_list = list(data_rows[0])
+                row_list[0] = last_valid_date  # 替换日期
+                selected_row = tuple(row_list)
+            else:
+                # 新增规则：第二条也不匹配时，用第一条数据但修改日期为 last_valid_date
+                tqdm.write(f"⚠️ [{symbol}] 最新日期 {row0_date} 过大，第二条 {row1_date} 不匹配 {last_valid_date}，使用第一条数据并修改日期写入。")
+                row_list = list(data_rows[0])
+                row_list[0] = last_valid_date  # 替换日期
+                selected_row = tuple(row_list)
+                
+        # 规则3：如果最新一条日期比计算日期小
+        else: # row0_date < last_valid_date
+            # 【新增逻辑】检查第一条和第二条的日期是否相同
+            if row1_date == row0_date:
+                tqdm.write(f"⚠️ [{symbol}] 网页最新日期 {row0_date} < 预期日期 {last_valid_date}，但存在两条相同日期数据，取第二条完整数据并修改日期写入。")
+                row_list = list(data_rows[1])
+                row_list[0] = last_valid_date  # 强行替换为正确的日期
+                selected_row = tuple(row_list)
+            # else:
+            #     tqdm.write(f"⚠️ [{symbol}] 网页最新日期 {row0_date} < 预期日期 {last_valid_date}，数据未更新，跳过。")
+            #     skip_symbol = True
+            #     break # 跳出重试循环，不再重试
+            else:
+                tqdm.write(f"⚠️ [{symbol}] 网页最新日期 {row0_date} < 预期日期 {last_valid_date}，数据未更新，临时使用最新数据并修改日期为 {last_valid_date} 写入。")
+                row_list = list(data_rows[0])
+                row_list[0] = last_valid_date  # 强行替换为正确的日期
+                selected_row = tuple(row_list)
+    else:
+        # 如果无法计算 last_valid_date，默认取第一条
+        selected_row = data_rows[0]
+    # ======================================================
+    return selected_row
+
+def scrape_history_pool(workers=DEFAULT_WORKERS, base_url=YAHOO_BASE_URL, db_path=DB_PATH,
+                        json_path=SECTORS_JSON_PATH, last_valid_date=None, backend="selenium",
+                        **pool_options):
+    """
+    并发模式：workers 个 worker 从同一个任务队列取 symbol，
+    日期校验（规则 1/2/3）、表类型、Symbol 转译与串行模式完全相同；
+    写库与 JSON 清理都在唯一的写库线程里按表批量完成。返回 run_driver_pool 的统计。
+    backend: selenium（每个 worker 一个 headless Chrome）/ auto（先 HTTP 解析，失败再用 Chrome）/ http
+    """
+    tasks_dict = load_tasks_from_json(json_path)
+    alias_to_symbol = load_alias_mapping(SYMBOL_MAPPING_PATH)
+
+    if last_valid_date is None:
+        last_valid_date = get_last_valid_trading_date()
+    if last_valid_date:
+        tqdm.write(f"📅 计算得出的最近有效开盘日为: {last_valid_date}")
+    else:
+        tqdm.write("⚠️ 无法计算最近有效开盘日，将使用网页原始日期。")
+
+    task_list = [(sym, group, alias_to_symbol.get(sym, sym))
+                 for group, symbols in tasks_dict.items() for sym in symbols]
+    if not task_list:
+        tqdm.write("✅ JSON 文件中没有待抓取的 Symbol，任务结束。")
+        return {'written': 0, 'rows': 0, 'failed': [], 'seconds': 0.0}
+    tqdm.write(f"共加载 {len(task_list)} 个待抓取任务，并发 {workers} 个 driver。")
+
+    def fetch_rows(worker, task):
+        symbol, group, scrape_symbol = task
+        url = build_history_url(scrape_symbol, base_url)
+        data_rows = None
+        if worker.http is not None:
+            try:
+                # 提取数据 (获取前两条)，与 extract_data_via_js 的结果相同
+                data_rows = parse_history_rows(worker.http.get(url), symbol, limit=2)
+                if not data_rows:
+                    raise FetchError("提取到的数据为空")
+                worker.http_ok()
+            except FetchError as e:
+                worker.http_failed(e)
+                data_rows = None
+        if data_rows is None:
+            driver = worker.driver
+            driver.get(url)
+            # 等待表格加载
+            WebDriverWait(driver, 8).until(EC.presence_of_element_located((By.CSS_SELECTOR, "table")))
+            # 提取数据 (获取前两条)
+            data_rows = extract_data_via_js(driver, symbol)
+        if not data_rows:
+            raise Exception("提取到的数据为空")
+        selected_row = select_row_for_date(data_rows, last_valid_date, symbol)
+        return [selected_row] if selected_row else []
+
+    def on_written(group, tasks):
+        remove_symbols_from_json(json_path, group, [task[0] for task in tasks])
+
+    # 整次运行一个 BulkWriter：主线程创建，只在写库线程里使用，抓取池结束后关闭
+    with BulkWriter(db_path, log=tqdm.write, check_same_thread=False) as writer:
+        def write_rows(group, rows):
+            return insert_data_to_db(writer, group, rows, get_table_type(group))
+
+        return run_driver_pool(
+            task_list,
+            lambda: PageWorker(backend, lambda: make_headless_chrome(CHROME_BINARY_PATH, CHROME_DRIVER_PATH)),
+            fetch_rows, write_rows, on_written,
+            workers=workers, **pool_options
+        )
+
+def scrape_history(workers=1, backend="selenium"):
+    if workers > 1 or backend != "selenium":
+        scrape_history_pool(workers, backend=backend)
+        run_check_yesterday_if_empty()
+        return
+
     # 1. 加载任务和映射表
     tasks_dict = load_tasks_from_json(SECTORS_JSON_PATH)
     alias_to_symbol = load_alias_mapping(SYMBOL_MAPPING_PATH)
@@ -375,6 +521,7 @@ def scrape_history():
 
     driver.set_page_load_timeout(30)
     wait = WebDriverWait(driver, 8) # 设置 8 秒超时
+    writer = BulkWriter(DB_PATH, log=tqdm.write)  # 整次运行共用一个写库连接
 
     try:
         pbar = tqdm(task_list, desc="总体进度", position=0)
@@ -391,9 +538,7 @@ def scrape_history():
                 scrape_symbol = symbol
                 pbar.set_description(f"处理中: {symbol} [{group}]")
             
-            encoded_symbol = urllib.parse.quote(scrape_symbol)
-            # 修改 URL：移除 period 参数，直接访问 history 默认页
-            target_url = f"https://finance.yahoo.com/quote/{encoded_symbol}/history/"
+            target_url = build_history_url(scrape_symbol)
             
             max_retries = 3
             success = False
@@ -411,64 +556,11 @@ def scrape_history():
                     if not data_rows:
                         raise Exception("提取到的数据为空")
                     
-                    # ================= 日期校验逻辑 =================
-                    selected_row = None
-                    
-                    if last_valid_date:
-                        row0_date = data_rows[0][0]
-                        row1_date = data_rows[1][0] if len(data_rows) > 1 else None
-                        
-                        # 规则1：如果最新一条日期与计算日期一致
-                        if row0_date == last_valid_date:
-                            # 检查第二条是否也一致
-                            if row1_date == last_valid_date:
-                                selected_row = data_rows[1]
-                            else:
-                                selected_row = data_rows[0]
-                                
-                        # 规则2：如果最新一条日期比计算日期大
-                        elif row0_date > last_valid_date:
-                            # 看第二条是否一致
-                            if row1_date == last_valid_date:
-                                selected_row = data_rows[1]
-                            elif row1_date is None:
-                                # 只有第一条，没有第二条，将第一条的日期修改为 last_valid_date
-                                tqdm.write(f"⚠️ [{symbol}] 最新日期 {row0_date} 过大且无第二条数据，将日期修改为 {last_valid_date} 写入。")
-                                row_list = list(data_rows[0])
-                                row_list[0] = last_valid_date  # 替换日期
-                                selected_row = tuple(row_list)
-                            else:
-                                # 新增规则：第二条也不匹配时，用第一条数据但修改日期为 last_valid_date
-                                tqdm.write(f"⚠️ [{symbol}] 最新日期 {row0_date} 过大，第二条 {row1_date} 不匹配 {last_valid_date}，使用第一条数据并修改日期写入。")
-                                row_list = list(data_rows[0])
-                                row_list[0] = last_valid_date  # 替换日期
-                                selected_row = tuple(row_list)
-                                
-                        # 规则3：如果最新一条日期比计算日期小
-                        else: # row0_date < last_valid_date
-                            # 【新增逻辑】检查第一条和第二条的日期是否相同
-                            if row1_date == row0_date:
-                                tqdm.write(f"⚠️ [{symbol}] 网页最新日期 {row0_date} < 预期日期 {last_valid_date}，但存在两条相同日期数据，取第二条完整数据并修改日期写入。")
-                                row_list = list(data_rows[1])
-                                row_list[0] = last_valid_date  # 强行替换为正确的日期
-                                selected_row = tuple(row_list)
-                            # else:
-                            #     tqdm.write(f"⚠️ [{symbol}] 网页最新日期 {row0_date} < 预期日期 {last_valid_date}，数据未更新，跳过。")
-                            #     skip_symbol = True
-                            #     break # 跳出重试循环，不再重试
-                            else:
-                                tqdm.write(f"⚠️ [{symbol}] 网页最新日期 {row0_date} < 预期日期 {last_valid_date}，数据未更新，临时使用最新数据并修改日期为 {last_valid_date} 写入。")
-                                row_list = list(data_rows[0])
-                                row_list[0] = last_valid_date  # 强行替换为正确的日期
-                                selected_row = tuple(row_list)
-                    else:
-                        # 如果无法计算 last_valid_date，默认取第一条
-                        selected_row = data_rows[0]
-                    # ======================================================
+                    selected_row = select_row_for_date(data_rows, last_valid_date, symbol)
 
                     if selected_row:
                         # 写入数据库（将选中的单行包装为列表传入）
-                        if insert_data_to_db(DB_PATH, group, [selected_row], table_type):
+                        if insert_data_to_db(writer, group, [selected_row], table_type):
                             tqdm.write(f"[{symbol}] 成功写入最新 1 条数据 ({selected_row[0]}) 到 {group} 表。")
                             remove_symbol_from_json(SECTORS_JSON_PATH, group, symbol)
                             success = True
@@ -485,6 +577,7 @@ def scrape_history():
                         tqdm.write(f"❌ [{symbol}] 抓取失败 (已重试 {max_retries} 次): {str(e)[:100]}")
             
     finally:
+        writer.close()
         driver.quit()
         tqdm.write("🎉 所有任务执行完毕。")
 
@@ -515,6 +608,14 @@ def run_check_yesterday_if_empty():
         print("⚠️ Sectors_empty.json 中仍有未完成的任务，跳过执行 Check_yesterday.py。")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Yahoo history 抓取最新行情")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"并发 headless driver 数，>1 时启用抓取池（建议 {DEFAULT_WORKERS}）")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="auto: HTTP 解析优先、Selenium 兜底；http: 只用 HTTP；selenium: 原来的浏览器抓取")
+    args = parser.parse_args()
+
     # 获取当前日期 (0=周一, 1=周二, ..., 5=周六, 6=周日)
     today_num = datetime.datetime.now().weekday()
     weekdays = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
@@ -526,6 +627,6 @@ if __name__ == "__main__":
     # # 逻辑：周二(1) 到 周六(5) 允许执行
     # if today_num in [1, 2, 3, 4, 5]:
     #     print(f"✅ 当前是 {today_str} (星期{today_num})，符合执行条件 (周二至周六)，开始任务...")
-    scrape_history()
+    scrape_history(args.workers, args.backend)
     # else:
     #     print(f"⚠️ 当前是 {today_str} (星期{today_num})，不符合执行条件 (周二至周六)，程序退出。")
\ No newline at end of file
@@ -28,6 +28,7 @@ TOP_N = 20
 sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Selenium"))
 try:
     from Tiger_API import _get_global_fetcher, _normalize_symbol
+    from Quote_Service import get_quote_service
 except ImportError as e:
     print(f"导入 Tiger_API 失败: {e}")
     sys.exit(1)
@@ -107,9 +108,9 @@ def get_pre_after_changes(top_n=TOP_N):
     if not symbols:
         return []
 
+    # 走进程内共享的报价服务：与图表等窗口共用 TTL 缓存和调用预算
     try:
-        fetcher = _get_global_fetcher()
-        latest_prices = fetcher.get_realtime_prices(symbols)
+        quotes = get_quote_service().get_quotes(symbols)
     except Exception as e:
         print(f"[pre_after] 拉取实时价失败: {e}")
         return []
@@ -118,8 +119,8 @@ def get_pre_after_changes(top_n=TOP_N):
 
     changes = []
     for sym in symbols:
-        norm = _normalize_symbol(sym)
-        latest = latest_prices.get(norm) or latest_prices.get(sym)
+        quote = quotes.get(sym)
+        latest = quote['price'] if quote else None
         close_price = close_map.get(sym)
         if latest is None or latest <= 0 or close_price is None or close_price <= 0:
             continue
@@ -1,11 +1,17 @@
 import json
 import sqlite3
 import os
+import sys
 import datetime
 
 USER_HOME = os.path.expanduser("~")
 BASE_CODING_DIR = os.path.join(USER_HOME, "Coding")
 
+# 共用 Query 目录下的批量成交额排名
+sys.path.append(os.path.join(BASE_CODING_DIR, "Financial_System", "Query"))
+from Turnover_Rank import turnover_rank, get_panel, preload, lookback_start, meets_cutoff, is_top_n as is_top_n_turnover
+from Earning_History_Store import get_store as get_earning_history_store
+
 # --- 1. 配置文件和路径 ---
 BASE_PATH = USER_HOME
 
@@ -232,6 +238,10 @@ def update_panel_with_conflict_check(json_path, pe_vol_list, pe_vol_notes, pe_vo
     except Exception as e:
         log_detail(f"错误: 写入 Panel JSON 文件失败: {e}")
 
+def load_history(history_json_path):
+    """{分组: {日期: [symbols]}}，直接从 Earning_History 库里取（库为准，不依赖 JSON 是否已导出）"""
+    return get_earning_history_store(DB_FILE, history_json_path).to_dict()
+
 def update_earning_history_json(file_path, group_name, symbols_to_add, log_detail, base_date_str):
     log_detail(f"\n--- 更新历史记录文件: {os.path.basename(file_path)} -> '{group_name}' ---")
     
@@ -244,31 +254,14 @@ def update_earning_history_json(file_path, group_name, symbols_to_add, log_detai
     record_date_str = base_date_str
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
-
-    if group_name not in data:
-        data[group_name] = {}
-
-    existing_symbols = data[group_name].get(record_date_str, [])
-    combined_symbols = set(existing_symbols) | set(symbols_to_add)
-    updated_symbols = sorted(list(combined_symbols))
-    
-    # 二次保险：如果合并后依然为空，也跳过
-    if not updated_symbols:
-        return
-    
-    data[group_name][record_date_str] = updated_symbols
-    num_added = len(updated_symbols) - len(existing_symbols)
-
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        history = get_earning_history_store(DB_FILE, file_path)
+        num_added, total = history.add(group_name, record_date_str, symbols_to_add)
+        # 二次保险：如果合并后依然为空，也跳过
+        if not total:
+            return
         log_detail(f"成功更新历史记录。日期: {record_date_str}, 分组: '{group_name}'.")
         log_detail(f" - 本次新增 {num_added} 个不重复的 symbol。")
-    except Exception as e:
+    except (sqlite3.Error, ValueError) as e:
         log_detail(f"错误: 写入历史记录文件失败: {e}")
 
 # --- 3. 核心逻辑模块 ---
@@ -374,8 +367,7 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
     
     # 加载历史记录
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
     except Exception as e:
         log_detail(f"错误: 无法读取历史记录文件: {e}")
         return []
@@ -416,6 +408,22 @@ def pe_volume(db_path, history_json_path, sector_map, target_date_override, symb
         (date_t2, 2, "T-2策略"),
         (date_t3, 3, "T-3策略")
     ]
+
+    # 成交额排名：先收集 4 个任务的全部候选，每张表一次读库（窗口同时覆盖"财报日起"和"N 个月"两种）
+    all_candidates = set()
+    for hist_date, _, _ in tasks:
+        for group in target_groups:
+            grp_data = history_data.get(group, {})
+            if isinstance(grp_data, dict):
+                all_candidates.update(clean_symbol(s) for s in grp_data.get(hist_date, []))
+    rank_pairs = [(sector_map[s], s) for s in sorted(all_candidates) if s in sector_map]
+    preload_days = int(CONFIG["COND8_VOLUME_LOOKBACK_MONTHS"] * 30)
+    cursor.execute("SELECT name, MAX(date) FROM Earning WHERE date <= ? GROUP BY name", (base_date,))
+    for name, er_date in cursor.fetchall():
+        if name in all_candidates and er_date:
+            er_days = (datetime.date.fromisoformat(base_date) - datetime.date.fromisoformat(er_date)).days
+            preload_days = max(preload_days, er_days)
+    preload(cursor, rank_pairs, base_date, preload_days)
     
     for hist_date, date_idx, task_name in tasks:
         # 1. 从历史文件中提取该日期的所有 symbol
@@ -538,8 +546,7 @@ def check_pe_volume_retention(db_path, history_json_path, panel_json_path, curre
     
     # 2. 加载历史记录，找到“前一天”的 PE_Volume 列表
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
         
         hist_pe_vol = history_data.get("PE_Volume", {})
         if not hist_pe_vol:
@@ -669,8 +676,7 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
 
     # 2. 从History中收集候选股 (仅限 T, T-1, T-2)
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
+        history_data = load_history(history_json_path)
     except Exception:
         conn.close()
         return []
@@ -691,6 +697,10 @@ def process_pe_volume_up(db_path, history_json_path, sector_map, target_date_ove
     log_detail(f"在 T, T-1, T-2 的历史记录中共扫描到 {len(candidate_symbols)} 个候选 Symbol。")
 
     results = []
+
+    # 成交额排名：全部候选每张表一次读库，下面 T, T-1, T-2 的排名都在内存里切片
+    preload(cursor, [(sector_map[s], s) for s in candidate_symbols if s in sector_map],
+            base_date, int(vol_rank_months * 30))
     
     # 3. 逐个检查逻辑
     for symbol in candidate_symbols:
@@ -830,9 +840,8 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
     # 加载历史记录
     hist_pe_vol_high = {}
     try:
-        with open(history_json_path, 'r', encoding='utf-8') as f:
-            hist_data = json.load(f)
-            hist_pe_vol_high = hist_data.get("PE_Volume_high", {})
+        hist_data = load_history(history_json_path)
+        hist_pe_vol_high = hist_data.get("PE_Volume_high", {})
     except Exception as e:
         log_detail(f"读取历史文件失败: {e}")
         hist_data = {}
@@ -892,6 +901,11 @@ def process_pe_volume_high(db_path, history_json_path, panel_json_path, sector_m
     # 遍历所有 symbol
     all_symbols = list(sector_map.keys())
     log_detail(f"开始扫描 {len(all_symbols)} 个 Symbol...")
+
+    # 成交额排名（12 个月 / 6 个月 / 丙类与抄底的 N 天）：每张表一次读库，循环里只在内存里切片
+    preload(cursor, [(sector_map[s], s) for s in all_symbols],
+            target_date_override or None,
+            max(turnover_lookback_months * 30, 6 * 30, bing_lookback_days))
     
     for symbol in all_symbols:
         is_tracing = (symbol == symbol_to_trace)
@@ -1226,6 +1240,10 @@ def process_etf_volume_high(db_path, target_date_override, symbol_to_trace, log_
         log_detail(f"错误: 无法读取 ETFs 数据表: {e}")
         conn.close()
         return []
+
+    # 成交额排名：全部 ETF 一次读库
+    preload(cursor, [("ETFs", s) for s in all_etfs], target_date_override or None,
+            turnover_lookback_months * 30)
         
     for symbol in all_etfs:
         is_tracing = (symbol == symbol_to_trace)
@@ -1310,6 +1328,10 @@ def process_etf_volume_low(db_path, target_date_override, symbol_to_trace, log_d
         conn.close()
         return []
         
+    # 成交额排名（T 日与 T-1 日）：全部 ETF 一次读库
+    preload(cursor, [("ETFs", s) for s in all_etfs], target_date_override or None,
+            turnover_lookback_months * 30)
+
     for symbol in all_etfs:
         is_tracing = (symbol == symbol_to_trace)
         if is_tracing:
@@ -1398,43 +1420,24 @@ def check_turnover_since_earning(cursor, sector_name, symbol, er_date_str, lates
     """
     检查 latest_turnover 是否是从 er_date_str (财报日) 到 latest_date_str 期间的前 rank_threshold 名成交额
     """
-    # 查询从财报日到最新日期的所有交易数据
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, er_date_str, latest_date_str))
-    rows = cursor.fetchall()
-    
-    # 计算成交额并过滤掉 None 值
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
-    
-    if not valid_data:
+    # 从财报日到最新日期的成交额前 N 名（批量接口，按 cursor 复用已加载的数据）
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, {symbol: er_date_str},
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
+
+    if not res or res.count == 0:
         return False
-    
-    # 按成交额从大到小排序
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    
-    # 获取前 rank_threshold 名
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-    
+
+    top_n_data = res.top
+
     # 判断最新成交额是否在前 N 名中（或者大于等于第 N 名）
-    is_top_n = False
-    if len(top_n_turnovers) > 0:
-        # 如果数据量少于阈值，且当前值在其中，那肯定是前N名
-        # 如果数据量足够，检查是否大于等于第N大的值
-        cutoff_value = top_n_turnovers[-1]
-        if latest_turnover >= cutoff_value:
-            is_top_n = True
-    
+    is_top_n = meets_cutoff(top_n_data, latest_turnover)
+
     if is_tracing:
-        log_detail(f"    - 条件F (财报日起前{rank_threshold}): 范围 {er_date_str} ~ {latest_date_str}, 共 {len(valid_data)} 个交易日")
+        log_detail(f"    - 条件F (财报日起前{rank_threshold}): 范围 {er_date_str} ~ {latest_date_str}, 共 {res.count} 个交易日")
         top_n_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
         log_detail(f"      前{rank_threshold}名: {top_n_str}")
         log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 是否前{rank_threshold}: {is_top_n}")
-    
+
     return is_top_n
 
 def check_turnover_rank_by_days(cursor, sector_name, symbol, latest_date_str, latest_turnover, lookback_days, rank_threshold, log_detail, is_tracing):
@@ -1444,49 +1447,23 @@ def check_turnover_rank_by_days(cursor, sector_name, symbol, latest_date_str, la
     参数:
         lookback_days: 回溯天数（如45天）
     """
-    # 计算 N 天前的日期
-    try:
-        dt = datetime.datetime.strptime(latest_date_str, "%Y-%m-%d")
-        start_date = dt - datetime.timedelta(days=lookback_days)
-        start_date_str = start_date.strftime("%Y-%m-%d")
-    except Exception:
-        return False
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, lookback_days,
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
 
-    # 查询过去 N 天的所有日期、价格和成交量
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, start_date_str, latest_date_str))
-    rows = cursor.fetchall()
-    
-    # 计算成交额并过滤掉 None 值
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
-    
-    if not valid_data:
+    if not res or res.count == 0:
         return False
-    
-    # 按成交额从大到小排序
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    
-    # 截取前 N 名
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-    
+
+    top_n_data = res.top
+
     # 判定逻辑
-    is_top_n = False
-    if latest_turnover in top_n_turnovers:
-        is_top_n = True
-    elif len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]:
-        is_top_n = True
-    
+    is_top_n = is_top_n_turnover(top_n_data, latest_turnover, rank_threshold)
+
     if is_tracing:
-        log_detail(f"    - 条件F (成交额排名-丙类): 回溯{lookback_days}天，共{len(valid_data)}个交易日")
+        log_detail(f"    - 条件F (成交额排名-丙类): 回溯{lookback_days}天，共{res.count}个交易日")
         top_n_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
         log_detail(f"      前{rank_threshold}名: {top_n_str}")
         log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 在前{rank_threshold}名: {is_top_n}")
-    
+
     return is_top_n
 
 def check_turnover_rank(cursor, sector_name, symbol, latest_date_str, latest_turnover, lookback_months, rank_threshold, log_detail, is_tracing):
@@ -1494,48 +1471,26 @@ def check_turnover_rank(cursor, sector_name, symbol, latest_date_str, latest_tur
     检查 latest_turnover (成交额=price*volume) 是否是过去 lookback_months 个月内的前 rank_threshold 名
     """
     # 计算 N 个月前的日期
-    try:
-        dt = datetime.datetime.strptime(latest_date_str, "%Y-%m-%d")
-        start_date = dt - datetime.timedelta(days=lookback_months * 30)
-        start_date_str = start_date.strftime("%Y-%m-%d")
-    except Exception:
+    start_date_str = lookback_start(latest_date_str, lookback_months * 30)
+    if start_date_str is None:
         return False
 
-    # 查询过去 N 个月的所有日期、价格和成交量
-    query = f'SELECT date, price, volume FROM "{sector_name}" WHERE name = ? AND date >= ? AND date <= ?'
-    cursor.execute(query, (symbol, start_date_str, latest_date_str))
-    rows = cursor.fetchall()
-    
-    # 计算成交额并过滤掉 None 值
-    valid_data = []
-    for r in rows:
-        if r[1] is not None and r[2] is not None:
-            turnover = r[1] * r[2]
-            valid_data.append((r[0], turnover))
-    
-    if not valid_data:
+    res = turnover_rank(cursor, [(sector_name, symbol)], latest_date_str, lookback_months * 30,
+                        rank_threshold, panel=get_panel(cursor)).get(symbol)
+    top_n_data, valid_count = (res.top, res.count) if res else ([], 0)
+
+    if valid_count == 0:
         return False
-    
-    # 按成交额从大到小排序
-    sorted_data = sorted(valid_data, key=lambda x: x[1], reverse=True)
-    
-    # 截取前 N 名
-    top_n_data = sorted_data[:rank_threshold]
-    top_n_turnovers = [item[1] for item in top_n_data]
-    
+
     # 判定逻辑
-    is_top_n = False
-    if latest_turnover in top_n_turnovers:
-        is_top_n = True
-    elif len(top_n_turnovers) >= rank_threshold and latest_turnover >= top_n_turnovers[rank_threshold - 1]:
-        is_top_n = True
-    
+    is_top_n = is_top_n_turnover(top_n_data, latest_turnover, rank_threshold)
+
     if is_tracing:
-        log_detail(f"    - 条件E (成交额排名): 回溯{lookback_months}个月，共{len(valid_data)}个交易日")
+        log_detail(f"    - 条件E (成交额排名): 回溯{lookback_months}个月，共{valid_count}个交易日")
         top_n_str = ", ".join([f"[{d}]: {v:,.0f}" for d, v in top_n_data])
         log_detail(f"      前{rank_threshold}名: {top_n_str}")
         log_detail(f"      当前成交额: {latest_turnover:,.0f} -> 在前{rank_threshold}名: {is_top_n}")
-    
+
     return is_top_n
 
 # ========== 修改：处理 PE_Hot 策略的独立函数 (接收动态白名单 + 增加市值维度 + 10天防暴涨过滤) ==========